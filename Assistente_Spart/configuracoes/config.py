@@ -14,6 +14,12 @@ CAMINHO_FAISS = str(BASE_DIR / "faiss" / "faiss_full_rag.index")
 CAMINHO_META = str(BASE_DIR / "faiss" / "faiss_full_rag_meta.pkl")
 DATASET_PATH = str(BASE_DIR / "dataset_finetuning.jsonl")
 DB_PATH = str(BASE_DIR / "db" / "manuais.db")
+# Matriz normalizada dos embeddings dos manuais (memory-mapped, refeita quando o SQLite muda)
+MANUAIS_MATRIZ_PATH = str(BASE_DIR / "db" / "manuais_matriz.npy")
+MANUAIS_IDS_PATH = str(BASE_DIR / "db" / "manuais_ids.npy")
+# Cache persistente de embeddings de perguntas (arquivo separado para não invalidar a matriz)
+CACHE_EMBEDDINGS_PATH = str(BASE_DIR / "db" / "cache_embeddings.db")
+CACHE_EMBEDDINGS_MAX = 2048  # entradas no LRU em memória
 
 # Configurações do modelo
 EMBEDDING_MODEL = "text-embedding-3-small"
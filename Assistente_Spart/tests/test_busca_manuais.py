@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import tempfile
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from Assistente_Spart.utils import cache_embeddings
+from Assistente_Spart.utils.sqlite_manuais import IndiceManuais
+
+
+class IndiceManuaisTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.dir.name, "manuais.db")
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("CREATE TABLE manuais (id INTEGER PRIMARY KEY, titulo TEXT, url TEXT, embedding BLOB)")
+            vetores = {
+                1: np.array([1, 0, 0], dtype="float32"),
+                2: np.array([0, 2, 0], dtype="float32"),
+                3: np.array([1, 1, 0], dtype="float32"),
+                4: np.array([1, 1], dtype="float32"),  # dimensão errada: ignorado
+            }
+            for id_, emb in vetores.items():
+                conn.execute("INSERT INTO manuais VALUES (?, ?, ?, ?)", (id_, f"m{id_}", f"u{id_}", emb.tobytes()))
+        self.indice = IndiceManuais(
+            self.db, os.path.join(self.dir.name, "m.npy"), os.path.join(self.dir.name, "i.npy"), dim=3
+        )
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_ordena_por_cosseno(self):
+        resultado = self.indice.buscar(np.array([0, 3, 0], dtype="float32"), top_n=2)
+        self.assertEqual([id_ for _, id_ in resultado], [2, 3])
+        self.assertAlmostEqual(resultado[0][0], 1.0, places=5)
+
+    def test_reaproveita_matriz_gravada(self):
+        self.indice.garantir()
+        self.assertIsInstance(self.indice.matriz, np.memmap)
+        outro = IndiceManuais(self.db, self.indice.matriz_path, self.indice.ids_path, dim=3)
+        with patch.object(outro, "_reconstruir") as reconstruir:
+            outro.garantir()
+        reconstruir.assert_not_called()
+        self.assertEqual(sorted(outro.ids.tolist()), [1, 2, 3])
+
+    def test_ids_de_outra_geracao_refaz_matriz(self):
+        self.indice.garantir()
+        np.save(self.indice.ids_path, np.array([1, 2], dtype="int64"))
+        outro = IndiceManuais(self.db, self.indice.matriz_path, self.indice.ids_path, dim=3)
+        outro.garantir()
+        self.assertEqual(len(outro.ids), outro.matriz.shape[0])
+        self.assertEqual(sorted(outro.ids.tolist()), [1, 2, 3])
+
+    def test_refazer_nao_altera_matriz_aberta(self):
+        self.indice.garantir()
+        aberta = self.indice.matriz
+        antes = np.array(aberta)
+        with sqlite3.connect(self.db) as conn:
+            conn.execute("UPDATE manuais SET embedding = ? WHERE id = 1", (np.array([0, 0, 5], dtype="float32").tobytes(),))
+        self.indice._reconstruir()
+        np.testing.assert_array_equal(aberta, antes)
+        self.assertEqual([n for n in os.listdir(self.dir.name) if n.endswith(".tmp")], [])
+
+
+class CacheEmbeddingsTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.patches = [
+            patch.object(cache_embeddings, "CACHE_EMBEDDINGS_PATH", os.path.join(self.dir.name, "c.db")),
+            patch.object(cache_embeddings, "_tabela_criada", False),
+        ]
+        for p in self.patches:
+            p.start()
+        cache_embeddings.limpar_cache()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        cache_embeddings.limpar_cache()
+        self.dir.cleanup()
+
+    def test_pergunta_repetida_nao_chama_api(self):
+        gerar = MagicMock(return_value=[0.5, 0.5])
+        a = cache_embeddings.embedding_pergunta("Como emitir  NF-e?", gerar)
+        b = cache_embeddings.embedding_pergunta("como emitir nf-e? ", gerar)
+        self.assertEqual(gerar.call_count, 1)
+        self.assertIs(a, b)
+
+    def test_cache_persistido_sobrevive_ao_lru(self):
+        gerar = MagicMock(return_value=[1.0, 2.0])
+        cache_embeddings.embedding_pergunta("pergunta", gerar)
+        cache_embeddings.limpar_cache()
+        emb = cache_embeddings.embedding_pergunta("pergunta", gerar)
+        self.assertEqual(gerar.call_count, 1)
+        self.assertEqual(emb.tolist(), [1.0, 2.0])
+
+    def test_cria_pasta_do_cache(self):
+        caminho = os.path.join(self.dir.name, "novo", "c.db")
+        with patch.object(cache_embeddings, "CACHE_EMBEDDINGS_PATH", caminho):
+            cache_embeddings.embedding_pergunta("pergunta", MagicMock(return_value=[1.0]))
+        self.assertTrue(os.path.exists(caminho))
@@ -0,0 +1,98 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ..configuracoes.config import CACHE_EMBEDDINGS_MAX, CACHE_EMBEDDINGS_PATH, EMBEDDING_MODEL
+
+_lock = threading.Lock()
+_lru = OrderedDict()
+_tabela_criada = False
+
+
+def normalizar_pergunta(texto: str) -> str:
+    """Chave do cache: minúsculas, sem espaços extras."""
+    return re.sub(r"\s+", " ", str(texto or "").strip().lower())
+
+
+def _conectar():
+    global _tabela_criada
+    if not _tabela_criada:
+        os.makedirs(os.path.dirname(CACHE_EMBEDDINGS_PATH), exist_ok=True)
+    conn = sqlite3.connect(CACHE_EMBEDDINGS_PATH, check_same_thread=False)
+    if not _tabela_criada:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_embeddings (
+                chave TEXT NOT NULL,
+                modelo TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (chave, modelo)
+            )
+        """)
+        conn.commit()
+        _tabela_criada = True
+    return conn
+
+
+def _lembrar(chave, emb):
+    with _lock:
+        _lru[chave] = emb
+        _lru.move_to_end(chave)
+        while len(_lru) > CACHE_EMBEDDINGS_MAX:
+            _lru.popitem(last=False)
+
+
+def _ler_persistido(chave):
+    try:
+        with _conectar() as conn:
+            row = conn.execute(
+                "SELECT embedding FROM cache_embeddings WHERE chave = ? AND modelo = ?",
+                (chave, EMBEDDING_MODEL),
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    return np.frombuffer(row[0], dtype="float32") if row else None
+
+
+def _persistir(chave, emb):
+    try:
+        with _conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_embeddings (chave, modelo, embedding) VALUES (?, ?, ?)",
+                (chave, EMBEDDING_MODEL, emb.tobytes()),
+            )
+            conn.commit()
+    except sqlite3.Error:
+        # cache é só otimização: falha de disco não derruba a pergunta
+        pass
+
+
+def embedding_pergunta(texto: str, gerar) -> np.ndarray:
+    """
+    Embedding de ``texto`` com cache: LRU em memória, depois SQLite em disco,
+    e só então ``gerar(texto)`` (chamada à API). Perguntas iguais após a
+    normalização reaproveitam o mesmo vetor.
+    """
+    chave = normalizar_pergunta(texto)
+    with _lock:
+        emb = _lru.get(chave)
+        if emb is not None:
+            _lru.move_to_end(chave)
+            return emb
+
+    emb = _ler_persistido(chave)
+    if emb is None:
+        emb = np.array(gerar(texto), dtype="float32")
+        _persistir(chave, emb)
+    # vetor compartilhado entre chamadas: somente leitura
+    emb.setflags(write=False)
+    _lembrar(chave, emb)
+    return emb
+
+
+def limpar_cache():
+    with _lock:
+        _lru.clear()
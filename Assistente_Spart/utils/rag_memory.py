@@ -2,6 +2,7 @@ import os, pickle, numpy as np
 import faiss
 import tiktoken
 from openai import OpenAI
+from .cache_embeddings import embedding_pergunta
 from ..configuracoes.config import API_KEY, CAMINHO_FAISS, CAMINHO_META, EMBED_DIM, EMBEDDING_MODEL, TOKENIZER_ENCODING, MAX_TOKENS_PER_CHUNK
 
 _client = None
@@ -36,6 +37,10 @@ class RAGMemory:
         self.ids_set = set(hash(text) for text in self.meta)
 
     def embed_text(self, texto: str):
+        # Mesma pergunta (normalizada) não volta à API: ver cache_embeddings
+        return embedding_pergunta(texto, self._gerar_embedding)
+
+    def _gerar_embedding(self, texto: str):
         client = get_client()
         resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texto)
         return np.array(resp.data[0].embedding, dtype="float32")
@@ -1,14 +1,15 @@
 import sqlite3
 import os
+import tempfile
+import threading
 import numpy as np
-from openai import OpenAI
-from ..configuracoes.config import API_KEY, DB_PATH, EMBEDDING_MODEL
+from .cache_embeddings import embedding_pergunta
+from .rag_memory import get_client
+from ..configuracoes.config import DB_PATH, EMBED_DIM, EMBEDDING_MODEL, MANUAIS_IDS_PATH, MANUAIS_MATRIZ_PATH
 
 # Garante diretório do banco
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-client = OpenAI(api_key=API_KEY)
-
 # Cria tabela (robusto em multi-thread)
 with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
     c = conn.cursor()
@@ -24,7 +25,7 @@ with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
     conn.commit()
 
 def gerar_embedding(texto: str):
-    resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texto)
+    resp = get_client().embeddings.create(model=EMBEDDING_MODEL, input=texto)
     return np.array(resp.data[0].embedding, dtype="float32")
 
 def inserir_manual_com_embedding(titulo: str, url: str):
@@ -44,30 +45,122 @@ def inserir_manual_com_embedding(titulo: str, url: str):
         )
         conn.commit()
 
+
+def _salvar_npy(path, array):
+    """
+    Grava o .npy num temporário da mesma pasta e troca com ``os.replace``:
+    quem está com o arquivo antigo aberto em mmap continua lendo o antigo.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".npy.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class IndiceManuais:
+    """
+    Embeddings dos manuais numa matriz float32 contígua, já normalizada
+    (produto interno = cosseno). A matriz é gravada em .npy ao lado do banco
+    e aberta com mmap; só é refeita a partir do SQLite quando o banco fica
+    mais novo que ela.
+    """
+
+    def __init__(self, db_path=DB_PATH, matriz_path=MANUAIS_MATRIZ_PATH, ids_path=MANUAIS_IDS_PATH, dim=EMBED_DIM):
+        self.db_path = db_path
+        self.matriz_path = matriz_path
+        self.ids_path = ids_path
+        self.dim = dim
+        self.matriz = np.zeros((0, dim), dtype="float32")
+        self.ids = np.zeros(0, dtype="int64")
+        self._versao = None
+        self._lock = threading.Lock()
+
+    def _versao_banco(self):
+        try:
+            return os.path.getmtime(self.db_path)
+        except OSError:
+            return 0.0
+
+    def _reconstruir(self):
+        ids, vetores = [], []
+        with sqlite3.connect(self.db_path, check_same_thread=False) as conn:
+            for id_, blob in conn.execute("SELECT id, embedding FROM manuais WHERE embedding IS NOT NULL"):
+                emb = np.frombuffer(blob, dtype="float32")
+                # ignora embeddings com dimensão incompatível
+                if emb.size == self.dim:
+                    ids.append(id_)
+                    vetores.append(emb)
+        matriz = np.vstack(vetores) if vetores else np.zeros((0, self.dim), dtype="float32")
+        normas = np.linalg.norm(matriz, axis=1)
+        validos = normas > 0
+        matriz = np.ascontiguousarray(matriz[validos] / normas[validos, None], dtype="float32")
+        ids = np.asarray(ids, dtype="int64")[validos]
+        try:
+            # ids antes da matriz: é a data da matriz que libera a leitura em _carregar
+            _salvar_npy(self.ids_path, ids)
+            _salvar_npy(self.matriz_path, matriz)
+        except OSError:
+            return matriz, ids
+        return np.load(self.matriz_path, mmap_mode="r"), np.load(self.ids_path)
+
+    def _carregar(self, versao):
+        try:
+            if os.path.getmtime(self.matriz_path) >= versao and os.path.exists(self.ids_path):
+                matriz = np.load(self.matriz_path, mmap_mode="r")
+                ids = np.load(self.ids_path)
+                # par de arquivos de gerações diferentes: refaz
+                if matriz.ndim == 2 and matriz.shape[1] == self.dim and len(ids) == matriz.shape[0]:
+                    return matriz, ids
+        except (OSError, ValueError):
+            pass
+        return self._reconstruir()
+
+    def garantir(self):
+        versao = self._versao_banco()
+        if versao != self._versao:
+            with self._lock:
+                if versao != self._versao:
+                    self.matriz, self.ids = self._carregar(versao)
+                    self._versao = versao
+        return self
+
+    def buscar(self, query_emb, top_n=3):
+        """Lista de (similaridade, id) dos ``top_n`` manuais mais próximos."""
+        self.garantir()
+        query_emb = np.asarray(query_emb, dtype="float32")
+        qnorm = np.linalg.norm(query_emb)
+        if qnorm == 0 or query_emb.size != self.dim or not len(self.ids):
+            return []
+        sims = self.matriz @ (query_emb / qnorm)
+        n = min(top_n, sims.size)
+        melhores = np.argpartition(-sims, n - 1)[:n]
+        melhores = melhores[np.argsort(-sims[melhores])]
+        return [(float(sims[i]), int(self.ids[i])) for i in melhores]
+
+
+_indice = IndiceManuais()
+
 def buscar_manual_por_pergunta_vetorial(pergunta: str, top_n: int = 3):
-    query_emb = gerar_embedding(pergunta)
-    qnorm = np.linalg.norm(query_emb)
-    if qnorm == 0:
+    query_emb = embedding_pergunta(pergunta, gerar_embedding)
+    encontrados = _indice.buscar(query_emb, top_n)
+    if not encontrados:
         return []
-    resultados = []
-
+    ids = [id_ for _, id_ in encontrados]
     with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
         c = conn.cursor()
-        c.execute("SELECT id, titulo, url, embedding FROM manuais")
-        rows = c.fetchall()
-        for id_, titulo, url, emb_blob in rows:
-            emb = np.frombuffer(emb_blob, dtype="float32")
-            # ignora embeddings com dimensão incompatível
-            if emb.size != query_emb.size:
-                continue
-            denom = (qnorm * np.linalg.norm(emb))
-            if denom == 0:
-                continue
-            sim = float(np.dot(query_emb, emb) / denom)
-            resultados.append((sim, id_, titulo, url))
-
-    resultados.sort(reverse=True, key=lambda x: x[0])
-    return resultados[:top_n]
+        c.execute(
+            f"SELECT id, titulo, url FROM manuais WHERE id IN ({', '.join('?' * len(ids))})",
+            ids,
+        )
+        dados = {id_: (titulo, url) for id_, titulo, url in c.fetchall()}
+    return [(sim, id_) + dados[id_] for sim, id_ in encontrados if id_ in dados]
 
 def buscar_manual_por_id(id_: int):
     with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
@@ -78,4 +171,4 @@ def buscar_manual_por_id(id_: int):
             id_, titulo, url, emb_blob = row
             emb = np.frombuffer(emb_blob, dtype="float32")
             return {"id": id_, "titulo": titulo, "url": url, "embedding": emb}
-        return None
\ No newline at end of file
+        return None
@@ -2,7 +2,7 @@ from django.views.generic import TemplateView
 from requests import post
 from Licencas.models import Empresas, Filiais
 from core.middleware import get_licenca_slug
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from core.utils import get_licenca_db_config
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
@@ -13,11 +13,31 @@ import logging
 from ..models import Caixageral, Movicaixa, TIPO_MOVIMENTO
 from Pedidos.models import PedidoVenda, Itenspedidovenda
 from ..services import CaixaService
+from core.numeracao import NumeracaoService
+from functools import wraps
+from ..carrinho import CarrinhoExpirado, CarrinhoService, PrecosCaixa
+from ..extrato import ExtratoCaixaService, TAMANHO_PAGINA, TIPOS_MOVIMENTO
 
 
 logger = logging.getLogger(__name__)
 
 
+def _carrinho_expirado(view):
+    """Responde 409 quando o carrinho da venda expirou com itens não gravados."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except CarrinhoExpirado as e:
+            return JsonResponse({
+                'detail': str(e),
+                'codigo': 'carrinho_expirado',
+                'numero_venda': e.numero_venda,
+                'total_gravado': float(e.total_gravado),
+            }, status=409)
+    return wrapper
+
+
 class CaixaDashboardView(TemplateView):
     template_name = 'CaixaDiario/caixa_dashboard.html'
 
@@ -359,11 +379,12 @@ def caixa_resumo(request, slug=None):
         movi_caix=caixa_aberto.caix_caix,
         movi_data=data_ref
     )
-    entradas = float(movs.aggregate(Sum('movi_entr'))['movi_entr__sum'] or 0)
-    saidas = float(movs.aggregate(Sum('movi_said'))['movi_said__sum'] or 0)
+    agregados = ExtratoCaixaService.resumo_caixa(movs)
+    entradas = agregados['entradas']
+    saidas = agregados['saidas']
     saldo_atual = float(saldo_inicial) + entradas - saidas
-    qtd_movimentos = movs.count()
-    tipos_map = {'1': 'DINHEIRO', '2': 'CHEQUE', '3': 'CARTÃO DE CREDITO', '4': 'CARTÃO DE DEBITO', '5': 'CREDIÁRIO', '6': 'PIX'}
+    qtd_movimentos = agregados['qtd_movimentos']
+    tipos_map = TIPOS_MOVIMENTO
     por_forma = []
     for row in movs.values('movi_tipo').annotate(total=Sum('movi_entr')).order_by('-total'):
         tipo = str(row.get('movi_tipo'))
@@ -372,7 +393,7 @@ def caixa_resumo(request, slug=None):
             'descricao': tipos_map.get(tipo, tipo),
             'total': float(row.get('total') or 0)
         })
-    total_vendas = movs.exclude(movi_nume_vend__isnull=True).values('movi_nume_vend').distinct().count()
+    total_vendas = agregados['total_vendas']
     return JsonResponse({
         'caixa': int(caixa_aberto.caix_caix),
         'data': str(data_ref),
@@ -404,9 +425,7 @@ def venda_iniciar(request, slug=None):
     if not caixa_aberto:
         return JsonResponse({'Detalhe': 'Caixa não está aberto'}, status=400)
     with transaction.atomic(using=banco):
-        ultimo_num_pedido = PedidoVenda.objects.using(banco).filter(pedi_empr=empresa_id, pedi_fili=filial_id).aggregate(Max('pedi_nume'))['pedi_nume__max'] or 0
-        ultimo_num_movimento = Movicaixa.objects.using(banco).filter(movi_empr=empresa_id, movi_fili=filial_id).aggregate(Max('movi_nume_vend'))['movi_nume_vend__max'] or 0
-        numero_venda = max(ultimo_num_pedido, ultimo_num_movimento) + 1
+        numero_venda = NumeracaoService.proximo(banco, 'pedido', empresa_id, filial_id)
         pedido_existente = PedidoVenda.objects.using(banco).filter(
             pedi_empr=empresa_id,
             pedi_fili=filial_id,
@@ -423,7 +442,7 @@ def venda_iniciar(request, slug=None):
             pedido_existente.pedi_hora = datetime.now().time()
             pedido_existente.save(using=banco)
         else:
-            PedidoVenda.objects.using(banco).create(
+            pedido_existente = PedidoVenda.objects.using(banco).create(
                 pedi_empr=empresa_id,
                 pedi_fili=filial_id,
                 pedi_nume=numero_venda,
@@ -432,6 +451,7 @@ def venda_iniciar(request, slug=None):
                 pedi_data=datetime.today().date(),
                 pedi_stat='0',
             )
+    CarrinhoService.iniciar(banco, empresa_id, filial_id, pedido_existente)
     return JsonResponse({
         'numero_venda': numero_venda,
         'cliente': cliente,
@@ -445,6 +465,7 @@ def venda_iniciar(request, slug=None):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_carrinho_expirado
 def venda_adicionar_item(request, slug=None):
     banco = get_licenca_db_config(request)
     empresa_id = request.session.get('empresa_id') or request.headers.get('X-Empresa') or request.GET.get('empresa')
@@ -473,63 +494,31 @@ def venda_adicionar_item(request, slug=None):
             valor_unitario = float(valor_unitario_in or 0)
             if valor_unitario <= 0:
                 return JsonResponse({'Detalhe': 'Valor unitário manual inválido'}, status=400)
-        elif preco_origem == 'promocional':
-            from Produtos.servicos.preco_promocional import buscar_preco_promocional, obter_valor_preco_promocional
-            tp = buscar_preco_promocional(
-                banco=banco,
-                tabe_empr=str(empresa_id),
-                tabe_fili=str(filial_id),
-                tabe_prod=str(produto),
-            )
-            price = obter_valor_preco_promocional(preco=tp, modalidade=preco_tipo)
         else:
-            from Produtos.servicos.preco_servico import buscar_preco_normal, obter_valor_preco_normal
-            tp = buscar_preco_normal(
-                banco=banco,
-                tabe_empr=str(empresa_id),
-                tabe_fili=str(filial_id),
-                tabe_prod=str(produto),
+            price = PrecosCaixa.preco(
+                banco,
+                empresa_id,
+                filial_id,
+                produto,
+                origem='promocional' if preco_origem == 'promocional' else 'normal',
+                modalidade=preco_tipo,
             )
-            price = obter_valor_preco_normal(preco=tp, modalidade=preco_tipo)
         if preco_origem != 'manual':
             if price is None:
                 return JsonResponse({'Detalhe': 'Preço não encontrado para o produto'}, status=400)
             valor_unitario = float(price or 0)
     except Exception:
         return JsonResponse({'Detalhe': 'Preço não encontrado para o produto'}, status=400)
-    with transaction.atomic(using=banco):
-        pedido = PedidoVenda.objects.using(banco).filter(pedi_empr=empresa_id, pedi_fili=filial_id, pedi_nume=numero_venda).first()
-        if not pedido:
-            return JsonResponse({'Detalhe': f'Pedido {numero_venda} não encontrado'}, status=400)
-        valor_total = float(quantidade_val) * float(valor_unitario)
-        item_existente = Itenspedidovenda.objects.using(banco).filter(iped_empr=empresa_id, iped_fili=filial_id, iped_pedi=str(numero_venda), iped_prod=produto).first()
-        if item_existente:
-            item_existente.iped_unit = valor_unitario
-            item_existente.iped_quan = float(item_existente.iped_quan) + float(quantidade_val)
-            item_existente.iped_tota = float(item_existente.iped_quan) * float(item_existente.iped_unit)
-            item_existente.save(using=banco)
-            item_obj = item_existente
-        else:
-            ultimo_item = Itenspedidovenda.objects.using(banco).filter(iped_empr=empresa_id, iped_fili=filial_id, iped_pedi=str(numero_venda)).aggregate(Max('iped_item'))['iped_item__max'] or 0
-            item_obj = Itenspedidovenda.objects.using(banco).create(
-                iped_empr=empresa_id,
-                iped_fili=filial_id,
-                iped_pedi=str(numero_venda),
-                iped_item=ultimo_item + 1,
-                iped_prod=produto,
-                iped_quan=quantidade_val,
-                iped_unit=valor_unitario,
-                iped_tota=valor_total,
-                iped_data=pedido.pedi_data,
-                iped_forn=pedido.pedi_forn
-            )
-        total_pedido = Itenspedidovenda.objects.using(banco).filter(iped_empr=empresa_id, iped_fili=filial_id, iped_pedi=str(numero_venda)).aggregate(Sum('iped_tota'))['iped_tota__sum'] or 0
-        pedido.pedi_tota = total_pedido
-        pedido.save(using=banco)
+    carrinho, _ = CarrinhoService.adicionar(banco, empresa_id, filial_id, numero_venda, produto, quantidade_val, valor_unitario)
+    if carrinho is None:
+        return JsonResponse({'Detalhe': f'Pedido {numero_venda} não encontrado'}, status=400)
+    valor_total = float(quantidade_val) * float(valor_unitario)
+    total_pedido = carrinho['total']
     return JsonResponse({'numero_venda': numero_venda, 'produto': produto, 'quantidade': float(quantidade_val), 'valor_unitario': float(valor_unitario), 'valor_total': float(valor_total), 'total_pedido': float(total_pedido), 'preco_origem': preco_origem or 'normal', 'preco_tipo': preco_tipo, 'status': 'Item adicionado com sucesso'})
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_carrinho_expirado
 def venda_atualizar_item(request, slug=None):
     banco = get_licenca_db_config(request)
     empresa_id = request.session.get('empresa_id') or request.headers.get('X-Empresa') or request.GET.get('empresa')
@@ -552,56 +541,31 @@ def venda_atualizar_item(request, slug=None):
             valor_unitario = float(valor_unitario_in or 0)
             if valor_unitario <= 0:
                 return JsonResponse({'Detalhe': 'Valor unitário manual inválido'}, status=400)
-        elif preco_origem == 'promocional':
-            from Produtos.servicos.preco_promocional import buscar_preco_promocional, obter_valor_preco_promocional
-            tp = buscar_preco_promocional(
-                banco=banco,
-                tabe_empr=str(empresa_id),
-                tabe_fili=str(filial_id),
-                tabe_prod=str(produto),
-            )
-            price = obter_valor_preco_promocional(preco=tp, modalidade=preco_tipo)
         else:
-            from Produtos.servicos.preco_servico import buscar_preco_normal, obter_valor_preco_normal
-            tp = buscar_preco_normal(
-                banco=banco,
-                tabe_empr=str(empresa_id),
-                tabe_fili=str(filial_id),
-                tabe_prod=str(produto),
+            price = PrecosCaixa.preco(
+                banco,
+                empresa_id,
+                filial_id,
+                produto,
+                origem='promocional' if preco_origem == 'promocional' else 'normal',
+                modalidade=preco_tipo,
             )
-            price = obter_valor_preco_normal(preco=tp, modalidade=preco_tipo)
         if preco_origem != 'manual':
             if price is None:
                 return JsonResponse({'Detalhe': 'Preço não encontrado para o produto'}, status=400)
             valor_unitario = float(price or 0)
     except Exception:
         return JsonResponse({'Detalhe': 'Preço não encontrado para o produto'}, status=400)
-    with transaction.atomic(using=banco):
-        item = Itenspedidovenda.objects.using(banco).filter(
-            iped_empr=empresa_id, iped_fili=filial_id, iped_pedi=str(numero_venda), iped_prod=produto
-        ).first()
-        if not item:
-            return JsonResponse({'detail': 'Item não encontrado'}, status=404)
-        if quantidade is not None and quantidade != '':
-            item.iped_quan = float(quantidade)
-        item.iped_unit = float(valor_unitario)
-        item.iped_tota = float(item.iped_quan) * float(item.iped_unit)
-        item.save(using=banco)
-        total_pedido = Itenspedidovenda.objects.using(banco).filter(
-            iped_empr=empresa_id, iped_fili=filial_id, iped_pedi=str(numero_venda)
-        ).aggregate(Sum('iped_tota'))['iped_tota__sum'] or 0
-        pedido = PedidoVenda.objects.using(banco).filter(
-            pedi_empr=empresa_id, pedi_fili=filial_id, pedi_nume=numero_venda
-        ).first()
-        if pedido:
-            pedido.pedi_tota = total_pedido
-            pedido.save(using=banco)
+    carrinho, item = CarrinhoService.atualizar(banco, empresa_id, filial_id, numero_venda, produto, quantidade, valor_unitario)
+    if item is None:
+        return JsonResponse({'detail': 'Item não encontrado'}, status=404)
+    total_pedido = carrinho['total']
     return JsonResponse({
         'numero_venda': numero_venda,
         'produto': produto,
-        'quantidade': float(item.iped_quan),
-        'valor_unitario': float(item.iped_unit),
-        'valor_total': float(item.iped_tota),
+        'quantidade': float(item['quan']),
+        'valor_unitario': float(item['unit']),
+        'valor_total': float(item['tota']),
         'total_pedido': float(total_pedido),
         'preco_origem': preco_origem or 'normal',
         'preco_tipo': preco_tipo,
@@ -610,6 +574,7 @@ def venda_atualizar_item(request, slug=None):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_carrinho_expirado
 def venda_remover_item(request, slug=None):
     banco = get_licenca_db_config(request)
     empresa_id = request.session.get('empresa_id') or request.headers.get('X-Empresa') or request.GET.get('empresa')
@@ -621,25 +586,15 @@ def venda_remover_item(request, slug=None):
     produto = data.get('produto')
     if not all([numero_venda, produto]):
         return JsonResponse({'detail': 'Número da venda e produto são obrigatórios'}, status=400)
-    with transaction.atomic(using=banco):
-        deleted, _ = Itenspedidovenda.objects.using(banco).filter(
-            iped_empr=empresa_id, iped_fili=filial_id, iped_pedi=str(numero_venda), iped_prod=produto
-        ).delete()
-        if not deleted:
-            return JsonResponse({'detail': 'Item não encontrado'}, status=404)
-        total_pedido = Itenspedidovenda.objects.using(banco).filter(
-            iped_empr=empresa_id, iped_fili=filial_id, iped_pedi=str(numero_venda)
-        ).aggregate(Sum('iped_tota'))['iped_tota__sum'] or 0
-        pedido = PedidoVenda.objects.using(banco).filter(
-            pedi_empr=empresa_id, pedi_fili=filial_id, pedi_nume=numero_venda
-        ).first()
-        if pedido:
-            pedido.pedi_tota = total_pedido
-            pedido.save(using=banco)
+    carrinho, item = CarrinhoService.remover(banco, empresa_id, filial_id, numero_venda, produto)
+    if item is None:
+        return JsonResponse({'detail': 'Item não encontrado'}, status=404)
+    total_pedido = carrinho['total']
     return JsonResponse({'numero_venda': numero_venda, 'produto': produto, 'total_pedido': float(total_pedido), 'status': 'Item removido com sucesso'})
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_carrinho_expirado
 def venda_processar_pagamento(request, slug=None):
     banco = get_licenca_db_config(request)
     empresa_id = request.session.get('empresa_id') or request.headers.get('X-Empresa') or request.GET.get('empresa')
@@ -658,6 +613,9 @@ def venda_processar_pagamento(request, slug=None):
     parcelas = data.get('parcelas') or 1
     tipo_movimento = CaixaService.resolver_tipo_movimento(movi_tipo=movi_tipo, forma_pagamento=forma_pagamento)
     operador = request.headers.get('usuario_id') or request.headers.get('X-Usuario')
+    if numero_venda:
+        # Venda sai da fase de leitura: itens do carrinho vão para o pedido
+        CarrinhoService.persistir(banco, empresa_id, filial_id, numero_venda)
 
     try:
         logger.info(
@@ -703,6 +661,7 @@ def venda_processar_pagamento(request, slug=None):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_carrinho_expirado
 def venda_finalizar(request, slug=None):
     banco = get_licenca_db_config(request)
     empresa_id = request.session.get('empresa_id') or request.headers.get('X-Empresa') or request.GET.get('empresa')
@@ -717,15 +676,13 @@ def venda_finalizar(request, slug=None):
     movimentos = Movicaixa.objects.using(banco).filter(movi_empr=empresa_id, movi_fili=filial_id, movi_nume_vend=numero_venda)
     total_itens = movimentos.filter(movi_tipo='1').aggregate(total=Sum('movi_entr'))['total'] or 0
     total_pagamentos = movimentos.exclude(movi_tipo='1').aggregate(total=Sum('movi_entr'))['total'] or 0
-    pedido = PedidoVenda.objects.using(banco).filter(pedi_empr=empresa_id, pedi_fili=filial_id, pedi_nume=numero_venda).first()
-    if pedido:
-        pedido.pedi_stat = '1'
-        pedido.save(using=banco)
+    CarrinhoService.persistir(banco, empresa_id, filial_id, numero_venda, status='1')
     return JsonResponse({'numero_venda': numero_venda, 'total_itens': float(total_itens), 'total_pagamentos': float(total_pagamentos), 'status': 'Finalizada'})
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_carrinho_expirado
 def venda_emitir(request, slug=None):
     """
     Emite cupom ou NFC-e de uma venda
@@ -770,6 +727,9 @@ def venda_emitir(request, slug=None):
                 'Número da venda obrigatório'
         }, status=400)
     
+    # Itens ainda no carrinho vão para o pedido antes de montar o documento
+    CarrinhoService.persistir(banco, empresa_id, filial_id, numero_venda)
+    
     # Busca pedido
     pedido = PedidoVenda.objects.using(
         banco
@@ -1242,6 +1202,7 @@ def venda_emitir(request, slug=None):
     })
 
 @require_http_methods(["GET"])
+@_carrinho_expirado
 def venda_status(request, slug=None):
     banco = get_licenca_db_config(request)
     empresa_id = request.session.get('empresa_id') or request.headers.get('X-Empresa') or request.GET.get('empresa')
@@ -1256,11 +1217,8 @@ def venda_status(request, slug=None):
         pedi_fili=filial_id,
         pedi_nume=numero_venda
     ).first()
-    total_pedido = Itenspedidovenda.objects.using(banco).filter(
-        iped_empr=empresa_id,
-        iped_fili=filial_id,
-        iped_pedi=str(numero_venda)
-    ).aggregate(Sum('iped_tota'))['iped_tota__sum'] or 0
+    carrinho = CarrinhoService.obter(banco, empresa_id, filial_id, numero_venda)
+    total_pedido = carrinho['total'] if carrinho else 0
     total_pagamentos = Movicaixa.objects.using(banco).filter(
         movi_empr=empresa_id,
         movi_fili=filial_id,
@@ -1316,116 +1274,39 @@ def venda_extrato(request, slug=None):
             data_ref = datetime.strptime(data_str, '%Y-%m-%d').date()
         except Exception:
             data_ref = None
-    movimentos = Movicaixa.objects.using(banco).filter(movi_empr=empresa_id, movi_fili=filial_id)
-    if caixa:
-        movimentos = movimentos.filter(movi_caix=caixa)
-    if data_ref:
-        movimentos = movimentos.filter(movi_data=data_ref)
-    if vendedor:
-        movimentos = movimentos.filter(movi_vend=str(vendedor))
-    if forma:
-        movimentos = movimentos.filter(Q(movi_tipo_movi=str(forma)) | Q(movi_tipo=str(forma)))
-    movimentos = movimentos.exclude(movi_nume_vend__isnull=True)
-    numeros = list(movimentos.values_list('movi_nume_vend', flat=True).distinct())
-    resultados = []
-    tipos_map = {
-        '1': 'DINHEIRO',
-        '2': 'CHEQUE',
-        '3': 'CARTÃO DE CREDITO',
-        '4': 'CARTÃO DE DEBITO',
-        '5': 'CREDIÁRIO',
-        '6': 'PIX',
-    }
-    for num in numeros:
-        pedido = PedidoVenda.objects.using(banco).filter(pedi_empr=empresa_id, pedi_fili=filial_id, pedi_nume=num).first()
-        cliente_codigo = str(pedido.pedi_forn) if pedido and pedido.pedi_forn else ''
-        cliente_nome = ''
-        if cliente_codigo:
-            try:
-                from Entidades.models import Entidades
-                cliente_nome = Entidades.objects.using(banco).filter(
-                    enti_empr=str(empresa_id),
-                    enti_clie=cliente_codigo,
-                ).values_list('enti_nome', flat=True).first() or ''
-            except Exception:
-                cliente_nome = ''
-        cliente_display = f'{cliente_codigo} - {cliente_nome}' if cliente_nome else cliente_codigo
-        itens_qs = Itenspedidovenda.objects.using(banco).filter(iped_empr=empresa_id, iped_fili=filial_id, iped_pedi=str(num))
+    movimentos = ExtratoCaixaService.movimentos(
+        banco, empresa_id, filial_id, caixa=caixa, data=data_ref, vendedor=vendedor, forma=forma
+    )
+    formato = (request.GET.get('formato') or '').strip().lower()
+    if formato == 'csv':
+        resposta = StreamingHttpResponse(
+            ExtratoCaixaService.linhas_csv(ExtratoCaixaService.vendas(banco, empresa_id, filial_id, movimentos)),
+            content_type='text/csv; charset=utf-8',
+        )
+        resposta['Content-Disposition'] = f'attachment; filename="extrato_{caixa or "todos"}_{data_ref or "geral"}.csv"'
+        return resposta
+    if formato == 'pdf':
+        arquivo = ExtratoCaixaService.gerar_pdf(
+            ExtratoCaixaService.vendas(banco, empresa_id, filial_id, movimentos),
+            titulo=f'Extrato de caixa {caixa or ""} {data_ref or ""}'.strip(),
+        )
+        return FileResponse(arquivo, as_attachment=True, filename=f'extrato_{caixa or "todos"}_{data_ref or "geral"}.pdf', content_type='application/pdf')
+
+    limite = request.GET.get('limite')
+    apos = request.GET.get('apos')
+    proximo = None
+    if limite:
         try:
-            from Produtos.models import Produtos
-            cods = list(itens_qs.values_list('iped_prod', flat=True))
-            nomes_map = {
-                str(r['prod_codi']): r['prod_nome']
-                for r in Produtos.objects.using(banco)
-                .filter(prod_empr=str(empresa_id), prod_codi__in=cods)
-                .values('prod_codi', 'prod_nome')
-            }
-        except Exception:
-            nomes_map = {}
-        itens = []
-        for it in itens_qs:
-            itens.append({
-                'produto': str(it.iped_prod),
-                'descricao': nomes_map.get(str(it.iped_prod)) or str(it.iped_prod),
-                'quantidade': float(it.iped_quan or 0),
-                'unitario': float(it.iped_unit or 0),
-                'total': float(it.iped_tota or 0),
-            })
-        total_venda = float(itens_qs.aggregate(Sum('iped_tota'))['iped_tota__sum'] or 0)
-        movs_venda = movimentos.filter(movi_nume_vend=num)
-        mov_first = movs_venda.first()
-        data_movimento = str(mov_first.movi_data) if mov_first and getattr(mov_first, 'movi_data', None) else ''
-        aggs_pg = movs_venda.aggregate(entr=Sum('movi_entr'), said=Sum('movi_said'))
-        total_pagamentos_bruto = float(aggs_pg.get('entr') or 0)
-        total_troco = float(aggs_pg.get('said') or 0)
-        total_pagamentos = float(total_pagamentos_bruto) - float(total_troco)
-        saldo = float(total_venda) - float(total_pagamentos)
-        pagamentos = []
-        for row in movs_venda.values('movi_tipo').annotate(entr=Sum('movi_entr'), said=Sum('movi_said')).order_by('-entr'):
-            tipo = str(row.get('movi_tipo'))
-            total = float(row.get('entr') or 0) - float(row.get('said') or 0)
-            if not total:
-                continue
-            pagamentos.append({
-                'tipo': tipo,
-                'descricao': tipos_map.get(tipo, tipo),
-                'total': total,
-            })
-        resultados.append({
-            'numero_venda': int(num),
-            'data': data_movimento or (str(pedido.pedi_data) if pedido and pedido.pedi_data else ''),
-            'caixa': int(mov_first.movi_caix) if mov_first else None,
-            'vendedor': str(pedido.pedi_vend) if pedido else '',
-            'cliente': cliente_display,
-            'cliente_codigo': cliente_codigo,
-            'cliente_nome': cliente_nome,
-            'total_venda': total_venda,
-            'total_pagamentos_bruto': total_pagamentos_bruto,
-            'troco': total_troco,
-            'total_pagamentos': total_pagamentos,
-            'saldo': saldo,
-            'pagamentos': pagamentos,
-            'itens': itens,
-        })
-    totais = []
-    resumo_pg = movimentos.aggregate(entr=Sum('movi_entr'), said=Sum('movi_said'))
-    resumo_bruto = float(resumo_pg.get('entr') or 0)
-    resumo_troco = float(resumo_pg.get('said') or 0)
-    resumo_liquido = float(resumo_bruto) - float(resumo_troco)
-    for row in movimentos.values('movi_tipo').annotate(entr=Sum('movi_entr'), said=Sum('movi_said')).order_by('-entr'):
-        t = str(row.get('movi_tipo'))
-        total_entr = float(row.get('entr') or 0)
-        total_troco = float(row.get('said') or 0)
-        total_liquido = float(total_entr) - float(total_troco)
-        if not total_entr and not total_troco:
-            continue
-        totais.append({
-            'tipo': t,
-            'descricao': tipos_map.get(t, t),
-            'total': total_entr,
-            'troco': total_troco,
-            'liquido': total_liquido,
-        })
+            limite = max(1, min(int(limite), TAMANHO_PAGINA))
+            apos = int(apos) if apos else None
+        except (TypeError, ValueError):
+            return JsonResponse({'detail': 'Parâmetros de paginação inválidos'}, status=400)
+        resultados = ExtratoCaixaService.pagina(banco, empresa_id, filial_id, movimentos, apos=apos, limite=limite)
+        if len(resultados) == limite:
+            proximo = resultados[-1]['numero_venda']
+    else:
+        resultados = list(ExtratoCaixaService.vendas(banco, empresa_id, filial_id, movimentos))
+    resumo, totais = ExtratoCaixaService.totais(movimentos)
 
     data_kpi = data_ref
     if not data_kpi and caixa:
@@ -1465,19 +1346,15 @@ def venda_extrato(request, slug=None):
             movi_caix=caixa,
             movi_data=data_kpi,
         )
-        aggs_kpi = movs_kpi.aggregate(entr=Sum('movi_entr'), said=Sum('movi_said'))
-        entradas_caixa = float(aggs_kpi.get('entr') or 0)
-        saidas_caixa = float(aggs_kpi.get('said') or 0)
+        aggs_kpi = ExtratoCaixaService.resumo_caixa(movs_kpi)
+        entradas_caixa = aggs_kpi['entradas']
+        saidas_caixa = aggs_kpi['saidas']
         saldo_atual = float(saldo_inicial) + float(entradas_caixa) - float(saidas_caixa)
     return JsonResponse({
         'results': resultados,
+        'proximo': proximo,
         'totais': totais,
-        'resumo': {
-            'bruto': resumo_bruto,
-            'troco': resumo_troco,
-            'liquido': resumo_liquido,
-        }
-        ,
+        'resumo': resumo,
         'kpi': {
             'caixa': int(caixa) if caixa else None,
             'data': str(data_kpi) if data_kpi else '',
@@ -1551,16 +1428,17 @@ def caixa_movimentos(request, slug=None):
         movi_fili=filial_id,
         movi_caix=caixa,
         movi_data=data_ref,
-    ).order_by('movi_ctrl')
-
-    results = []
-    for m in qs:
-        results.append({
-            'ctrl': int(getattr(m, 'movi_ctrl', 0) or 0),
-            'descricao': str(getattr(m, 'movi_obse', '') or ''),
-            'entr': float(getattr(m, 'movi_entr', 0) or 0),
-            'said': float(getattr(m, 'movi_said', 0) or 0),
-        })
+    ).order_by('movi_ctrl').values_list('movi_ctrl', 'movi_obse', 'movi_entr', 'movi_said')
+
+    results = [
+        {
+            'ctrl': int(ctrl or 0),
+            'descricao': str(obse or ''),
+            'entr': float(entr or 0),
+            'said': float(said or 0),
+        }
+        for ctrl, obse, entr, said in qs.iterator()
+    ]
     return JsonResponse({'caixa': int(caixa), 'data': str(data_ref), 'results': results})
 
 @csrf_exempt
@@ -0,0 +1,321 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from Pedidos.models import PedidoVenda, Itenspedidovenda
+
+logger = logging.getLogger(__name__)
+
+CENTAVOS = Decimal("0.01")
+
+
+def _decimal(valor):
+    return Decimal(str(valor or 0))
+
+
+class CarrinhoExpirado(Exception):
+    """O carrinho saiu do cache com itens ainda não gravados no pedido."""
+
+    def __init__(self, numero_venda, total_esperado, total_gravado):
+        self.numero_venda = numero_venda
+        self.total_esperado = total_esperado
+        self.total_gravado = total_gravado
+        super().__init__(
+            f"Carrinho da venda {numero_venda} expirou: itens lidos após a última gravação "
+            f"foram perdidos (total {total_esperado}, gravado {total_gravado}). Leia-os novamente."
+        )
+
+
+class PrecosCaixa:
+    """
+    Tabela de preços (normal e promocional) da filial carregada numa consulta
+    só e mantida em memória por CAIXA_PRECOS_TTL segundos. Evita uma ida ao
+    banco por leitura de código de barras no caixa.
+    """
+
+    _tabelas = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _modelo(origem):
+        if origem == "promocional":
+            from Produtos.preco_models import TabelaprecosPromocional
+            return TabelaprecosPromocional
+        from Produtos.models import Tabelaprecos
+        return Tabelaprecos
+
+    @staticmethod
+    def _carregar(banco, empresa, filial, origem):
+        tabela = {}
+        linhas = (
+            PrecosCaixa._modelo(origem).objects.using(banco)
+            .filter(tabe_empr=str(empresa), tabe_fili=str(filial))
+            .order_by("pk")
+            .values_list("tabe_prod", "tabe_prco", "tabe_avis", "tabe_apra")
+        )
+        for prod, prco, avis, apra in linhas.iterator():
+            # Mesmo critério do .first() de buscar_preco_*: fica a primeira linha
+            tabela.setdefault(str(prod), (prco, avis, apra))
+        return tabela
+
+    @staticmethod
+    def tabela(banco, empresa, filial, origem="normal"):
+        ttl = int(getattr(settings, "CAIXA_PRECOS_TTL", 120))
+        chave = (banco, str(empresa), str(filial), origem)
+        agora = time.monotonic()
+        with PrecosCaixa._lock:
+            entrada = PrecosCaixa._tabelas.get(chave)
+        if entrada and agora - entrada[0] < ttl:
+            return entrada[1]
+        tabela = PrecosCaixa._carregar(banco, empresa, filial, origem)
+        with PrecosCaixa._lock:
+            PrecosCaixa._tabelas[chave] = (agora, tabela)
+        logger.debug("[CAIXA] Preços %s carregados para %s: %s produtos", origem, chave[:3], len(tabela))
+        return tabela
+
+    @staticmethod
+    def limpar_cache(banco: str = None) -> None:
+        with PrecosCaixa._lock:
+            if banco is None:
+                PrecosCaixa._tabelas.clear()
+            else:
+                for chave in [c for c in PrecosCaixa._tabelas if c[0] == banco]:
+                    del PrecosCaixa._tabelas[chave]
+
+    @staticmethod
+    def preco(banco, empresa, filial, produto, origem="normal", modalidade=None):
+        """Preço unitário do produto na modalidade (mesmas regras de obter_valor_preco_*) ou None."""
+        linha = PrecosCaixa.tabela(banco, empresa, filial, origem).get(str(produto))
+        if not linha:
+            return None
+        prco, avis, apra = linha
+        mod = (modalidade or "").lower().strip()
+        if mod in {"prazo", "a_prazo", "1"}:
+            return apra or avis or prco
+        return avis or apra or prco
+
+
+class CarrinhoService:
+    """
+    Venda em andamento no caixa mantida no cache (Redis em produção) com o
+    total corrente. Os itens só vão para itenspedidovenda em ``persistir``,
+    chamado quando a venda sai da fase de leitura (pagamento, finalização,
+    emissão), numa transação com bulk_create.
+
+    Cada alteração grava só o total corrente em pedi_tota (um UPDATE pela
+    chave). Se o carrinho sumir do cache, o total gravado que não bate com
+    os itens do pedido indica itens perdidos: a venda levanta
+    CarrinhoExpirado uma vez e segue com os itens já gravados.
+    """
+
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    @staticmethod
+    def _chave(banco, empresa, filial, numero_venda):
+        return f"caixa:carrinho:{banco}:{empresa}:{filial}:{numero_venda}"
+
+    @staticmethod
+    def _ttl():
+        return int(getattr(settings, "CAIXA_CARRINHO_TTL", 43200))
+
+    @staticmethod
+    @contextmanager
+    def _travado(chave):
+        # django_redis expõe lock distribuído; no LocMemCache basta um lock do processo
+        if hasattr(cache, "lock"):
+            with cache.lock(f"{chave}:lock", timeout=10, blocking_timeout=10):
+                yield
+            return
+        with CarrinhoService._locks_lock:
+            lock = CarrinhoService._locks.setdefault(chave, threading.Lock())
+        with lock:
+            yield
+
+    @staticmethod
+    def _novo(pedido):
+        return {
+            "data": pedido.pedi_data,
+            "cliente": pedido.pedi_forn,
+            "itens": {},
+            "proximo": 1,
+            "total": Decimal("0"),
+            "pendente": False,
+        }
+
+    @staticmethod
+    def _pedidos(banco, empresa, filial, numero_venda):
+        return PedidoVenda.objects.using(banco).filter(
+            pedi_empr=empresa, pedi_fili=filial, pedi_nume=numero_venda
+        )
+
+    @staticmethod
+    def _carregar(banco, empresa, filial, numero_venda):
+        """
+        Carrinho a partir do pedido gravado (venda iniciada antes ou expulsa do
+        cache). Levanta CarrinhoExpirado se a venda aberta tinha itens só no cache.
+        """
+        pedido = CarrinhoService._pedidos(banco, empresa, filial, numero_venda).first()
+        if not pedido:
+            return None
+        carrinho = CarrinhoService._novo(pedido)
+        itens = (
+            Itenspedidovenda.objects.using(banco)
+            .filter(iped_empr=empresa, iped_fili=filial, iped_pedi=str(numero_venda))
+            .order_by("iped_item")
+            .values_list("iped_item", "iped_prod", "iped_quan", "iped_unit", "iped_tota")
+        )
+        for seq, prod, quan, unit, tota in itens:
+            carrinho["itens"][str(prod)] = {
+                "seq": seq,
+                "quan": _decimal(quan),
+                "unit": _decimal(unit),
+                "tota": _decimal(tota),
+            }
+            carrinho["proximo"] = max(carrinho["proximo"], seq + 1)
+            carrinho["total"] += _decimal(tota)
+
+        esperado = _decimal(pedido.pedi_tota)
+        if str(pedido.pedi_stat) == "0" and esperado != carrinho["total"]:
+            # Alinha o total com o que sobrou para a venda poder continuar
+            CarrinhoService._pedidos(banco, empresa, filial, numero_venda).update(pedi_tota=carrinho["total"])
+            logger.warning(
+                "[CAIXA] Venda %s: carrinho expirou com itens não gravados (total %s, gravado %s)",
+                numero_venda, esperado, carrinho["total"],
+            )
+            raise CarrinhoExpirado(numero_venda, esperado, carrinho["total"])
+        return carrinho
+
+    @staticmethod
+    def iniciar(banco, empresa, filial, pedido):
+        """Carrinho vazio para a venda recém-aberta em venda_iniciar."""
+        chave = CarrinhoService._chave(banco, empresa, filial, pedido.pedi_nume)
+        cache.set(chave, CarrinhoService._novo(pedido), CarrinhoService._ttl())
+
+    @staticmethod
+    def obter(banco, empresa, filial, numero_venda):
+        chave = CarrinhoService._chave(banco, empresa, filial, numero_venda)
+        carrinho = cache.get(chave)
+        if carrinho is None:
+            carrinho = CarrinhoService._carregar(banco, empresa, filial, numero_venda)
+        return carrinho
+
+    @staticmethod
+    def _alterar(banco, empresa, filial, numero_venda, alteracao):
+        chave = CarrinhoService._chave(banco, empresa, filial, numero_venda)
+        with CarrinhoService._travado(chave):
+            carrinho = cache.get(chave)
+            if carrinho is None:
+                carrinho = CarrinhoService._carregar(banco, empresa, filial, numero_venda)
+                if carrinho is None:
+                    return None, None
+            item = alteracao(carrinho)
+            if item is not None:
+                carrinho["total"] = sum((i["tota"] for i in carrinho["itens"].values()), Decimal("0"))
+                carrinho["pendente"] = True
+                CarrinhoService._pedidos(banco, empresa, filial, numero_venda).update(pedi_tota=carrinho["total"])
+            cache.set(chave, carrinho, CarrinhoService._ttl())
+        return carrinho, item
+
+    @staticmethod
+    def adicionar(banco, empresa, filial, numero_venda, produto, quantidade, valor_unitario):
+        """
+        Soma a quantidade ao item do produto (com o novo preço) ou cria o item.
+        Retorna (carrinho, item); carrinho None se o pedido não existe.
+        """
+        quantidade, valor_unitario = _decimal(quantidade), _decimal(valor_unitario)
+
+        def alteracao(carrinho):
+            item = carrinho["itens"].get(str(produto))
+            if item is None:
+                item = {"seq": carrinho["proximo"], "quan": Decimal("0")}
+                carrinho["proximo"] += 1
+                carrinho["itens"][str(produto)] = item
+            item["unit"] = valor_unitario
+            item["quan"] += quantidade
+            item["tota"] = (item["quan"] * valor_unitario).quantize(CENTAVOS)
+            return item
+
+        return CarrinhoService._alterar(banco, empresa, filial, numero_venda, alteracao)
+
+    @staticmethod
+    def atualizar(banco, empresa, filial, numero_venda, produto, quantidade, valor_unitario):
+        """Troca preço (e quantidade, se informada) do item; item None se o produto não está na venda."""
+        valor_unitario = _decimal(valor_unitario)
+
+        def alteracao(carrinho):
+            item = carrinho["itens"].get(str(produto))
+            if item is None:
+                return None
+            if quantidade is not None and quantidade != "":
+                item["quan"] = _decimal(quantidade)
+            item["unit"] = valor_unitario
+            item["tota"] = (item["quan"] * valor_unitario).quantize(CENTAVOS)
+            return item
+
+        return CarrinhoService._alterar(banco, empresa, filial, numero_venda, alteracao)
+
+    @staticmethod
+    def remover(banco, empresa, filial, numero_venda, produto):
+        return CarrinhoService._alterar(
+            banco, empresa, filial, numero_venda,
+            lambda carrinho: carrinho["itens"].pop(str(produto), None),
+        )
+
+    @staticmethod
+    def persistir(banco, empresa, filial, numero_venda, status=None):
+        """
+        Grava os itens do carrinho e o total do pedido numa transação
+        (status opcional, ex.: '1' na finalização). Sem carrinho no cache só o
+        status é gravado, depois de conferir que nenhum item ficou só no cache
+        (CarrinhoExpirado). Retorna o total do pedido ou None se a venda não
+        tem carrinho.
+        """
+        chave = CarrinhoService._chave(banco, empresa, filial, numero_venda)
+        with CarrinhoService._travado(chave):
+            carrinho = cache.get(chave)
+            if carrinho is None:
+                CarrinhoService._carregar(banco, empresa, filial, numero_venda)
+            campos = {"pedi_stat": status} if status is not None else {}
+            if carrinho is not None and carrinho["pendente"]:
+                itens = sorted(carrinho["itens"].items(), key=lambda par: par[1]["seq"])
+                novos = [
+                    Itenspedidovenda(
+                        iped_empr=empresa,
+                        iped_fili=filial,
+                        iped_pedi=str(numero_venda),
+                        iped_item=ordem,
+                        iped_prod=prod,
+                        iped_quan=item["quan"],
+                        iped_unit=item["unit"],
+                        iped_tota=item["tota"],
+                        iped_data=carrinho["data"],
+                        iped_forn=carrinho["cliente"],
+                    )
+                    for ordem, (prod, item) in enumerate(itens, start=1)
+                ]
+                campos["pedi_tota"] = carrinho["total"]
+                with transaction.atomic(using=banco):
+                    Itenspedidovenda.objects.using(banco).filter(
+                        iped_empr=empresa, iped_fili=filial, iped_pedi=str(numero_venda)
+                    ).delete()
+                    Itenspedidovenda.objects.using(banco).bulk_create(novos, batch_size=500)
+                    CarrinhoService._pedidos(banco, empresa, filial, numero_venda).update(**campos)
+                logger.info("[CAIXA] Venda %s: %s itens gravados (total %s)", numero_venda, len(novos), carrinho["total"])
+            elif campos:
+                CarrinhoService._pedidos(banco, empresa, filial, numero_venda).update(**campos)
+
+            if carrinho is None:
+                return None
+            if status is not None:
+                cache.delete(chave)
+            else:
+                carrinho["pendente"] = False
+                cache.set(chave, carrinho, CarrinhoService._ttl())
+            return carrinho["total"]
@@ -0,0 +1,286 @@
+import csv
+import logging
+import tempfile
+
+from django.db.models import Count, Min, Q, Sum
+
+from Pedidos.models import PedidoVenda, Itenspedidovenda
+from .models import Movicaixa
+
+logger = logging.getLogger(__name__)
+
+TIPOS_MOVIMENTO = {
+    '1': 'DINHEIRO',
+    '2': 'CHEQUE',
+    '3': 'CARTÃO DE CREDITO',
+    '4': 'CARTÃO DE DEBITO',
+    '5': 'CREDIÁRIO',
+    '6': 'PIX',
+}
+
+# Vendas por página quando o extrato é percorrido inteiro (exportação / sem limite)
+TAMANHO_PAGINA = 1000
+
+COLUNAS_CSV = (
+    'numero_venda', 'data', 'caixa', 'vendedor', 'cliente_codigo', 'cliente_nome',
+    'total_venda', 'total_pagamentos_bruto', 'troco', 'total_pagamentos', 'saldo', 'pagamentos',
+)
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer devolver a linha em vez de gravar."""
+
+    def write(self, valor):
+        return valor
+
+
+def _codigo_cliente(valor):
+    """Código do cliente como inteiro (chave de Entidades), ou None se não for numérico."""
+    texto = str(valor or '').strip()
+    return int(texto) if texto.isdigit() else None
+
+
+class ExtratoCaixaService:
+    """
+    Extrato de vendas do caixa em consultas agregadas por página (movimentos
+    agrupados por venda, pagamentos por tipo, pedidos, clientes, itens e
+    nomes de produto: seis consultas por página, independente do número de
+    vendas). Paginação por chave (``apos`` = último número de venda).
+    """
+
+    @staticmethod
+    def movimentos(banco, empresa, filial, caixa=None, data=None, vendedor=None, forma=None):
+        qs = Movicaixa.objects.using(banco).filter(movi_empr=empresa, movi_fili=filial)
+        if caixa:
+            qs = qs.filter(movi_caix=caixa)
+        if data:
+            qs = qs.filter(movi_data=data)
+        if vendedor:
+            qs = qs.filter(movi_vend=str(vendedor))
+        if forma:
+            qs = qs.filter(Q(movi_tipo_movi=str(forma)) | Q(movi_tipo=str(forma)))
+        return qs.exclude(movi_nume_vend__isnull=True)
+
+    @staticmethod
+    def pagina(banco, empresa, filial, movimentos, apos=None, limite=TAMANHO_PAGINA):
+        """Vendas com número maior que ``apos``, em ordem, no máximo ``limite``."""
+        qs = movimentos
+        if apos is not None:
+            qs = qs.filter(movi_nume_vend__gt=apos)
+        vendas = list(
+            qs.values('movi_nume_vend')
+            .annotate(entr=Sum('movi_entr'), said=Sum('movi_said'), data=Min('movi_data'), caixa=Min('movi_caix'))
+            .order_by('movi_nume_vend')[:limite]
+        )
+        if not vendas:
+            return []
+        numeros = [v['movi_nume_vend'] for v in vendas]
+
+        pagamentos = {}
+        por_tipo = (
+            movimentos.filter(movi_nume_vend__in=numeros)
+            .values('movi_nume_vend', 'movi_tipo')
+            .annotate(entr=Sum('movi_entr'), said=Sum('movi_said'))
+            .order_by('movi_nume_vend', '-entr')
+        )
+        for row in por_tipo:
+            total = float(row['entr'] or 0) - float(row['said'] or 0)
+            if not total:
+                continue
+            tipo = str(row['movi_tipo'])
+            pagamentos.setdefault(row['movi_nume_vend'], []).append({
+                'tipo': tipo,
+                'descricao': TIPOS_MOVIMENTO.get(tipo, tipo),
+                'total': total,
+            })
+
+        pedidos = {
+            p['pedi_nume']: p
+            for p in PedidoVenda.objects.using(banco)
+            .filter(pedi_empr=empresa, pedi_fili=filial, pedi_nume__in=numeros)
+            .values('pedi_nume', 'pedi_forn', 'pedi_vend', 'pedi_data')
+        }
+
+        # pedi_forn é texto ("010"), enti_clie é inteiro: as duas pontas usam int
+        codigos = {_codigo_cliente(p['pedi_forn']) for p in pedidos.values()} - {None}
+        clientes = {}
+        try:
+            from Entidades.models import Entidades
+            clientes = {
+                int(codigo): nome
+                for codigo, nome in Entidades.objects.using(banco)
+                .filter(enti_empr=str(empresa), enti_clie__in=list(codigos))
+                .values_list('enti_clie', 'enti_nome')
+            }
+        except Exception:
+            logger.exception("[EXTRATO] Falha ao buscar nomes de clientes")
+
+        itens = {}
+        produtos = set()
+        linhas_itens = (
+            Itenspedidovenda.objects.using(banco)
+            .filter(iped_empr=empresa, iped_fili=filial, iped_pedi__in=[str(n) for n in numeros])
+            .order_by('iped_pedi', 'iped_item')
+            .values_list('iped_pedi', 'iped_prod', 'iped_quan', 'iped_unit', 'iped_tota')
+        )
+        for pedi, prod, quan, unit, tota in linhas_itens:
+            itens.setdefault(str(pedi), []).append((str(prod), quan, unit, tota))
+            produtos.add(str(prod))
+
+        nomes_produtos = {}
+        try:
+            from Produtos.models import Produtos
+            nomes_produtos = {
+                str(codigo): nome
+                for codigo, nome in Produtos.objects.using(banco)
+                .filter(prod_empr=str(empresa), prod_codi__in=list(produtos))
+                .values_list('prod_codi', 'prod_nome')
+            }
+        except Exception:
+            logger.exception("[EXTRATO] Falha ao buscar nomes de produtos")
+
+        resultados = []
+        for venda in vendas:
+            num = venda['movi_nume_vend']
+            pedido = pedidos.get(num)
+            cliente_codigo = str(pedido['pedi_forn']) if pedido and pedido['pedi_forn'] else ''
+            cliente_nome = clientes.get(_codigo_cliente(cliente_codigo), '')
+            itens_venda = [
+                {
+                    'produto': prod,
+                    'descricao': nomes_produtos.get(prod) or prod,
+                    'quantidade': float(quan or 0),
+                    'unitario': float(unit or 0),
+                    'total': float(tota or 0),
+                }
+                for prod, quan, unit, tota in itens.get(str(num), [])
+            ]
+            total_venda = sum(i['total'] for i in itens_venda)
+            bruto = float(venda['entr'] or 0)
+            troco = float(venda['said'] or 0)
+            liquido = bruto - troco
+            data_pedido = str(pedido['pedi_data']) if pedido and pedido['pedi_data'] else ''
+            resultados.append({
+                'numero_venda': int(num),
+                'data': str(venda['data']) if venda['data'] else data_pedido,
+                'caixa': int(venda['caixa']) if venda['caixa'] is not None else None,
+                'vendedor': str(pedido['pedi_vend']) if pedido else '',
+                'cliente': f'{cliente_codigo} - {cliente_nome}' if cliente_nome else cliente_codigo,
+                'cliente_codigo': cliente_codigo,
+                'cliente_nome': cliente_nome,
+                'total_venda': total_venda,
+                'total_pagamentos_bruto': bruto,
+                'troco': troco,
+                'total_pagamentos': liquido,
+                'saldo': total_venda - liquido,
+                'pagamentos': pagamentos.get(num, []),
+                'itens': itens_venda,
+            })
+        return resultados
+
+    @staticmethod
+    def vendas(banco, empresa, filial, movimentos, tamanho=TAMANHO_PAGINA):
+        """Todas as vendas do extrato, página a página."""
+        apos = None
+        while True:
+            pagina = ExtratoCaixaService.pagina(banco, empresa, filial, movimentos, apos=apos, limite=tamanho)
+            yield from pagina
+            if len(pagina) < tamanho:
+                return
+            apos = pagina[-1]['numero_venda']
+
+    @staticmethod
+    def totais(movimentos):
+        """(resumo bruto/troco/líquido, totais por tipo) dos movimentos filtrados."""
+        resumo = movimentos.aggregate(entr=Sum('movi_entr'), said=Sum('movi_said'))
+        bruto = float(resumo.get('entr') or 0)
+        troco = float(resumo.get('said') or 0)
+        totais = []
+        for row in movimentos.values('movi_tipo').annotate(entr=Sum('movi_entr'), said=Sum('movi_said')).order_by('-entr'):
+            tipo = str(row.get('movi_tipo'))
+            entr = float(row.get('entr') or 0)
+            said = float(row.get('said') or 0)
+            if not entr and not said:
+                continue
+            totais.append({
+                'tipo': tipo,
+                'descricao': TIPOS_MOVIMENTO.get(tipo, tipo),
+                'total': entr,
+                'troco': said,
+                'liquido': entr - said,
+            })
+        return {'bruto': bruto, 'troco': troco, 'liquido': bruto - troco}, totais
+
+    @staticmethod
+    def resumo_caixa(movimentos):
+        """Entradas, saídas, quantidade de movimentos e de vendas numa consulta."""
+        aggs = movimentos.aggregate(
+            entr=Sum('movi_entr'),
+            said=Sum('movi_said'),
+            qtd=Count('*'),
+            vendas=Count('movi_nume_vend', distinct=True),
+        )
+        return {
+            'entradas': float(aggs.get('entr') or 0),
+            'saidas': float(aggs.get('said') or 0),
+            'qtd_movimentos': int(aggs.get('qtd') or 0),
+            'total_vendas': int(aggs.get('vendas') or 0),
+        }
+
+    @staticmethod
+    def linhas_csv(vendas):
+        """Cabeçalho e uma linha por venda, já formatados (para StreamingHttpResponse)."""
+        escritor = csv.writer(_Eco(), delimiter=';')
+        yield escritor.writerow(COLUNAS_CSV)
+        for venda in vendas:
+            pagamentos = ', '.join(f"{p['descricao']} {p['total']:.2f}" for p in venda['pagamentos'])
+            yield escritor.writerow(
+                [venda[c] for c in COLUNAS_CSV[:-1]] + [pagamentos]
+            )
+
+    @staticmethod
+    def gerar_pdf(vendas, titulo='Extrato de caixa'):
+        """
+        PDF (reportlab) com uma linha por venda, gravado em arquivo temporário
+        em disco a partir de 1 MB; devolve o arquivo posicionado no início.
+        """
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        arquivo = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        pdf = canvas.Canvas(arquivo, pagesize=A4)
+        largura, altura = A4
+        colunas = (('Venda', 30), ('Data', 80), ('Cliente', 140), ('Total', 400), ('Pago', 460), ('Saldo', 520))
+
+        def cabecalho():
+            pdf.setFont('Helvetica-Bold', 11)
+            pdf.drawString(30, altura - 30, titulo)
+            pdf.setFont('Helvetica-Bold', 8)
+            for nome, x in colunas:
+                pdf.drawString(x, altura - 50, nome)
+            pdf.setFont('Helvetica', 8)
+            return altura - 64
+
+        y = cabecalho()
+        total = 0.0
+        for venda in vendas:
+            if y < 40:
+                pdf.showPage()
+                y = cabecalho()
+            valores = (
+                str(venda['numero_venda']),
+                venda['data'],
+                venda['cliente'][:50],
+                f"{venda['total_venda']:.2f}",
+                f"{venda['total_pagamentos']:.2f}",
+                f"{venda['saldo']:.2f}",
+            )
+            for (_, x), valor in zip(colunas, valores):
+                pdf.drawString(x, y, valor)
+            total += venda['total_venda']
+            y -= 12
+        pdf.setFont('Helvetica-Bold', 8)
+        pdf.drawString(30, max(y - 6, 20), f'Total vendido: {total:.2f}')
+        pdf.save()
+        arquivo.seek(0)
+        return arquivo
@@ -0,0 +1,122 @@
+import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from CaixaDiario.carrinho import CarrinhoExpirado, CarrinhoService, PrecosCaixa
+
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "teste-carrinho"}}
+
+
+@override_settings(CACHES=LOCMEM)
+class TestCarrinhoService(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        pedido = SimpleNamespace(pedi_nume=7, pedi_data=datetime.date(2024, 5, 1), pedi_forn=10)
+        CarrinhoService.iniciar("t", 1, 1, pedido)
+        patcher = mock.patch.object(CarrinhoService, "_pedidos")
+        self.pedidos = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_adicionar_acumula_e_mantem_total(self):
+        CarrinhoService.adicionar("t", 1, 1, 7, "A", 2, "1.50")
+        CarrinhoService.adicionar("t", 1, 1, 7, "B", 1, "10")
+        carrinho, item = CarrinhoService.adicionar("t", 1, 1, 7, "A", 1, "2")
+
+        self.assertEqual(item["quan"], Decimal("3"))
+        self.assertEqual(item["tota"], Decimal("6.00"))
+        self.assertEqual(carrinho["total"], Decimal("16.00"))
+        self.assertEqual([carrinho["itens"][p]["seq"] for p in ("A", "B")], [1, 2])
+
+    def test_atualizar_e_remover_item_ausente(self):
+        CarrinhoService.adicionar("t", 1, 1, 7, "A", 2, "5")
+        self.assertIsNone(CarrinhoService.atualizar("t", 1, 1, 7, "X", 1, "1")[1])
+        self.assertIsNone(CarrinhoService.remover("t", 1, 1, 7, "X")[1])
+
+        carrinho, _ = CarrinhoService.remover("t", 1, 1, 7, "A")
+        self.assertEqual(carrinho["total"], Decimal("0"))
+
+    def test_cada_alteracao_grava_o_total_corrente(self):
+        CarrinhoService.adicionar("t", 1, 1, 7, "A", 2, "5")
+        CarrinhoService.adicionar("t", 1, 1, 7, "B", 1, "3")
+        self.pedidos.return_value.update.assert_called_with(pedi_tota=Decimal("13.00"))
+
+    @mock.patch("CaixaDiario.carrinho.Itenspedidovenda")
+    def test_persistir_grava_em_lote_e_finaliza(self, itens):
+        CarrinhoService.adicionar("t", 1, 1, 7, "A", 2, "5")
+        CarrinhoService.adicionar("t", 1, 1, 7, "B", 1, "3")
+        CarrinhoService.remover("t", 1, 1, 7, "A")
+        CarrinhoService.adicionar("t", 1, 1, 7, "C", 1, "4")
+
+        with mock.patch("CaixaDiario.carrinho.transaction"):
+            total = CarrinhoService.persistir("t", 1, 1, 7, status="1")
+
+        self.assertEqual(total, Decimal("7.00"))
+        novos = itens.objects.using.return_value.bulk_create.call_args[0][0]
+        self.assertEqual(len(novos), 2)
+        self.assertEqual(itens.call_args_list[0][1]["iped_item"], 1)
+        self.assertEqual(itens.call_args_list[1][1]["iped_prod"], "C")
+        self.pedidos.return_value.update.assert_called_with(pedi_stat="1", pedi_tota=Decimal("7.00"))
+        self.assertIsNone(cache.get(CarrinhoService._chave("t", 1, 1, 7)))
+
+
+@override_settings(CACHES=LOCMEM)
+@mock.patch("CaixaDiario.carrinho.Itenspedidovenda")
+class TestCarrinhoExpirado(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(CarrinhoService, "_pedidos")
+        self.pedidos = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _pedido_gravado(self, itens, total, pedidos_itens):
+        self.pedidos.return_value.first.return_value = SimpleNamespace(
+            pedi_nume=7, pedi_data=datetime.date(2024, 5, 1), pedi_forn=10, pedi_tota=total, pedi_stat="0",
+        )
+        pedidos_itens.objects.using.return_value.filter.return_value.order_by.return_value.values_list.return_value = itens
+
+    def test_itens_so_no_cache_levantam_erro_uma_vez(self, itens):
+        # Total gravado a cada leitura (13) maior que os itens no banco (5): houve perda
+        self._pedido_gravado([(1, "A", 1, 5, 5)], Decimal("13.00"), itens)
+        with self.assertLogs("CaixaDiario.carrinho", level="WARNING"), self.assertRaises(CarrinhoExpirado) as erro:
+            CarrinhoService.adicionar("t", 1, 1, 7, "C", 1, "2")
+        self.assertEqual(erro.exception.total_gravado, Decimal("5"))
+        self.pedidos.return_value.update.assert_called_once_with(pedi_tota=Decimal("5"))
+
+    def test_finalizar_nao_grava_status_com_itens_perdidos(self, itens):
+        self._pedido_gravado([], Decimal("8.00"), itens)
+        with self.assertLogs("CaixaDiario.carrinho", level="WARNING"), self.assertRaises(CarrinhoExpirado):
+            CarrinhoService.persistir("t", 1, 1, 7, status="1")
+        self.assertNotIn(mock.call(pedi_stat="1"), self.pedidos.return_value.update.call_args_list)
+
+    def test_pedido_consistente_e_reconstruido(self, itens):
+        self._pedido_gravado([(1, "A", 2, 5, 10)], Decimal("10"), itens)
+        carrinho = CarrinhoService.obter("t", 1, 1, 7)
+        self.assertEqual(carrinho["total"], Decimal("10"))
+        self.assertEqual(carrinho["proximo"], 2)
+        self.pedidos.return_value.update.assert_not_called()
+
+
+class TestPrecosCaixa(SimpleTestCase):
+    def tearDown(self):
+        PrecosCaixa.limpar_cache()
+
+    @mock.patch.object(PrecosCaixa, "_carregar", return_value={"A": (Decimal("10"), None, Decimal("12"))})
+    def test_modalidades_e_carga_unica(self, carregar):
+        self.assertEqual(PrecosCaixa.preco("t", 1, 1, "A", modalidade="avista"), Decimal("12"))
+        self.assertEqual(PrecosCaixa.preco("t", 1, 1, "A", modalidade="prazo"), Decimal("12"))
+        self.assertIsNone(PrecosCaixa.preco("t", 1, 1, "Z"))
+        carregar.assert_called_once()
+
+    def test_alteracao_de_preco_descarta_tabela_do_banco(self):
+        from Produtos.servicos.preco_servico import limpar_precos_caixa
+
+        PrecosCaixa._tabelas[("t", "1", "1", "normal")] = (0, {})
+        PrecosCaixa._tabelas[("outro", "1", "1", "normal")] = (0, {})
+        with mock.patch("Produtos.servicos.preco_servico.transaction.on_commit", side_effect=lambda f, using: f()):
+            limpar_precos_caixa("t")
+        self.assertEqual(list(PrecosCaixa._tabelas), [("outro", "1", "1", "normal")])
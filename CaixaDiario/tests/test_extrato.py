@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from CaixaDiario.extrato import ExtratoCaixaService
+
+
+def _venda(numero, total=10.0):
+    return {
+        'numero_venda': numero, 'data': '2024-05-01', 'caixa': 1, 'vendedor': '3',
+        'cliente': '10 - CLIENTE', 'cliente_codigo': '10', 'cliente_nome': 'CLIENTE',
+        'total_venda': total, 'total_pagamentos_bruto': total, 'troco': 0.0,
+        'total_pagamentos': total, 'saldo': 0.0,
+        'pagamentos': [{'tipo': '1', 'descricao': 'DINHEIRO', 'total': total}], 'itens': [],
+    }
+
+
+class TestExtratoCaixa(SimpleTestCase):
+    def test_vendas_avanca_pela_chave(self):
+        paginas = [[_venda(1), _venda(2)], [_venda(5), _venda(9)], [_venda(12)]]
+        with mock.patch.object(ExtratoCaixaService, 'pagina', side_effect=paginas) as pagina:
+            numeros = [v['numero_venda'] for v in ExtratoCaixaService.vendas('t', 1, 1, None, tamanho=2)]
+
+        self.assertEqual(numeros, [1, 2, 5, 9, 12])
+        self.assertEqual([c.kwargs['apos'] for c in pagina.call_args_list], [None, 2, 9])
+
+    def test_csv_uma_linha_por_venda(self):
+        linhas = list(ExtratoCaixaService.linhas_csv([_venda(1), _venda(2, 5.5)]))
+
+        self.assertEqual(len(linhas), 3)
+        self.assertTrue(linhas[0].startswith('numero_venda;data;'))
+        self.assertIn('DINHEIRO 5.50', linhas[2])
+
+    def test_pdf(self):
+        arquivo = ExtratoCaixaService.gerar_pdf(_venda(n) for n in range(120))
+        self.assertEqual(arquivo.read(5), b'%PDF-')
+
+    @mock.patch('Produtos.models.Produtos')
+    @mock.patch('Entidades.models.Entidades')
+    @mock.patch('CaixaDiario.extrato.Itenspedidovenda')
+    @mock.patch('CaixaDiario.extrato.PedidoVenda')
+    def test_nome_do_cliente_com_codigo_em_texto(self, pedidos, itens, entidades, produtos):
+        movimentos = mock.MagicMock()
+        movimentos.values.return_value.annotate.return_value.order_by.return_value = [
+            {'movi_nume_vend': 1, 'entr': 10, 'said': 0, 'data': '2024-05-01', 'caixa': 1},
+            {'movi_nume_vend': 2, 'entr': 5, 'said': 0, 'data': '2024-05-01', 'caixa': 1},
+        ]
+        movimentos.filter.return_value.values.return_value.annotate.return_value.order_by.return_value = []
+        pedidos.objects.using.return_value.filter.return_value.values.return_value = [
+            {'pedi_nume': 1, 'pedi_forn': '010', 'pedi_vend': '3', 'pedi_data': None},
+            {'pedi_nume': 2, 'pedi_forn': 'CONSUMIDOR', 'pedi_vend': '3', 'pedi_data': None},
+        ]
+        itens.objects.using.return_value.filter.return_value.order_by.return_value.values_list.return_value = []
+        filtro_entidades = entidades.objects.using.return_value.filter
+        filtro_entidades.return_value.values_list.return_value = [(10, 'CLIENTE DEZ')]
+
+        vendas = ExtratoCaixaService.pagina('t', 1, 1, movimentos)
+
+        self.assertEqual(filtro_entidades.call_args.kwargs['enti_clie__in'], [10])
+        self.assertEqual([(v['cliente_codigo'], v['cliente_nome']) for v in vendas], [
+            ('010', 'CLIENTE DEZ'), ('CONSUMIDOR', ''),
+        ])
@@ -1,5 +1,6 @@
 from rest_framework import viewsets, status, filters
 from CaixaDiario.services import CaixaService
+from core.numeracao import NumeracaoService
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Sum, Max
 from Pedidos.models import PedidoVenda, Itenspedidovenda
@@ -147,17 +148,7 @@ class MovicaixaViewSet(viewsets.ModelViewSet):
 
             with transaction.atomic(using=banco):
 
-                ultimo_num_pedido = PedidoVenda.objects.using(banco).filter(
-                    pedi_empr=empresa_id,
-                    pedi_fili=filial_id
-                ).aggregate(Max('pedi_nume'))['pedi_nume__max'] or 0
-
-                ultimo_num_movimento = Movicaixa.objects.using(banco).filter(
-                    movi_empr=empresa_id,
-                    movi_fili=filial_id
-                ).aggregate(Max('movi_nume_vend'))['movi_nume_vend__max'] or 0
-
-                numero_venda = max(ultimo_num_pedido, ultimo_num_movimento) + 1
+                numero_venda = NumeracaoService.proximo(banco, 'pedido', empresa_id, filial_id)
                 
                 ultimo_ctrl = Movicaixa.objects.using(banco).filter(
                     movi_empr=empresa_id,
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.licencas_loader import carregar_licencas_dict
+from core.utils import get_db_from_slug
+from DRE.servicos.fatos_servico import FatosDiariosService
+
+
+class Command(BaseCommand):
+    help = (
+        "Consolida os fatos diários (faturamento, devoluções, recebimentos, despesas e vendas) "
+        "usados pelo DRE e pelos dashboards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slug", help="Processa apenas a licença informada")
+        parser.add_argument("--dias", type=int, help="Dias recalculados (padrão: FATOS_DIAS_RECALCULO)")
+        parser.add_argument("--completo", action="store_true", help="Refaz todo o histórico")
+
+    def handle(self, *args, **options):
+        licencas = carregar_licencas_dict()
+        if not licencas:
+            raise CommandError("Nenhuma licença encontrada")
+
+        if options.get("slug"):
+            licencas = [lic for lic in licencas if lic["slug"] == options["slug"]]
+            if not licencas:
+                raise CommandError(f"Licença {options['slug']} não encontrada")
+
+        for lic in licencas:
+            slug = lic["slug"]
+            try:
+                banco = get_db_from_slug(slug)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Banco indisponível: {e}"))
+                continue
+
+            try:
+                linhas = FatosDiariosService.atualizar(banco, dias=options.get("dias"), completo=options["completo"])
+                self.stdout.write(self.style.SUCCESS(f"[{slug}] Fatos diários com {linhas} linhas atualizadas"))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Erro ao atualizar fatos diários: {e}"))
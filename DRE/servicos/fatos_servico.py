@@ -0,0 +1,298 @@
+import datetime
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TTL_CORTE = 300
+INICIO_HISTORICO = datetime.date(1900, 1, 1)
+
+TABELAS_FATOS = (
+    """
+    CREATE TABLE IF NOT EXISTS fatosdiarios (
+        fadi_empr integer NOT NULL,
+        fadi_fili integer NOT NULL,
+        fadi_data date NOT NULL,
+        fadi_tipo varchar(12) NOT NULL,
+        fadi_grup varchar(4) NOT NULL DEFAULT '',
+        fadi_valo numeric(17,2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (fadi_empr, fadi_fili, fadi_data, fadi_tipo, fadi_grup)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fatosvendas (
+        fave_empr integer NOT NULL,
+        fave_fili integer NOT NULL,
+        fave_data date NOT NULL,
+        fave_clie varchar(60) NOT NULL,
+        fave_qtde integer NOT NULL DEFAULT 0,
+        fave_tota numeric(17,2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (fave_empr, fave_fili, fave_data, fave_clie)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS fatosdiarios_data ON fatosdiarios (fadi_data)",
+    "CREATE INDEX IF NOT EXISTS fatosvendas_data ON fatosvendas (fave_data)",
+    """
+    CREATE TABLE IF NOT EXISTS fatoscontrole (
+        faco_id integer PRIMARY KEY,
+        faco_ate date NOT NULL,
+        faco_atua timestamp NOT NULL DEFAULT now()
+    )
+    """,
+)
+
+# CFOPs de devolução (mesmo critério do DRE gerencial)
+CFOP_DEVOLUCAO = "^(12|52|22|62)"
+
+# Valores diários por empresa, filial, data, tipo e grupo de CFOP (2 dígitos):
+# receita/devolucao das notas autorizadas, recebimento (baretitulos) e
+# despesa (bapatitulos). Os filtros de empresa/filial são opcionais.
+SELECT_FINANCEIRO = f"""
+    SELECT empresa, filial, data, tipo, grupo, COALESCE(SUM(valor), 0) AS valor
+      FROM (
+            SELECT n.empresa, n.filial, n.data_emissao AS data,
+                   CASE WHEN n.finalidade = 4 OR i.cfop::text ~ '{CFOP_DEVOLUCAO}' THEN 'devolucao'
+                        WHEN n.finalidade <> 4 AND i.cfop::text !~ '{CFOP_DEVOLUCAO}' THEN 'receita'
+                   END AS tipo,
+                   COALESCE(left(i.cfop::text, 2), '') AS grupo,
+                   i.total_item AS valor
+              FROM nf_nota n
+              JOIN nf_nota_item i ON i.nota_id = n.id
+             WHERE n.status = 100
+               AND n.data_emissao BETWEEN %(ini)s AND %(fim)s
+               {{filtro_nota}}
+            UNION ALL
+            SELECT bare_empr, bare_fili, bare_dpag, 'recebimento', '', bare_pago
+              FROM baretitulos
+             WHERE bare_dpag BETWEEN %(ini)s AND %(fim)s
+               {{filtro_receber}}
+            UNION ALL
+            SELECT bapa_empr, bapa_fili, bapa_dpag, 'despesa', '', bapa_pago
+              FROM bapatitulos
+             WHERE bapa_dpag BETWEEN %(ini)s AND %(fim)s
+               {{filtro_pagar}}
+      ) f
+     WHERE tipo IS NOT NULL
+     GROUP BY empresa, filial, data, tipo, grupo
+"""
+
+SELECT_VENDAS = """
+    SELECT pedi_empr AS empresa, pedi_fili AS filial, pedi_data AS data,
+           COALESCE(pedi_forn, '') AS cliente, COUNT(*) AS qtde, COALESCE(SUM(pedi_tota), 0) AS total
+      FROM pedidosvenda
+     WHERE pedi_data BETWEEN %(ini)s AND %(fim)s
+       {filtro}
+     GROUP BY 1, 2, 3, 4
+"""
+
+
+def _select_financeiro(filtrar):
+    if not filtrar:
+        return SELECT_FINANCEIRO.format(filtro_nota="", filtro_receber="", filtro_pagar="")
+    return SELECT_FINANCEIRO.format(
+        filtro_nota="AND n.empresa = %(empresa)s AND n.filial = %(filial)s",
+        filtro_receber="AND bare_empr = %(empresa)s AND bare_fili = %(filial)s",
+        filtro_pagar="AND bapa_empr = %(empresa)s AND bapa_fili = %(filial)s",
+    )
+
+
+def _filtro_fatos(prefixo, empresa, filial):
+    filtro = ""
+    if empresa is not None:
+        filtro += f" AND {prefixo}_empr = %(empresa)s"
+    if filial is not None:
+        filtro += f" AND {prefixo}_fili = %(filial)s"
+    return filtro
+
+
+class FatosDiariosService:
+    """
+    Camada de fatos diários por licença (fatosdiarios e fatosvendas), usada
+    pelo DRE e pelos dashboards. O job atualizar_fatos_diarios consolida até
+    ontem e registra a data de corte em fatoscontrole; as leituras somam os
+    fatos até o corte e vão às tabelas de origem só para os dias seguintes.
+    Sem fatos na base, tudo sai das tabelas de origem.
+    """
+
+    _corte = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def corte(banco: str):
+        """Último dia consolidado nos fatos, ou None se a base ainda não tem fatos."""
+        agora = time.monotonic()
+        with FatosDiariosService._lock:
+            cache = FatosDiariosService._corte.get(banco)
+            if cache and agora - cache[1] < TTL_CORTE:
+                return cache[0]
+
+        corte = None
+        try:
+            with connections[banco].cursor() as cursor:
+                cursor.execute("SELECT to_regclass('fatoscontrole') IS NOT NULL")
+                if cursor.fetchone()[0]:
+                    cursor.execute("SELECT faco_ate FROM fatoscontrole WHERE faco_id = 1")
+                    row = cursor.fetchone()
+                    corte = row[0] if row else None
+        except Exception as e:
+            logger.warning("[FATOS] falha ao ler corte dos fatos em %s: %s", banco, e)
+
+        with FatosDiariosService._lock:
+            FatosDiariosService._corte[banco] = (corte, agora)
+        return corte
+
+    @staticmethod
+    def limpar_cache(banco: str = None) -> None:
+        with FatosDiariosService._lock:
+            if banco is None:
+                FatosDiariosService._corte.clear()
+            else:
+                FatosDiariosService._corte.pop(banco, None)
+
+    @staticmethod
+    def _dividir(banco, data_ini, data_fim):
+        """(intervalo nos fatos, intervalo nas tabelas de origem); cada um pode ser None."""
+        corte = FatosDiariosService.corte(banco)
+        if corte is None or data_ini > corte:
+            return None, (data_ini, data_fim)
+        if data_fim <= corte:
+            return (data_ini, data_fim), None
+        return (data_ini, corte), (corte + datetime.timedelta(days=1), data_fim)
+
+    @staticmethod
+    def totais_financeiros(banco: str, empresa, filial, data_ini, data_fim) -> dict:
+        """
+        {tipo: valor} do período para receita, devolucao, recebimento e
+        despesa. Tipos sem lançamento no período não aparecem no dict.
+        """
+        params = {"empresa": int(empresa), "filial": int(filial)}
+        fatos, origem = FatosDiariosService._dividir(banco, data_ini, data_fim)
+        totais = {}
+        with connections[banco].cursor() as cursor:
+            if fatos:
+                cursor.execute(
+                    "SELECT fadi_tipo, SUM(fadi_valo) FROM fatosdiarios"
+                    " WHERE fadi_empr = %(empresa)s AND fadi_fili = %(filial)s"
+                    " AND fadi_data BETWEEN %(ini)s AND %(fim)s GROUP BY fadi_tipo",
+                    dict(params, ini=fatos[0], fim=fatos[1]),
+                )
+                for tipo, valor in cursor.fetchall():
+                    totais[tipo] = totais.get(tipo, Decimal(0)) + (valor or Decimal(0))
+            if origem:
+                cursor.execute(
+                    f"SELECT tipo, SUM(valor) FROM ({_select_financeiro(True)}) x GROUP BY tipo",
+                    dict(params, ini=origem[0], fim=origem[1]),
+                )
+                for tipo, valor in cursor.fetchall():
+                    totais[tipo] = totais.get(tipo, Decimal(0)) + (valor or Decimal(0))
+        return totais
+
+    @staticmethod
+    def totais_vendas(banco: str, data_ini, data_fim, empresa=None, filial=None):
+        """(quantidade de pedidos, total vendido) do período."""
+        params = {"empresa": empresa, "filial": filial}
+        fatos, origem = FatosDiariosService._dividir(banco, data_ini, data_fim)
+        qtde, total = 0, Decimal(0)
+        with connections[banco].cursor() as cursor:
+            if fatos:
+                cursor.execute(
+                    "SELECT SUM(fave_qtde), SUM(fave_tota) FROM fatosvendas"
+                    " WHERE fave_data BETWEEN %(ini)s AND %(fim)s" + _filtro_fatos("fave", empresa, filial),
+                    dict(params, ini=fatos[0], fim=fatos[1]),
+                )
+                q, t = cursor.fetchone()
+                qtde, total = qtde + (q or 0), total + (t or Decimal(0))
+            if origem:
+                cursor.execute(
+                    "SELECT SUM(qtde), SUM(total) FROM ("
+                    + SELECT_VENDAS.format(filtro=_filtro_fatos("pedi", empresa, filial))
+                    + ") x",
+                    dict(params, ini=origem[0], fim=origem[1]),
+                )
+                q, t = cursor.fetchone()
+                qtde, total = qtde + (q or 0), total + (t or Decimal(0))
+        return qtde, total
+
+    @staticmethod
+    def vendas_por_cliente(banco: str, empresa=None, filial=None, limite=10) -> list:
+        """Clientes com maior total vendido (todo o histórico): [(cliente, total, ultima_data)]."""
+        params = {"empresa": empresa, "filial": filial, "limite": limite}
+        corte = FatosDiariosService.corte(banco)
+        filtro_pedidos = _filtro_fatos("pedi", empresa, filial)
+        if corte is None:
+            partes = [f"SELECT pedi_forn, pedi_tota, pedi_data FROM pedidosvenda WHERE TRUE{filtro_pedidos}"]
+        else:
+            params["corte"] = corte
+            partes = [
+                "SELECT fave_clie, fave_tota, fave_data FROM fatosvendas"
+                " WHERE fave_data <= %(corte)s" + _filtro_fatos("fave", empresa, filial),
+                f"SELECT pedi_forn, pedi_tota, pedi_data FROM pedidosvenda WHERE pedi_data > %(corte)s{filtro_pedidos}",
+            ]
+        with connections[banco].cursor() as cursor:
+            cursor.execute(
+                "SELECT cliente, SUM(total), MAX(data) FROM ("
+                + " UNION ALL ".join(partes)
+                + ") x (cliente, total, data) GROUP BY cliente ORDER BY 2 DESC NULLS LAST LIMIT %(limite)s",
+                params,
+            )
+            return cursor.fetchall()
+
+    @staticmethod
+    def atualizar(banco: str, dias: int = None, completo: bool = False) -> int:
+        """
+        Consolida os fatos até ontem. Refaz os últimos ``dias`` (padrão
+        FATOS_DIAS_RECALCULO) e qualquer dia desde o corte anterior, para
+        pegar lançamentos retroativos; ``completo`` refaz todo o histórico.
+        Retorna o número de linhas gravadas.
+        """
+        if dias is None:
+            dias = int(getattr(settings, "FATOS_DIAS_RECALCULO", 45))
+        ate = timezone.localdate() - datetime.timedelta(days=1)
+
+        with transaction.atomic(using=banco):
+            with connections[banco].cursor() as cursor:
+                for sql in TABELAS_FATOS:
+                    cursor.execute(sql)
+                cursor.execute("LOCK TABLE fatoscontrole IN SHARE ROW EXCLUSIVE MODE")
+                cursor.execute("SELECT faco_ate FROM fatoscontrole WHERE faco_id = 1")
+                row = cursor.fetchone()
+
+                if completo or not row:
+                    desde = INICIO_HISTORICO
+                else:
+                    desde = min(row[0] + datetime.timedelta(days=1), ate - datetime.timedelta(days=max(int(dias), 1) - 1))
+                params = {"ini": desde, "fim": ate}
+
+                cursor.execute("DELETE FROM fatosdiarios WHERE fadi_data >= %(ini)s", params)
+                cursor.execute(
+                    "INSERT INTO fatosdiarios (fadi_empr, fadi_fili, fadi_data, fadi_tipo, fadi_grup, fadi_valo) "
+                    + _select_financeiro(False),
+                    params,
+                )
+                linhas = cursor.rowcount
+
+                cursor.execute("DELETE FROM fatosvendas WHERE fave_data >= %(ini)s", params)
+                cursor.execute(
+                    "INSERT INTO fatosvendas (fave_empr, fave_fili, fave_data, fave_clie, fave_qtde, fave_tota) "
+                    + SELECT_VENDAS.format(filtro=""),
+                    params,
+                )
+                linhas += cursor.rowcount
+
+                cursor.execute(
+                    "INSERT INTO fatoscontrole (faco_id, faco_ate, faco_atua) VALUES (1, %(fim)s, now()) "
+                    "ON CONFLICT (faco_id) DO UPDATE SET faco_ate = EXCLUDED.faco_ate, faco_atua = EXCLUDED.faco_atua",
+                    params,
+                )
+                if completo:
+                    cursor.execute("ANALYZE fatosdiarios")
+                    cursor.execute("ANALYZE fatosvendas")
+        logger.info("[FATOS] %s: %s linhas consolidadas de %s a %s", banco, linhas, desde, ate)
+        FatosDiariosService.limpar_cache(banco)
+        return linhas
@@ -0,0 +1,26 @@
+from celery import shared_task
+
+from core.licencas_loader import carregar_licencas_dict
+from core.utils import get_db_from_slug
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def atualizar_fatos_diarios(slug=None, dias=None):
+    """
+    Roda diariamente via Celery Beat.
+    Consolida os fatos diários do DRE/dashboards de cada licença.
+    """
+    from .servicos.fatos_servico import FatosDiariosService
+
+    slugs = [slug] if slug else [lic["slug"] for lic in carregar_licencas_dict()]
+    resultados = {}
+    for licenca_slug in slugs:
+        try:
+            resultados[licenca_slug] = FatosDiariosService.atualizar(get_db_from_slug(licenca_slug), dias=dias)
+        except Exception as exc:
+            logger.error(f"[FATOS] Erro ao atualizar {licenca_slug}: {exc}")
+            resultados[licenca_slug] = None
+    return resultados
@@ -0,0 +1,61 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+
+from DRE.servicos.fatos_servico import FatosDiariosService
+from DRE.views import _parametros
+
+
+CORTE = datetime.date(2024, 3, 10)
+
+
+class TestFatosDiariosService(SimpleTestCase):
+    def _cursor(self, connections, resultados):
+        cursor = connections.__getitem__.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetchall.side_effect = resultados
+        return cursor
+
+    @mock.patch.object(FatosDiariosService, "corte", return_value=CORTE)
+    def test_dividir_no_corte(self, _):
+        d = datetime.date
+        self.assertEqual(
+            FatosDiariosService._dividir("x", d(2024, 3, 1), d(2024, 3, 20)),
+            ((d(2024, 3, 1), CORTE), (d(2024, 3, 11), d(2024, 3, 20))),
+        )
+        self.assertEqual(FatosDiariosService._dividir("x", d(2024, 3, 1), d(2024, 3, 5)), ((d(2024, 3, 1), d(2024, 3, 5)), None))
+        self.assertEqual(FatosDiariosService._dividir("x", d(2024, 3, 11), d(2024, 3, 12)), (None, (d(2024, 3, 11), d(2024, 3, 12))))
+
+    @mock.patch.object(FatosDiariosService, "corte", return_value=None)
+    def test_sem_fatos_vai_para_origem(self, _):
+        d = datetime.date
+        self.assertEqual(FatosDiariosService._dividir("x", d(2024, 1, 1), d(2024, 1, 2)), (None, (d(2024, 1, 1), d(2024, 1, 2))))
+
+    @mock.patch.object(FatosDiariosService, "corte", return_value=CORTE)
+    @mock.patch("DRE.servicos.fatos_servico.connections")
+    def test_totais_somam_fatos_e_origem(self, connections, _):
+        cursor = self._cursor(connections, [
+            [("receita", Decimal("100")), ("despesa", Decimal("30"))],
+            [("receita", Decimal("5")), ("recebimento", Decimal("50"))],
+        ])
+
+        totais = FatosDiariosService.totais_financeiros(
+            "x", 1, 1, datetime.date(2024, 3, 1), datetime.date(2024, 3, 20)
+        )
+
+        self.assertEqual(totais, {"receita": Decimal("105"), "despesa": Decimal("30"), "recebimento": Decimal("50")})
+        self.assertNotIn("devolucao", totais)
+        self.assertEqual(cursor.execute.call_count, 2)
+        self.assertIn("fatosdiarios", cursor.execute.call_args_list[0][0][0])
+        self.assertEqual(cursor.execute.call_args_list[1][0][1]["ini"], datetime.date(2024, 3, 11))
+
+
+class TestParametros(SimpleTestCase):
+    def test_data_fora_do_formato_iso_devolve_400(self):
+        request = RequestFactory().get('/', {'data_ini': '01/02/2024', 'data_fim': '2024-02-29', 'empr': '1', 'fili': '1'})
+        params, erro = _parametros(request)
+
+        self.assertIsNone(params)
+        self.assertEqual(erro.status_code, 400)
+        self.assertEqual(erro.data, {"erro": "Parâmetros inválidos"})
@@ -1,9 +1,32 @@
+from decimal import Decimal
+
+from django.utils.dateparse import parse_date
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from core.decorator import modulo_necessario, ModuloRequeridoMixin
-from django.db import connections
 from core.middleware import get_licenca_slug
+from DRE.servicos.fatos_servico import FatosDiariosService
+
+# Custo estimado das mercadorias sobre a receita bruta
+PERCENTUAL_CMV = Decimal("0.403")
+
+
+def _parametros(request):
+    data_ini = request.GET.get("data_ini")
+    data_fim = request.GET.get("data_fim")
+    empresa = request.GET.get("empr")
+    filial = request.GET.get("fili")
+    if not all([data_ini, data_fim, empresa, filial]):
+        return None, Response({"erro": "Parâmetros obrigatórios faltando"}, status=400)
+    try:
+        inicio, fim = parse_date(data_ini), parse_date(data_fim)
+        if inicio is None or fim is None:
+            raise ValueError(data_ini, data_fim)
+        return (inicio, fim, int(empresa), int(filial)), None
+    except (TypeError, ValueError):
+        return None, Response({"erro": "Parâmetros inválidos"}, status=400)
+
 
 class DREGerencialDinamicoView(ModuloRequeridoMixin, APIView):
     permission_classes = [IsAuthenticated]
@@ -11,100 +34,32 @@ class DREGerencialDinamicoView(ModuloRequeridoMixin, APIView):
 
     @modulo_necessario('Financeiro')
     def get(self, request, *args, **kwargs):
-        data_ini = request.GET.get("data_ini")
-        data_fim = request.GET.get("data_fim")
-        empresa = request.GET.get("empr")
-        filial = request.GET.get("fili")
+        params, erro = _parametros(request)
+        if erro:
+            return erro
+        data_ini, data_fim, empresa, filial = params
         slug = get_licenca_slug()
 
-        if not all([data_ini, data_fim, empresa, filial]):
-            return Response({"erro": "Parâmetros obrigatórios faltando"}, status=400)
-
-        with connections[slug].cursor() as cursor:
-            cursor.execute("""
-                WITH 
-                    params AS (
-                        SELECT %s::int AS empresa, %s::int AS filial
-                    ),
-                    faturamento AS (
-                        SELECT
-                            n.empresa,
-                            n.filial,
-                            SUM(i.total_item) AS receita_bruta
-                        FROM nf_nota n
-                        JOIN nf_nota_item i ON i.nota_id = n.id
-                        JOIN params p ON p.empresa = n.empresa AND p.filial = n.filial
-                        WHERE n.status = 100
-                          AND n.data_emissao BETWEEN %s AND %s
-                          AND n.finalidade <> 4
-                          AND i.cfop::text !~ '^(12|52|22|62)'
-                        GROUP BY n.empresa, n.filial
-                    ),
-                    devolucoes AS (
-                        SELECT
-                            n.empresa,
-                            n.filial,
-                            SUM(i.total_item) AS total_devolvido
-                        FROM nf_nota n
-                        JOIN nf_nota_item i ON i.nota_id = n.id
-                        JOIN params p ON p.empresa = n.empresa AND p.filial = n.filial
-                        WHERE n.status = 100
-                          AND n.data_emissao BETWEEN %s AND %s
-                          AND (n.finalidade = 4 OR i.cfop::text ~ '^(12|52|22|62)')
-                        GROUP BY n.empresa, n.filial
-                    ),
-                recebimentos AS (
-                    SELECT 
-                        bare_empr AS empresa,
-                        bare_fili AS filial,
-                        SUM(bare_pago) AS total_recebido
-                    FROM baretitulos
-                    JOIN params p ON p.empresa = bare_empr AND p.filial = bare_fili
-                    WHERE bare_dpag BETWEEN %s AND %s
-                    GROUP BY bare_empr, bare_fili
-                ),
-                despesas AS (
-                    SELECT 
-                        bapa_empr AS empresa,
-                        bapa_fili AS filial,
-                        SUM(bapa_pago) AS total_despesas
-                    FROM bapatitulos
-                    JOIN params p ON p.empresa = bapa_empr AND p.filial = bapa_fili
-                    WHERE bapa_dpag BETWEEN %s AND %s
-                    GROUP BY bapa_empr, bapa_fili
-                )
-                SELECT
-                    p.empresa,
-                    p.filial,
-                    COALESCE(f.receita_bruta, 0) AS receita_bruta,
-                    COALESCE(d.total_devolvido, 0) AS deducoes,
-                    (COALESCE(f.receita_bruta, 0) - COALESCE(d.total_devolvido, 0)) AS receita_liquida,
-                    (COALESCE(f.receita_bruta, 0) * 0.403) AS cmv,
-                    ((COALESCE(f.receita_bruta, 0) - COALESCE(d.total_devolvido, 0)) - (COALESCE(f.receita_bruta, 0) * 0.403)) AS lucro_bruto,
-                    COALESCE(r.total_recebido, 0) AS total_recebido,
-                    COALESCE(dp.total_despesas, 0) AS total_despesas,
-                    (COALESCE(r.total_recebido, 0) - COALESCE(dp.total_despesas, 0)) AS resultado_operacional
-                FROM params p
-                LEFT JOIN faturamento f ON f.empresa = p.empresa AND f.filial = p.filial
-                LEFT JOIN devolucoes d ON d.empresa = p.empresa AND d.filial = p.filial
-                LEFT JOIN recebimentos r ON r.empresa = p.empresa AND r.filial = p.filial
-                LEFT JOIN despesas dp ON dp.empresa = p.empresa AND dp.filial = p.filial
-            """, [
-                empresa, filial,
-                data_ini, data_fim,
-                data_ini, data_fim,
-                data_ini, data_fim,
-                data_ini, data_fim,
-            ])
-
-            row = cursor.fetchone()
-            if row:
-                columns = [col[0] for col in cursor.description]
-                data = dict(zip(columns, row))
-                return Response(data)
-            else:
-                return Response({}, status=200)
+        totais = FatosDiariosService.totais_financeiros(slug, empresa, filial, data_ini, data_fim)
+        receita_bruta = totais.get("receita", Decimal(0))
+        deducoes = totais.get("devolucao", Decimal(0))
+        total_recebido = totais.get("recebimento", Decimal(0))
+        total_despesas = totais.get("despesa", Decimal(0))
+        receita_liquida = receita_bruta - deducoes
+        cmv = receita_bruta * PERCENTUAL_CMV
 
+        return Response({
+            "empresa": empresa,
+            "filial": filial,
+            "receita_bruta": receita_bruta,
+            "deducoes": deducoes,
+            "receita_liquida": receita_liquida,
+            "cmv": cmv,
+            "lucro_bruto": receita_liquida - cmv,
+            "total_recebido": total_recebido,
+            "total_despesas": total_despesas,
+            "resultado_operacional": total_recebido - total_despesas,
+        })
 
 
 class DRECaixaView(ModuloRequeridoMixin, APIView):
@@ -113,54 +68,22 @@ class DRECaixaView(ModuloRequeridoMixin, APIView):
 
     @modulo_necessario('Financeiro')
     def get(self, request, *args, **kwargs):
-        data_ini = request.GET.get("data_ini")
-        data_fim = request.GET.get("data_fim")
-        empresa = request.GET.get("empr")
-        filial = request.GET.get("fili")
-
-        if not all([data_ini, data_fim, empresa, filial]):
-            return Response({"erro": "Parâmetros obrigatórios faltando"}, status=400)
-
+        params, erro = _parametros(request)
+        if erro:
+            return erro
+        data_ini, data_fim, empresa, filial = params
         slug = get_licenca_slug()
 
-        with connections[slug].cursor() as cursor:
-            cursor.execute("""
-                WITH recebimentos AS (
-                    SELECT 
-                        bare_empr AS empresa,
-                        bare_fili AS filial,
-                        SUM(bare_pago) AS total_recebido
-                    FROM baretitulos
-                    WHERE bare_dpag BETWEEN %s AND %s
-                    GROUP BY bare_empr, bare_fili
-                ),
-                despesas AS (
-                    SELECT 
-                        bapa_empr AS empresa,
-                        bapa_fili AS filial,
-                        SUM(bapa_pago) AS total_despesas
-                    FROM bapatitulos
-                    WHERE bapa_dpag BETWEEN %s AND %s
-                    GROUP BY bapa_empr, bapa_fili
-                )
-                SELECT 
-                    r.empresa, r.filial,
-                    COALESCE(r.total_recebido, 0) AS total_recebido,
-                    COALESCE(d.total_despesas, 0) AS total_despesas,
-                    (COALESCE(r.total_recebido, 0) - COALESCE(d.total_despesas, 0)) AS resultado_caixa
-                FROM recebimentos r
-                LEFT JOIN despesas d ON d.empresa = r.empresa AND d.filial = r.filial
-                WHERE r.empresa = %s AND r.filial = %s
-            """, [
-                data_ini, data_fim,
-                data_ini, data_fim,
-                empresa, filial
-            ])
+        totais = FatosDiariosService.totais_financeiros(slug, empresa, filial, data_ini, data_fim)
+        if "recebimento" not in totais:
+            return Response({}, status=200)
 
-            row = cursor.fetchone()
-            if row:
-                columns = [col[0] for col in cursor.description]
-                data = dict(zip(columns, row))
-                return Response(data)
-            else:
-                return Response({}, status=200)
+        total_recebido = totais["recebimento"]
+        total_despesas = totais.get("despesa", Decimal(0))
+        return Response({
+            "empresa": empresa,
+            "filial": filial,
+            "total_recebido": total_recebido,
+            "total_despesas": total_despesas,
+            "resultado_caixa": total_recebido - total_despesas,
+        })
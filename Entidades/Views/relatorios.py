@@ -41,6 +41,9 @@ from .base_cliente import BaseClienteViewSet
 from core.excecoes import ErroDominio
 from core.dominio_handler import tratar_erro, tratar_sucesso
 from django.core.cache import cache
+from django.http import Http404
+from django.urls import reverse
+from midias.servico import TAMANHOS_MINIATURA, anotar as anotar_midia, servir as servir_midia
 
 
 class PedidosViewSet(BaseClienteViewSet):
@@ -97,13 +100,60 @@ class OrdemServicoViewSet(BaseClienteViewSet):
             arqu_fili__in=fili_ids,
         ).order_by("-arqu_codi_arqu")
 
+        # Por padrão a lista leva só a URL do arquivo (hash/tamanho calculados
+        # no banco); o base64 embutido fica para quem ainda pede incluir_base64=1.
+        incluir_base64 = self._incluir_base64()
+        if not incluir_base64:
+            qs = anotar_midia(qs.defer("arqu_arqu"), "os_arquivo")
+
         arquivos_map = {}
         for obj in qs:
             key = (obj.arqu_empr, obj.arqu_fili, obj.arqu_os)
-            item = OsArquSerializer(obj, context={"banco": banco, "include_base64": True}).data
+            item = OsArquSerializer(obj, context={"banco": banco, "include_base64": incluir_base64}).data
+            if not incluir_base64:
+                url = self._url_arquivo(obj)
+                item["hash"] = obj.midia_hash
+                item["tamanho"] = obj.midia_tamanho
+                item["url"] = f"{url}?v={obj.midia_hash}" if obj.midia_tamanho else None
+                item["miniatura_url"] = f"{url}?v={obj.midia_hash}&tam=256" if obj.midia_tamanho else None
             arquivos_map.setdefault(key, []).append(item)
         return arquivos_map
 
+    def _incluir_base64(self):
+        val = (self.request.query_params.get('incluir_base64') or '').strip().lower()
+        return val in ('1', 'true', 'yes', 'y')
+
+    def _url_arquivo(self, obj):
+        return reverse('ordem-servico-arquivo', kwargs={
+            'slug': self.kwargs.get('slug'),
+            'pk': obj.arqu_os,
+            'codigo': obj.arqu_codi_arqu,
+        })
+
+    @action(detail=True, methods=['get'], url_path=r'arquivos/(?P<codigo>\d+)', url_name='arquivo')
+    def arquivo(self, request, pk=None, codigo=None, *args, **kwargs):
+        """
+        Arquivo da OS do cliente, servido pelo hash (ETag/Range, miniatura em
+        ``tam``). O session_id vai no header X-Session-ID ou na query string.
+        """
+        permissoes = getattr(request, 'permissoes', {}) or {}
+        if not permissoes.get('ver_foto', True):
+            raise Http404('Arquivo não encontrado')
+        ordem = self.get_queryset().filter(orde_nume=pk).values_list('orde_empr', 'orde_fili').first()
+        if not ordem:
+            raise Http404('Ordem não encontrada')
+        tamanho = request.query_params.get('tam')
+        tamanho = int(tamanho) if tamanho and tamanho.isdigit() and int(tamanho) in TAMANHOS_MINIATURA else None
+        resposta = servir_midia(request, request.banco, 'os_arquivo', {
+            'arqu_empr': ordem[0],
+            'arqu_fili': ordem[1],
+            'arqu_os': pk,
+            'arqu_codi_arqu': codigo,
+        }, tamanho=tamanho)
+        if resposta is None:
+            raise Http404('Arquivo não encontrado')
+        return resposta
+
     def _inject_arquivos_no_payload(self, ordens, data):
         if not ordens or not data:
             return
@@ -140,6 +190,7 @@ class OrdemServicoViewSet(BaseClienteViewSet):
             f"po={potencia_value}",
             f"p={qp.get('page','')}",
             f"ps={qp.get('page_size','')}",
+            f"b64={1 if self._incluir_base64() else 0}",
         ]
         return f"os:{base}:" + "|".join(parts)
     
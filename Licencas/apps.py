@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LicencasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Licencas'
+
+    def ready(self):
+        import Licencas.signals
@@ -2,10 +2,11 @@ import logging
 
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.settings import api_settings
 
 from Licencas.models import Usuarios
+from core.contexto_auth import ContextoAuth
 from core.middleware import get_licenca_slug
 from core.utils import get_db_from_slug
 
@@ -14,6 +15,30 @@ logger = logging.getLogger("django")
 
 
 class CustomJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        # Mesmo contexto do LicencaMiddleware/PerfilPermissionMiddleware: o token
+        # já decodificado e o usuário já carregado na request são reaproveitados
+        self.contexto = ContextoAuth.obter(request)
+        return super().authenticate(request)
+
+    def get_validated_token(self, raw_token):
+        contexto = getattr(self, "contexto", None)
+        if isinstance(raw_token, bytes):
+            raw_token = raw_token.decode()
+        if contexto is not None and contexto.claims is not None and contexto.token == raw_token:
+            for AuthToken in api_settings.AUTH_TOKEN_CLASSES:
+                try:
+                    # Assinatura já verificada no ContextoAuth: monta o token com o
+                    # payload decodificado e só repete as checagens de exp/tipo
+                    token = AuthToken()
+                    token.token = raw_token
+                    token.payload = dict(contexto.claims)
+                    token.verify()
+                    return token
+                except TokenError:
+                    continue
+        return super().get_validated_token(raw_token)
+
     def get_user(self, validated_token):
         user_id_claim = getattr(self, "user_id_claim", api_settings.USER_ID_CLAIM)
         user_id_field = getattr(self, "user_id_field", api_settings.USER_ID_FIELD)
@@ -28,11 +53,17 @@ class CustomJWTAuthentication(JWTAuthentication):
         )
         banco = get_db_from_slug(slug) if slug else "default"
 
-        usuario = Usuarios.objects.using(banco).filter(**{user_id_field: user_id}).first()
-
-        if usuario is None:
-            username = validated_token.get("username") or validated_token.get("usua_nome")
-            if username:
+        username = validated_token.get("username") or validated_token.get("usua_nome")
+        contexto = getattr(self, "contexto", None)
+        if contexto is not None and user_id_field == Usuarios._meta.pk.attname:
+            try:
+                usuario_id = int(user_id)
+            except (TypeError, ValueError):
+                usuario_id = None
+            usuario = contexto.usuario(banco, usuario_id, username)
+        else:
+            usuario = Usuarios.objects.using(banco).filter(**{user_id_field: user_id}).first()
+            if usuario is None and username:
                 usuario = Usuarios.objects.using(banco).filter(usua_nome__iexact=username).first()
 
         if usuario is None:
@@ -1,16 +1,22 @@
+from functools import lru_cache
+
 from django.conf import settings
 from base64 import urlsafe_b64encode, urlsafe_b64decode
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes
 from cryptography.fernet import Fernet
 
-def _derive_key() -> bytes:
-    secret = settings.SECRET_KEY.encode()
+@lru_cache(maxsize=4)
+def _derive_key_para(secret: bytes) -> bytes:
     salt = b"licencas-certificado-a1"
     kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=390000)
     key = urlsafe_b64encode(kdf.derive(secret))
     return key
 
+def _derive_key() -> bytes:
+    # PBKDF2 com 390k iterações: derivada uma vez por SECRET_KEY, não a cada decrypt
+    return _derive_key_para(settings.SECRET_KEY.encode())
+
 def get_fernet() -> Fernet:
     return Fernet(_derive_key())
 
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.contexto_auth import limpar_snapshot_usuarios
+
+from .models import Usuarios
+
+
+@receiver(post_save, sender=Usuarios)
+@receiver(post_delete, sender=Usuarios)
+def usuario_alterado(sender, instance, using, **kwargs):
+    limpar_snapshot_usuarios(using)
@@ -42,9 +42,8 @@ SETOR_OBRIGATORIO_SLUGS = {"savexml144", "saveweb144"}
 
 
 def get_banco_por_docu(docu):
-    from core.licenca_context import get_licencas_map
-    docu_digits = re.sub(r"\D", "", str(docu or ""))
-    match = next((x for x in get_licencas_map() if re.sub(r"\D", "", str(x.get('cnpj') or "")) == docu_digits), None)
+    from core.licenca_context import get_licenca_por_documento
+    match = get_licenca_por_documento(docu)
     return match['slug'] if match else None
 
 
@@ -384,8 +383,8 @@ class EmpresaUsuarioView(APIView):
 
     def get(self, request, *args, **kwargs):
         slug = (kwargs.get("slug") or "").strip() or get_licenca_slug()
-        from core.licenca_context import get_licencas_map
-        licenca_info = next((item for item in get_licencas_map() if item['slug'] == slug), None)
+        from core.licenca_context import get_licenca
+        licenca_info = get_licenca(slug)
 
         if not licenca_info:
             return Response({"error": "Licença não encontrada."}, status=404)
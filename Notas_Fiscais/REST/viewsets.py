@@ -21,6 +21,7 @@ from ..services.nota_service import NotaService
 from ..services.calculo_impostos_service import CalculoImpostosService
 from ..dominio.builder import NotaBuilder
 from ..aplicacao.emissao_service import EmissaoService
+from ..aplicacao.emissao_lote_service import EmissaoLoteService
 from ..services.gerar_xml_notas import gerar_e_enviar_xml_contabilidade
 
 logger = logging.getLogger(__name__)
@@ -448,6 +449,55 @@ class NotaViewSet(viewsets.ModelViewSet):
             logger.error(f"Erro ao transmitir nota {pk}: {e}")
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=["post"], url_path="transmitir-lote")
+    def transmitir_lote(self, request, slug=None):
+        banco = get_licenca_db_config(request) or "default"
+        empresa = (
+            request.session.get("empresa_id")
+            or request.query_params.get("empresa")
+            or request.headers.get("X-Empresa")
+        )
+        filial = (
+            request.session.get("filial_id")
+            or request.query_params.get("filial")
+            or request.headers.get("X-Filial")
+        )
+        ids = request.data.get("ids") or []
+        if not isinstance(ids, list) or not ids:
+            return Response({"detail": "Informe a lista de ids das notas"}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids_validos = list(
+            Nota.objects.using(banco)
+            .filter(pk__in=ids, empresa=empresa, filial=filial)
+            .values_list("id", flat=True)
+        )
+        if not ids_validos:
+            return Response({"detail": "Nenhuma nota encontrada"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            current_slug = slug or request.parser_context["kwargs"].get("slug") or ""
+            resultados = EmissaoLoteService(current_slug, banco).emitir(ids_validos)
+        except Exception as e:
+            logger.error(f"Erro ao transmitir lote de notas {ids_validos}: {e}")
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "resultados": [
+                    {
+                        "id": nota_id,
+                        "status": r.get("status"),
+                        "motivo": r.get("motivo"),
+                        "protocolo": r.get("protocolo"),
+                        "chave": r.get("chave"),
+                    }
+                    for nota_id, r in resultados.items()
+                ],
+                "autorizadas": sum(1 for r in resultados.values() if r.get("status") == 100),
+            },
+            status=status.HTTP_200_OK,
+        )
+
     @action(detail=True, methods=["post"])
     def inutilizar(self, request, pk=None, slug=None):
         banco = get_licenca_db_config(request) or "default"
@@ -0,0 +1,138 @@
+import logging
+import time
+from itertools import groupby
+
+from ..models import Nota
+from ..infrastructure.assinatura_lote import pool_assinatura
+from ..infrastructure.sefaz_adapter import LOTE_MAX_NOTAS
+from .emissao_service import EmissaoService
+from core.excecoes import ErroDominio
+
+
+logger = logging.getLogger(__name__)
+
+
+def _resultado_erro(e):
+    return {
+        "xml": None,
+        "codigo": getattr(e, "codigo", None),
+        "motivo": getattr(e, "mensagem", None) or str(e),
+        "status": None,
+        "protocolo": None,
+        "chave": None,
+        "xml_protocolo": None,
+    }
+
+
+def _resultado_autorizada(nota):
+    return {
+        "xml": None,
+        "codigo": "nota_ja_autorizada",
+        "motivo": nota.motivo_status or "Nota já autorizada.",
+        "status": 100,
+        "protocolo": nota.protocolo_autorizacao,
+        "chave": nota.chave_acesso,
+        "xml_protocolo": None,
+    }
+
+
+class EmissaoLoteService:
+    """
+    Emissão de várias notas em lotes enviNFe (até LOTE_MAX_NOTAS por lote).
+
+    As notas são agrupadas por empresa/filial/modelo (mesmo certificado e
+    endpoint); a montagem do XML é feita aqui, a assinatura vai para o
+    pool de processos e cada lote segue num único envio à SEFAZ. O resultado
+    de cada nota é persistido como em EmissaoService.emitir. Notas já
+    autorizadas não são reenviadas, mas aparecem no resultado com status 100.
+    """
+
+    def __init__(self, slug, database):
+        self.slug = slug
+        self.db = database
+        self.emissao = EmissaoService(slug, database)
+
+    def emitir(self, nota_ids, tamanho_lote=LOTE_MAX_NOTAS):
+        """Devolve {nota_id: resposta} no formato de EmissaoService.emitir."""
+        tamanho_lote = max(1, min(int(tamanho_lote or LOTE_MAX_NOTAS), LOTE_MAX_NOTAS))
+        notas = list(
+            Nota.objects.using(self.db)
+            .filter(id__in=list(nota_ids))
+            .order_by("empresa", "filial", "modelo", "id")
+        )
+
+        resultados = {nota.id: _resultado_autorizada(nota) for nota in notas if nota.status == 100}
+        notas = [nota for nota in notas if nota.status != 100]
+        for (empresa, filial, modelo), grupo in groupby(notas, key=lambda n: (n.empresa, n.filial, str(n.modelo))):
+            resultados.update(self._emitir_grupo(list(grupo), modelo, tamanho_lote))
+        return resultados
+
+    def _emitir_grupo(self, notas, modelo, tamanho_lote):
+        resultados = {}
+        adapter = None
+        preparadas = []
+        for nota in notas:
+            try:
+                dto, nfe_obj = self.emissao._montar_nfe(nota)
+                if adapter is None:
+                    adapter, filial_obj = self.emissao._adapter(nota, dto)
+                self.emissao._configurar_nfce(nota, dto, filial_obj, nfe_obj)
+                preparadas.append((nota, adapter.serializar(nfe_obj), getattr(nfe_obj, "_nfce_csc", None)))
+            except ErroDominio as e:
+                logger.warning("[NFE_LOTE] nota %s fora do lote: %s", nota.id, e.mensagem)
+                resultados[nota.id] = _resultado_erro(e)
+            except Exception as e:
+                # Erro inesperado numa nota não derruba as outras do grupo
+                logger.exception("[NFE_LOTE] erro ao montar a nota %s", nota.id)
+                resultados[nota.id] = _resultado_erro(ErroDominio(
+                    "Falha ao montar a nota para envio.",
+                    codigo="nfe_montagem_erro",
+                    detalhes={"erro_original": str(e), "erro_tipo": e.__class__.__name__},
+                ))
+
+        for inicio in range(0, len(preparadas), tamanho_lote):
+            lote = preparadas[inicio:inicio + tamanho_lote]
+            resultados.update(self._transmitir(adapter, lote, modelo))
+        return resultados
+
+    def _transmitir(self, adapter, lote, modelo):
+        try:
+            assinados = pool_assinatura.assinar(adapter, [nfe for _, nfe, _ in lote], [csc for _, _, csc in lote])
+            respostas = adapter.autorizar_lote(
+                assinados,
+                modelo="nfce" if modelo == "65" else "nfe",
+                id_lote=int(time.time() * 1000) % 10 ** 15,
+            )
+        except Exception as e:
+            logger.exception("[NFE_LOTE] falha ao enviar lote de %s notas", len(lote))
+            erro = ErroDominio(
+                "Falha ao enviar o lote para a SEFAZ.",
+                codigo="sefaz_envio_erro",
+                detalhes={"erro_original": str(e), "erro_tipo": e.__class__.__name__},
+            )
+            return {nota.id: _resultado_erro(erro) for nota, _, _ in lote}
+
+        resultados = {}
+        for (nota, _, _), resposta in zip(lote, respostas):
+            # A SEFAZ já respondeu: falha ao gravar uma nota não pode deixar as
+            # outras autorizadas sem registro local.
+            try:
+                self.emissao._recuperar_duplicidade(adapter, resposta)
+                self.emissao._persistir(nota, resposta)
+            except Exception as e:
+                logger.exception("[NFE_LOTE] nota %s respondida pela SEFAZ mas não gravada", nota.id)
+                resultado = _resultado_erro(ErroDominio(
+                    "Nota processada pela SEFAZ, mas não gravada no sistema.",
+                    codigo="nfe_persistencia_erro",
+                ))
+                # chave e protocolo permitem conciliar a nota depois
+                resultado.update(chave=resposta.get("chave"), protocolo=resposta.get("protocolo"))
+                resultados[nota.id] = resultado
+                continue
+            resultados[nota.id] = resposta
+        logger.info(
+            "[NFE_LOTE] lote de %s notas: %s autorizadas",
+            len(lote),
+            sum(1 for r in respostas if r.get("status") == 100),
+        )
+        return resultados
@@ -25,6 +25,35 @@ class EmissaoService:
     def emitir(self, nota_id):
         nota = Nota.objects.using(self.db).get(id=nota_id)
 
+        dto, nfe_obj = self._montar_nfe(nota)
+        adapter, filial_obj = self._adapter(nota, dto)
+        self._configurar_nfce(nota, dto, filial_obj, nfe_obj)
+
+        try:
+            resposta = adapter.emitir(nfe_obj)
+        except Exception as e:
+            detalhes = {
+                "erro_original": str(e),
+                "erro_tipo": e.__class__.__name__,
+                "erro_repr": repr(e),
+            }
+            logger.exception(
+                "Erro ao emitir nota na SEFAZ para empresa=%s filial=%s nota_id=%s",
+                nota.empresa,
+                nota.filial,
+                nota.id,
+            )
+            raise ErroDominio(
+                "Falha ao enviar a nota para a SEFAZ.",
+                codigo="sefaz_envio_erro",
+                detalhes=detalhes,
+            )
+
+        self._recuperar_duplicidade(adapter, resposta)
+        self._persistir(nota, resposta)
+        return resposta
+
+    def _montar_nfe(self, nota):
         # 1) Calcular impostos item a item
         CalculoImpostosService(self.db).aplicar_impostos(nota)
 
@@ -45,19 +74,16 @@ class EmissaoService:
         # 3) Montar objeto NFe (PyNFe)
         nfe_obj = construir_nfe_pynfe(dto)
 
+        return dto, nfe_obj
+
+    def _adapter(self, nota, dto):
         # 4) Certificado
         from Licencas.models import Filiais
         filial_obj = Filiais.objects.using(self.db).defer('empr_cert_digi').get(empr_empr=nota.empresa, empr_codi=nota.filial)
 
         try:
-            cert_path, cert_pass = CertificadoLoader(filial_obj).load()
-            tamanho = 0
-            try:
-                if hasattr(filial_obj, 'empr_cert_digi') and filial_obj.empr_cert_digi:
-                    tamanho = len(filial_obj.empr_cert_digi)
-            except Exception:
-                pass
-            logger.info(f"Certificado carregado com sucesso para empresa={nota.empresa}, filial={nota.filial}, caminho={cert_path}, senha={cert_pass}, tamanho={tamanho} bytes")
+            certificado = CertificadoLoader(filial_obj).carregar()
+            logger.info(f"Certificado carregado com sucesso para empresa={nota.empresa}, filial={nota.filial}, fingerprint={certificado.fingerprint[:12]}")
         except Exception as e:
             detalhes = {
                 "empresa": nota.empresa,
@@ -77,7 +103,7 @@ class EmissaoService:
             )
 
         try:
-            adapter = SefazAdapter(cert_path, cert_pass, dto.emitente.uf, dto.ambiente)
+            adapter = SefazAdapter(certificado, dto.emitente.uf, dto.ambiente)
         except Exception as e:
             detalhes = {"erro_original": str(e)}
             logger.error(
@@ -92,92 +118,62 @@ class EmissaoService:
                 detalhes=detalhes,
             )
 
-        if str(getattr(nota, "modelo", "")) == "65":
-            uf = str(dto.emitente.uf or "").strip().upper()
-            tp_amb = int(dto.ambiente or 2)
-
-            id_token = str(getattr(filial_obj, "empr_id_toke", "") or "").strip()
-            csc = str(getattr(filial_obj, "empr_csn_toke", "") or "").strip()
-
-            csc_source = "filial"
-            if (not id_token or not csc) and uf == "PR" and tp_amb != 1:
-                csc = "TBPHFPLCMUIB4K4CGY3SJW1RE8YWQWFQ4D56"
-                id_token = "1"
-                csc_source = "fallback_pr_homologacao"
-            if not id_token or not csc:
-                logger.info(
-                    "NFC-e CSC/IDToken ausente empresa=%s filial=%s uf=%s tpAmb=%s id_token=%s csc_len=%s csc_tail=%s source=%s",
-                    nota.empresa,
-                    nota.filial,
-                    uf,
-                    tp_amb,
-                    id_token or "",
-                    len(csc or ""),
-                    (csc or "")[-4:] if csc else "",
-                    csc_source,
-                )
-                raise ErroDominio(
-                    "Filial sem CSC/ID Token configurado para NFC-e (modelo 65).",
-                    codigo="nfce_csc_nao_configurado",
-                    detalhes={
-                        "empresa": nota.empresa,
-                        "filial": nota.filial,
-                    },
-                )
+        return adapter, filial_obj
+
+    def _configurar_nfce(self, nota, dto, filial_obj, nfe_obj):
+        if str(getattr(nota, "modelo", "")) != "65":
+            return
+
+        uf = str(dto.emitente.uf or "").strip().upper()
+        tp_amb = int(dto.ambiente or 2)
+
+        id_token = str(getattr(filial_obj, "empr_id_toke", "") or "").strip()
+        csc = str(getattr(filial_obj, "empr_csn_toke", "") or "").strip()
+
+        csc_source = "filial"
+        if (not id_token or not csc) and uf == "PR" and tp_amb != 1:
+            csc = "TBPHFPLCMUIB4K4CGY3SJW1RE8YWQWFQ4D56"
+            id_token = "1"
+            csc_source = "fallback_pr_homologacao"
+        if not id_token or not csc:
             logger.info(
-                "NFC-e CSC/IDToken selecionado empresa=%s filial=%s uf=%s tpAmb=%s id_token=%s csc_len=%s csc_tail=%s source=%s",
+                "NFC-e CSC/IDToken ausente empresa=%s filial=%s uf=%s tpAmb=%s id_token=%s csc_len=%s csc_tail=%s source=%s",
                 nota.empresa,
                 nota.filial,
                 uf,
                 tp_amb,
-                id_token,
-                len(csc),
-                csc[-4:],
+                id_token or "",
+                len(csc or ""),
+                (csc or "")[-4:] if csc else "",
                 csc_source,
             )
-            print(
-                f"DEBUG: NFC-e CSC/IDToken selecionado empresa={nota.empresa} filial={nota.filial} uf={uf} tpAmb={tp_amb} "
-                f"id_token={id_token} csc_len={len(csc)} csc_tail={csc[-4:]} source={csc_source}"
-            )
-            nfe_obj._nfce_csc = {
-                "id_token": id_token,
-                "csc": csc,
-                "uf": uf,
-                "ambiente": str(tp_amb),
-            }
-
-        try:
-            resposta = adapter.emitir(nfe_obj)
-        except Exception as e:
-            detalhes = {
-                "erro_original": str(e),
-                "erro_tipo": e.__class__.__name__,
-                "erro_repr": repr(e),
-            }
-            logger.exception(
-                "Erro ao emitir nota na SEFAZ para empresa=%s filial=%s nota_id=%s",
-                nota.empresa,
-                nota.filial,
-                nota.id,
-            )
             raise ErroDominio(
-                "Falha ao enviar a nota para a SEFAZ.",
-                codigo="sefaz_envio_erro",
-                detalhes=detalhes,
+                "Filial sem CSC/ID Token configurado para NFC-e (modelo 65).",
+                codigo="nfce_csc_nao_configurado",
+                detalhes={
+                    "empresa": nota.empresa,
+                    "filial": nota.filial,
+                },
             )
-
-        # Converter objeto Element XML para string antes de salvar e retornar
-        if 'xml' in resposta and not isinstance(resposta['xml'], str):
-             try:
-                from lxml import etree
-                resposta['xml'] = etree.tostring(resposta['xml'], encoding='unicode')
-             except Exception:
-                try:
-                    import xml.etree.ElementTree as ET
-                    resposta['xml'] = ET.tostring(resposta['xml'], encoding='unicode')
-                except Exception:
-                    resposta['xml'] = str(resposta['xml'])
-
+        logger.debug(
+            "NFC-e CSC/IDToken selecionado empresa=%s filial=%s uf=%s tpAmb=%s id_token=%s csc_len=%s csc_tail=%s source=%s",
+            nota.empresa,
+            nota.filial,
+            uf,
+            tp_amb,
+            id_token,
+            len(csc),
+            csc[-4:],
+            csc_source,
+        )
+        nfe_obj._nfce_csc = {
+            "id_token": id_token,
+            "csc": csc,
+            "uf": uf,
+            "ambiente": str(tp_amb),
+        }
+
+    def _recuperar_duplicidade(self, adapter, resposta):
         # Tratamento para erro 539 (Duplicidade com diferença na Chave)
         if resposta.get("status") == 539:
             motivo = resposta.get("motivo", "")
@@ -213,6 +209,19 @@ class EmissaoService:
                 except Exception as e_cons:
                     logger.error(f"Erro ao consultar chave original na duplicidade: {e_cons}")
 
+    def _persistir(self, nota, resposta):
+        # Converter objeto Element XML para string antes de salvar e retornar
+        if 'xml' in resposta and not isinstance(resposta['xml'], str):
+             try:
+                from lxml import etree
+                resposta['xml'] = etree.tostring(resposta['xml'], encoding='unicode')
+             except Exception:
+                try:
+                    import xml.etree.ElementTree as ET
+                    resposta['xml'] = ET.tostring(resposta['xml'], encoding='unicode')
+                except Exception:
+                    resposta['xml'] = str(resposta['xml'])
+
         # 7) Persistir
         with transaction.atomic(using=self.db):
             nota.chave_acesso = resposta.get("chave")
@@ -274,8 +283,6 @@ class EmissaoService:
                 using=self.db
             )
 
-        return resposta
-
     def consultar_status(self, nota_id):
         nota = Nota.objects.using(self.db).get(id=nota_id)
         chave_consulta = nota.chave_acesso
@@ -335,7 +342,7 @@ class EmissaoService:
         filial_obj = Filiais.objects.using(self.db).defer('empr_cert_digi').get(empr_empr=nota.empresa, empr_codi=nota.filial)
 
         try:
-            cert_path, cert_pass = CertificadoLoader(filial_obj).load()
+            certificado = CertificadoLoader(filial_obj).carregar()
         except Exception as e:
             detalhes = {
                 "empresa": nota.empresa,
@@ -354,7 +361,7 @@ class EmissaoService:
         try:
             ambiente = int(filial_obj.empr_ambi_nfe or 2)
             uf = filial_obj.empr_esta
-            adapter = SefazAdapter(cert_path, cert_pass, uf, ambiente)
+            adapter = SefazAdapter(certificado, uf, ambiente)
             
             resposta = adapter.consultar(chave_consulta)
             
@@ -443,14 +450,14 @@ class EmissaoService:
         filial_obj = Filiais.objects.using(self.db).defer('empr_cert_digi').get(empr_empr=nota.empresa, empr_codi=nota.filial)
 
         try:
-            cert_path, cert_pass = CertificadoLoader(filial_obj).load()
+            certificado = CertificadoLoader(filial_obj).carregar()
         except Exception as e:
             raise ErroDominio("Falha ao carregar certificado digital.", detalhes={"erro": str(e)})
 
         try:
             ambiente = int(filial_obj.empr_ambi_nfe or 2)
             uf = filial_obj.empr_esta
-            adapter = SefazAdapter(cert_path, cert_pass, uf, ambiente)
+            adapter = SefazAdapter(certificado, uf, ambiente)
             
             # Precisamos do CNPJ da filial
             cnpj = filial_obj.empr_docu
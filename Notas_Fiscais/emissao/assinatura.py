@@ -1,16 +1,9 @@
 # notas_fiscais/assinador_service.py
 
-import tempfile
-from pathlib import Path
 from lxml import etree
 from signxml import XMLSigner, methods
-from cryptography.hazmat.primitives.serialization import (
-    pkcs12,
-    Encoding,
-    PrivateFormat,
-    NoEncryption,
-)
 
+from ..infrastructure.certificado_cache import CertificadoA1, CertificadoInvalido
 from .exceptions import ErroEmissao
 
 NFE_NS = "http://www.portalfiscal.inf.br/nfe"
@@ -20,50 +13,31 @@ class AssinadorA1Service:
     """
     Serviço para assinar XML de NF-e/NFC-e usando certificado A1 (PFX/P12).
     
-    - Recebe OBRIGATORIAMENTE os bytes crús do certificado.
+    - Recebe os bytes crús do certificado ou um CertificadoA1 já aberto (cache).
     - Não mexe com criptografia, quem controla isso é o caller.
     - Garante assinatura envelopada padrão SEFAZ (xmldsig).
     """
 
-    def __init__(self, pfx_bytes: bytes, pfx_pass: str):
-        if not isinstance(pfx_bytes, (bytes, bytearray)):
+    def __init__(self, pfx_bytes: bytes = None, pfx_pass: str = None, certificado=None):
+        if certificado is None and not isinstance(pfx_bytes, (bytes, bytearray)):
             raise ErroEmissao("Certificado inválido: pfx_bytes deve ser bytes puros.")
 
         self.pfx_bytes = pfx_bytes
         self.pfx_pass = pfx_pass
+        self.certificado = certificado
 
     def _extract_key_and_cert(self):
         """
-        Extrai chave privada e certificado PEM do PFX carregado na memória.
+        Chave privada e certificado (com cadeia) em PEM. O PFX é aberto uma
+        única vez; com um CertificadoA1 do cache nem isso.
         """
-        try:
-            password = self.pfx_pass.encode("utf-8") if self.pfx_pass else None
-            key, cert, addl = pkcs12.load_key_and_certificates(self.pfx_bytes, password)
-        except Exception:
-            raise ErroEmissao("Falha ao carregar PFX: senha incorreta ou arquivo inválido.")
-
-        if key is None or cert is None:
-            raise ErroEmissao("Certificado A1 inválido ou incompleto.")
-
-        # Converter key e cert para PEM (formato aceito pelo signxml)
-        key_pem = key.private_bytes(
-            Encoding.PEM,
-            PrivateFormat.PKCS8,
-            NoEncryption(),
-        ).decode()
-
-        cert_pem = cert.public_bytes(Encoding.PEM).decode()
-
-        # Concatena cadeia de certificados se houver
-        chain_pem = ""
-        if addl:
-            for c in addl:
-                try:
-                    chain_pem += c.public_bytes(Encoding.PEM).decode()
-                except Exception:
-                    pass
+        if self.certificado is None:
+            try:
+                self.certificado = CertificadoA1.de_pfx(self.pfx_bytes, self.pfx_pass)
+            except CertificadoInvalido as e:
+                raise ErroEmissao(str(e))
 
-        return key_pem, cert_pem + chain_pem
+        return self.certificado.key_pem.decode(), self.certificado.cadeia_pem
 
     def assinar_xml(self, xml_str: str) -> str:
         """
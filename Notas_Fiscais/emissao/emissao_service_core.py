@@ -87,8 +87,8 @@ class EmissaoServiceCore:
         logger.debug("EmissaoServiceCore.emitir: XML base gerado: %s", xml_gerado)
 
         # 5) Assinar
-        pfx_path, pfx_pass = self._load_certificado()
-        assinador = AssinadorA1Service(pfx_path, pfx_pass)
+        certificado = self._load_certificado()
+        assinador = AssinadorA1Service(certificado=certificado)
         xml_assinado = assinador.assinar_xml(xml_gerado)
 
         xml_enviado = montar_envi_nfe(
@@ -99,14 +99,11 @@ class EmissaoServiceCore:
         # 7) URL SEFAZ correta
         url = self._resolve_url()
 
-        # 8) TLS cert/key
-        cert_pem, key_pem = assinador._extract_keys()
-
         logger.debug("EmissaoServiceCore.emitir: XML enviNFe montado: %s", xml_enviado)
 
+        # 8) TLS com o mesmo certificado em memória
         resposta_xml = SefazClient(
-            cert_pem=cert_pem,
-            key_pem=key_pem,
+            certificado=certificado,
             url=url,
             verify=self._resolve_verify(),
         ).enviar_xml(xml_enviado)
@@ -174,33 +171,15 @@ class EmissaoServiceCore:
     # =====================================================================
     def _load_certificado(self):
         """
-        Retorna (pfx_bytes, senha) direto do banco ou fallback para arquivo.
+        CertificadoA1 da filial (banco ou arquivo legado), aberto uma vez e
+        reaproveitado do cache entre emissões.
         """
-        pfx_bytes = None
+        from ..infrastructure.certificado_loader import CertificadoLoader
+
         try:
-            # Tenta ler do banco se a coluna existir
-            if hasattr(self.filial, 'empr_cert_digi') and self.filial.empr_cert_digi:
-                pfx_bytes = bytes(self.filial.empr_cert_digi)
-        except Exception:
-            pass
-
-        # Fallback se não encontrou no banco
-        if not pfx_bytes:
-            caminho = getattr(self.filial, 'empr_cert', None)
-            if caminho:
-                import os
-                if os.path.isfile(caminho):
-                    with open(caminho, 'rb') as f:
-                        pfx_bytes = f.read()
-
-        if not pfx_bytes:
-            raise ErroImissao("Filial não possui certificado digital (nem banco, nem arquivo).")
-
-        # Senha continua criptografada no banco
-        from Licencas.crypto import decrypt_str
-        senha = decrypt_str(self.filial.empr_senh_cert)
-
-        return pfx_bytes, senha
+            return CertificadoLoader(self.filial).carregar()
+        except Exception as e:
+            raise ErroEmissao(f"Certificado digital A1 inválido ou não configurado: {e}")
 
 
     # =====================================================================
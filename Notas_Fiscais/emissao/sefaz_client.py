@@ -11,8 +11,9 @@ WSDL_NS = "http://www.portalfiscal.inf.br/nfe/wsdl/NFeAutorizacao4"
 
 
 class SefazClient:
-    def __init__(self, cert_pem_path: str, key_pem_path: str, url: str, verify=True):
-        self.cert = (cert_pem_path, key_pem_path)
+    def __init__(self, cert_pem_path: str = None, key_pem_path: str = None, url: str = None, verify=True, certificado=None):
+        # Com um CertificadoA1 (cache) o TLS usa a chave em memória, sem PEMs em disco
+        self.cert = None if certificado is not None else (cert_pem_path, key_pem_path)
         self.url = url
         self.verify = verify
         
@@ -25,7 +26,10 @@ class SefazClient:
             allowed_methods=["POST"],
             raise_on_status=False # Vamos tratar o status manualmente
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        if certificado is not None:
+            adapter = certificado.adaptador(verify, max_retries=retry_strategy)
+        else:
+            adapter = HTTPAdapter(max_retries=retry_strategy)
         self.session.mount("https://", adapter)
         self.session.mount("http://", adapter)
 
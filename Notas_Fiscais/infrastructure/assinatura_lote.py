@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from lxml import etree
+
+
+logger = logging.getLogger(__name__)
+
+# Adapters por certificado dentro de cada processo do pool (evita reabrir a chave a cada nota)
+_adapters_processo = {}
+
+
+def _adapter_do_processo(key_pem, cert_pem, uf, ambiente):
+    from .certificado_cache import CertificadoA1
+    from .sefaz_adapter import SefazAdapter
+
+    chave = (hashlib.sha256(key_pem).hexdigest(), uf, str(ambiente))
+    adapter = _adapters_processo.get(chave)
+    if adapter is None:
+        if len(_adapters_processo) >= 16:
+            _adapters_processo.clear()
+        adapter = SefazAdapter(CertificadoA1.de_pem(key_pem, cert_pem), uf, ambiente)
+        _adapters_processo[chave] = adapter
+    return adapter
+
+
+def assinar_nfe(key_pem, cert_pem, uf, ambiente, xml, nfce_csc=None):
+    """Executado no pool: assina um <NFe> serializado e devolve o XML assinado."""
+    adapter = _adapter_do_processo(key_pem, cert_pem, uf, ambiente)
+    assinado = adapter.assinar(etree.fromstring(xml.encode("utf-8")), nfce_csc)
+    return etree.tostring(assinado, encoding="unicode")
+
+
+class PoolAssinatura:
+    """
+    Pool de processos para assinar as notas de um lote em paralelo (c14n e
+    RSA são CPU e seguram o GIL). Os processos são criados com spawn e só
+    recebem XML e os PEMs do certificado; sem pool, assina no próprio processo.
+    """
+
+    def __init__(self, processos=None):
+        self._processos = processos
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def processos(self):
+        if self._processos is not None:
+            return int(self._processos)
+        return int(getattr(settings, "NFE_LOTE_PROCESSOS", min(4, os.cpu_count() or 1)))
+
+    def _obter_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _descartar_executor(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def assinar(self, adapter, nfes, nfce_cscs=None):
+        """Assina os <NFe> (elementos) com o certificado do adapter; devolve os XMLs na mesma ordem."""
+        nfce_cscs = nfce_cscs or [None] * len(nfes)
+        if self.processos <= 1 or len(nfes) <= 1:
+            return [etree.tostring(adapter.assinar(nfe, csc), encoding="unicode") for nfe, csc in zip(nfes, nfce_cscs)]
+
+        certificado = adapter.certificado
+        key_pem, cert_pem = certificado.key_pem, certificado.cert_pem
+        xmls = [etree.tostring(nfe, encoding="unicode") for nfe in nfes]
+        try:
+            executor = self._obter_executor()
+            futuros = [
+                executor.submit(assinar_nfe, key_pem, cert_pem, adapter.uf, adapter.ambiente, xml, csc)
+                for xml, csc in zip(xmls, nfce_cscs)
+            ]
+            return [f.result() for f in futuros]
+        except BrokenProcessPool:
+            logger.warning("[NFE_LOTE] pool de assinatura indisponível, assinando no processo atual")
+            self._descartar_executor()
+            return [
+                etree.tostring(adapter.assinar(etree.fromstring(xml.encode("utf-8")), csc), encoding="unicode")
+                for xml, csc in zip(xmls, nfce_cscs)
+            ]
+
+    def encerrar(self):
+        self._descartar_executor()
+
+
+pool_assinatura = PoolAssinatura()
@@ -0,0 +1,232 @@
+import hashlib
+import logging
+import os
+import ssl
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives.serialization import (
+    pkcs12,
+    Encoding,
+    PrivateFormat,
+    NoEncryption,
+    load_pem_private_key,
+)
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.ssl_ import create_urllib3_context
+
+
+logger = logging.getLogger(__name__)
+
+
+class CertificadoInvalido(Exception):
+    pass
+
+
+def _carregar_cadeia_em_memoria(contexto, pem: bytes):
+    """
+    load_cert_chain só aceita caminho de arquivo: no Linux o PEM vai para um
+    memfd (nunca chega ao disco); fora dele, um temporário removido logo após a leitura.
+    """
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("certificado-a1", getattr(os, "MFD_CLOEXEC", 0))
+        try:
+            with os.fdopen(os.dup(fd), "wb") as arquivo:
+                arquivo.write(pem)
+            contexto.load_cert_chain(f"/proc/self/fd/{fd}")
+        finally:
+            os.close(fd)
+        return
+
+    arquivo = tempfile.NamedTemporaryFile(delete=False, suffix=".pem")
+    try:
+        with arquivo:
+            arquivo.write(pem)
+        contexto.load_cert_chain(arquivo.name)
+    finally:
+        os.remove(arquivo.name)
+
+
+class _AdaptadorCertificado(HTTPAdapter):
+    """HTTPAdapter com o SSLContext do certificado cliente já carregado."""
+
+    def __init__(self, contexto, **kwargs):
+        self._contexto = contexto
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self._contexto
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs["ssl_context"] = self._contexto
+        return super().proxy_manager_for(*args, **kwargs)
+
+
+class CertificadoA1:
+    """
+    Certificado A1 já aberto: chave privada, certificado e cadeia em memória,
+    com os PEMs, contextos TLS e sessões HTTP montados sob demanda e reaproveitados.
+    """
+
+    def __init__(self, chave, certificado, cadeia=(), fingerprint=None):
+        self.chave = chave
+        self.certificado = certificado
+        self.cadeia = list(cadeia or ())
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self._contextos = {}
+        self._sessoes = {}
+
+    @classmethod
+    def de_pfx(cls, pfx_bytes, senha, fingerprint=None):
+        pfx_bytes = bytes(pfx_bytes)
+        password = senha.encode("utf-8") if senha else None
+        try:
+            chave, certificado, cadeia = pkcs12.load_key_and_certificates(pfx_bytes, password)
+        except Exception as e:
+            raise CertificadoInvalido("Falha ao carregar PFX: senha incorreta ou arquivo inválido.") from e
+        if chave is None or certificado is None:
+            raise CertificadoInvalido("Certificado A1 inválido ou incompleto.")
+        return cls(chave, certificado, cadeia, fingerprint or hashlib.sha256(pfx_bytes).hexdigest())
+
+    @classmethod
+    def de_pem(cls, key_pem: bytes, cert_pem: str, fingerprint=None):
+        """Reabre um certificado a partir dos PEMs (ex.: nos processos do pool de assinatura)."""
+        chave = load_pem_private_key(key_pem, password=None)
+        certificado = x509.load_pem_x509_certificate(cert_pem.encode() if isinstance(cert_pem, str) else cert_pem)
+        return cls(chave, certificado, (), fingerprint or hashlib.sha256(key_pem).hexdigest())
+
+    @cached_property
+    def key_pem(self) -> bytes:
+        return self.chave.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption())
+
+    @cached_property
+    def cert_pem(self) -> str:
+        return self.certificado.public_bytes(Encoding.PEM).decode()
+
+    @cached_property
+    def cadeia_pem(self) -> str:
+        """Certificado seguido da cadeia, no formato aceito pelo signxml."""
+        pem = self.cert_pem
+        for cert in self.cadeia:
+            try:
+                pem += cert.public_bytes(Encoding.PEM).decode()
+            except Exception:
+                pass
+        return pem
+
+    def contexto_ssl(self, verify=True):
+        verify = bool(verify)
+        with self._lock:
+            contexto = self._contextos.get(verify)
+            if contexto is None:
+                contexto = create_urllib3_context(cert_reqs=ssl.CERT_REQUIRED if verify else ssl.CERT_NONE)
+                _carregar_cadeia_em_memoria(contexto, self.key_pem + self.cadeia_pem.encode())
+                self._contextos[verify] = contexto
+        return contexto
+
+    def adaptador(self, verify=True, **kwargs):
+        return _AdaptadorCertificado(self.contexto_ssl(verify), **kwargs)
+
+    def sessao(self, verify=True, tentativas=0):
+        """
+        Sessão HTTP autenticada com o certificado, compartilhada entre as
+        emissões da filial (mantém o pool de conexões com a SEFAZ).
+        """
+        chave = (verify if isinstance(verify, str) else bool(verify), tentativas)
+        with self._lock:
+            sessao = self._sessoes.get(chave)
+        if sessao is not None:
+            return sessao
+
+        max_retries = 0
+        if tentativas:
+            max_retries = Retry(
+                total=tentativas,
+                backoff_factor=1,
+                status_forcelist=[429, 502, 503, 504],
+                allowed_methods=["POST"],
+            )
+        sessao = requests.Session()
+        sessao.verify = verify
+        sessao.mount("https://", self.adaptador(verify, max_retries=max_retries))
+        with self._lock:
+            return self._sessoes.setdefault(chave, sessao)
+
+
+class CacheCertificados:
+    """
+    Certificados abertos por (banco, empresa, filial, fingerprint), com TTL e
+    descarte LRU. Trocar o PFX da filial muda o fingerprint e a entrada antiga sai.
+    """
+
+    def __init__(self, ttl=None, maximo=None):
+        self._ttl = ttl
+        self._maximo = maximo
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    @property
+    def ttl(self):
+        return float(self._ttl or getattr(settings, "CERTIFICADO_CACHE_TTL", 1800))
+
+    @property
+    def maximo(self):
+        return int(self._maximo or getattr(settings, "CERTIFICADO_CACHE_MAX", 64))
+
+    def obter(self, chave, carregar):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and item[0] > agora:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return item[1]
+
+        certificado = carregar()
+
+        with self._lock:
+            self.falhas += 1
+            for antiga in [k for k in self._itens if k[:-1] == chave[:-1] and k != chave]:
+                del self._itens[antiga]
+            self._itens[chave] = (agora + self.ttl, certificado)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+        return certificado
+
+    def limpar(self, banco=None, empresa=None, filial=None):
+        with self._lock:
+            if banco is None:
+                self._itens.clear()
+                return
+            for chave in list(self._itens):
+                if chave[0] != banco:
+                    continue
+                if empresa is not None and chave[1] != empresa:
+                    continue
+                if filial is not None and chave[2] != filial:
+                    continue
+                del self._itens[chave]
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "certificados": len(self._itens),
+                "capacidade": self.maximo,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+            }
+
+
+cache_certificados = CacheCertificados()
@@ -1,36 +1,56 @@
-import tempfile
+import hashlib
 import logging
-from Licencas.crypto import decrypt_bytes, decrypt_str
 import os
+
+from Licencas.crypto import decrypt_bytes, decrypt_str
 from Licencas.models import Filiais
 
+from .certificado_cache import CertificadoA1, cache_certificados
+
 
 logger = logging.getLogger(__name__)
 
 
+def _como_bytes(valor):
+    if hasattr(valor, "tobytes"):
+        return valor.tobytes()
+    if isinstance(valor, str):
+        return valor.encode("utf-8")
+    return bytes(valor)
+
+
+def _decrypt_senha(senha_token):
+    try:
+        return decrypt_str(senha_token)
+    except Exception:
+        return senha_token
+
+
 class CertificadoLoader:
-    """     
+    """
     Carrega o certificado digital da filial.
     Usa os campos:
     - empr_cert_digi (bytes)
     - empr_senh_cert
+
+    O certificado aberto fica em memória (cache_certificados) enquanto o
+    conteúdo cadastrado não mudar; nada é gravado em disco.
     """
 
     def __init__(self, filial):
         self.filial = filial
 
-    def load(self):
+    def _ler_origem(self):
         cert_token = None
         senha_token = getattr(self.filial, "empr_senh_cert", None)
         caminho_arquivo = getattr(self.filial, "empr_cert", None)
-        db_alias = getattr(getattr(self.filial, "_state", None), "db", None) or "default"
 
         empr_empr = getattr(self.filial, "empr_empr", None)
         empr_codi = getattr(self.filial, "empr_codi", None)
         if empr_empr is not None and empr_codi is not None:
             try:
                 row = (
-                    Filiais.objects.using(db_alias)
+                    Filiais.objects.using(self._db_alias())
                     .filter(empr_empr=empr_empr, empr_codi=empr_codi)
                     .values_list("empr_cert_digi", "empr_senh_cert", "empr_cert")
                     .first()
@@ -39,30 +59,52 @@ class CertificadoLoader:
                     cert_token, senha_token, caminho_arquivo = row
             except Exception:
                 cert_token = None
-
-        # Se não encontrou no banco, tenta via arquivo (fallback legado)
-        if not cert_token:
-            if caminho_arquivo:
-                if os.path.isfile(caminho_arquivo):
-                    try:
-                        senha = decrypt_str(senha_token)
-                    except Exception:
-                        senha = senha_token
-                    return caminho_arquivo, (senha or "")
-            env_path = os.environ.get("CTE_PFX_PATH") or os.environ.get("PFX_PATH")
-            env_pass = os.environ.get("CTE_PFX_PASSWORD") or os.environ.get("PFX_PASSWORD")
-            if env_path and os.path.isfile(env_path):
-                logger.info("Usando certificado A1 via ambiente: %s", env_path)
-                return env_path, (env_pass or "")
-
-        if not cert_token:
-            raise Exception("Filial não possui certificado digital cadastrado (nem banco, nem arquivo).")
-
-        try:
-            senha = decrypt_str(senha_token)
-        except Exception:
-            senha = senha_token
-
+        return cert_token, senha_token, caminho_arquivo
+
+    def _db_alias(self):
+        return getattr(getattr(self.filial, "_state", None), "db", None) or "default"
+
+    def carregar(self) -> CertificadoA1:
+        cert_token, senha_token, caminho_arquivo = self._ler_origem()
+
+        if cert_token:
+            token = _como_bytes(cert_token)
+            fingerprint = hashlib.sha256(token + b"\0" + _como_bytes(senha_token or "")).hexdigest()
+
+            def abrir():
+                return self._abrir_token(token, senha_token, fingerprint)
+        else:
+            # Se não encontrou no banco, tenta via arquivo (fallback legado)
+            caminho, senha = self._arquivo_legado(caminho_arquivo, senha_token)
+            st = os.stat(caminho)
+            fingerprint = hashlib.sha256(
+                f"{caminho}:{st.st_mtime_ns}:{st.st_size}:{senha}".encode("utf-8")
+            ).hexdigest()
+
+            def abrir():
+                with open(caminho, "rb") as f:
+                    return CertificadoA1.de_pfx(f.read(), senha, fingerprint)
+
+        chave = (
+            self._db_alias(),
+            getattr(self.filial, "empr_empr", None),
+            getattr(self.filial, "empr_codi", None),
+            fingerprint,
+        )
+        return cache_certificados.obter(chave, abrir)
+
+    def _arquivo_legado(self, caminho_arquivo, senha_token):
+        if caminho_arquivo and os.path.isfile(caminho_arquivo):
+            return caminho_arquivo, (_decrypt_senha(senha_token) or "")
+        env_path = os.environ.get("CTE_PFX_PATH") or os.environ.get("PFX_PATH")
+        env_pass = os.environ.get("CTE_PFX_PASSWORD") or os.environ.get("PFX_PASSWORD")
+        if env_path and os.path.isfile(env_path):
+            logger.info("Usando certificado A1 via ambiente: %s", env_path)
+            return env_path, (env_pass or "")
+        raise Exception("Filial não possui certificado digital cadastrado (nem banco, nem arquivo).")
+
+    def _abrir_token(self, cert_token, senha_token, fingerprint):
+        senha = _decrypt_senha(senha_token)
         if senha is None:
             senha = ""
 
@@ -77,19 +119,8 @@ class CertificadoLoader:
         except Exception as e:
             logger.error(f"Falha ao descriptografar certificado da filial {getattr(self.filial, 'id', 'N/A')}: {e}")
             cert_bytes = cert_token
-            if hasattr(cert_bytes, "tobytes"):
-                cert_bytes = cert_bytes.tobytes()
-            elif isinstance(cert_bytes, str):
-                logger.warning("Certificado em formato string e falhou na descriptografia. Tentando converter para bytes.")
-                cert_bytes = cert_bytes.encode('utf-8')
 
         if not isinstance(cert_bytes, (bytes, bytearray)):
             raise TypeError(f"Conteúdo do certificado não é bytes. Tipo atual: {type(cert_bytes)}")
 
-        f = tempfile.NamedTemporaryFile(delete=False, suffix=".pfx")
-        f.write(cert_bytes)
-        f.flush()
-
-        logger.info("Certificado temporário criado: %s", f.name)
-
-        return f.name, senha
+        return CertificadoA1.de_pfx(cert_bytes, senha, fingerprint)
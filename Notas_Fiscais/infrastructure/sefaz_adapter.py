@@ -2,20 +2,76 @@ from pynfe.processamento.comunicacao import ComunicacaoSefaz
 from pynfe.processamento.assinatura import AssinaturaA1
 from pynfe.processamento.serializacao import SerializacaoXML
 from pynfe.entidades.fonte_dados import _fonte_dados
+from pynfe.utils.flags import NAMESPACE_NFE, VERSAO_PADRAO
 from lxml import etree
 import base64
 import hashlib
+import re
+import time
+
+NS = {"ns": NAMESPACE_NFE}
+
+# Limite de NF-e por enviNFe definido no MOC
+LOTE_MAX_NOTAS = 50
+LOTE_INTERVALO_CONSULTA = 3
+LOTE_TENTATIVAS_CONSULTA = 10
+
+class AssinaturaA1Memoria(AssinaturaA1):
+    """AssinaturaA1 do PyNFe com chave e certificado já abertos (CertificadoA1 do cache)."""
+
+    def __init__(self, certificado):
+        # Chave já carregada: com PEM o signxml refaz load_pem_private_key (validação RSA) a cada assinatura
+        self.key, self.cert = certificado.chave, certificado.cert_pem
+
+
+class ComunicacaoSefazMemoria(ComunicacaoSefaz):
+    """
+    ComunicacaoSefaz que usa a sessão TLS do CertificadoA1 em vez de gravar
+    chave e certificado em PEMs temporários a cada requisição.
+    """
+
+    def __init__(self, uf, certificado, homologacao=False, url=None):
+        super().__init__(uf, certificado, None, homologacao)
+        # Endereço fixo para todos os serviços (SEFAZ local de testes/benchmark)
+        self.url = url
+
+    def _get_url(self, modelo, consulta, contingencia=False):
+        if self.url:
+            return self.url
+        return super()._get_url(modelo=modelo, consulta=consulta, contingencia=contingencia)
+
+    def _post(self, url, xml, timeout=None):
+        xml_declaration = '<?xml version="1.0" encoding="UTF-8"?>'
+
+        # limpa xml com caracteres bugados para infNFeSupl em NFC-e
+        xml = re.sub(
+            "<qrCode>(.*?)</qrCode>",
+            lambda x: x.group(0)
+            .replace("&lt;", "<")
+            .replace("&gt;", ">")
+            .replace("&amp;", ""),
+            etree.tostring(xml, encoding="unicode").replace("\n", ""),
+        )
+        xml = xml_declaration + xml
+        result = self.certificado.sessao(verify=False).post(
+            url,
+            xml,
+            headers=self._post_header(),
+            timeout=timeout,
+        )
+        result.encoding = "utf-8"
+        return result
+
 
 class SefazAdapter:
 
-    def __init__(self, cert_path, cert_pass, uf, ambiente):
+    def __init__(self, certificado, uf, ambiente, url=None):
         self.uf = uf
         self.ambiente = ambiente
-        self.cert_path = cert_path
-        self.cert_pass = cert_pass
-        self.assinador = AssinaturaA1(cert_path, cert_pass)
+        self.certificado = certificado
+        self.assinador = AssinaturaA1Memoria(certificado)
         self.homologacao = True if int(ambiente) == 2 else False
-        self.comunicacao = ComunicacaoSefaz(uf, cert_path, cert_pass, self.homologacao)
+        self.comunicacao = ComunicacaoSefazMemoria(uf, certificado, self.homologacao, url=url)
 
     def _normalizar_xml_assinado(self, xml_assinado):
         if xml_assinado is None:
@@ -254,9 +310,17 @@ class SefazAdapter:
 
         return status, motivo, protocolo, chave, xml_protocolo
 
-    def emitir(self, nota_fiscal):
+    def serializar(self, nota_fiscal):
+        """
+        <NFe> de uma única nota. Serializa o objeto recebido (e não a fonte de
+        dados global do PyNFe, que acumula as notas montadas por outras emissões).
+        """
         serializador = SerializacaoXML(_fonte_dados, homologacao=self.homologacao)
-        nfe = serializador.exportar(nota_fiscal)
+        nfe = etree.Element("NFe", xmlns=NAMESPACE_NFE)
+        try:
+            nfe.append(serializador._serializar_nota_fiscal(nota_fiscal, retorna_string=False))
+        finally:
+            _fonte_dados.limpar_dados()
 
         # Injeta IBS e CBS se disponíveis (contornando limitação do PyNFe)
         if hasattr(nota_fiscal, '_itens_extra'):
@@ -272,12 +336,14 @@ class SefazAdapter:
             self._injetar_nf_referenciada(nfe, nota_fiscal._chave_referenciada)
 
         self._normalizar_serie_ide(nfe)
+        return nfe
 
+    def assinar(self, nfe, nfce_csc=None):
         xml_assinado = self.assinador.assinar(nfe)
         xml_assinado = self._normalizar_xml_assinado(xml_assinado)
 
-        if hasattr(nota_fiscal, '_nfce_csc'):
-            cfg = nota_fiscal._nfce_csc or {}
+        if nfce_csc is not None:
+            cfg = nfce_csc or {}
             try:
                 self._injetar_qrcode_nfce(
                     xml_assinado,
@@ -288,13 +354,19 @@ class SefazAdapter:
                 )
             except Exception as e:
                 print(f"DEBUG: Falha ao injetar QRCode NFC-e: {e}")
+        return xml_assinado
 
+    @staticmethod
+    def modelo_envio(nota_fiscal):
         # Determina se é NF-e ou NFC-e para escolher o endpoint correto
-        modelo_envio = 'nfe'
         if hasattr(nota_fiscal, 'modelo') and str(nota_fiscal.modelo) == '65':
-            modelo_envio = 'nfce'
+            return 'nfce'
+        return 'nfe'
 
-        envio = self.comunicacao.autorizacao(modelo=modelo_envio, nota_fiscal=xml_assinado)
+    def emitir(self, nota_fiscal):
+        xml_assinado = self.assinar(self.serializar(nota_fiscal), getattr(nota_fiscal, '_nfce_csc', None))
+
+        envio = self.comunicacao.autorizacao(modelo=self.modelo_envio(nota_fiscal), nota_fiscal=xml_assinado)
         status, motivo, protocolo, chave, xml_protocolo = self._parse_envio_autorizacao(envio)
 
         return {
@@ -307,6 +379,108 @@ class SefazAdapter:
             "xml_protocolo": xml_protocolo,
         }
 
+    def autorizar_lote(self, xmls_assinados, modelo='nfe', id_lote=1, sincrono=None,
+                       intervalo_consulta=LOTE_INTERVALO_CONSULTA, tentativas_consulta=LOTE_TENTATIVAS_CONSULTA):
+        """
+        Envia até LOTE_MAX_NOTAS NF-e já assinadas num único enviNFe e devolve,
+        na mesma ordem, um dict por nota no formato de emitir().
+
+        A SEFAZ só aceita indSinc=1 com uma nota; lotes maiores vão assíncronos
+        e o retorno é obtido por consReciNFe (retAutorizacao) a cada
+        ``intervalo_consulta`` segundos enquanto o lote estiver em processamento (105).
+        """
+        if not xmls_assinados:
+            return []
+        if len(xmls_assinados) > LOTE_MAX_NOTAS:
+            raise ValueError(f"Lote com {len(xmls_assinados)} notas; o limite da SEFAZ é {LOTE_MAX_NOTAS}.")
+        if sincrono is None:
+            sincrono = len(xmls_assinados) == 1
+        elif sincrono and len(xmls_assinados) > 1:
+            raise ValueError("Envio síncrono (indSinc=1) aceita apenas uma nota por lote.")
+
+        elementos = [
+            x if isinstance(x, etree._Element) else etree.fromstring(x.encode("utf-8") if isinstance(x, str) else x)
+            for x in xmls_assinados
+        ]
+        chaves = [self._chave_do_xml(el) for el in elementos]
+
+        comunicacao = self.comunicacao
+        raiz = etree.Element("enviNFe", xmlns=NAMESPACE_NFE, versao=VERSAO_PADRAO)
+        etree.SubElement(raiz, "idLote").text = str(id_lote)
+        etree.SubElement(raiz, "indSinc").text = "1" if sincrono else "0"
+        for el in elementos:
+            raiz.append(el)
+
+        url = comunicacao._get_url(modelo=modelo, consulta="AUTORIZACAO")
+        retorno = comunicacao._post(url, comunicacao._construir_xml_soap("NFeAutorizacao4", raiz))
+        ret_envi = self._ler_retorno(retorno, "retEnviNFe")
+        status_lote, motivo_lote = self._status(ret_envi)
+
+        if status_lote == 103:
+            n_rec = ret_envi.findtext(".//ns:infRec/ns:nRec", namespaces=NS)
+            ret_consulta = None
+            for tentativa in range(tentativas_consulta):
+                time.sleep(intervalo_consulta)
+                ret_consulta = self._ler_retorno(comunicacao.consulta_recibo(modelo, n_rec), "retConsReciNFe")
+                status_lote, motivo_lote = self._status(ret_consulta)
+                if status_lote != 105:
+                    break
+            protocolos = ret_consulta
+        else:
+            protocolos = ret_envi
+
+        por_chave = {}
+        if status_lote == 104 and protocolos is not None:
+            for prot in protocolos.findall(".//ns:protNFe", namespaces=NS):
+                inf = prot.find("ns:infProt", namespaces=NS)
+                if inf is None:
+                    continue
+                c_stat = inf.findtext("ns:cStat", namespaces=NS)
+                por_chave[inf.findtext("ns:chNFe", namespaces=NS)] = {
+                    "status": int(c_stat) if c_stat else None,
+                    "motivo": inf.findtext("ns:xMotivo", namespaces=NS),
+                    "protocolo": inf.findtext("ns:nProt", namespaces=NS),
+                    "xml_protocolo": etree.tostring(prot, encoding="unicode"),
+                }
+
+        resultados = []
+        for el, chave in zip(elementos, chaves):
+            prot = por_chave.get(chave)
+            if prot is None:
+                # Lote rejeitado/sem protocolo para a nota: a nota herda o status do lote
+                prot = {"status": status_lote, "motivo": motivo_lote, "protocolo": None, "xml_protocolo": None}
+            resultados.append({
+                "xml": el,
+                "codigo": None,
+                "chave": chave,
+                **prot,
+            })
+        return resultados
+
+    @staticmethod
+    def _chave_do_xml(nfe):
+        inf = nfe.find(".//ns:infNFe", namespaces=NS)
+        if inf is None:
+            inf = nfe.find(".//infNFe")
+        ident = (inf.get("Id") if inf is not None else "") or ""
+        return ident[3:] if ident.startswith("NFe") else ident
+
+    @staticmethod
+    def _ler_retorno(resposta, tag):
+        conteudo = getattr(resposta, "content", resposta)
+        if isinstance(conteudo, str):
+            conteudo = conteudo.encode("utf-8")
+        root = etree.fromstring(conteudo)
+        ret = root.find(f".//ns:{tag}", namespaces=NS)
+        return ret if ret is not None else root
+
+    @staticmethod
+    def _status(ret):
+        if ret is None:
+            return None, "Resposta vazia da SEFAZ"
+        c_stat = ret.findtext("ns:cStat", namespaces=NS)
+        return (int(c_stat) if c_stat else None), ret.findtext("ns:xMotivo", namespaces=NS)
+
     def _injetar_emitente_cpf(self, nfe_elem, cpf):
         cpf_digits = "".join([c for c in str(cpf or "") if c.isdigit()])[:11]
         if not cpf_digits:
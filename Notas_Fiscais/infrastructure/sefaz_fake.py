@@ -0,0 +1,176 @@
+import datetime
+import itertools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lxml import etree
+
+from .certificado_cache import CertificadoA1
+
+
+logger = logging.getLogger(__name__)
+
+NFE_NS = "http://www.portalfiscal.inf.br/nfe"
+SOAP_NS = "http://www.w3.org/2003/05/soap-envelope"
+NS = {"ns": NFE_NS}
+
+
+def certificado_autoassinado(nome="EMPRESA TESTE:00000000000191"):
+    """CertificadoA1 autoassinado, só para testes e benchmark contra a SefazFake."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    chave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    sujeito = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, nome)])
+    agora = datetime.datetime.utcnow()
+    certificado = (
+        x509.CertificateBuilder()
+        .subject_name(sujeito)
+        .issuer_name(sujeito)
+        .public_key(chave.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(agora)
+        .not_valid_after(agora + datetime.timedelta(days=1))
+        .sign(chave, hashes.SHA256())
+    )
+    return CertificadoA1(chave, certificado, fingerprint="autoassinado")
+
+
+def nfe_sintetica(numero, cuf="41"):
+    """<NFe> mínimo (só o necessário para assinar e trafegar) com chave derivada do número."""
+    chave = f"{cuf}{int(numero):042d}"
+    nfe = etree.Element(f"{{{NFE_NS}}}NFe", nsmap={None: NFE_NS})
+    inf = etree.SubElement(nfe, f"{{{NFE_NS}}}infNFe", Id=f"NFe{chave}", versao="4.00")
+    ide = etree.SubElement(inf, f"{{{NFE_NS}}}ide")
+    etree.SubElement(ide, f"{{{NFE_NS}}}cUF").text = cuf
+    etree.SubElement(ide, f"{{{NFE_NS}}}nNF").text = str(numero)
+    return nfe
+
+
+def _envelope(metodo, corpo):
+    return (
+        f'<soap:Envelope xmlns:soap="{SOAP_NS}"><soap:Body>'
+        f'<nfeResultMsg xmlns="http://www.portalfiscal.inf.br/nfe/wsdl/{metodo}">{corpo}</nfeResultMsg>'
+        f"</soap:Body></soap:Envelope>"
+    ).encode("utf-8")
+
+
+class SefazFake:
+    """
+    SEFAZ local (HTTP) para testes e benchmark offline da emissão.
+
+    Responde NFeAutorizacao4 (indSinc=1: 104 com protNFe; indSinc=0: 103 com
+    nRec) e NFeRetAutorizacao4 (104 com um protNFe por nota do recibo).
+    Não valida schema nem assinatura; ``latencia`` simula o tempo de resposta.
+    """
+
+    def __init__(self, host="127.0.0.1", porta=0, latencia=0.0, status_nota=100):
+        self.host = host
+        self.porta = porta
+        self.latencia = latencia
+        self.status_nota = status_nota
+        self.requisicoes = 0
+        self.notas_recebidas = 0
+        self._recibos = {}
+        self._sequencia = itertools.count(1)
+        self._lock = threading.Lock()
+        self._servidor = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self._servidor.server_address[1]}/ws"
+
+    def iniciar(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                corpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                resposta = fake._responder(corpo)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/soap+xml; charset=utf-8")
+                self.send_header("Content-Length", str(len(resposta)))
+                self.end_headers()
+                self.wfile.write(resposta)
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer((self.host, self.porta), Handler)
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="sefaz-fake", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def _prot_nfe(self, chave):
+        n_prot = f"141{next(self._sequencia):012d}"
+        motivo = "Autorizado o uso da NF-e" if self.status_nota == 100 else "Rejeicao simulada"
+        return (
+            f'<protNFe versao="4.00"><infProt>'
+            f"<tpAmb>2</tpAmb><chNFe>{chave}</chNFe><nProt>{n_prot}</nProt>"
+            f"<cStat>{self.status_nota}</cStat><xMotivo>{motivo}</xMotivo>"
+            f"</infProt></protNFe>"
+        )
+
+    def _responder(self, corpo):
+        if self.latencia:
+            time.sleep(self.latencia)
+        root = etree.fromstring(corpo)
+        with self._lock:
+            self.requisicoes += 1
+
+        envi = root.find(".//ns:enviNFe", namespaces=NS)
+        if envi is not None:
+            chaves = [(inf.get("Id") or "")[3:] for inf in envi.findall(".//ns:infNFe", namespaces=NS)]
+            with self._lock:
+                self.notas_recebidas += len(chaves)
+            if envi.findtext("ns:indSinc", namespaces=NS) == "1":
+                prots = "".join(self._prot_nfe(c) for c in chaves)
+                return _envelope(
+                    "NFeAutorizacao4",
+                    f'<retEnviNFe xmlns="{NFE_NS}" versao="4.00"><tpAmb>2</tpAmb>'
+                    f"<cStat>104</cStat><xMotivo>Lote processado</xMotivo>{prots}</retEnviNFe>",
+                )
+            with self._lock:
+                n_rec = f"41{next(self._sequencia):013d}"
+                self._recibos[n_rec] = chaves
+            return _envelope(
+                "NFeAutorizacao4",
+                f'<retEnviNFe xmlns="{NFE_NS}" versao="4.00"><tpAmb>2</tpAmb>'
+                f"<cStat>103</cStat><xMotivo>Lote recebido com sucesso</xMotivo>"
+                f"<infRec><nRec>{n_rec}</nRec><tMed>1</tMed></infRec></retEnviNFe>",
+            )
+
+        n_rec = root.findtext(".//ns:consReciNFe/ns:nRec", namespaces=NS)
+        with self._lock:
+            chaves = self._recibos.pop(n_rec, None)
+        if chaves is None:
+            return _envelope(
+                "NFeRetAutorizacao4",
+                f'<retConsReciNFe xmlns="{NFE_NS}" versao="4.00"><tpAmb>2</tpAmb>'
+                f"<cStat>106</cStat><xMotivo>Lote nao localizado</xMotivo></retConsReciNFe>",
+            )
+        prots = "".join(self._prot_nfe(c) for c in chaves)
+        return _envelope(
+            "NFeRetAutorizacao4",
+            f'<retConsReciNFe xmlns="{NFE_NS}" versao="4.00"><tpAmb>2</tpAmb><nRec>{n_rec}</nRec>'
+            f"<cStat>104</cStat><xMotivo>Lote processado</xMotivo>{prots}</retConsReciNFe>",
+        )
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Notas_Fiscais.infrastructure.assinatura_lote import PoolAssinatura
+from Notas_Fiscais.infrastructure.sefaz_adapter import LOTE_MAX_NOTAS, SefazAdapter
+from Notas_Fiscais.infrastructure.sefaz_fake import SefazFake, certificado_autoassinado, nfe_sintetica
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a transmissão nota a nota com a transmissão em lote (assinatura paralela) "
+        "contra uma SEFAZ local, sem rede nem banco"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notas", type=int, default=200)
+        parser.add_argument("--lote", type=int, default=LOTE_MAX_NOTAS)
+        parser.add_argument("--processos", type=int, default=None, help="Padrão: NFE_LOTE_PROCESSOS")
+        parser.add_argument("--latencia", type=float, default=0.05, help="Latência simulada da SEFAZ (s)")
+
+    def handle(self, *args, **options):
+        total = options["notas"]
+        tamanho = max(1, min(options["lote"], LOTE_MAX_NOTAS))
+        certificado = certificado_autoassinado()
+        pool = PoolAssinatura(options["processos"])
+
+        with SefazFake(latencia=options["latencia"]) as sefaz:
+            adapter = SefazAdapter(certificado, "PR", 2, url=sefaz.url)
+
+            inicio = time.perf_counter()
+            for numero in range(1, total + 1):
+                adapter.autorizar_lote([adapter.assinar(nfe_sintetica(numero))], id_lote=numero)
+            sequencial = time.perf_counter() - inicio
+            self._linha("nota a nota", total, sequencial, sefaz.requisicoes)
+
+            requisicoes = sefaz.requisicoes
+            inicio = time.perf_counter()
+            autorizadas = 0
+            for primeira in range(1, total + 1, tamanho):
+                nfes = [nfe_sintetica(n) for n in range(primeira, min(primeira + tamanho, total + 1))]
+                assinados = pool.assinar(adapter, nfes)
+                respostas = adapter.autorizar_lote(assinados, id_lote=primeira, intervalo_consulta=0)
+                autorizadas += sum(1 for r in respostas if r["status"] == 100)
+            em_lote = time.perf_counter() - inicio
+            self._linha(
+                f"lote de {tamanho} ({pool.processos} processos)", total, em_lote, sefaz.requisicoes - requisicoes
+            )
+
+        pool.encerrar()
+        self.stdout.write(f"Autorizadas em lote: {autorizadas}/{total}")
+        if em_lote:
+            self.stdout.write(self.style.SUCCESS(f"Ganho: {sequencial / em_lote:.1f}x"))
+
+    def _linha(self, nome, total, segundos, requisicoes):
+        self.stdout.write(
+            f"{nome:<30} {segundos:8.2f}s  {total / segundos if segundos else 0:8.1f} notas/s  {requisicoes} requisições"
+        )
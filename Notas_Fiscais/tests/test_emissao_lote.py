@@ -0,0 +1,156 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+from lxml import etree
+
+from core.excecoes import ErroDominio
+from Notas_Fiscais.aplicacao import emissao_lote_service
+from Notas_Fiscais.aplicacao.emissao_lote_service import EmissaoLoteService
+from Notas_Fiscais.infrastructure.assinatura_lote import PoolAssinatura
+from Notas_Fiscais.infrastructure.sefaz_adapter import SefazAdapter
+from Notas_Fiscais.infrastructure.sefaz_fake import SefazFake, certificado_autoassinado, nfe_sintetica
+
+
+class TestEmissaoLote(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sefaz = SefazFake().iniciar()
+        cls.adapter = SefazAdapter(certificado_autoassinado(), "PR", 2, url=cls.sefaz.url)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sefaz.parar()
+        super().tearDownClass()
+
+    def test_lote_assincrono_mapeia_protocolo_por_chave(self):
+        assinados = PoolAssinatura(processos=1).assinar(self.adapter, [nfe_sintetica(n) for n in (7, 8, 9)])
+        self.assertIn("Signature", assinados[0])
+
+        respostas = self.adapter.autorizar_lote(assinados, intervalo_consulta=0)
+
+        self.assertEqual([r["chave"] for r in respostas], [f"41{n:042d}" for n in (7, 8, 9)])
+        self.assertTrue(all(r["status"] == 100 and r["protocolo"] for r in respostas))
+        self.assertEqual(len({r["protocolo"] for r in respostas}), 3)
+
+    def test_nota_unica_vai_sincrona(self):
+        requisicoes = self.sefaz.requisicoes
+        xml = etree.tostring(self.adapter.assinar(nfe_sintetica(10)), encoding="unicode")
+
+        resposta, = self.adapter.autorizar_lote([xml])
+
+        self.assertEqual(resposta["status"], 100)
+        self.assertEqual(self.sefaz.requisicoes - requisicoes, 1)
+
+    def test_lote_acima_do_limite(self):
+        with self.assertRaises(ValueError):
+            self.adapter.autorizar_lote(["<NFe/>"] * 51)
+
+
+def _nota(id, empresa=1, filial=1, modelo="55", status=0):
+    return SimpleNamespace(
+        id=id, empresa=empresa, filial=filial, modelo=modelo, status=status,
+        chave_acesso=f"chave{id}", protocolo_autorizacao=f"prot{id}", motivo_status=None,
+    )
+
+
+class TestEmissaoLoteService(SimpleTestCase):
+    def setUp(self):
+        # Na ordem do order_by("empresa", "filial", "modelo", "id")
+        self.notas = [
+            _nota(1), _nota(2), _nota(5, status=100), _nota(6), _nota(4, modelo="65"), _nota(3, filial=2),
+        ]
+        self.servico = EmissaoLoteService("demo", "demo")
+        self.emissao = self.servico.emissao = mock.MagicMock()
+        self.adapters = {}
+
+        def montar(nota):
+            if nota.id == 2:
+                raise ErroDominio("Série inválida", codigo="serie_invalida")
+            if nota.id == 6:
+                raise KeyError("cfop")
+            return SimpleNamespace(), f"nfe{nota.id}"
+
+        def adapter(nota, dto):
+            chave = (nota.empresa, nota.filial, str(nota.modelo))
+            adapter = self.adapters.setdefault(chave, mock.MagicMock(name=str(chave)))
+            adapter.serializar.side_effect = lambda nfe: f"<{nfe}/>"
+            adapter.autorizar_lote.side_effect = lambda xmls, **kw: [
+                {"status": 100, "chave": x, "protocolo": "p"} for x in xmls
+            ]
+            return adapter, SimpleNamespace()
+
+        self.emissao._montar_nfe.side_effect = montar
+        self.emissao._adapter.side_effect = adapter
+        for alvo, valor in (
+            ("Nota", mock.MagicMock()),
+            ("pool_assinatura", mock.MagicMock()),
+        ):
+            patcher = mock.patch.object(emissao_lote_service, alvo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        filtro = emissao_lote_service.Nota.objects.using.return_value.filter.return_value
+        filtro.order_by.return_value = self.notas
+        emissao_lote_service.pool_assinatura.assinar.side_effect = lambda adapter, xmls, cscs: xmls
+
+    def test_agrupa_por_empresa_filial_modelo(self):
+        with self.assertLogs("Notas_Fiscais.aplicacao.emissao_lote_service", level="WARNING"):
+            resultados = self.servico.emitir([1, 2, 3, 4, 5, 6])
+
+        self.assertEqual(set(self.adapters), {(1, 1, "55"), (1, 2, "55"), (1, 1, "65")})
+        self.assertEqual(
+            {k: a.autorizar_lote.call_args.args[0] for k, a in self.adapters.items()},
+            {(1, 1, "55"): ["<nfe1/>"], (1, 2, "55"): ["<nfe3/>"], (1, 1, "65"): ["<nfe4/>"]},
+        )
+        self.assertEqual(self.adapters[(1, 1, "65")].autorizar_lote.call_args.kwargs["modelo"], "nfce")
+        self.assertEqual(sorted(resultados), [1, 2, 3, 4, 5, 6])
+
+    def test_falha_parcial_fica_na_nota(self):
+        with self.assertLogs("Notas_Fiscais.aplicacao.emissao_lote_service", level="WARNING"):
+            resultados = self.servico.emitir([1, 2, 3, 4, 5, 6])
+
+        self.assertEqual(resultados[2]["codigo"], "serie_invalida")
+        self.assertEqual(resultados[6]["codigo"], "nfe_montagem_erro")
+        self.assertIsNone(resultados[6]["status"])
+        self.assertEqual(resultados[1]["status"], 100)
+        persistidas = [c.args[0].id for c in self.emissao._persistir.call_args_list]
+        self.assertEqual(sorted(persistidas), [1, 3, 4])
+
+    def test_nota_ja_autorizada_aparece_sem_reenvio(self):
+        del self.notas[:2], self.notas[1:]
+        resultados = self.servico.emitir([5])
+        self.assertEqual(resultados[5]["status"], 100)
+        self.assertEqual((resultados[5]["chave"], resultados[5]["protocolo"]), ("chave5", "prot5"))
+        self.emissao._montar_nfe.assert_not_called()
+
+    def test_falha_no_envio_marca_todo_o_lote(self):
+        adapter = mock.MagicMock()
+        adapter.autorizar_lote.side_effect = ConnectionError("timeout")
+        with self.assertLogs("Notas_Fiscais.aplicacao.emissao_lote_service", level="ERROR"):
+            resultados = self.servico._transmitir(adapter, [(_nota(1), "<a/>", None), (_nota(2), "<b/>", None)], "55")
+        self.assertEqual({r["codigo"] for r in resultados.values()}, {"sefaz_envio_erro"})
+        self.emissao._persistir.assert_not_called()
+
+    def test_falha_ao_gravar_uma_nota_nao_para_o_lote(self):
+        adapter = mock.MagicMock()
+        adapter.autorizar_lote.return_value = [
+            {"status": 100, "chave": "c1", "protocolo": "p1"},
+            {"status": 100, "chave": "c2", "protocolo": "p2"},
+            {"status": 100, "chave": "c3", "protocolo": "p3"},
+        ]
+
+        def persistir(nota, resposta):
+            if nota.id == 2:
+                raise RuntimeError("deadlock")
+
+        self.emissao._persistir.side_effect = persistir
+        lote = [(_nota(1), "<a/>", None), (_nota(2), "<b/>", None), (_nota(3), "<c/>", None)]
+        with self.assertLogs("Notas_Fiscais.aplicacao.emissao_lote_service", level="ERROR"):
+            resultados = self.servico._transmitir(adapter, lote, "55")
+
+        self.assertEqual([c.args[0].id for c in self.emissao._persistir.call_args_list], [1, 2, 3])
+        self.assertEqual(resultados[1]["status"], 100)
+        self.assertEqual(resultados[3]["status"], 100)
+        self.assertEqual(resultados[2]["codigo"], "nfe_persistencia_erro")
+        self.assertEqual((resultados[2]["chave"], resultados[2]["protocolo"]), ("c2", "p2"))
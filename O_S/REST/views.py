@@ -15,7 +15,7 @@ from django.db.models.functions import Coalesce
 from django.utils import timezone
 from rest_framework.decorators import action
 from rest_framework.parsers import JSONParser
-from ..utils import get_next_item_number_sequence, get_next_service_id, get_next_global_peca_item_id, get_next_global_serv_item_id, get_next_global_os_hora_item_id
+from ..utils import get_next_item_number_sequence, get_next_service_id, gravar_com_itens_globais
 from listacasamento.utils import get_next_item_number
 from ..permissions import PodeVerOrdemDoSetor
 from ..models import Os, PecasOs, ServicosOs, OsHora
@@ -35,6 +35,15 @@ logger = logging.getLogger(__name__)
 import base64
 
 
+def _salvar_itens(serializer_class, itens, banco):
+    objs = []
+    for item in itens:
+        s = serializer_class(data=item, context={'banco': banco})
+        s.is_valid(raise_exception=True)
+        objs.append(s.save())
+    return objs
+
+
 class BaseMultiDBModelViewSet(ModuloRequeridoMixin, ModelViewSet):
 
     def get_banco(self):
@@ -204,9 +213,9 @@ class OsViewSet(BaseMultiDBModelViewSet):
             return tratar_erro(e)
 
     def get_next_ordem_numero(self, empre, fili):
-        banco = self.get_banco()
-        ultimo = Os.objects.using(banco).filter(os_empr=empre, os_fili=fili).aggregate(Max('os_os'))['os_os__max']
-        return (ultimo or 0) + 1
+        # Só consulta: o número é reservado pelo OsService na criação
+        from core.numeracao import NumeracaoService
+        return NumeracaoService.espiar(self.get_banco(), 'os', empre, fili)
     
     
 
@@ -822,7 +831,6 @@ class PecasOsViewSet(BaseMultiDBModelViewSet):
 
         try:
             with transaction.atomic(using=banco):
-
                 # ADICIONAR
                 for item in adicionar:
                     campos_obrig = ['peca_os', 'peca_empr', 'peca_fili', 'peca_prod']
@@ -830,13 +838,11 @@ class PecasOsViewSet(BaseMultiDBModelViewSet):
                     if faltando:
                         raise ValidationError(f"Faltam campos: {', '.join(faltando)}")
 
-                    # peca_item é PK globalmente; garantir ID único mesmo entre ordens distintas
-                    item['peca_item'] = get_next_global_peca_item_id(banco)
-
-                    s = PecasOsSerializer(data=item, context={'banco': banco})
-                    s.is_valid(raise_exception=True)
-                    obj = s.save()
-
+                # peca_item é PK globalmente; garantir ID único mesmo entre ordens distintas
+                novos = gravar_com_itens_globais(
+                    banco, PecasOs, adicionar, lambda: _salvar_itens(PecasOsSerializer, adicionar, banco)
+                )
+                for obj in novos:
                     resposta['adicionados'].append(
                         PecasOsSerializer(obj, context={'banco': banco}).data
                     )
@@ -977,19 +983,16 @@ class ServicosOsViewSet(BaseMultiDBModelViewSet):
             is_many = isinstance(request.data, list)
             data_in = request.data
             data_copy = [d.copy() for d in data_in] if is_many else data_in.copy()
-            if is_many:
-                for item in data_copy:
-                    if not item.get('serv_item'):
-                        item['serv_item'] = get_next_global_serv_item_id(banco)
-            else:
-                if not data_copy.get('serv_item'):
-                    data_copy['serv_item'] = get_next_global_serv_item_id(banco)
 
-            serializer = self.get_serializer(data=data_copy, many=is_many)
-            serializer.is_valid(raise_exception=True)
+            def gravar():
+                serializer = self.get_serializer(data=data_copy, many=is_many)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                return serializer
 
-            with transaction.atomic(using=banco):
-                objs = serializer.save()
+            serializer = gravar_com_itens_globais(
+                banco, ServicosOs, data_copy if is_many else [data_copy], gravar
+            )
 
             exemplo = data_copy[0] if is_many else data_copy
 
@@ -1064,8 +1067,8 @@ class ServicosOsViewSet(BaseMultiDBModelViewSet):
 
         try:
             with transaction.atomic(using=banco):
-
                 # ADICIONAR
+                validos = []
                 for item in adicionar:
                     if not isinstance(item, dict):
                         logger.warning(f"Item inválido em adicionar: {item}")
@@ -1076,13 +1079,12 @@ class ServicosOsViewSet(BaseMultiDBModelViewSet):
                     faltando = [c for c in obrig if not item.get(c)]
                     if faltando:
                         raise ValidationError(f"Faltam campos para adicionar: {', '.join(faltando)}")
+                    validos.append(item)
 
-                    item['serv_item'] = get_next_global_serv_item_id(banco)
-
-                    s = ServicosOsSerializer(data=item, context={'banco': banco})
-                    s.is_valid(raise_exception=True)
-                    obj = s.save()
-
+                novos = gravar_com_itens_globais(
+                    banco, ServicosOs, validos, lambda: _salvar_itens(ServicosOsSerializer, validos, banco)
+                )
+                for item, obj in zip(validos, novos):
                     resposta['adicionados'].append(
                         ServicosOsSerializer(obj, context={'banco': banco}).data
                     )
@@ -1253,20 +1255,16 @@ class OsHoraViewSet(BaseMultiDBModelViewSet):
             is_many = isinstance(request.data, list)
             data_copy = request.data.copy() if not is_many else [item.copy() for item in request.data]
             
-            # Gerar os_hora_item automaticamente (global)
-            if is_many:
-                for item in data_copy:
-                    if not item.get('os_hora_item'):
-                        item['os_hora_item'] = get_next_global_os_hora_item_id(banco)
-            else:
-                if not data_copy.get('os_hora_item'):
-                    data_copy['os_hora_item'] = get_next_global_os_hora_item_id(banco)
-            
-            serializer = self.get_serializer(data=data_copy, many=is_many)
-            serializer.is_valid(raise_exception=True)
-            
-            with transaction.atomic(using=banco):
+            # os_hora_item sempre da sequência global, um bloco para a requisição
+            def gravar():
+                serializer = self.get_serializer(data=data_copy, many=is_many)
+                serializer.is_valid(raise_exception=True)
                 serializer.save()
+                return serializer
+
+            serializer = gravar_com_itens_globais(
+                banco, OsHora, data_copy if is_many else [data_copy], gravar
+            )
             
             return tratar_sucesso(serializer.data, status_code=status.HTTP_201_CREATED)
         
@@ -1327,7 +1325,6 @@ class OsHoraViewSet(BaseMultiDBModelViewSet):
 
         try:
             with transaction.atomic(using=banco):
-
                 # ADICIONAR
                 for item in adicionar:
                     obrig = ['os_hora_os', 'os_hora_empr', 'os_hora_fili', 'os_hora_data']
@@ -1335,13 +1332,10 @@ class OsHoraViewSet(BaseMultiDBModelViewSet):
                     if faltando:
                         raise ValidationError(f"Faltam campos: {', '.join(faltando)}")
 
-                    if not item.get('os_hora_item'):
-                        item['os_hora_item'] = get_next_global_os_hora_item_id(banco)
-
-                    s = OsHoraSerializer(data=item, context={'banco': banco})
-                    s.is_valid(raise_exception=True)
-                    obj = s.save()
-
+                novos = gravar_com_itens_globais(
+                    banco, OsHora, adicionar, lambda: _salvar_itens(OsHoraSerializer, adicionar, banco)
+                )
+                for obj in novos:
                     resposta['adicionados'].append(
                         OsHoraSerializer(obj, context={'banco': banco}).data
                     )
@@ -4,8 +4,9 @@ import logging
 from decimal import Decimal, InvalidOperation
 from django.utils import timezone
 from ..models import Os, PecasOs, ServicosOs, OsHora
-from ..utils import get_next_service_id
+from ..utils import get_next_service_ids
 from comissoes.services.automatico import ComissaoAutomaticaService
+from core.numeracao import NumeracaoService
 
 class OsService:
     logger = logging.getLogger(__name__)
@@ -49,13 +50,7 @@ class OsService:
 
     @staticmethod
     def _proxima_ordem_numero(banco: str, os_empr: int, os_fili: int) -> int:
-        ultimo = (
-            Os.objects.using(banco)
-            .filter(os_empr=os_empr, os_fili=os_fili)
-            .order_by('-os_os')
-            .first()
-        )
-        return (ultimo.os_os + 1) if ultimo else 1
+        return NumeracaoService.proximo(banco, 'os', os_empr, os_fili)
 
     @staticmethod
     def create_os(banco: str, os_data: dict, pecas_data: list, servicos_data: list, horas_data: list = None):
@@ -85,6 +80,8 @@ class OsService:
 
             if not os_data.get('os_os'):
                 os_data['os_os'] = OsService._proxima_ordem_numero(banco, os_empr, os_fili)
+            else:
+                NumeracaoService.registrar_uso(banco, 'os', os_empr, os_fili, os_data['os_os'])
 
             if 'os_tota' not in os_data or os_data['os_tota'] is None:
                 os_data['os_tota'] = Decimal('0.00')
@@ -145,6 +142,7 @@ class OsService:
                     raise e
 
             # ========== SERVIÇOS ==========
+            novos_ids = iter(get_next_service_ids(banco, ordem.os_os, ordem.os_empr, ordem.os_fili, len(servicos_data)) if servicos_data else [])
             for idx, item_data in enumerate(servicos_data, start=1):
                 serv_quan = OsService._to_decimal(item_data.get('serv_quan', 0))
                 serv_unit = OsService._to_decimal(item_data.get('serv_unit', 0))
@@ -156,7 +154,7 @@ class OsService:
 
                 OsService.logger.debug(f"[create_os] Serviço: {serv_quan} x {serv_unit} - {serv_desc} = {serv_tota}")
 
-                novo_id, _ = get_next_service_id(banco, ordem.os_os, ordem.os_empr, ordem.os_fili)
+                novo_id = next(novos_ids)
                 
                 if local_id:
                     id_mappings['servicos_ids'].append({'local_id': local_id, 'remote_id': novo_id})
@@ -307,6 +305,7 @@ class OsService:
                     raise e
 
             # Recriar serviços
+            novos_ids = iter(get_next_service_ids(banco, ordem.os_os, ordem.os_empr, ordem.os_fili, len(servicos_data)) if servicos_data else [])
             for item_data in servicos_data:
                 serv_quan = OsService._to_decimal(item_data.get('serv_quan', 0))
                 serv_unit = OsService._to_decimal(item_data.get('serv_unit', 0))
@@ -314,7 +313,7 @@ class OsService:
                 serv_tota = (serv_quan * serv_unit) - serv_desc
                 subtotal_servicos += serv_tota
 
-                novo_id, _ = get_next_service_id(banco, ordem.os_os, ordem.os_empr, ordem.os_fili)
+                novo_id = next(novos_ids)
                 ServicosOs.objects.using(banco).create(
                     serv_empr=ordem.os_empr,
                     serv_fili=ordem.os_fili,
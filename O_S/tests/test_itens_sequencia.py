@@ -0,0 +1,109 @@
+from contextlib import nullcontext
+from unittest.mock import MagicMock, patch
+
+from django.db import IntegrityError
+from django.test import SimpleTestCase
+
+from O_S import utils
+from O_S.models import PecasOs, ServicosOs
+
+
+def _conexao(resultados):
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = resultados
+    conexao = MagicMock(in_atomic_block=False)
+    conexao.cursor.return_value.__enter__.return_value = cursor
+    return conexao, cursor
+
+
+class ReservaItensGlobaisTests(SimpleTestCase):
+    def setUp(self):
+        utils._sequencias_prontas.clear()
+
+    def test_bloco_em_um_comando_sem_lock(self):
+        conexao, cursor = _conexao([[(41,), (42,), (43,)], [(44,)]])
+        with patch.object(utils, "connections", {"t1": conexao}):
+            self.assertEqual(utils.reservar_itens_globais("t1", PecasOs, 3), [41, 42, 43])
+            self.assertEqual(utils.get_next_global_peca_item_id("t1"), 44)
+
+        sqls = [c.args[0] for c in cursor.execute.call_args_list]
+        # sequência criada/semeada uma vez só por banco
+        self.assertEqual(sum("CREATE SEQUENCE" in s for s in sqls), 1)
+        self.assertIn("nextval('pecasos_peca_item_aloc_seq') FROM generate_series(1, %s)", sqls[2])
+        self.assertFalse(any("FOR UPDATE" in s for s in sqls))
+
+    def test_quantidade_zero_nao_consulta(self):
+        with patch.object(utils, "connections", {}):
+            self.assertEqual(utils.reservar_itens_globais("t1", PecasOs, 0), [])
+
+
+class GravarComItensGlobaisTests(SimpleTestCase):
+    def setUp(self):
+        utils._sequencias_prontas.clear()
+        utils._sequencias_prontas.add(("t1", "servicosos_serv_item_aloc_seq"))
+        patcher = patch.object(utils.transaction, "atomic", side_effect=lambda using=None: nullcontext())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_numero_do_cliente_e_substituido(self):
+        conexao, _ = _conexao([[(7,), (8,)]])
+        itens = [{"serv_item": 999}, {}]
+        with patch.object(utils, "connections", {"t1": conexao}):
+            resultado = utils.gravar_com_itens_globais("t1", ServicosOs, itens, lambda: "ok")
+        self.assertEqual(resultado, "ok")
+        self.assertEqual(itens, [{"serv_item": 7}, {"serv_item": 8}])
+
+    def test_colisao_ressemeia_e_renumera(self):
+        conexao, cursor = _conexao([[(5,)], [(51,)]])
+        itens = [{}]
+        gravados = []
+
+        def gravar():
+            gravados.append(itens[0]["serv_item"])
+            if len(gravados) == 1:
+                raise IntegrityError("duplicate key")
+            return "ok"
+
+        with patch.object(utils, "connections", {"t1": conexao}), \
+                self.assertLogs("O_S.utils", level="WARNING"):
+            self.assertEqual(utils.gravar_com_itens_globais("t1", ServicosOs, itens, gravar), "ok")
+
+        self.assertEqual(gravados, [5, 51])
+        sqls = [c.args[0] for c in cursor.execute.call_args_list]
+        self.assertIn("setval('servicosos_serv_item_aloc_seq'", sqls[1])
+        self.assertIn("MAX(serv_item)", sqls[1])
+
+    def test_segunda_colisao_propaga(self):
+        conexao, _ = _conexao([[(5,)], [(6,)]])
+
+        def gravar():
+            raise IntegrityError("duplicate key")
+
+        with patch.object(utils, "connections", {"t1": conexao}), \
+                self.assertLogs("O_S.utils", level="WARNING"), self.assertRaises(IntegrityError):
+            utils.gravar_com_itens_globais("t1", ServicosOs, [{}], gravar)
+
+
+class SequenciaPorOrdemTests(SimpleTestCase):
+    def setUp(self):
+        patcher = patch.object(utils.transaction, "atomic", side_effect=lambda using=None: nullcontext())
+        self.atomic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lock_da_ordem_e_primeiros_livres(self):
+        conexao, cursor = _conexao([[(2,), (4,)]])
+        with patch.object(utils, "connections", {"t1": conexao}):
+            livres = utils.get_next_service_ids("t1", 10, 1, 1, quantidade=2)
+
+        self.assertEqual(livres, [2, 4])
+        # advisory xact lock só segura algo dentro de transação
+        self.atomic.assert_called_once_with(using="t1")
+        lock, busca = cursor.execute.call_args_list
+        self.assertEqual(lock.args[1], ["servicosos:1:1:10"])
+        self.assertNotIn("FOR UPDATE", busca.args[0])
+        self.assertEqual(busca.args[1], [10, 1, 1, 2, 10, 1, 1, 2])
+
+    def test_compatibilidade_um_item(self):
+        conexao, _ = _conexao([[(3,)]])
+        with patch.object(utils, "connections", {"t1": conexao}):
+            self.assertEqual(utils.get_next_service_id("t1", 10, 1, 1), (3, 3))
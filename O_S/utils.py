@@ -1,35 +1,143 @@
-from django.db import connections
-from O_S.models import ServicosOs, Os, PecasOs
+import logging
+import threading
+
+from django.db import IntegrityError, connections, transaction
+from O_S.models import ServicosOs, Os, PecasOs, OsHora
+
+logger = logging.getLogger(__name__)
+
+
+# peca_item/serv_item/os_hora_item são a chave primária vista pelo Django
+# (UPDATE/DELETE do ORM filtram só por ela), então os itens criados pela API
+# recebem números únicos na tabela inteira. Eles vêm de uma SEQUENCE do
+# Postgres: nextval não trava linha nenhuma nem espera a transação de outro
+# técnico, e um lote reserva vários números num comando só. A semente (MAX da
+# tabela) é lida uma vez por processo; se alguém gravar números por fora da
+# sequência, a colisão re-semeia e renumera (gravar_com_itens_globais).
+SEQUENCIAS_ITENS = {
+    PecasOs: ('pecasos', 'peca_item', 'pecasos_peca_item_aloc_seq'),
+    ServicosOs: ('servicosos', 'serv_item', 'servicosos_serv_item_aloc_seq'),
+    OsHora: ('os_hora', 'os_hora_item', 'os_hora_os_hora_item_aloc_seq'),
+}
+
+_sequencias_prontas = set()
+_sequencias_lock = threading.Lock()
+
+
+def _semear(cursor, tabela, campo, sequencia):
+    # Nunca abaixo do maior item já gravado (só avança)
+    cursor.execute(
+        f"""
+        SELECT setval('{sequencia}', m.maximo)
+        FROM (SELECT MAX({campo})::bigint AS maximo FROM {tabela}) m
+        WHERE m.maximo > (
+            SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM {sequencia}
+        )
+        """
+    )
+
+
+def _garantir_sequencia(banco, tabela, campo, sequencia):
+    chave = (banco, sequencia)
+    if chave in _sequencias_prontas:
+        return
+    with connections[banco].cursor() as cursor:
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {sequencia}")
+        _semear(cursor, tabela, campo, sequencia)
+
+    def _marcar():
+        with _sequencias_lock:
+            _sequencias_prontas.add(chave)
 
+    # Dentro de uma transação o CREATE só vale após o commit.
+    if connections[banco].in_atomic_block:
+        transaction.on_commit(_marcar, using=banco)
+    else:
+        _marcar()
 
-def get_next_sequential_id(banco, model, ordem_id, empresa_id, filial_id, id_field, ordem_field, empresa_field, filial_field):
+
+def reservar_itens_globais(banco, model, quantidade=1):
     """
-    Gera o próximo número sequencial simples (1..N) para itens da ordem.
+    Reserva ``quantidade`` números de item únicos na tabela de ``model``
+    (PecasOs, ServicosOs ou OsHora). Números de transações desfeitas não
+    voltam; buracos são aceitos.
     """
+    if quantidade < 1:
+        return []
+    tabela, campo, sequencia = SEQUENCIAS_ITENS[model]
+    _garantir_sequencia(banco, tabela, campo, sequencia)
     with connections[banco].cursor() as cursor:
         cursor.execute(
-            f"""
-            SELECT {id_field}
-            FROM {model._meta.db_table}
-            WHERE {ordem_field} = %s 
-              AND {empresa_field} = %s 
-              AND {filial_field} = %s
-            FOR UPDATE
-            """,
-            [ordem_id, empresa_id, filial_id]
+            f"SELECT nextval('{sequencia}') FROM generate_series(1, %s)",
+            [quantidade],
         )
-        ids = sorted(int(row[0]) for row in cursor.fetchall() if row[0] is not None)
+        return [int(row[0]) for row in cursor.fetchall()]
+
+
+def ressemear_sequencia(banco, model):
+    """Avança a sequência de ``model`` até o maior item gravado na tabela."""
+    tabela, campo, sequencia = SEQUENCIAS_ITENS[model]
+    with connections[banco].cursor() as cursor:
+        _semear(cursor, tabela, campo, sequencia)
 
-        if not ids:
-            return 1
 
-        sequ = 1
-        for id_atual in ids:
-            if id_atual != sequ:
-                return sequ
-            sequ += 1
+def gravar_com_itens_globais(banco, model, itens, gravar):
+    """
+    Numera ``itens`` (dicts) pela sequência de ``model`` e chama ``gravar()``
+    num savepoint. Número do cliente não é aproveitado. Se a gravação colidir
+    com um item gravado por fora da sequência, re-semeia pelo MAX da tabela e
+    tenta de novo uma vez com números novos.
+    """
+    campo = SEQUENCIAS_ITENS[model][1]
+    for tentativa in range(2):
+        for item, numero in zip(itens, reservar_itens_globais(banco, model, len(itens))):
+            item[campo] = numero
+        try:
+            with transaction.atomic(using=banco):
+                return gravar()
+        except IntegrityError:
+            if tentativa:
+                raise
+            logger.warning("[O_S] %s: colisão em %s, re-semeando a sequência", banco, campo)
+            ressemear_sequencia(banco, model)
+
+
+def get_next_sequential_id(banco, model, ordem_id, empresa_id, filial_id, id_field, ordem_field, empresa_field, filial_field, quantidade=1):
+    """
+    Gera o próximo número sequencial simples (1..N) para itens da ordem,
+    preenchendo buracos. Com ``quantidade`` > 1 retorna a lista dos primeiros
+    números livres.
+
+    A busca é feita no banco (generate_series + NOT EXISTS pelo índice da
+    ordem); concorrência na mesma ordem é serializada por um advisory lock da
+    própria ordem, sem travar os itens nem outras ordens. O lock vale até o
+    fim da transação: chame dentro do atomic que grava os itens.
+    """
+    tabela = model._meta.db_table
+    filtro = f"{ordem_field} = %s AND {empresa_field} = %s AND {filial_field} = %s"
+    params = [ordem_id, empresa_id, filial_id]
+    with transaction.atomic(using=banco), connections[banco].cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(hashtext(%s))",
+            [f"{tabela}:{empresa_id}:{filial_id}:{ordem_id}"],
+        )
+        cursor.execute(
+            f"""
+            SELECT s
+            FROM generate_series(1, (SELECT COUNT(*) FROM {tabela} WHERE {filtro}) + %s) AS s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {tabela} WHERE {filtro} AND {id_field} = s
+            )
+            ORDER BY s
+            LIMIT %s
+            """,
+            params + [quantidade] + params + [quantidade],
+        )
+        livres = [int(row[0]) for row in cursor.fetchall()]
 
-        return sequ
+    if quantidade == 1:
+        return livres[0]
+    return livres
 
 def get_next_item_number_sequence(banco, peca_os, peca_empr, peca_fili):
     """
@@ -49,20 +157,7 @@ def get_next_item_number_sequence(banco, peca_os, peca_empr, peca_fili):
 
 
 def get_next_global_peca_item_id(banco):
-    with connections[banco].cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT peca_item
-            FROM pecasos
-            WHERE peca_item IS NOT NULL
-            ORDER BY peca_item DESC
-            LIMIT 1
-            FOR UPDATE
-            """
-        )
-        row = cursor.fetchone()
-        ultimo = int(row[0]) if row and row[0] is not None else 0
-        return ultimo + 1
+    return reservar_itens_globais(banco, PecasOs)[0]
 
 
 def get_next_service_id(banco, ordem_id, empresa_id, filial_id):
@@ -70,47 +165,29 @@ def get_next_service_id(banco, ordem_id, empresa_id, filial_id):
     Gera próximo número sequencial simples (1..N) para serviços da ordem.
     Retorna (novo_id, sequencia_local) para compatibilidade.
     """
-    with connections[banco].cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT serv_item
-            FROM servicosos 
-            WHERE serv_os = %s 
-              AND serv_empr = %s 
-              AND serv_fili = %s 
-            FOR UPDATE
-            """,
-            [ordem_id, empresa_id, filial_id]
-        )
-        ids = sorted(int(row[0]) for row in cursor.fetchall() if row[0] is not None)
-
-    if not ids:
-        return 1, 1
+    sequ = get_next_service_ids(banco, ordem_id, empresa_id, filial_id)[0]
+    return sequ, sequ
 
-    sequ = 1
-    for id_atual in ids:
-        if id_atual != sequ:
-            return sequ, sequ
-        sequ += 1
 
-    return sequ, sequ
+def get_next_service_ids(banco, ordem_id, empresa_id, filial_id, quantidade=1):
+    """Reserva os ``quantidade`` primeiros números livres de serviço da ordem."""
+    livres = get_next_sequential_id(
+        banco=banco,
+        model=ServicosOs,
+        ordem_id=ordem_id,
+        empresa_id=empresa_id,
+        filial_id=filial_id,
+        id_field='serv_item',
+        ordem_field='serv_os',
+        empresa_field='serv_empr',
+        filial_field='serv_fili',
+        quantidade=quantidade,
+    )
+    return livres if quantidade > 1 else [livres]
 
 
 def get_next_global_serv_item_id(banco):
-    with connections[banco].cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT serv_item
-            FROM servicosos
-            WHERE serv_item IS NOT NULL
-            ORDER BY serv_item DESC
-            LIMIT 1
-            FOR UPDATE
-            """
-        )
-        row = cursor.fetchone()
-        ultimo = int(row[0]) if row and row[0] is not None else 0
-        return ultimo + 1
+    return reservar_itens_globais(banco, ServicosOs)[0]
 
 
 def compactar_servicos(banco, serv_empr, serv_fili, serv_os):
@@ -138,17 +215,4 @@ def compactar_servicos(banco, serv_empr, serv_fili, serv_os):
 
 
 def get_next_global_os_hora_item_id(banco):
-    with connections[banco].cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT os_hora_item
-            FROM os_hora
-            WHERE os_hora_item IS NOT NULL
-            ORDER BY os_hora_item DESC
-            LIMIT 1
-            FOR UPDATE
-            """
-        )
-        row = cursor.fetchone()
-    ultimo = int(row[0]) if row and row[0] is not None else 0
-    return ultimo + 1
+    return reservar_itens_globais(banco, OsHora)[0]
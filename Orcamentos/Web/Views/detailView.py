@@ -1,5 +1,6 @@
 from django.views.generic import DetailView
 from core.utils import get_licenca_db_config
+from midias.servico import anotar as anotar_midia
 from ...models import Orcamentos, ItensOrcamento
 
 class OrcamentoDetailView(DetailView):
@@ -24,7 +25,11 @@ class OrcamentoDetailView(DetailView):
             from Produtos.models import Produtos
             codigos = [i.iped_prod for i in itens_qs]
             produtos = Produtos.objects.using(banco).filter(prod_codi__in=codigos)
-            prod_map = {p.prod_codi: {'nome': p.prod_nome, 'has_foto': bool(p.prod_foto)} for p in produtos}
+            # Hash/tamanho da foto calculados no banco, sem trazer o blob
+            produtos = anotar_midia(produtos, 'produto', prefixo='foto').values_list(
+                'prod_codi', 'prod_nome', 'foto_hash', 'foto_tamanho'
+            )
+            prod_map = {codi: {'nome': nome, 'has_foto': bool(tamanho), 'foto_hash': foto} for codi, nome, foto, tamanho in produtos}
             itens_detalhados = []
             for i in itens_qs:
                 meta = prod_map.get(i.iped_prod, {})
@@ -32,6 +37,7 @@ class OrcamentoDetailView(DetailView):
                     'prod_codigo': i.iped_prod,
                     'prod_nome': meta.get('nome') or i.iped_prod,
                     'has_foto': bool(meta.get('has_foto')),
+                    'foto_hash': meta.get('foto_hash'),
                     'iped_quan': i.iped_quan,
                     'iped_unit': i.iped_unit,
                     'iped_tota': i.iped_tota,
@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.db import transaction
 from datetime import date
 from core.utils import get_licenca_db_config
+from core.numeracao import NumeracaoService
 from ...models import Orcamentos, ItensOrcamento
 from Pedidos.models import PedidoVenda, Itenspedidovenda
 
@@ -19,13 +20,9 @@ def transformar_em_pedido_web(request, pk, slug=None):
             messages.error(request, 'Orçamento não encontrado')
             return redirect('OrcamentosWeb:orcamentos_listar', slug=slug)
         with transaction.atomic(using=banco):
-            ultimo = PedidoVenda.objects.using(banco).filter(
-                pedi_empr=orcamento.pedi_empr,
-                pedi_fili=orcamento.pedi_fili
-            ).order_by('-pedi_nume').first()
-            proximo = (ultimo.pedi_nume + 1) if ultimo else 1
-            while PedidoVenda.objects.using(banco).filter(pedi_nume=proximo).exists():
-                proximo += 1
+            proximo = NumeracaoService.proximo(
+                banco, 'pedido', orcamento.pedi_empr, orcamento.pedi_fili
+            )
             pedido = PedidoVenda.objects.using(banco).create(
                 pedi_empr=orcamento.pedi_empr,
                 pedi_fili=orcamento.pedi_fili,
@@ -3,7 +3,7 @@ from Entidades.models import Entidades
 from Produtos.models import Produtos
 from ..models import Orcamentos, ItensOrcamento, STATUS_ORCAMENTO
 from django.forms import inlineformset_factory
-from django.db.models import Max
+from core.numeracao import NumeracaoService
 
 
 class OrcamentoForm(forms.ModelForm):
@@ -31,15 +31,16 @@ class OrcamentoForm(forms.ModelForm):
         self.fields['pedi_forn'].queryset = Entidades.objects.filter(enti_tipo_enti__in=['CL', 'AM'])  # Clientes e Ambos
         self.fields['pedi_vend'].queryset = Entidades.objects.filter(enti_tipo_enti__in=['VE', 'AM'])  # Vendedores e Ambos
 
-    def save(self, commit=True):
+    def save(self, commit=True, banco='default'):
         orcamento = super().save(commit=False)
 
         if orcamento.pedi_nume is None or orcamento.pedi_nume == 0:
-            max_nume = Orcamento.objects.aggregate(max_nume=Max('pedi_nume'))['max_nume'] or 0
-            orcamento.pedi_nume = max_nume + 1
+            orcamento.pedi_nume = NumeracaoService.proximo(
+                banco, 'orcamento', orcamento.pedi_empr, orcamento.pedi_fili
+            )
 
         if commit:
-            orcamento.save()
+            orcamento.save(using=banco)
 
         return orcamento
 
@@ -8,6 +8,8 @@ from django.db.models import Q
 from django.db.models import Subquery, OuterRef, BigIntegerField, Sum, Count
 from django.db.models.functions import Cast
 from core.utils import get_licenca_db_config, calcular_subtotal_item_bruto, calcular_total_item_com_desconto
+from core.numeracao import NumeracaoService
+from midias.servico import anotar as anotar_midia
 
 logger = logging.getLogger(__name__)
 from ..models import Orcamentos, ItensOrcamento
@@ -168,15 +170,7 @@ class OrcamentoCreateView(CreateView):
             return self.form_invalid(form)
 
         # Obter próximo número
-        ultimo = (
-            Orcamentos.objects.using(banco)
-            .filter(pedi_empr=empresa_id, pedi_fili=filial_id)
-            .order_by('-pedi_nume')
-            .first()
-        )
-        proximo_numero = (ultimo.pedi_nume + 1) if ultimo else 1
-        while Orcamentos.objects.using(banco).filter(pedi_nume=proximo_numero).exists():
-            proximo_numero += 1
+        proximo_numero = NumeracaoService.proximo(banco, 'orcamento', empresa_id, filial_id)
 
         orcamento = form.save(commit=False)
         orcamento.pedi_empr = empresa_id
@@ -446,7 +440,11 @@ class OrcamentoDetailView(DetailView):
             from Produtos.models import Produtos
             codigos = [i.iped_prod for i in itens_qs]
             produtos = Produtos.objects.using(banco).filter(prod_codi__in=codigos)
-            prod_map = {p.prod_codi: {'nome': p.prod_nome, 'has_foto': bool(p.prod_foto)} for p in produtos}
+            # Hash/tamanho da foto calculados no banco, sem trazer o blob
+            produtos = anotar_midia(produtos, 'produto', prefixo='foto').values_list(
+                'prod_codi', 'prod_nome', 'foto_hash', 'foto_tamanho'
+            )
+            prod_map = {codi: {'nome': nome, 'has_foto': bool(tamanho), 'foto_hash': foto} for codi, nome, foto, tamanho in produtos}
             itens_detalhados = []
             for i in itens_qs:
                 meta = prod_map.get(i.iped_prod, {})
@@ -454,6 +452,7 @@ class OrcamentoDetailView(DetailView):
                     'prod_codigo': i.iped_prod,
                     'prod_nome': meta.get('nome') or i.iped_prod,
                     'has_foto': bool(meta.get('has_foto')),
+                    'foto_hash': meta.get('foto_hash'),
                     'iped_quan': i.iped_quan,
                     'iped_unit': i.iped_unit,
                     'iped_tota': i.iped_tota,
@@ -491,7 +490,11 @@ class OrcamentoPrintView(DetailView):
             from Produtos.models import Produtos
             codigos = [i.iped_prod for i in itens_qs]
             produtos = Produtos.objects.using(banco).filter(prod_codi__in=codigos)
-            prod_map = {p.prod_codi: {'nome': p.prod_nome, 'has_foto': bool(p.prod_foto)} for p in produtos}
+            # Hash/tamanho da foto calculados no banco, sem trazer o blob
+            produtos = anotar_midia(produtos, 'produto', prefixo='foto').values_list(
+                'prod_codi', 'prod_nome', 'foto_hash', 'foto_tamanho'
+            )
+            prod_map = {codi: {'nome': nome, 'has_foto': bool(tamanho), 'foto_hash': foto} for codi, nome, foto, tamanho in produtos}
             itens_detalhados = []
             for i in itens_qs:
                 meta = prod_map.get(i.iped_prod, {})
@@ -499,6 +502,7 @@ class OrcamentoPrintView(DetailView):
                     'prod_codigo': i.iped_prod,
                     'prod_nome': meta.get('nome') or i.iped_prod,
                     'has_foto': bool(meta.get('has_foto')),
+                    'foto_hash': meta.get('foto_hash'),
                     'iped_quan': i.iped_quan,
                     'iped_unit': i.iped_unit,
                     'iped_tota': i.iped_tota,
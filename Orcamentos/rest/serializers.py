@@ -12,7 +12,7 @@ import logging
 from decimal import Decimal, ROUND_HALF_UP
 from parametros_admin.utils_pedidos import aplicar_descontos
 from django.db import transaction
-from django.db.models import Max
+from core.numeracao import NumeracaoService
 
 logger = logging.getLogger(__name__)
 
@@ -133,9 +133,9 @@ class OrcamentosSerializer(BancoContextMixin, serializers.ModelSerializer):
             validated_data['pedi_desc'] = valores['desconto']
             validated_data['pedi_tota'] = valores['total']
 
-            ultimo_orcamento = Orcamentos.objects.using(banco).aggregate(max_nume=Max('pedi_nume'))
-            novo_nume = (ultimo_orcamento['max_nume'] or 0) + 1
-            validated_data['pedi_nume'] = novo_nume
+            validated_data['pedi_nume'] = NumeracaoService.proximo(
+                banco, 'orcamento', validated_data.get('pedi_empr'), validated_data.get('pedi_fili')
+            )
 
             orcamento = Orcamentos.objects.using(banco).create(**validated_data)
 
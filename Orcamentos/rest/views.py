@@ -16,6 +16,7 @@ from Licencas.models import Empresas
 from Pedidos.models import PedidoVenda, Itenspedidovenda
 from core.utils import get_licenca_db_config, calcular_subtotal_item_bruto, calcular_total_item_com_desconto
 from core.mixins.vendedor_mixin import VendedorEntidadeMixin
+from core.numeracao import NumeracaoService
 from rest_framework.permissions import IsAuthenticated
 from parametros_admin.utils_pedidos import obter_parametros_pedidos, atualizar_parametros_pedidos
 from core.cache_service import build_cache_key, cache_get_or_set, safe_delete_pattern
@@ -240,13 +241,9 @@ class OrcamentoViewSet(viewsets.ModelViewSet, VendedorEntidadeMixin):
             if not banco:
                 return Response({'erro': 'Banco de dados não encontrado'}, status=status.HTTP_404_NOT_FOUND)
             with transaction.atomic(using=banco):
-                ultimo_pedido = PedidoVenda.objects.using(banco).filter(
-                    pedi_empr=orcamento.pedi_empr,
-                    pedi_fili=orcamento.pedi_fili
-                ).order_by('-pedi_nume').first()
-                proximo_numero = (ultimo_pedido.pedi_nume + 1) if ultimo_pedido else 1
-                while PedidoVenda.objects.using(banco).filter(pedi_nume=proximo_numero).exists():
-                    proximo_numero += 1
+                proximo_numero = NumeracaoService.proximo(
+                    banco, 'pedido', orcamento.pedi_empr, orcamento.pedi_fili
+                )
                 pedido = PedidoVenda.objects.using(banco).create(
                     pedi_empr=orcamento.pedi_empr,
                     pedi_fili=orcamento.pedi_fili,
@@ -3,6 +3,7 @@ import logging
 from datetime import datetime
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from midias.servico import detectar_mime
 from .base import BancoModelSerializer
 from ..models import Ordemservicoimgantes, Ordemservicoimgdurante, Ordemservicoimgdepois, Osarquivos
 
@@ -142,20 +143,5 @@ class OsArquSerializer(serializers.ModelSerializer):
         if not b64:
             return None
         blob = getattr(obj, "arqu_arqu", None)
-        mime = self._detectar_mime(blob)
+        mime = detectar_mime(blob)
         return f"data:{mime};base64,{b64}"
-
-    def _detectar_mime(self, blob):
-        try:
-            head = bytes(blob)[:12]
-        except Exception:
-            return "application/octet-stream"
-        if len(head) >= 3 and head[0] == 0xFF and head[1] == 0xD8 and head[2] == 0xFF:
-            return "image/jpeg"
-        if len(head) >= 8 and head[:8] == b"\x89PNG\r\n\x1a\n":
-            return "image/png"
-        if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
-            return "image/webp"
-        if len(head) >= 4 and head[:4] == b"%PDF":
-            return "application/pdf"
-        return "application/octet-stream"
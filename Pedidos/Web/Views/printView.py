@@ -7,6 +7,7 @@ from ...models import PedidoVenda
 from Licencas.models import Empresas, Filiais
 from Entidades.models import Entidades
 from Produtos.models import Produtos
+from midias.servico import anotar as anotar_midia
 from ...models import Itenspedidovenda
 
 logger = logging.getLogger(__name__)
@@ -92,7 +93,14 @@ class PedidoPrintView(DetailView):
                 # Otimização de produtos
                 codigos = [i.iped_prod for i in itens_qs]
                 produtos = Produtos.objects.using(banco).filter(prod_codi__in=codigos, prod_empr=str(pedido.pedi_empr))
-                prod_map = {p.prod_codi: {'nome': p.prod_nome, 'unidade': p.prod_unme_id, 'has_foto': bool(p.prod_foto)} for p in produtos}
+                # Hash/tamanho da foto calculados no banco, sem trazer o blob
+                produtos = anotar_midia(produtos, 'produto', prefixo='foto').values_list(
+                    'prod_codi', 'prod_nome', 'prod_unme', 'foto_hash', 'foto_tamanho'
+                )
+                prod_map = {
+                    codi: {'nome': nome, 'unidade': unidade, 'has_foto': bool(tamanho), 'foto_hash': foto}
+                    for codi, nome, unidade, foto, tamanho in produtos
+                }
 
                 itens_detalhados = []
                 for i in itens_qs:
@@ -102,6 +110,7 @@ class PedidoPrintView(DetailView):
                         'prod_nome': meta.get('nome') or i.iped_prod,
                         'prod_unidade': meta.get('unidade') or i.iped_unme,
                         'has_foto': bool(meta.get('has_foto')),
+                        'foto_hash': meta.get('foto_hash'),
                         'iped_quan': i.iped_quan,
                         'iped_unit': i.iped_unit,
                         'iped_tota': i.iped_tota,
@@ -0,0 +1,218 @@
+import logging
+from decimal import Decimal
+
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Chave do pg_advisory_xact_lock que serializa a reserva de blocos de said_sequ
+TRAVA_SEQUENCIAL_SAIDAS = 'saidasestoque.said_sequ'
+
+
+class MovimentoEstoqueLoteService:
+    """
+    Gera as saídas de estoque de um pedido (baixa e estorno) em lote: saldos,
+    duplicidade e sequenciais são resolvidos com uma consulta cada, e as
+    saídas são gravadas com um único bulk_create, independente do número de itens.
+    """
+
+    @staticmethod
+    def base_obse(pedido) -> str:
+        return f"Saída automática - Pedido {pedido.pedi_nume}"
+
+    @staticmethod
+    def normalizar_codigos(banco: str, pedido, codigos) -> dict:
+        """Mapeia cada código informado para o prod_codi cadastrado (por prod_codi ou prod_codi_nume)."""
+        from Produtos.models import Produtos
+
+        brutos = {str(c).strip() for c in codigos if c is not None and str(c).strip()}
+        if not brutos:
+            return {}
+
+        mapa = {}
+        encontrados = Produtos.objects.using(banco).filter(
+            prod_empr=str(pedido.pedi_empr),
+            prod_codi__in=brutos,
+        ).values_list('prod_codi', flat=True)
+        for codi in encontrados:
+            mapa[str(codi)] = str(codi)
+
+        numericos = [c for c in brutos if c not in mapa and c.isdigit()]
+        if numericos:
+            for codi, nume in Produtos.objects.using(banco).filter(
+                prod_empr=str(pedido.pedi_empr),
+                prod_codi_nume__in=numericos,
+            ).values_list('prod_codi', 'prod_codi_nume'):
+                mapa.setdefault(str(nume), str(codi))
+
+        # Sem cadastro: mantém o código como veio, igual a _normalizar_codigo_produto
+        for c in brutos:
+            mapa.setdefault(c, c)
+        return mapa
+
+    @staticmethod
+    def _gravar_saidas(banco: str, saidas: list) -> None:
+        """
+        Numera e grava as saídas num bulk_create. A trava (por transação) faz
+        pedidos simultâneos reservarem blocos de said_sequ um de cada vez; o
+        MAX é lido já com a trava, depois do commit do bloco anterior.
+        """
+        from Saidas_Estoque.models import SaidasEstoque
+
+        with transaction.atomic(using=banco):
+            with connections[banco].cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [TRAVA_SEQUENCIAL_SAIDAS])
+                cursor.execute("SELECT COALESCE(MAX(said_sequ), 0) FROM saidasestoque")
+                ultimo = int(cursor.fetchone()[0] or 0)
+            for offset, saida in enumerate(saidas, start=1):
+                saida.said_sequ = ultimo + offset
+            SaidasEstoque.objects.using(banco).bulk_create(saidas)
+
+    @staticmethod
+    def baixar_itens(pedido, itens: list, banco: str, request=None) -> list:
+        """
+        Baixa vários itens (já agrupados por produto) de uma vez.
+        Retorna um resultado por item, na mesma ordem e formato de
+        PedidoVendaService._baixar_item_data.
+        """
+        from Produtos.models import SaldoProduto
+        from Saidas_Estoque.models import SaidasEstoque
+        from parametros_admin.utils_estoque import verificar_estoque_negativo
+        from .pedido_service import PedidoVendaService
+
+        if not itens:
+            return []
+
+        base_obse = MovimentoEstoqueLoteService.base_obse(pedido)
+        codigos = MovimentoEstoqueLoteService.normalizar_codigos(
+            banco, pedido, [it.get('iped_prod') for it in itens]
+        )
+
+        preparados = []
+        for it in itens:
+            bruto = str(it.get('iped_prod') or '').strip()
+            preparados.append({
+                'produto': codigos.get(bruto, bruto),
+                'quantidade': PedidoVendaService._to_decimal(it.get('iped_quan', 0)),
+                'unitario': PedidoVendaService._to_decimal(it.get('iped_unit', 0)),
+                'total': it.get('iped_tota'),
+            })
+        produtos = {p['produto'] for p in preparados if p['produto']}
+
+        ja_baixados = set(
+            SaidasEstoque.objects.using(banco).filter(
+                said_empr=pedido.pedi_empr,
+                said_fili=pedido.pedi_fili,
+                said_prod__in=produtos,
+                said_obse__exact=base_obse,
+            ).values_list('said_prod', flat=True)
+        )
+        saldos = dict(
+            SaldoProduto.objects.using(banco).filter(
+                produto_codigo__in=produtos,
+                empresa=str(pedido.pedi_empr),
+                filial=str(pedido.pedi_fili),
+            ).values_list('produto_codigo', 'saldo_estoque')
+        )
+
+        permite_negativo = None
+        usuario_id = getattr(getattr(request, 'user', None), 'usua_codi', 1) if request is not None else 1
+
+        resultados = []
+        novas = []
+        for p in preparados:
+            quantidade = p['quantidade']
+            produto = p['produto']
+            if quantidade <= 0:
+                resultados.append({'sucesso': True, 'processado': False, 'motivo': 'Quantidade inválida'})
+                continue
+            if produto in ja_baixados:
+                resultados.append({'sucesso': True, 'processado': False, 'motivo': 'Item já baixado para este pedido'})
+                continue
+
+            saldo = saldos.get(produto)
+            if saldo is not None and saldo < abs(quantidade):
+                if permite_negativo is None:
+                    permite_negativo = False
+                    if request is not None:
+                        try:
+                            permite_negativo = verificar_estoque_negativo(pedido.pedi_empr, pedido.pedi_fili, request)
+                        except Exception:
+                            permite_negativo = False
+                if not permite_negativo:
+                    resultados.append({'sucesso': False, 'erro': f"Produto {produto} sem estoque suficiente"})
+                    continue
+
+            if p['total'] is not None:
+                total = PedidoVendaService._to_decimal(p['total']).quantize(Decimal('0.01'))
+            else:
+                total = (p['unitario'] * abs(quantidade)).quantize(Decimal('0.01'))
+
+            novas.append(SaidasEstoque(
+                said_empr=pedido.pedi_empr,
+                said_fili=pedido.pedi_fili,
+                said_data=pedido.pedi_data,
+                said_prod=str(produto),
+                said_quan=abs(quantidade),
+                said_tota=total,
+                said_obse=base_obse,
+                said_usua=usuario_id,
+                said_enti=str(pedido.pedi_forn),
+            ))
+            ja_baixados.add(produto)
+            resultados.append({'sucesso': True, 'processado': True})
+
+        if novas:
+            MovimentoEstoqueLoteService._gravar_saidas(banco, novas)
+
+        return resultados
+
+    @staticmethod
+    def estornar(pedido, banco: str, produto_codigo: str = None) -> bool:
+        """
+        Gera os lançamentos de estorno de todas as saídas do pedido (ou só de um
+        produto) e marca as originais como revertidas. Retorna se algo foi estornado.
+        """
+        from Saidas_Estoque.models import SaidasEstoque
+        from .pedido_service import PedidoVendaService
+
+        base_obse = MovimentoEstoqueLoteService.base_obse(pedido)
+        qs = SaidasEstoque.objects.using(banco).filter(
+            said_empr=pedido.pedi_empr,
+            said_fili=pedido.pedi_fili,
+            said_obse__exact=base_obse,
+        )
+        if produto_codigo:
+            qs = qs.filter(said_prod=produto_codigo)
+        saidas = list(qs)
+        if not saidas:
+            return False
+
+        estornos = []
+        revertidas = []
+        for saida in saidas:
+            produto = str(getattr(saida, 'said_prod', '') or '').strip() or produto_codigo
+            if not produto:
+                continue
+            estornos.append(SaidasEstoque(
+                said_empr=pedido.pedi_empr,
+                said_fili=pedido.pedi_fili,
+                said_data=getattr(saida, 'said_data', None) or pedido.pedi_data,
+                said_prod=str(produto),
+                said_quan=PedidoVendaService._to_decimal(getattr(saida, 'said_quan', 0)) * Decimal('-1'),
+                said_tota=PedidoVendaService._to_decimal(getattr(saida, 'said_tota', 0)) * Decimal('-1'),
+                said_obse=f"{base_obse} - ESTORNO",
+                said_usua=int(getattr(saida, 'said_usua', 1) or 1),
+                said_enti=str(getattr(saida, 'said_enti', '') or pedido.pedi_forn),
+            ))
+            revertidas.append(saida.said_sequ)
+
+        if not estornos:
+            return False
+
+        with transaction.atomic(using=banco):
+            MovimentoEstoqueLoteService._gravar_saidas(banco, estornos)
+            SaidasEstoque.objects.using(banco).filter(said_sequ__in=revertidas).update(
+                said_obse=f"{base_obse} - REVERTIDA"
+            )
+        return True
@@ -1,17 +1,16 @@
 from django.db import transaction, connections
 import logging
 from decimal import Decimal, InvalidOperation
-from django.db.models import Max
 from ..models import PedidoVenda, Itenspedidovenda
 from Produtos.models import SaldoProduto
 from CFOP.services.services import MotorFiscal
-from core.utils import (
-    calcular_subtotal_item_bruto,
-    calcular_total_item_com_desconto,
-)
+from core.utils import calcular_totais_itens
+from core.persistencia_itens import sincronizar_itens
 from CFOP.services.bases import FiscalContexto
 from parametros_admin.utils_pedidos import verificar_baixa_estoque_pedido
 from comissoes.services import ComissaoAutomaticaService
+from core.numeracao import NumeracaoService
+from .estoque_lote import MovimentoEstoqueLoteService
 class PedidoVendaService:
     logger = logging.getLogger(__name__)
 
@@ -88,65 +87,7 @@ class PedidoVendaService:
 
     @staticmethod
     def _baixar_item_data(pedido, item_data: dict, banco: str, request=None) -> dict:
-        from Saidas_Estoque.models import SaidasEstoque
-        from parametros_admin.utils_estoque import verificar_estoque_negativo
-
-        produto_codigo = PedidoVendaService._normalizar_codigo_produto(banco, pedido, item_data.get('iped_prod'))
-        quantidade = PedidoVendaService._to_decimal(item_data.get('iped_quan', 0), default='0.00')
-        valor_unitario = PedidoVendaService._to_decimal(item_data.get('iped_unit', 0), default='0.00')
-        valor_total = item_data.get('iped_tota')
-
-        if quantidade <= 0:
-            return {'sucesso': True, 'processado': False, 'motivo': 'Quantidade inválida'}
-
-        base_obse = f"Saída automática - Pedido {pedido.pedi_nume}"
-        ja_baixado = SaidasEstoque.objects.using(banco).filter(
-            said_empr=pedido.pedi_empr,
-            said_fili=pedido.pedi_fili,
-            said_prod=str(produto_codigo),
-            said_obse__exact=base_obse,
-        ).exists()
-        if ja_baixado:
-            return {'sucesso': True, 'processado': False, 'motivo': 'Item já baixado para este pedido'}
-
-        saldo = SaldoProduto.objects.using(banco).filter(
-            produto_codigo=produto_codigo,
-            empresa=str(pedido.pedi_empr),
-            filial=str(pedido.pedi_fili),
-        ).first()
-
-        if saldo and saldo.saldo_estoque < abs(quantidade):
-            permite_negativo = False
-            if request is not None:
-                try:
-                    permite_negativo = verificar_estoque_negativo(pedido.pedi_empr, pedido.pedi_fili, request)
-                except Exception:
-                    permite_negativo = False
-            if not permite_negativo:
-                return {'sucesso': False, 'erro': f"Produto {produto_codigo} sem estoque suficiente"}
-
-        ultimo = SaidasEstoque.objects.using(banco).aggregate(mx=Max('said_sequ')).get('mx')
-        proximo_sequencial = (int(ultimo) + 1) if ultimo else 1
-
-        if valor_total is not None:
-            total_movimentacao = PedidoVendaService._to_decimal(valor_total, default='0.00').quantize(Decimal('0.01'))
-        else:
-            total_movimentacao = (valor_unitario * abs(quantidade)).quantize(Decimal('0.01'))
-        usuario_id = getattr(getattr(request, 'user', None), 'usua_codi', 1) if request is not None else 1
-        SaidasEstoque.objects.using(banco).create(
-            said_empr=pedido.pedi_empr,
-            said_fili=pedido.pedi_fili,
-            said_sequ=proximo_sequencial,
-            said_data=pedido.pedi_data,
-            said_prod=str(produto_codigo),
-            said_quan=abs(quantidade),
-            said_tota=total_movimentacao,
-            said_obse=base_obse,
-            said_usua=usuario_id,
-            said_enti=str(pedido.pedi_forn),
-        )
-
-        return {'sucesso': True, 'processado': True}
+        return MovimentoEstoqueLoteService.baixar_itens(pedido, [item_data], banco, request=request)[0]
 
     @staticmethod
     def _baixar_lote_agrupado(pedido, banco: str, prod_codi: str, lote_numero, quantidade: Decimal) -> dict:
@@ -194,103 +135,127 @@ class PedidoVendaService:
             return {'sucesso': False, 'erro': str(e)}
 
     @staticmethod
-    def _estornar_item(pedido, item, banco: str) -> dict:
-        try:
-            from Saidas_Estoque.models import SaidasEstoque
+    def _baixar_estoque_itens(pedido, itens_data: list, banco: str, request=None, origem: str = 'create') -> None:
+        """Baixa lotes e saídas de estoque de todos os itens do pedido em lote."""
+        itens_data = itens_data or []
+        codigos = MovimentoEstoqueLoteService.normalizar_codigos(
+            banco, pedido, [item_data.get('iped_prod') for item_data in itens_data]
+        )
 
-            produto_codigo = str(getattr(item, 'iped_prod', '') or '')
-            if not produto_codigo:
-                return {'sucesso': True, 'processado': False, 'motivo': 'Produto inválido'}
+        def _norm(item_data):
+            return codigos.get(str(item_data.get('iped_prod') or '').strip())
+
+        lotes_agrupados = {}
+        for item_data in itens_data:
+            lote_num = item_data.get('iped_lote_vend')
+            if lote_num is None or str(lote_num).strip() == '':
+                continue
+            prod_norm = _norm(item_data)
+            if not prod_norm:
+                continue
+            key = (prod_norm, str(lote_num).strip())
+            lotes_agrupados[key] = lotes_agrupados.get(key, Decimal('0.00')) + abs(
+                PedidoVendaService._to_decimal(item_data.get('iped_quan', 0), default='0.00')
+            )
 
-            base_obse = f"Saída automática - Pedido {pedido.pedi_nume}"
-            saidas = SaidasEstoque.objects.using(banco).filter(
-                said_empr=pedido.pedi_empr,
-                said_fili=pedido.pedi_fili,
-                said_prod=produto_codigo,
-                said_obse__exact=base_obse,
+        for (prod_norm, lote_num), qtd in lotes_agrupados.items():
+            r = PedidoVendaService._baixar_lote_agrupado(
+                pedido=pedido,
+                banco=banco,
+                prod_codi=prod_norm,
+                lote_numero=lote_num,
+                quantidade=qtd,
             )
-            if not saidas.exists():
-                return {'sucesso': True, 'processado': False, 'motivo': 'Item sem baixa para estornar'}
+            if not r.get('sucesso'):
+                raise ValueError(r.get('erro') or "Falha ao baixar lote")
 
-            processado = False
-            ultimo = SaidasEstoque.objects.using(banco).aggregate(mx=Max('said_sequ')).get('mx')
-            proximo_sequencial = (int(ultimo) + 1) if ultimo else 1
-            for saida in saidas:
-                SaidasEstoque.objects.using(banco).create(
-                    said_empr=pedido.pedi_empr,
-                    said_fili=pedido.pedi_fili,
-                    said_sequ=proximo_sequencial,
-                    said_data=getattr(saida, "said_data", None) or pedido.pedi_data,
-                    said_prod=str(getattr(saida, "said_prod", "") or produto_codigo),
-                    said_quan=Decimal(str(getattr(saida, "said_quan", 0) or 0)) * Decimal("-1"),
-                    said_tota=Decimal(str(getattr(saida, "said_tota", 0) or 0)) * Decimal("-1"),
-                    said_obse=f"{base_obse} - ESTORNO",
-                    said_usua=int(getattr(saida, "said_usua", 1) or 1),
-                    said_enti=str(getattr(saida, "said_enti", "") or pedido.pedi_forn),
+        itens_agrupados = {}
+        for item_data in itens_data:
+            prod_norm = _norm(item_data)
+            if not prod_norm:
+                continue
+            qtd = PedidoVendaService._to_decimal(item_data.get('iped_quan', 0), default='0.00')
+            unit = PedidoVendaService._to_decimal(item_data.get('iped_unit', 0), default='0.00')
+            total = (unit * abs(qtd)).quantize(Decimal('0.01'))
+
+            if prod_norm not in itens_agrupados:
+                itens_agrupados[prod_norm] = {
+                    'iped_prod': prod_norm,
+                    'iped_quan': Decimal('0.00'),
+                    'iped_tota': Decimal('0.00'),
+                }
+            itens_agrupados[prod_norm]['iped_quan'] += abs(qtd)
+            itens_agrupados[prod_norm]['iped_tota'] += total
+
+        itens = list(itens_agrupados.values())
+        try:
+            with transaction.atomic(using=banco):
+                resultados = MovimentoEstoqueLoteService.baixar_itens(pedido, itens, banco, request=request)
+        except Exception as e:
+            # Lote falhou: refaz item a item para que só o problemático fique sem baixa
+            PedidoVendaService.logger.warning(
+                "[PedidoService.%s] baixa em lote falhou pedido=%s err=%s; baixando item a item",
+                origem, getattr(pedido, 'pedi_nume', None), e
+            )
+            resultados = []
+            for item_dict in itens:
+                try:
+                    with transaction.atomic(using=banco):
+                        resultados.extend(
+                            MovimentoEstoqueLoteService.baixar_itens(pedido, [item_dict], banco, request=request)
+                        )
+                except Exception as erro_item:
+                    PedidoVendaService.logger.exception(
+                        "[PedidoService.%s] erro ao baixar item=%s pedido=%s",
+                        origem, item_dict.get('iped_prod'), getattr(pedido, 'pedi_nume', None)
+                    )
+                    resultados.append({'sucesso': False, 'erro': str(erro_item)})
+        for item_dict, r in zip(itens, resultados):
+            if not r.get('sucesso'):
+                PedidoVendaService.logger.warning(
+                    "[PedidoService.%s] item=%s não baixado: %s",
+                    origem, item_dict.get('iped_prod'), r.get('erro')
                 )
-                proximo_sequencial += 1
 
-                saida.said_obse = f"{base_obse} - REVERTIDA"
-                saida.save(using=banco, update_fields=["said_obse"])
-                processado = True
+    @staticmethod
+    def _estornar_item(pedido, item, banco: str) -> dict:
+        try:
+            produto_codigo = str(getattr(item, 'iped_prod', '') or '')
+            if not produto_codigo:
+                return {'sucesso': True, 'processado': False, 'motivo': 'Produto inválido'}
 
-            return {'sucesso': True, 'processado': processado}
+            processado = MovimentoEstoqueLoteService.estornar(pedido, banco, produto_codigo=produto_codigo)
+            if not processado:
+                return {'sucesso': True, 'processado': False, 'motivo': 'Item sem baixa para estornar'}
+            return {'sucesso': True, 'processado': True}
         except Exception as e:
             return {'sucesso': False, 'erro': f"Erro ao estornar item {getattr(item, 'iped_prod', None)}: {str(e)}"}
 
     @staticmethod
     def estornar_estoque_pedido(pedido, banco: str) -> dict:
-        from Saidas_Estoque.models import SaidasEstoque
-
         with transaction.atomic(using=banco):
-            base_obse = f"Saída automática - Pedido {pedido.pedi_nume}"
-            saidas = SaidasEstoque.objects.using(banco).filter(
-                said_empr=pedido.pedi_empr,
-                said_fili=pedido.pedi_fili,
-                said_obse__exact=base_obse,
-            )
-
-            if not saidas.exists():
+            processado = MovimentoEstoqueLoteService.estornar(pedido, banco)
+            if not processado:
                 return {'sucesso': True, 'processado': False, 'motivo': 'Pedido sem baixa de estoque para estornar'}
 
-            processado = False
-            ultimo = SaidasEstoque.objects.using(banco).aggregate(mx=Max('said_sequ')).get('mx')
-            proximo_sequencial = (int(ultimo) + 1) if ultimo else 1
-            for saida in saidas:
-                produto_codigo = PedidoVendaService._normalizar_codigo_produto(banco, pedido, getattr(saida, 'said_prod', ''))
-                if not produto_codigo:
-                    continue
-                SaidasEstoque.objects.using(banco).create(
-                    said_empr=pedido.pedi_empr,
-                    said_fili=pedido.pedi_fili,
-                    said_sequ=proximo_sequencial,
-                    said_data=getattr(saida, "said_data", None) or pedido.pedi_data,
-                    said_prod=str(getattr(saida, "said_prod", "") or produto_codigo),
-                    said_quan=Decimal(str(getattr(saida, "said_quan", 0) or 0)) * Decimal("-1"),
-                    said_tota=Decimal(str(getattr(saida, "said_tota", 0) or 0)) * Decimal("-1"),
-                    said_obse=f"{base_obse} - ESTORNO",
-                    said_usua=int(getattr(saida, "said_usua", 1) or 1),
-                    said_enti=str(getattr(saida, "said_enti", "") or pedido.pedi_forn),
-                )
-                proximo_sequencial += 1
-
-                saida.said_obse = f"{base_obse} - REVERTIDA"
-                saida.save(using=banco, update_fields=["said_obse"])
-                processado = True
-
             try:
                 from Produtos.models import Lote
 
+                itens_com_lote = [
+                    it for it in Itenspedidovenda.objects.using(banco).filter(
+                        iped_empr=pedido.pedi_empr,
+                        iped_fili=pedido.pedi_fili,
+                        iped_pedi=str(pedido.pedi_nume),
+                    ).values('iped_prod', 'iped_quan', 'iped_lote_vend')
+                    if it.get('iped_lote_vend') is not None and str(it.get('iped_lote_vend')).strip() != ''
+                ]
+                codigos = MovimentoEstoqueLoteService.normalizar_codigos(
+                    banco, pedido, [it.get('iped_prod') for it in itens_com_lote]
+                )
                 lotes_agrupados = {}
-                for it in Itenspedidovenda.objects.using(banco).filter(
-                    iped_empr=pedido.pedi_empr,
-                    iped_fili=pedido.pedi_fili,
-                    iped_pedi=str(pedido.pedi_nume),
-                ).values('iped_prod', 'iped_quan', 'iped_lote_vend'):
+                for it in itens_com_lote:
                     lote_num = it.get('iped_lote_vend')
-                    if lote_num is None or str(lote_num).strip() == '':
-                        continue
-                    prod_norm = PedidoVendaService._normalizar_codigo_produto(banco, pedido, it.get('iped_prod'))
+                    prod_norm = codigos.get(str(it.get('iped_prod') or '').strip())
                     if not prod_norm:
                         continue
                     key = (prod_norm, str(lote_num).strip())
@@ -328,24 +293,82 @@ class PedidoVendaService:
         return True
     @staticmethod
     def _proximo_pedido_numero(banco: str, pedi_empr: int, pedi_fili: int) -> int:
-        with connections[banco].cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT GREATEST(
-                    COALESCE((SELECT MAX(pedi_nume)::bigint FROM pedidosvenda), 0),
-                    COALESCE((
-                        SELECT MAX(NULLIF(regexp_replace(said_obse, '\\D', '', 'g'), '')::bigint)
-                        FROM saidasestoque
-                        WHERE said_empr = %s
-                          AND said_fili = %s
-                          AND said_obse LIKE 'Saída automática - Pedido %%'
-                    ), 0)
-                ) AS max_num
-                """,
-                [pedi_empr, pedi_fili],
+        return NumeracaoService.proximo(banco, 'pedido', pedi_empr, pedi_fili)
+
+    @staticmethod
+    def _gravar_itens(banco: str, pedido, itens_data: list, pedi_tipo_oper: str | None, origem: str = 'create') -> dict:
+        """
+        Grava os itens do pedido (inclusão, alteração e exclusão em lote) e
+        aplica o motor fiscal em cada um. Retorna os totais de calcular_totais_itens.
+        """
+        to_dec = PedidoVendaService._to_decimal
+        totais = calcular_totais_itens(
+            (to_dec(it.get('iped_quan', 0)), to_dec(it.get('iped_unit', 0)), to_dec(it.get('iped_desc', 0)))
+            for it in itens_data
+        )
+
+        itens = []
+        for idx, (item_data, subtotal_bruto, total_item) in enumerate(
+            zip(itens_data, totais['subtotais'], totais['totais']), start=1
+        ):
+            item_data_clean = item_data.copy()
+            item_data_clean.pop('iped_suto', None)
+            item_data_clean.pop('iped_tota', None)
+            itens.append(Itenspedidovenda(
+                iped_empr=pedido.pedi_empr,
+                iped_fili=pedido.pedi_fili,
+                iped_item=idx,
+                iped_pedi=str(pedido.pedi_nume),
+                iped_data=pedido.pedi_data,
+                iped_forn=pedido.pedi_forn,
+                iped_vend=pedido.pedi_vend,
+                iped_unli=subtotal_bruto,
+                iped_suto=subtotal_bruto,
+                iped_tota=total_item,
+                **item_data_clean,
+            ))
+
+        resumo = sincronizar_itens(Itenspedidovenda, banco, {
+            'iped_empr': pedido.pedi_empr,
+            'iped_fili': pedido.pedi_fili,
+            'iped_pedi': str(pedido.pedi_nume),
+        }, itens)
+        PedidoVendaService.logger.debug(
+            "[PedidoService.%s] itens pedido=%s %s", origem, getattr(pedido, 'pedi_nume', None), resumo
+        )
+
+        uf_origem = uf_destino = None
+        try:
+            uf_origem = pedido.get_uf_origem(banco)
+            uf_destino = getattr(pedido.cliente, 'enti_esta', None) or ''
+            motor = MotorFiscal(banco=banco)
+        except Exception as e:
+            PedidoVendaService.logger.exception(
+                "[PedidoService.%s] erro fiscal tipo=%s uf_origem=%s uf_destino=%s err=%s",
+                origem, pedi_tipo_oper, uf_origem, uf_destino, e
             )
-            max_num = cursor.fetchone()[0] or 0
-        return int(max_num) + 1 if max_num else 1
+            return totais
+
+        for item in itens:
+            try:
+                ctx = FiscalContexto(
+                    uf_origem=uf_origem or '',
+                    uf_destino=uf_destino or '',
+                    produto=item.produto,
+                    empresa_id=pedido.pedi_empr,
+                    filial_id=pedido.pedi_fili,
+                    banco=banco,
+                    regime=None,
+                )
+                pacote = motor.calcular_item(ctx=ctx, item=item, tipo_oper=pedi_tipo_oper or 'VENDA')
+                motor.aplicar_no_item(item, pacote)
+            except Exception as e:
+                PedidoVendaService.logger.exception(
+                    "[PedidoService.%s] erro fiscal item=%s tipo=%s uf_origem=%s uf_destino=%s err=%s",
+                    origem, item.iped_item, pedi_tipo_oper, uf_origem, uf_destino, e
+                )
+
+        return totais
 
     @staticmethod
     def create_pedido_venda(banco: str, pedido_data: dict, itens_data: list, pedi_tipo_oper: str = 'VENDA', request=None):
@@ -354,11 +377,13 @@ class PedidoVendaService:
             pedi_fili = int(pedido_data.get('pedi_fili'))
 
             numero = pedido_data.get('pedi_nume')
-            if numero is None or numero == "":
+            informado = numero is not None and numero != ""
+            if not informado:
                 numero = PedidoVendaService._proximo_pedido_numero(banco, pedi_empr, pedi_fili)
             try:
                 numero = int(numero)
             except Exception:
+                informado = False
                 numero = PedidoVendaService._proximo_pedido_numero(banco, pedi_empr, pedi_fili)
             pedido_existente = PedidoVenda.objects.using(banco).filter(
                 pedi_empr=pedi_empr,
@@ -375,86 +400,25 @@ class PedidoVendaService:
                     request=request,
                 )
 
-            while PedidoVenda.objects.using(banco).filter(pedi_nume=numero).exists():
-                numero += 1
+            if informado:
+                # Número vindo do cliente: se já pertence a outra empresa/filial, gera um novo
+                if PedidoVenda.objects.using(banco).filter(pedi_nume=numero).exists():
+                    numero = PedidoVendaService._proximo_pedido_numero(banco, pedi_empr, pedi_fili)
+                else:
+                    NumeracaoService.registrar_uso(banco, 'pedido', pedi_empr, pedi_fili, numero)
             pedido_data['pedi_nume'] = numero
 
             pedido_data.pop('tipo_oper', None)
             pedido = PedidoVenda.objects.using(banco).create(**pedido_data)
 
-            itens_criados = []
-            subtotal_sum = Decimal('0.00')
-            total_items_sum = Decimal('0.00')
-            any_item_discount = False
             PedidoVendaService.logger.debug(
                 "[PedidoService.create] Início: pedi_nume=%s pedi_desc=%s",
                 getattr(pedido, 'pedi_nume', None), pedido_data.get('pedi_desc')
             )
-            for idx, item_data in enumerate(itens_data, start=1):
-                iped_quan = PedidoVendaService._to_decimal(item_data.get('iped_quan', 0))
-                iped_unit = PedidoVendaService._to_decimal(item_data.get('iped_unit', 0))
-                iped_desc = PedidoVendaService._to_decimal(item_data.get('iped_desc', 0))
-
-                subtotal_bruto = calcular_subtotal_item_bruto(iped_quan, iped_unit)
-                total_item = calcular_total_item_com_desconto(iped_quan, iped_unit, iped_desc)
-
-                subtotal_sum += Decimal(str(subtotal_bruto))
-                total_items_sum += Decimal(str(total_item))
-                if iped_desc and iped_desc > 0:
-                    any_item_discount = True
-
-                item_data_clean = item_data.copy()
-                item_data_clean.pop('iped_suto', None)
-                item_data_clean.pop('iped_tota', None)
-
-                PedidoVendaService.logger.debug(
-                    "[PedidoService.create] Item %d: quan=%s unit=%s desc=%s subtotal=%s total=%s",
-                    idx, iped_quan, iped_unit, iped_desc, subtotal_bruto, total_item
-                )
-
-                item = Itenspedidovenda.objects.using(banco).create(
-                    iped_empr=pedido.pedi_empr,
-                    iped_fili=pedido.pedi_fili,
-                    iped_item=idx,
-                    iped_pedi=str(pedido.pedi_nume),
-                    iped_data=pedido.pedi_data,
-                    iped_forn=pedido.pedi_forn,
-                    iped_vend=pedido.pedi_vend,
-                    iped_unli=subtotal_bruto,
-                    iped_suto=subtotal_bruto,
-                    iped_tota=total_item,
-                    **item_data_clean,
-                )
-                try:
-                    uf_origem = pedido.get_uf_origem(banco)
-                    uf_destino = getattr(pedido.cliente, 'enti_esta', None) or ''
-
-                    motor = MotorFiscal(banco=banco)
-
-                    ctx = FiscalContexto(
-                        uf_origem=uf_origem or '',
-                        uf_destino=uf_destino or '',
-                        produto=item.produto,
-                        empresa_id=pedido.pedi_empr,
-                        filial_id=pedido.pedi_fili,
-                        banco=banco,
-                        regime=None,
-                    )
-
-                    pacote = motor.calcular_item(
-                        ctx=ctx,
-                        item=item,
-                        tipo_oper=pedi_tipo_oper or 'VENDA',
-                    )
-
-                    motor.aplicar_no_item(item, pacote)
-
-                except Exception as e:
-                    PedidoVendaService.logger.exception(
-                        "[PedidoService.create] erro fiscal item=%s tipo=%s uf_origem=%s uf_destino=%s err=%s",
-                        idx, pedi_tipo_oper, uf_origem, uf_destino, e
-                    )
-                itens_criados.append(item)
+            totais = PedidoVendaService._gravar_itens(banco, pedido, itens_data, pedi_tipo_oper, origem='create')
+            subtotal_sum = totais['subtotal']
+            total_items_sum = totais['total']
+            any_item_discount = totais['tem_desconto']
 
             pedido_desc_val = PedidoVendaService._to_decimal(pedido_data.get('pedi_desc', 0))
             if pedido_desc_val > 0 and any_item_discount:
@@ -496,62 +460,7 @@ class PedidoVendaService:
                 PedidoVendaService.logger.debug(
                     "[PedidoService.create] Iniciando baixa de %d itens", len(itens_data or [])
                 )
-                lotes_agrupados = {}
-                for item_data in (itens_data or []):
-                    prod_codi = item_data.get('iped_prod')
-                    lote_num = item_data.get('iped_lote_vend')
-                    if lote_num is None or str(lote_num).strip() == '':
-                        continue
-                    prod_norm = PedidoVendaService._normalizar_codigo_produto(banco, pedido, prod_codi)
-                    if not prod_norm:
-                        continue
-                    key = (prod_norm, str(lote_num).strip())
-                    lotes_agrupados[key] = lotes_agrupados.get(key, Decimal('0.00')) + abs(
-                        PedidoVendaService._to_decimal(item_data.get('iped_quan', 0), default='0.00')
-                    )
-
-                for (prod_norm, lote_num), qtd in lotes_agrupados.items():
-                    r = PedidoVendaService._baixar_lote_agrupado(
-                        pedido=pedido,
-                        banco=banco,
-                        prod_codi=prod_norm,
-                        lote_numero=lote_num,
-                        quantidade=qtd,
-                    )
-                    if not r.get('sucesso'):
-                        raise ValueError(r.get('erro') or "Falha ao baixar lote")
-
-                itens_agrupados = {}
-                for item_data in (itens_data or []):
-                    try:
-                        prod_norm = PedidoVendaService._normalizar_codigo_produto(banco, pedido, item_data.get('iped_prod'))
-                        if not prod_norm:
-                            continue
-                        qtd = PedidoVendaService._to_decimal(item_data.get('iped_quan', 0), default='0.00')
-                        unit = PedidoVendaService._to_decimal(item_data.get('iped_unit', 0), default='0.00')
-                        total = (unit * abs(qtd)).quantize(Decimal('0.01'))
-
-                        if prod_norm not in itens_agrupados:
-                            itens_agrupados[prod_norm] = {
-                                'iped_prod': prod_norm,
-                                'iped_quan': Decimal('0.00'),
-                                'iped_tota': Decimal('0.00'),
-                            }
-                        itens_agrupados[prod_norm]['iped_quan'] += abs(qtd)
-                        itens_agrupados[prod_norm]['iped_tota'] += total
-                    except Exception as e:
-                        PedidoVendaService.logger.exception(
-                            "[PedidoService.create] erro ao baixar item=%s err=%s",
-                            item_data.get('iped_prod', None), e
-                        )
-                for item_data_dict in itens_agrupados.values():
-                    try:
-                        PedidoVendaService._baixar_item_data(pedido, item_data_dict, banco, request=request)
-                    except Exception as e:
-                        PedidoVendaService.logger.exception(
-                            "[PedidoService.create] erro ao baixar item=%s err=%s",
-                            item_data_dict.get('iped_prod', None), e
-                        )
+                PedidoVendaService._baixar_estoque_itens(pedido, itens_data, banco, request=request, origem='create')
 
             PedidoVendaService.logger.debug(
                 "[PedidoService.create] Fim: pedi_nume=%s subtotal=%s desc=%s total=%s",
@@ -582,80 +491,14 @@ class PedidoVendaService:
                 setattr(pedido, attr, value)
             pedido.save(using=banco)
 
-            Itenspedidovenda.objects.using(banco).filter(
-                iped_empr=pedido.pedi_empr,
-                iped_fili=pedido.pedi_fili,
-                iped_pedi=str(pedido.pedi_nume),
-            ).delete()
-
-            itens_criados = []
-            subtotal_sum = Decimal('0.00')
-            total_items_sum = Decimal('0.00')
-            any_item_discount = False
-
             PedidoVendaService.logger.debug(
                 "[PedidoService.update] Início: pedi_nume=%s pedi_desc_update=%s",
                 getattr(pedido, 'pedi_nume', None), pedido_updates.get('pedi_desc')
             )
-
-            for idx, item_data in enumerate(itens_data, start=1):
-                iped_quan = PedidoVendaService._to_decimal(item_data.get('iped_quan', 0))
-                iped_unit = PedidoVendaService._to_decimal(item_data.get('iped_unit', 0))
-                iped_desc = PedidoVendaService._to_decimal(item_data.get('iped_desc', 0))
-
-                subtotal_bruto = calcular_subtotal_item_bruto(iped_quan, iped_unit)
-                total_item = calcular_total_item_com_desconto(iped_quan, iped_unit, iped_desc)
-
-                subtotal_sum += Decimal(str(subtotal_bruto))
-                total_items_sum += Decimal(str(total_item))
-                if iped_desc and iped_desc > 0:
-                    any_item_discount = True
-
-                item_data_clean = item_data.copy()
-                item_data_clean.pop('iped_suto', None)
-                item_data_clean.pop('iped_tota', None)
-
-                PedidoVendaService.logger.debug(
-                    "[PedidoService.update] Item %d: quan=%s unit=%s desc=%s subtotal=%s total=%s",
-                    idx, iped_quan, iped_unit, iped_desc, subtotal_bruto, total_item
-                )
-
-                item = Itenspedidovenda.objects.using(banco).create(
-                    iped_empr=pedido.pedi_empr,
-                    iped_fili=pedido.pedi_fili,
-                    iped_item=idx,
-                    iped_pedi=str(pedido.pedi_nume),
-                    iped_data=pedido.pedi_data,
-                    iped_forn=pedido.pedi_forn,
-                    iped_vend=pedido.pedi_vend,
-                    iped_unli=subtotal_bruto,
-                    iped_suto=subtotal_bruto,
-                    iped_tota=total_item,
-                    **item_data_clean,
-                )
-
-                try:
-                    uf_origem = pedido.get_uf_origem(banco)
-                    uf_destino = getattr(pedido.cliente, 'enti_esta', None) or ''
-                    motor = MotorFiscal(banco=banco)
-                    ctx = FiscalContexto(
-                        uf_origem=uf_origem or '',
-                        uf_destino=uf_destino or '',
-                        produto=item.produto,
-                        empresa_id=pedido.pedi_empr,
-                        filial_id=pedido.pedi_fili,
-                        banco=banco,
-                        regime=None,
-                    )
-                    pacote = motor.calcular_item(ctx=ctx, item=item, tipo_oper=pedi_tipo_oper or 'VENDA')
-                    motor.aplicar_no_item(item, pacote)
-                except Exception as e:
-                    PedidoVendaService.logger.exception(
-                        "[PedidoService.update] erro fiscal item=%s tipo=%s err=%s",
-                        idx, pedi_tipo_oper, e
-                    )
-
-                itens_criados.append(item)
+            totais = PedidoVendaService._gravar_itens(banco, pedido, itens_data, pedi_tipo_oper, origem='update')
+            subtotal_sum = totais['subtotal']
+            total_items_sum = totais['total']
+            any_item_discount = totais['tem_desconto']
 
             pedido_desc_val = PedidoVendaService._to_decimal(pedido_updates.get('pedi_desc', 0))
             if pedido_desc_val > 0 and any_item_discount:
@@ -681,62 +524,7 @@ class PedidoVendaService:
                     )
             elif deve_baixar:
                 if not PedidoVendaService.pedido_tem_baixa(banco, pedido):
-                    lotes_agrupados = {}
-                    for item_data in (itens_data or []):
-                        prod_codi = item_data.get('iped_prod')
-                        lote_num = item_data.get('iped_lote_vend')
-                        if lote_num is None or str(lote_num).strip() == '':
-                            continue
-                        prod_norm = PedidoVendaService._normalizar_codigo_produto(banco, pedido, prod_codi)
-                        if not prod_norm:
-                            continue
-                        key = (prod_norm, str(lote_num).strip())
-                        lotes_agrupados[key] = lotes_agrupados.get(key, Decimal('0.00')) + abs(
-                            PedidoVendaService._to_decimal(item_data.get('iped_quan', 0), default='0.00')
-                        )
-
-                    for (prod_norm, lote_num), qtd in lotes_agrupados.items():
-                        r = PedidoVendaService._baixar_lote_agrupado(
-                            pedido=pedido,
-                            banco=banco,
-                            prod_codi=prod_norm,
-                            lote_numero=lote_num,
-                            quantidade=qtd,
-                        )
-                        if not r.get('sucesso'):
-                            raise ValueError(r.get('erro') or "Falha ao baixar lote")
-
-                    itens_agrupados = {}
-                    for item_data in (itens_data or []):
-                        try:
-                            prod_norm = PedidoVendaService._normalizar_codigo_produto(banco, pedido, item_data.get('iped_prod'))
-                            if not prod_norm:
-                                continue
-                            qtd = PedidoVendaService._to_decimal(item_data.get('iped_quan', 0), default='0.00')
-                            unit = PedidoVendaService._to_decimal(item_data.get('iped_unit', 0), default='0.00')
-                            total = (unit * abs(qtd)).quantize(Decimal('0.01'))
-
-                            if prod_norm not in itens_agrupados:
-                                itens_agrupados[prod_norm] = {
-                                    'iped_prod': prod_norm,
-                                    'iped_quan': Decimal('0.00'),
-                                    'iped_tota': Decimal('0.00'),
-                                }
-                            itens_agrupados[prod_norm]['iped_quan'] += abs(qtd)
-                            itens_agrupados[prod_norm]['iped_tota'] += total
-                        except Exception as e:
-                            PedidoVendaService.logger.exception(
-                                "[PedidoService.update] erro ao baixar item=%s err=%s",
-                                item_data.get('iped_prod', None), e
-                            )
-                    for item_dict in itens_agrupados.values():
-                        try:
-                            PedidoVendaService._baixar_item_data(pedido, item_dict, banco, request=request)
-                        except Exception as e:
-                            PedidoVendaService.logger.exception(
-                                "[PedidoService.update] erro ao baixar item=%s err=%s",
-                                item_dict.get('iped_prod', None), e
-                            )
+                    PedidoVendaService._baixar_estoque_itens(pedido, itens_data, banco, request=request, origem='update')
 
             pedido.save(using=banco)
 
@@ -763,35 +551,59 @@ class PedidoVendaService:
 class proximo_pedido_numero:
     @staticmethod
     def get_proximo_numero(banco: str, pedi_empr: int = None, pedi_fili: int = None):
-        qs = PedidoVenda.objects.using(banco).all()
-        if pedi_empr is not None:
-            qs = qs.filter(pedi_empr=pedi_empr)
-        if pedi_fili is not None:
-            qs = qs.filter(pedi_fili=pedi_fili)
-        ultimo_pedido = qs.order_by('-pedi_nume').first()
-        return (ultimo_pedido.pedi_nume + 1) if ultimo_pedido else 1
+        return NumeracaoService.proximo(banco, 'pedido', pedi_empr, pedi_fili)
 
 class OrcamentoService:
     logger = logging.getLogger(__name__)
 
     @staticmethod
     def _proximo_orcamento_numero(banco: str, pedi_empr: int, pedi_fili: int) -> int:
-        from Orcamentos.models import Orcamentos
-        ultimo = (
-            Orcamentos.objects.using(banco)
-            .filter(pedi_empr=pedi_empr, pedi_fili=pedi_fili)
-            .order_by('-pedi_nume')
-            .first()
+        return NumeracaoService.proximo(banco, 'orcamento', pedi_empr, pedi_fili)
+
+    @staticmethod
+    def _gravar_itens(banco: str, orcamento, itens_data: list) -> dict:
+        """Grava os itens do orçamento em lote. Retorna os totais de calcular_totais_itens."""
+        from Orcamentos.models import ItensOrcamento
+
+        to_dec = PedidoVendaService._to_decimal
+        totais = calcular_totais_itens(
+            (to_dec(it.get('iped_quan', 0)), to_dec(it.get('iped_unit', 0)), to_dec(it.get('iped_desc', 0)))
+            for it in itens_data
+        )
+
+        itens = []
+        for idx, (item, subtotal_bruto, total_item) in enumerate(
+            zip(itens_data, totais['subtotais'], totais['totais']), start=1
+        ):
+            clean_item = item.copy()
+            clean_item.pop('iped_suto', None)
+            clean_item.pop('iped_tota', None)
+            itens.append(ItensOrcamento(
+                iped_empr=orcamento.pedi_empr,
+                iped_fili=orcamento.pedi_fili,
+                iped_item=idx,
+                iped_pedi=str(orcamento.pedi_nume),
+                iped_data=orcamento.pedi_data,
+                iped_forn=getattr(orcamento, 'pedi_forn', None),
+                iped_suto=subtotal_bruto,
+                iped_tota=total_item,
+                **clean_item,
+            ))
+
+        resumo = sincronizar_itens(ItensOrcamento, banco, {
+            'iped_empr': orcamento.pedi_empr,
+            'iped_fili': orcamento.pedi_fili,
+            'iped_pedi': str(orcamento.pedi_nume),
+        }, itens)
+        OrcamentoService.logger.debug(
+            "[OrcamentoService] itens orcamento=%s %s", getattr(orcamento, 'pedi_nume', None), resumo
         )
-        proximo = (ultimo.pedi_nume + 1) if ultimo else 1
-        while Orcamentos.objects.using(banco).filter(pedi_nume=proximo).exists():
-            proximo += 1
-        return proximo
+        return totais
 
     @transaction.atomic
     @staticmethod
     def create_orcamento(banco: str, orcamento_data: dict, itens_data: list):
-        from Orcamentos.models import Orcamentos, ItensOrcamento
+        from Orcamentos.models import Orcamentos
 
         pedi_empr = int(orcamento_data.get('pedi_empr'))
         pedi_fili = int(orcamento_data.get('pedi_fili'))
@@ -800,37 +612,13 @@ class OrcamentoService:
             orcamento_data['pedi_nume'] = OrcamentoService._proximo_orcamento_numero(
                 banco, pedi_empr, pedi_fili
             )
+        else:
+            NumeracaoService.registrar_uso(banco, 'orcamento', pedi_empr, pedi_fili, orcamento_data['pedi_nume'])
 
         desconto_total = PedidoVendaService._to_decimal(orcamento_data.get('pedi_desc', 0))
         orc = Orcamentos.objects.using(banco).create(**{k: v for k, v in orcamento_data.items() if k != 'pedi_topr' and k != 'pedi_tota'})
 
-        subtotal_sum = Decimal('0.00')
-        itens_criados = []
-        for idx, item in enumerate(itens_data, start=1):
-            iped_quan = PedidoVendaService._to_decimal(item.get('iped_quan', 0))
-            iped_unit = PedidoVendaService._to_decimal(item.get('iped_unit', 0))
-            iped_desc = PedidoVendaService._to_decimal(item.get('iped_desc', 0))
-
-            subtotal_bruto = calcular_subtotal_item_bruto(iped_quan, iped_unit)
-            total_item = calcular_total_item_com_desconto(iped_quan, iped_unit, iped_desc)
-            subtotal_sum += Decimal(str(subtotal_bruto))
-
-            clean_item = item.copy()
-            clean_item.pop('iped_suto', None)
-            clean_item.pop('iped_tota', None)
-
-            created = ItensOrcamento.objects.using(banco).create(
-                iped_empr=orc.pedi_empr,
-                iped_fili=orc.pedi_fili,
-                iped_item=idx,
-                iped_pedi=str(orc.pedi_nume),
-                iped_data=orc.pedi_data,
-                iped_forn=getattr(orc, 'pedi_forn', None),
-                iped_suto=subtotal_bruto,
-                iped_tota=total_item,
-                **clean_item,
-            )
-            itens_criados.append(created)
+        subtotal_sum = OrcamentoService._gravar_itens(banco, orc, itens_data)['subtotal']
 
         orc.pedi_topr = subtotal_sum
         orc.pedi_desc = desconto_total
@@ -844,45 +632,13 @@ class OrcamentoService:
     @transaction.atomic
     @staticmethod
     def update_orcamento(banco: str, orcamento_obj, updates: dict, itens_data: list):
-        from Orcamentos.models import ItensOrcamento
-
         updates = updates.copy()
         desconto_total = PedidoVendaService._to_decimal(updates.pop('pedi_desc', getattr(orcamento_obj, 'pedi_desc', 0)))
         for attr, value in updates.items():
             setattr(orcamento_obj, attr, value)
         orcamento_obj.save(using=banco)
 
-        ItensOrcamento.objects.using(banco).filter(
-            iped_empr=orcamento_obj.pedi_empr,
-            iped_fili=orcamento_obj.pedi_fili,
-            iped_pedi=str(orcamento_obj.pedi_nume),
-        ).delete()
-
-        subtotal_sum = Decimal('0.00')
-        for idx, item in enumerate(itens_data, start=1):
-            iped_quan = PedidoVendaService._to_decimal(item.get('iped_quan', 0))
-            iped_unit = PedidoVendaService._to_decimal(item.get('iped_unit', 0))
-            iped_desc = PedidoVendaService._to_decimal(item.get('iped_desc', 0))
-
-            subtotal_bruto = calcular_subtotal_item_bruto(iped_quan, iped_unit)
-            total_item = calcular_total_item_com_desconto(iped_quan, iped_unit, iped_desc)
-            subtotal_sum += Decimal(str(subtotal_bruto))
-
-            clean_item = item.copy()
-            clean_item.pop('iped_suto', None)
-            clean_item.pop('iped_tota', None)
-
-            ItensOrcamento.objects.using(banco).create(
-                iped_empr=orcamento_obj.pedi_empr,
-                iped_fili=orcamento_obj.pedi_fili,
-                iped_item=idx,
-                iped_pedi=str(orcamento_obj.pedi_nume),
-                iped_data=orcamento_obj.pedi_data,
-                iped_forn=getattr(orcamento_obj, 'pedi_forn', None),
-                iped_suto=subtotal_bruto,
-                iped_tota=total_item,
-                **clean_item,
-            )
+        subtotal_sum = OrcamentoService._gravar_itens(banco, orcamento_obj, itens_data)['subtotal']
 
         orcamento_obj.pedi_topr = subtotal_sum
         orcamento_obj.pedi_desc = desconto_total
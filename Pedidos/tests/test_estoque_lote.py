@@ -0,0 +1,113 @@
+import datetime
+from contextlib import nullcontext
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from Pedidos.services import estoque_lote
+from Pedidos.services.estoque_lote import MovimentoEstoqueLoteService
+from Pedidos.services.pedido_service import PedidoVendaService
+from Produtos.models import SaldoProduto
+from Saidas_Estoque.models import SaidasEstoque
+
+
+def _atomic(using=None):
+    return nullcontext()
+
+
+class TestMovimentoEstoqueLote(SimpleTestCase):
+    def setUp(self):
+        self.pedido = SimpleNamespace(
+            pedi_nume=55, pedi_empr=1, pedi_fili=1, pedi_forn=9, pedi_data=datetime.date(2024, 5, 1)
+        )
+        self.cursor = mock.MagicMock()
+        self.cursor.fetchone.return_value = (100,)
+        conexao = mock.MagicMock()
+        conexao.cursor.return_value.__enter__.return_value = self.cursor
+        for patcher in (
+            mock.patch.object(estoque_lote, "connections", {"t": conexao}),
+            mock.patch.object(estoque_lote.transaction, "atomic", side_effect=_atomic),
+            mock.patch.object(SaidasEstoque, "objects"),
+            mock.patch.object(SaldoProduto, "objects"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_baixa_em_lote_com_bloco_sob_trava(self):
+        SaidasEstoque.objects.using.return_value.filter.return_value.values_list.return_value = ["C"]
+        SaldoProduto.objects.using.return_value.filter.return_value.values_list.return_value = [
+            ("A", Decimal("10")), ("D", Decimal("1")), ("E", Decimal("9")),
+        ]
+        itens = [
+            {"iped_prod": "A", "iped_quan": "2", "iped_unit": "5"},
+            {"iped_prod": "B", "iped_quan": 0, "iped_unit": 1},
+            {"iped_prod": "C", "iped_quan": 1, "iped_unit": 1},
+            {"iped_prod": "D", "iped_quan": 3, "iped_unit": 1},
+            {"iped_prod": "E", "iped_quan": "1,5", "iped_tota": "7"},
+        ]
+        with mock.patch.object(MovimentoEstoqueLoteService, "normalizar_codigos",
+                               return_value={c: c for c in "ABCDE"}):
+            resultados = MovimentoEstoqueLoteService.baixar_itens(self.pedido, itens, "t")
+
+        self.assertEqual([r.get("processado") for r in resultados], [True, False, False, None, True])
+        self.assertEqual(resultados[3], {"sucesso": False, "erro": "Produto D sem estoque suficiente"})
+
+        comandos = [c.args[0] for c in self.cursor.execute.call_args_list]
+        self.assertIn("pg_advisory_xact_lock", comandos[0])
+        self.assertIn("MAX(said_sequ)", comandos[1])
+        novas = SaidasEstoque.objects.using.return_value.bulk_create.call_args.args[0]
+        self.assertEqual([(s.said_sequ, s.said_prod, s.said_quan, s.said_tota) for s in novas], [
+            (101, "A", Decimal("2"), Decimal("10.00")),
+            (102, "E", Decimal("1.5"), Decimal("7.00")),
+        ])
+
+    def test_estorno_gera_contrapartidas_e_marca_revertidas(self):
+        saidas = [
+            SaidasEstoque(said_sequ=7, said_prod="A", said_quan=Decimal("2"), said_tota=Decimal("10"),
+                          said_usua=3, said_enti="9", said_data=datetime.date(2024, 5, 1)),
+            SaidasEstoque(said_sequ=8, said_prod="B", said_quan=Decimal("1"), said_tota=Decimal("4"),
+                          said_usua=3, said_enti="9", said_data=datetime.date(2024, 5, 1)),
+        ]
+        revertidas = mock.MagicMock()
+        SaidasEstoque.objects.using.return_value.filter.side_effect = [saidas, revertidas]
+
+        self.assertTrue(MovimentoEstoqueLoteService.estornar(self.pedido, "t"))
+
+        estornos = SaidasEstoque.objects.using.return_value.bulk_create.call_args.args[0]
+        self.assertEqual([(s.said_sequ, s.said_prod, s.said_quan) for s in estornos], [
+            (101, "A", Decimal("-2")), (102, "B", Decimal("-1")),
+        ])
+        self.assertTrue(all(s.said_obse == "Saída automática - Pedido 55 - ESTORNO" for s in estornos))
+        SaidasEstoque.objects.using.return_value.filter.assert_called_with(said_sequ__in=[7, 8])
+        revertidas.update.assert_called_once_with(
+            said_obse="Saída automática - Pedido 55 - REVERTIDA"
+        )
+
+    def test_estorno_sem_saidas(self):
+        SaidasEstoque.objects.using.return_value.filter.return_value = []
+        self.assertFalse(MovimentoEstoqueLoteService.estornar(self.pedido, "t"))
+        SaidasEstoque.objects.using.return_value.bulk_create.assert_not_called()
+
+
+class TestBaixaEstoqueItens(SimpleTestCase):
+    @mock.patch("Pedidos.services.pedido_service.transaction.atomic", side_effect=_atomic)
+    def test_falha_do_lote_fica_restrita_ao_item(self, atomic):
+        pedido = SimpleNamespace(pedi_nume=1, pedi_empr=1, pedi_fili=1)
+        chamadas = []
+
+        def baixar(pedido, itens, banco, request=None):
+            chamadas.append([i["iped_prod"] for i in itens])
+            if len(itens) > 1 or itens[0]["iped_prod"] == "B":
+                raise RuntimeError("falha no banco")
+            return [{"sucesso": True, "processado": True}]
+
+        itens = [{"iped_prod": "A", "iped_quan": 1, "iped_unit": 1}, {"iped_prod": "B", "iped_quan": 1, "iped_unit": 1}]
+        with mock.patch.object(MovimentoEstoqueLoteService, "normalizar_codigos", return_value={"A": "A", "B": "B"}), \
+                mock.patch.object(MovimentoEstoqueLoteService, "baixar_itens", side_effect=baixar), \
+                self.assertLogs("Pedidos.services.pedido_service", level="WARNING") as logs:
+            PedidoVendaService._baixar_estoque_itens(pedido, itens, "t")
+
+        self.assertEqual(chamadas, [["A", "B"], ["A"], ["B"]])
+        self.assertTrue(any("item=B" in linha for linha in logs.output))
@@ -1,6 +1,7 @@
 from decimal import Decimal
 from django.db import transaction
 
+from core.numeracao import NumeracaoService
 from Pisos.models import Orcamentopisos, Itensorcapisos
 from Pisos.services.utils_service import parse_decimal, arredondar
 from Pisos.services.cliente_service import ClienteEnderecoService
@@ -29,17 +30,7 @@ class OrcamentoCriarService:
             return orcamento
 
     def _criar_orcamento(self, *, banco, dados):
-        ultimo = (
-            Orcamentopisos.objects.using(banco)
-            .filter(
-                orca_empr=dados["orca_empr"],
-                orca_fili=dados["orca_fili"],
-            )
-            .order_by("-orca_nume")
-            .first()
-        )
-
-        proximo_numero = (ultimo.orca_nume + 1) if ultimo else 1
+        proximo_numero = NumeracaoService.proximo(banco, "orcamento_pisos", dados["orca_empr"], dados["orca_fili"])
 
         dados_orcamento = dict(dados)
         dados_orcamento.pop("itens_input", None)
@@ -1,3 +1,4 @@
+from core.numeracao import NumeracaoService
 from Pisos.models import Orcamentopisos, Pedidospisos, Itensorcapisos, Itenspedidospisos
 
 
@@ -13,14 +14,7 @@ class OrcamentoExportarPedidoService:
         if orcamento.orca_stat == 2:
             raise ValueError("Orçamento já exportado")
 
-        ultimo = (
-            Pedidospisos.objects.using(banco)
-            .filter(pedi_empr=empresa, pedi_fili=filial)
-            .order_by("-pedi_nume")
-            .first()
-        )
-
-        proximo = (ultimo.pedi_nume + 1) if ultimo else 1
+        proximo = NumeracaoService.proximo(banco, "pedido_pisos", empresa, filial)
 
         pedido = Pedidospisos.objects.using(banco).create(
             pedi_empr=orcamento.orca_empr,
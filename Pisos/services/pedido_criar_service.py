@@ -1,6 +1,7 @@
 from decimal import Decimal
 from django.db import transaction
 
+from core.numeracao import NumeracaoService
 from Pisos.models import Pedidospisos, Itenspedidospisos
 from Pisos.services.utils_service import parse_decimal, arredondar
 from Pisos.services.cliente_service import ClienteEnderecoService
@@ -29,17 +30,7 @@ class PedidoCriarService:
             return pedido
 
     def _criar_pedido(self, *, banco, dados):
-        ultimo = (
-            Pedidospisos.objects.using(banco)
-            .filter(
-                pedi_empr=dados["pedi_empr"],
-                pedi_fili=dados["pedi_fili"],
-            )
-            .order_by("-pedi_nume")
-            .first()
-        )
-
-        proximo_numero = (ultimo.pedi_nume + 1) if ultimo else 1
+        proximo_numero = NumeracaoService.proximo(banco, "pedido_pisos", dados["pedi_empr"], dados["pedi_fili"])
 
         dados_pedido = dict(dados)
         dados_pedido.pop("itens_input", None)
@@ -1,6 +1,7 @@
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.exceptions import ValidationError as DRFValidationError
 
+from core.numeracao import NumeracaoService
 from Pisos.models import Pedidospisos
 from Pisos.serializers import PedidospisosSerializer, OrcamentopisosSerializer
 
@@ -32,8 +33,7 @@ def exportar_orcamento_para_pedido(banco, empresa, filial, numero):
     orcamento = Orcamentopisos.objects.using(banco).get(orca_empr=empresa, orca_fili=filial, orca_nume=numero)
     if orcamento.orca_stat == 2:
         raise ValueError("Orçamento já exportado")
-    ultimo = Pedidospisos.objects.using(banco).filter(pedi_empr=empresa, pedi_fili=filial).order_by("-pedi_nume").first()
-    prox = (ultimo.pedi_nume + 1) if ultimo else 1
+    prox = NumeracaoService.proximo(banco, "pedido_pisos", empresa, filial)
 
     dados_pedido = {
         "pedi_empr": orcamento.orca_empr,
@@ -16,6 +16,8 @@ logger = logging.getLogger(__name__)
 
 from core.utils import get_licenca_db_config
 from core.middleware import get_licenca_slug
+from midias.servico import TAMANHOS_MINIATURA, anotar as anotar_midia, servir as servir_midia
+from ...servicos.catalogo_servico import CatalogoProdutoService
 from django.db.models import Subquery, OuterRef, DecimalField, Value as V, IntegerField
 from django.db.models.functions import Coalesce, Cast
 
@@ -211,6 +213,16 @@ class ProdutoListView(DBAndSlugMixin, ListView):
             qs = qs.filter(prod_nome__icontains=prod_nome)
         if prod_codi:
             qs = qs.filter(prod_codi__icontains=prod_codi)
+        # A grade só precisa saber se há foto e da versão para a URL; o blob vem por /foto/
+        qs = anotar_midia(qs.defer('prod_foto'), 'produto', prefixo='foto')
+        catalogo = CatalogoProdutoService.anotar(qs, self.db_alias, self.empresa_id, self.filial_id, {
+            'saldo_estoque': 'cata_sald',
+            'preco_vista': 'cata_avis',
+            'preco_prazo': 'cata_praz',
+            'preco_custo': 'cata_cuge',
+        })
+        if catalogo is not None:
+            return catalogo.order_by('prod_empr', 'prod_codi')
         # Anotar saldo de estoque via subquery (por empresa/filial quando disponíveis)
         saldo_qs = SaldoProduto.objects.using(self.db_alias).filter(
             produto_codigo=OuterRef('pk')
@@ -276,14 +288,19 @@ class ProdutoListView(DBAndSlugMixin, ListView):
         except Exception:
             fil_int = None
 
-        produtos = ctx.get('page_obj').object_list if ctx.get('page_obj') else ctx.get('produtos', [])
+        produtos = list(ctx.get('page_obj').object_list if ctx.get('page_obj') else ctx.get('produtos', []))
+        precos_qs = Tabelaprecos.objects.using(self.db_alias).filter(
+            tabe_prod__in=[p.prod_codi for p in produtos]
+        )
+        if emp_int is not None:
+            precos_qs = precos_qs.filter(tabe_empr=emp_int)
+        if fil_int is not None:
+            precos_qs = precos_qs.filter(tabe_fili=fil_int)
+        precos_por_produto = {}
+        for preco in precos_qs:
+            precos_por_produto.setdefault(preco.tabe_prod, []).append(preco)
         for p in produtos:
-            precos_qs = Tabelaprecos.objects.using(self.db_alias).filter(tabe_prod=p.prod_codi)
-            if emp_int is not None:
-                precos_qs = precos_qs.filter(tabe_empr=emp_int)
-            if fil_int is not None:
-                precos_qs = precos_qs.filter(tabe_fili=fil_int)
-            p.tabelaprecos_set = _ManagerLike(list(precos_qs))
+            p.tabelaprecos_set = _ManagerLike(precos_por_produto.get(p.prod_codi, []))
         return ctx
 
 
@@ -1625,37 +1642,45 @@ class ExportarProdutosView(DBAndSlugMixin, View):
             prod_codi_int=Cast('prod_codi', IntegerField())
         )
 
-        # Preços
-        preco_qs = Tabelaprecos.objects.using(self.db_alias).filter(
-            tabe_prod=OuterRef('prod_codi')
-        )
-
-        if self.empresa_id:
-            try:
-                preco_qs = preco_qs.filter(tabe_empr=int(self.empresa_id))
-            except Exception:
-                pass
-
-        if self.filial_id:
-            try:
-                preco_qs = preco_qs.filter(tabe_fili=int(self.filial_id))
-            except Exception:
-                pass
+        catalogo = CatalogoProdutoService.anotar(qs, self.db_alias, self.empresa_id, self.filial_id, {
+            'preco_vista': 'cata_avis',
+            'preco_prazo': 'cata_praz',
+            'preco_custo': 'cata_cuge',
+        }, zerar_nulos=('preco_vista', 'preco_prazo', 'preco_custo'))
+        if catalogo is not None:
+            qs = catalogo.order_by('prod_empr', 'prod_codi_int')
+        else:
+            # Preços
+            preco_qs = Tabelaprecos.objects.using(self.db_alias).filter(
+                tabe_prod=OuterRef('prod_codi')
+            )
 
-        qs = qs.annotate(
-            preco_vista=Coalesce(
-                Subquery(preco_qs.values('tabe_avis')[:1], output_field=DecimalField()),
-                0
-            ),
-            preco_prazo=Coalesce(
-                Subquery(preco_qs.values('tabe_praz')[:1], output_field=DecimalField()),
-                0
-            ),
-            preco_custo=Coalesce(
-                Subquery(preco_qs.values('tabe_cuge')[:1], output_field=DecimalField()),
-                0
-            ),
-        ).order_by('prod_empr', 'prod_codi_int')
+            if self.empresa_id:
+                try:
+                    preco_qs = preco_qs.filter(tabe_empr=int(self.empresa_id))
+                except Exception:
+                    pass
+
+            if self.filial_id:
+                try:
+                    preco_qs = preco_qs.filter(tabe_fili=int(self.filial_id))
+                except Exception:
+                    pass
+
+            qs = qs.annotate(
+                preco_vista=Coalesce(
+                    Subquery(preco_qs.values('tabe_avis')[:1], output_field=DecimalField()),
+                    0
+                ),
+                preco_prazo=Coalesce(
+                    Subquery(preco_qs.values('tabe_praz')[:1], output_field=DecimalField()),
+                    0
+                ),
+                preco_custo=Coalesce(
+                    Subquery(preco_qs.values('tabe_cuge')[:1], output_field=DecimalField()),
+                    0
+                ),
+            ).order_by('prod_empr', 'prod_codi_int')
 
         wb = Workbook()
         ws = wb.active
@@ -1737,15 +1762,21 @@ class ProdutoFotoView(DBAndSlugMixin, View):
         qs = Produtos.objects.using(self.db_alias).filter(prod_codi=prod_codi)
         if self.empresa_id:
             qs = qs.filter(prod_empr=str(self.empresa_id))
-        produto = qs.order_by('prod_empr').first()
-        if not produto:
+        # Só a chave: o blob é lido (uma vez) pelo serviço de mídias, e nem isso se o ETag confere
+        empresa = qs.order_by('prod_empr').values_list('prod_empr', flat=True).first()
+        if empresa is None:
             raise Http404('Produto não encontrado')
 
-        foto = produto.prod_foto
-        if not foto:
+        tamanho = request.GET.get('tam')
+        tamanho = int(tamanho) if tamanho and tamanho.isdigit() and int(tamanho) in TAMANHOS_MINIATURA else None
+        resposta = servir_midia(
+            request, self.db_alias, 'produto',
+            {'prod_empr': empresa, 'prod_codi': prod_codi}, tamanho=tamanho,
+        )
+        if resposta is None:
             # Sem foto, retornar 404 para que o template use placeholder
             raise Http404('Foto não disponível')
-        return HttpResponse(bytes(foto), content_type='image/jpeg')
+        return resposta
 
 
 
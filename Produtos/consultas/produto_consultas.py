@@ -1,77 +1,56 @@
 from django.db.models import Subquery, OuterRef, DecimalField, Value as V, Case, When, BigIntegerField, CharField, Q
 from django.db.models.functions import Coalesce, Cast
 from ..models import Produtos, SaldoProduto, Tabelaprecos
+from ..servicos.busca_servico import BuscaProdutoService
+from ..servicos.catalogo_servico import CatalogoProdutoService
 
 def listar_produtos(banco, empresa_id=None, filial_id=None, q=None, marca_nome=None, saldo_filter=None, limit=None):
     """
     Retorna queryset de produtos com saldos e preços anotados.
     Centraliza a lógica complexa de subqueries.
+    Com os índices de busca criados (indexar_busca_produtos) o termo ``q`` é
+    buscado por código, prefixo, palavras e semelhança, ordenado por relevância.
     """
     if not banco:
         return Produtos.objects.none()
 
-    queryset = Produtos.objects.using(banco)
+    indexado = BuscaProdutoService.indice_disponivel(banco)
 
-    # Subqueries
-    saldo_qs = SaldoProduto.objects.using(banco).filter(
-        produto_codigo=OuterRef('pk')
-    )
-    if empresa_id:
-        saldo_qs = saldo_qs.filter(empresa=empresa_id)
-    if filial_id:
-        saldo_qs = saldo_qs.filter(filial=filial_id)
-
-    saldo_subquery = Subquery(
-        saldo_qs.values('saldo_estoque')[:1],
-        output_field=DecimalField()
-    )
-    
-    # Preços
-    preco_base_qs = Tabelaprecos.objects.using(banco).filter(
-        tabe_prod=OuterRef('prod_codi'),
-        tabe_empr=OuterRef('prod_empr')
-    ).exclude(
-        tabe_entr__year__lt=1900
-    ).exclude(
-        tabe_entr__year__gt=2100
-    )
-
-    preco_vista_subquery = Subquery(
-        preco_base_qs.values('tabe_avis')[:1],
-        output_field=DecimalField()
-    )
-
-    preco_normal_subquery = Subquery(
-        preco_base_qs.values('tabe_prco')[:1],
-        output_field=DecimalField()
-    )
+    queryset = Produtos.objects.using(banco)
 
-    url_imagem = Subquery(
-        Produtos.objects.using(banco).filter(
-            prod_codi=OuterRef('prod_codi')
-        ).values('prod_url')[:1],
-        output_field=CharField()
-    )
+    # Saldo e preços do catálogo (um LEFT JOIN); sem catálogo, subqueries por linha
+    catalogo = CatalogoProdutoService.anotar(queryset, banco, empresa_id, filial_id, {
+        'saldo_estoque': 'cata_sald',
+        'prod_preco_vista': 'cata_avis',
+        'prod_preco_normal': 'cata_prco',
+    }, zerar_nulos=('prod_preco_vista', 'prod_preco_normal'))
+    if catalogo is not None:
+        queryset = catalogo
+    else:
+        queryset = _anotar_saldo_precos(queryset, banco, empresa_id, filial_id)
 
-    # Annotate
     queryset = queryset.annotate(
-        saldo_estoque=Coalesce(saldo_subquery, V(0), output_field=DecimalField()),
-        prod_preco_vista=Coalesce(preco_vista_subquery, V(0), output_field=DecimalField()),
-        prod_preco_normal=Coalesce(preco_normal_subquery, V(0), output_field=DecimalField()),
         prod_coba_str=Coalesce(Cast('prod_coba', CharField()), V('')),
-        prod_url_img=Coalesce(url_imagem, V('')),
-        prod_codi_int=Case(
-            When(prod_codi__regex=r'^\d+$', then=Cast('prod_codi', BigIntegerField())),
-            default=V(None),
-            output_field=BigIntegerField()
-        )
+        prod_url_img=Coalesce('prod_url', V('')),
     )
+    if indexado:
+        queryset = BuscaProdutoService.aplicar_ordem_codigo(queryset)
+    else:
+        queryset = queryset.annotate(
+            prod_codi_int=Case(
+                When(prod_codi__regex=r'^\d+$', then=Cast('prod_codi', BigIntegerField())),
+                default=V(None),
+                output_field=BigIntegerField()
+            )
+        )
 
     # Filtros
     if empresa_id:
         queryset = queryset.filter(prod_empr=empresa_id)
 
-    if q:
+    if q and indexado:
+        queryset = BuscaProdutoService.aplicar_busca(queryset, q)
+    elif q:
         queryset = queryset.filter(
             Q(prod_nome__icontains=q) |
             Q(prod_coba_str__exact=q) |
@@ -96,7 +75,10 @@ def listar_produtos(banco, empresa_id=None, filial_id=None, q=None, marca_nome=N
         elif saldo_filter == 'sem':
             queryset = queryset.filter(saldo_estoque=0)
     
-    queryset = queryset.order_by('prod_empr', 'prod_codi_int', 'prod_codi')
+    if q and indexado:
+        queryset = queryset.order_by('busca_rank', '-busca_simi', 'prod_empr', 'prod_codi_int', 'prod_codi')
+    else:
+        queryset = queryset.order_by('prod_empr', 'prod_codi_int', 'prod_codi')
 
     if limit:
         queryset = queryset[:limit]
@@ -112,3 +94,48 @@ def buscar_produto_por_codigo(banco, empresa_id, codigo):
         prod_empr=empresa_id,
         prod_codi=codigo
     ).first()
+
+
+def _anotar_saldo_precos(queryset, banco, empresa_id, filial_id):
+    """Saldo e preços por subquery, para bases sem catalogoprodutos."""
+    saldo_qs = SaldoProduto.objects.using(banco).filter(
+        produto_codigo=OuterRef('pk')
+    )
+    if empresa_id:
+        saldo_qs = saldo_qs.filter(empresa=empresa_id)
+    if filial_id:
+        saldo_qs = saldo_qs.filter(filial=filial_id)
+
+    saldo_subquery = Subquery(
+        saldo_qs.values('saldo_estoque')[:1],
+        output_field=DecimalField()
+    )
+    
+    # Preços
+    preco_base_qs = Tabelaprecos.objects.using(banco).filter(
+        tabe_prod=OuterRef('prod_codi'),
+        tabe_empr=OuterRef('prod_empr')
+    ).exclude(
+        tabe_entr__year__lt=1900
+    ).exclude(
+        tabe_entr__year__gt=2100
+    )
+    # Mesmo escopo do catálogo: só o preço da própria filial
+    if filial_id:
+        preco_base_qs = preco_base_qs.filter(tabe_fili=filial_id)
+
+    preco_vista_subquery = Subquery(
+        preco_base_qs.values('tabe_avis')[:1],
+        output_field=DecimalField()
+    )
+
+    preco_normal_subquery = Subquery(
+        preco_base_qs.values('tabe_prco')[:1],
+        output_field=DecimalField()
+    )
+
+    return queryset.annotate(
+        saldo_estoque=Coalesce(saldo_subquery, V(0), output_field=DecimalField()),
+        prod_preco_vista=Coalesce(preco_vista_subquery, V(0), output_field=DecimalField()),
+        prod_preco_normal=Coalesce(preco_normal_subquery, V(0), output_field=DecimalField()),
+    )
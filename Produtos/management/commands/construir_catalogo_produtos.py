@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.licencas_loader import carregar_licencas_dict
+from core.utils import get_db_from_slug
+from Produtos.servicos.catalogo_servico import CatalogoProdutoService
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria/recarrega a tabela catalogoprodutos (saldo e preços por empresa, filial e produto) "
+        "e as triggers que a mantêm atualizada"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slug", help="Processa apenas a licença informada")
+
+    def handle(self, *args, **options):
+        licencas = carregar_licencas_dict()
+        if not licencas:
+            raise CommandError("Nenhuma licença encontrada")
+
+        if options.get("slug"):
+            licencas = [lic for lic in licencas if lic["slug"] == options["slug"]]
+            if not licencas:
+                raise CommandError(f"Licença {options['slug']} não encontrada")
+
+        for lic in licencas:
+            slug = lic["slug"]
+            try:
+                banco = get_db_from_slug(slug)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Banco indisponível: {e}"))
+                continue
+
+            try:
+                linhas = CatalogoProdutoService.construir(banco)
+                self.stdout.write(self.style.SUCCESS(f"[{slug}] Catálogo de produtos com {linhas} linhas"))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Erro ao construir catálogo: {e}"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.licencas_loader import carregar_licencas_dict
+from core.utils import get_db_from_slug
+from Produtos.servicos.busca_servico import BuscaProdutoService
+
+
+class Command(BaseCommand):
+    help = "Cria a coluna prod_codi_int e os índices trigram/full-text da busca de produtos em cada base"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slug", help="Processa apenas a licença informada")
+
+    def handle(self, *args, **options):
+        licencas = carregar_licencas_dict()
+        if not licencas:
+            raise CommandError("Nenhuma licença encontrada")
+
+        if options.get("slug"):
+            licencas = [lic for lic in licencas if lic["slug"] == options["slug"]]
+            if not licencas:
+                raise CommandError(f"Licença {options['slug']} não encontrada")
+
+        for lic in licencas:
+            slug = lic["slug"]
+            try:
+                banco = get_db_from_slug(slug)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Banco indisponível: {e}"))
+                continue
+
+            try:
+                BuscaProdutoService.construir_indice(
+                    banco, log=lambda msg: self.stdout.write(f"[{slug}] {msg}")
+                )
+                self.stdout.write(self.style.SUCCESS(f"[{slug}] Busca de produtos indexada"))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Erro ao indexar busca de produtos: {e}"))
@@ -349,6 +349,32 @@ class SaldoProduto(models.Model):
             )
         ]
 
+
+class CatalogoProduto(models.Model):
+    """
+    Leitura pronta de saldo e preços por (empresa, filial, produto), mantida por
+    triggers em produtos, saldosprodutos e tabelaprecos (construir_catalogo_produtos).
+    """
+    cata_empr = models.IntegerField(primary_key=True)
+    cata_fili = models.IntegerField()
+    cata_prod = models.ForeignKey(
+        Produtos, on_delete=models.DO_NOTHING, db_column='cata_prod',
+        related_name='catalogo', db_constraint=False,
+    )
+    cata_sald = models.DecimalField(max_digits=15, decimal_places=4, default=0)
+    cata_avis = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    cata_prco = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    cata_apra = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    cata_praz = models.DecimalField(max_digits=15, decimal_places=4, null=True, blank=True)
+    cata_cuge = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    cata_url = models.CharField(max_length=255, blank=True, default='')
+    cata_atua = models.DateTimeField()
+
+    class Meta:
+        db_table = 'catalogoprodutos'
+        managed = False
+        unique_together = (('cata_empr', 'cata_fili', 'cata_prod'),)
+
     
         
 
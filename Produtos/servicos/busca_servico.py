@@ -0,0 +1,241 @@
+import logging
+import re
+import threading
+import time
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Índices da busca de produtos. CONCURRENTLY não trava a tabela, mas exige
+# autocommit, por isso só rodam pelo comando indexar_busca_produtos.
+#
+# prod_codi_int é uma coluna comum mantida por trigger: uma coluna GENERATED
+# ... STORED reescreveria a tabela inteira sob ACCESS EXCLUSIVE. ADD COLUMN
+# sem default só altera o catálogo; o lock_timeout evita que o ALTER fique na
+# fila atrás de transações longas travando as leituras. As linhas existentes
+# são preenchidas em lotes, cada um com seu próprio commit.
+EXPR_CODIGO_INT = "CASE WHEN {col} ~ '^[0-9]{{1,18}}$' THEN {col}::bigint END"
+
+COLUNA_CODIGO_INT = (
+    "SET lock_timeout = '5s'",
+    "ALTER TABLE produtos ADD COLUMN IF NOT EXISTS prod_codi_int bigint",
+    "RESET lock_timeout",
+)
+
+TRIGGER_CODIGO_INT = (
+    f"""
+    CREATE OR REPLACE FUNCTION produtos_codi_int_trg() RETURNS trigger AS $$
+    BEGIN
+        NEW.prod_codi_int := {EXPR_CODIGO_INT.format(col='NEW.prod_codi')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS produtos_codi_int ON produtos",
+    "CREATE TRIGGER produtos_codi_int BEFORE INSERT OR UPDATE OF prod_codi ON produtos "
+    "FOR EACH ROW EXECUTE PROCEDURE produtos_codi_int_trg()",
+)
+
+PREENCHER_CODIGO_INT = f"""
+    UPDATE produtos SET prod_codi_int = {EXPR_CODIGO_INT.format(col='prod_codi')}
+     WHERE ctid IN (
+        SELECT ctid FROM produtos
+         WHERE prod_codi_int IS NULL AND prod_codi ~ '^[0-9]{{1,18}}$'
+         LIMIT %s
+     )
+"""
+
+LOTE_PREENCHIMENTO = 5000
+
+INDICES = (
+    ("produtos_busca_nome_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS produtos_busca_nome_trgm "
+     "ON produtos USING gin (prod_nome gin_trgm_ops)"),
+    ("produtos_busca_nome_fts",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS produtos_busca_nome_fts "
+     "ON produtos USING gin (to_tsvector('simple', coalesce(prod_nome, '')))"),
+    ("produtos_busca_codi_int",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS produtos_busca_codi_int "
+     "ON produtos (prod_empr, prod_codi_int, prod_codi)"),
+    ("produtos_busca_codi",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS produtos_busca_codi "
+     "ON produtos (prod_codi)"),
+    ("produtos_busca_coba",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS produtos_busca_coba "
+     "ON produtos (prod_coba)"),
+    ("saldosprodutos_busca_prod",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS saldosprodutos_busca_prod "
+     "ON saldosprodutos (sapr_prod, sapr_empr, sapr_fili)"),
+    ("tabelaprecos_busca_prod",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tabelaprecos_busca_prod "
+     "ON tabelaprecos (tabe_prod, tabe_empr)"),
+)
+
+# Ordem do resultado: código/código de barras exato, prefixo do nome,
+# todas as palavras como prefixo (full-text), trecho do nome e por último
+# o que só bateu por semelhança (trigram).
+RANK_CODIGO, RANK_PREFIXO, RANK_PALAVRAS, RANK_CONTEM, RANK_SEMELHANTE = range(5)
+
+TTL_DISPONIVEL = 300
+
+
+def _escapar_like(termo: str) -> str:
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _tsquery_prefixo(termo: str) -> str:
+    palavras = re.findall(r'[^\W_]+', termo.lower())
+    return ' & '.join(f"{p}:*" for p in palavras)
+
+
+class BuscaProdutoService:
+    """
+    Busca de produtos por nome/código apoiada nos índices pg_trgm e full-text
+    criados por indexar_busca_produtos. Enquanto a base não tiver os índices,
+    listar_produtos continua com o filtro icontains.
+    """
+
+    _disponivel = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def indice_disponivel(banco: str) -> bool:
+        agora = time.monotonic()
+        with BuscaProdutoService._lock:
+            cache = BuscaProdutoService._disponivel.get(banco)
+            if cache and agora - cache[1] < TTL_DISPONIVEL:
+                return cache[0]
+
+        try:
+            with connections[banco].cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+                       AND EXISTS (
+                           SELECT 1 FROM pg_index i
+                             JOIN pg_class c ON c.oid = i.indexrelid
+                            WHERE c.relname = 'produtos_busca_codi_int' AND i.indisvalid
+                       )
+                    """
+                )
+                disponivel = bool(cursor.fetchone()[0])
+        except Exception as e:
+            logger.warning("[BUSCA_PRODUTOS] falha ao verificar índice em %s: %s", banco, e)
+            disponivel = False
+
+        with BuscaProdutoService._lock:
+            BuscaProdutoService._disponivel[banco] = (disponivel, agora)
+        return disponivel
+
+    @staticmethod
+    def limpar_cache(banco: str = None) -> None:
+        with BuscaProdutoService._lock:
+            if banco is None:
+                BuscaProdutoService._disponivel.clear()
+            else:
+                BuscaProdutoService._disponivel.pop(banco, None)
+
+    @staticmethod
+    def aplicar_ordem_codigo(queryset):
+        """Usa a coluna prod_codi_int gravada no lugar do cast por regex em cada linha."""
+        return queryset.extra(select={'prod_codi_int': 'produtos.prod_codi_int'})
+
+    @staticmethod
+    def aplicar_busca(queryset, termo: str):
+        """
+        Filtra o queryset de produtos pelo termo e anota busca_rank/busca_simi
+        para ordenação. Códigos e código de barras são comparados por igualdade
+        (índices btree); o nome por prefixo, palavras, trecho e semelhança.
+        """
+        termo = (termo or '').strip()
+        if not termo:
+            return queryset
+
+        codigo_sem_zeros = termo.lstrip('0') or termo
+        like_termo = _escapar_like(termo)
+        tsquery = _tsquery_prefixo(termo)
+
+        cond_codigo = (
+            "(produtos.prod_codi = %s OR produtos.prod_codi = %s OR produtos.prod_coba = %s)"
+        )
+        params_codigo = [termo, codigo_sem_zeros, termo]
+        cond_prefixo = "produtos.prod_nome ILIKE %s"
+        params_prefixo = [f"{like_termo}%"]
+        cond_contem = "produtos.prod_nome ILIKE %s"
+        params_contem = [f"%{like_termo}%"]
+        cond_semelhante = "produtos.prod_nome %% %s"
+        params_semelhante = [termo]
+
+        if tsquery:
+            cond_palavras = "to_tsvector('simple', coalesce(produtos.prod_nome, '')) @@ to_tsquery('simple', %s)"
+            params_palavras = [tsquery]
+        else:
+            cond_palavras = "FALSE"
+            params_palavras = []
+
+        where = (
+            f"({cond_codigo} OR {cond_prefixo} OR {cond_palavras} "
+            f"OR {cond_contem} OR {cond_semelhante})"
+        )
+        rank = (
+            f"CASE WHEN {cond_codigo} THEN {RANK_CODIGO} "
+            f"WHEN {cond_prefixo} THEN {RANK_PREFIXO} "
+            f"WHEN {cond_palavras} THEN {RANK_PALAVRAS} "
+            f"WHEN {cond_contem} THEN {RANK_CONTEM} "
+            f"ELSE {RANK_SEMELHANTE} END"
+        )
+        params_ordem = params_codigo + params_prefixo + params_palavras + params_contem
+
+        return queryset.extra(
+            select={
+                'busca_rank': rank,
+                'busca_simi': "similarity(produtos.prod_nome, %s)",
+            },
+            select_params=params_ordem + [termo],
+            where=[where],
+            params=params_ordem + params_semelhante,
+        )
+
+    @staticmethod
+    def construir_indice(banco: str, log=None) -> list:
+        """
+        Cria extensão, coluna prod_codi_int e índices da busca na base.
+        Retorna a lista de índices criados ou já existentes.
+        """
+        log = log or logger.info
+        conn = connections[banco]
+        prontos = []
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for comando in COLUNA_CODIGO_INT:
+                cursor.execute(comando)
+            for comando in TRIGGER_CODIGO_INT:
+                cursor.execute(comando)
+            total = 0
+            while True:
+                cursor.execute(PREENCHER_CODIGO_INT, [LOTE_PREENCHIMENTO])
+                linhas = cursor.rowcount
+                if linhas <= 0:
+                    break
+                total += linhas
+            log(f"prod_codi_int preenchido em {total} linha(s)")
+            cursor.execute(
+                """
+                SELECT c.relname FROM pg_index i
+                  JOIN pg_class c ON c.oid = i.indexrelid
+                 WHERE NOT i.indisvalid AND c.relname = ANY(%s)
+                """,
+                [[nome for nome, _ in INDICES]],
+            )
+            for (invalido,) in cursor.fetchall():
+                log(f"{invalido} inválido, recriando")
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {invalido}")
+            for nome, sql in INDICES:
+                inicio = time.monotonic()
+                cursor.execute(sql)
+                log(f"{nome} pronto em {time.monotonic() - inicio:.1f}s")
+                prontos.append(nome)
+            cursor.execute("ANALYZE produtos")
+        BuscaProdutoService.limpar_cache(banco)
+        return prontos
@@ -0,0 +1,253 @@
+import logging
+import threading
+import time
+
+from django.db import connections, transaction
+from django.db.models import F, FilteredRelation, Q, Value as V, DecimalField
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+TTL_DISPONIVEL = 300
+
+TABELA_CATALOGO = """
+    CREATE TABLE IF NOT EXISTS catalogoprodutos (
+        cata_empr integer NOT NULL,
+        cata_fili integer NOT NULL,
+        cata_prod varchar(60) NOT NULL,
+        cata_sald numeric(15,4) NOT NULL DEFAULT 0,
+        cata_avis numeric(15,2),
+        cata_prco numeric(15,2),
+        cata_apra numeric(15,2),
+        cata_praz numeric(15,4),
+        cata_cuge numeric(15,2),
+        cata_url varchar(255) NOT NULL DEFAULT '',
+        cata_atua timestamp NOT NULL DEFAULT now(),
+        PRIMARY KEY (cata_empr, cata_fili, cata_prod)
+    )
+"""
+
+# Bases construídas antes dos preços aceitarem nulo
+PRECOS_NULOS = """
+    ALTER TABLE catalogoprodutos
+        ALTER COLUMN cata_avis DROP NOT NULL, ALTER COLUMN cata_avis DROP DEFAULT,
+        ALTER COLUMN cata_prco DROP NOT NULL, ALTER COLUMN cata_prco DROP DEFAULT,
+        ALTER COLUMN cata_apra DROP NOT NULL, ALTER COLUMN cata_apra DROP DEFAULT,
+        ALTER COLUMN cata_praz DROP NOT NULL, ALTER COLUMN cata_praz DROP DEFAULT,
+        ALTER COLUMN cata_cuge DROP NOT NULL, ALTER COLUMN cata_cuge DROP DEFAULT
+"""
+
+# Uma linha por produto x filial da empresa, com saldo e preço da própria
+# filial. Sem preço cadastrado na filial as colunas de preço ficam nulas: o
+# preço de outra filial não vale aqui.
+SELECT_CATALOGO = """
+    SELECT f.empr_empr, f.empr_codi, p.prod_codi,
+           COALESCE(s.sapr_sald, 0), t.tabe_avis, t.tabe_prco,
+           t.tabe_apra, t.tabe_praz, t.tabe_cuge,
+           COALESCE(p.prod_url, ''), now()
+      FROM produtos p
+      JOIN filiais f ON f.empr_empr::text = p.prod_empr::text
+      LEFT JOIN LATERAL (
+           SELECT sapr_sald FROM saldosprodutos
+            WHERE sapr_prod = p.prod_codi
+              AND sapr_empr::text = f.empr_empr::text
+              AND sapr_fili::text = f.empr_codi::text
+            LIMIT 1
+      ) s ON TRUE
+      LEFT JOIN LATERAL (
+           SELECT tabe_avis, tabe_prco, tabe_apra, tabe_praz, tabe_cuge FROM tabelaprecos
+            WHERE tabe_prod = p.prod_codi
+              AND tabe_empr::text = p.prod_empr::text
+              AND tabe_fili::text = f.empr_codi::text
+              AND (tabe_entr IS NULL OR tabe_entr BETWEEN DATE '1900-01-01' AND DATE '2100-12-31')
+            LIMIT 1
+      ) t ON TRUE
+"""
+
+COLUNAS_CATALOGO = (
+    "cata_empr, cata_fili, cata_prod, cata_sald, cata_avis, cata_prco, "
+    "cata_apra, cata_praz, cata_cuge, cata_url, cata_atua"
+)
+
+FUNCAO_RECALCULAR = f"""
+    CREATE OR REPLACE FUNCTION catalogo_produtos_recalcular(p_emprs text[], p_prods text[])
+    RETURNS void LANGUAGE plpgsql AS $$
+    BEGIN
+        -- produto apagado: some do catálogo
+        DELETE FROM catalogoprodutos c
+         USING unnest(p_emprs, p_prods) AS k(empr, prod)
+         WHERE c.cata_empr::text = k.empr AND c.cata_prod = k.prod
+           AND NOT EXISTS (
+               SELECT 1 FROM produtos p WHERE p.prod_empr::text = k.empr AND p.prod_codi = k.prod
+           );
+
+        -- upsert: duas transações gravando o mesmo produto não colidem na chave
+        INSERT INTO catalogoprodutos ({COLUNAS_CATALOGO})
+        {SELECT_CATALOGO}
+         WHERE (p.prod_empr::text, p.prod_codi::text) IN (
+               SELECT DISTINCT k.empr, k.prod FROM unnest(p_emprs, p_prods) AS k(empr, prod)
+         )
+        ON CONFLICT (cata_empr, cata_fili, cata_prod) DO UPDATE SET
+            cata_sald = EXCLUDED.cata_sald, cata_avis = EXCLUDED.cata_avis,
+            cata_prco = EXCLUDED.cata_prco, cata_apra = EXCLUDED.cata_apra,
+            cata_praz = EXCLUDED.cata_praz, cata_cuge = EXCLUDED.cata_cuge,
+            cata_url = EXCLUDED.cata_url, cata_atua = EXCLUDED.cata_atua;
+    END
+    $$
+"""
+
+# Triggers por comando (FOR EACH STATEMENT com tabelas de transição): um UPDATE
+# em massa de preços recalcula os produtos afetados numa única passada. As
+# listagens tratam o catálogo como fonte da verdade: erro aqui desfaz a
+# gravação original em vez de deixar a linha do catálogo vencida.
+FUNCAO_TRIGGER = """
+    CREATE OR REPLACE FUNCTION catalogo_produtos_trg()
+    RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        col_empr text;
+        col_prod text;
+        emprs text[] := '{}';
+        prods text[] := '{}';
+        e text[];
+        c text[];
+    BEGIN
+        col_empr := CASE TG_TABLE_NAME WHEN 'produtos' THEN 'prod_empr'
+                                       WHEN 'saldosprodutos' THEN 'sapr_empr'
+                                       ELSE 'tabe_empr' END;
+        col_prod := CASE TG_TABLE_NAME WHEN 'produtos' THEN 'prod_codi'
+                                       WHEN 'saldosprodutos' THEN 'sapr_prod'
+                                       ELSE 'tabe_prod' END;
+        IF TG_OP <> 'INSERT' THEN
+            EXECUTE format('SELECT array_agg(%I::text), array_agg(%I::text) FROM antigos', col_empr, col_prod)
+               INTO e, c;
+            emprs := emprs || e;
+            prods := prods || c;
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            EXECUTE format('SELECT array_agg(%I::text), array_agg(%I::text) FROM novos', col_empr, col_prod)
+               INTO e, c;
+            emprs := emprs || e;
+            prods := prods || c;
+        END IF;
+        IF cardinality(emprs) > 0 THEN
+            PERFORM catalogo_produtos_recalcular(emprs, prods);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+
+TABELAS_ORIGEM = ('produtos', 'saldosprodutos', 'tabelaprecos')
+
+
+def _sql_triggers(tabela):
+    comandos = []
+    for evento, referencia in (
+        ('INSERT', 'NEW TABLE AS novos'),
+        ('UPDATE', 'OLD TABLE AS antigos NEW TABLE AS novos'),
+        ('DELETE', 'OLD TABLE AS antigos'),
+    ):
+        nome = f"catalogo_{tabela}_{evento.lower()}"
+        comandos.append(f"DROP TRIGGER IF EXISTS {nome} ON {tabela}")
+        comandos.append(
+            f"CREATE TRIGGER {nome} AFTER {evento} ON {tabela} "
+            f"REFERENCING {referencia} FOR EACH STATEMENT EXECUTE PROCEDURE catalogo_produtos_trg()"
+        )
+    return comandos
+
+
+class CatalogoProdutoService:
+    """
+    Catálogo de produtos com saldo e preços já resolvidos (tabela
+    catalogoprodutos). Listagens leem dele com um único LEFT JOIN; enquanto a
+    base não tiver o catálogo, seguem com as subqueries por linha.
+    """
+
+    _disponivel = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def disponivel(banco: str) -> bool:
+        agora = time.monotonic()
+        with CatalogoProdutoService._lock:
+            cache = CatalogoProdutoService._disponivel.get(banco)
+            if cache and agora - cache[1] < TTL_DISPONIVEL:
+                return cache[0]
+
+        try:
+            with connections[banco].cursor() as cursor:
+                cursor.execute("SELECT to_regclass('catalogoprodutos') IS NOT NULL")
+                disponivel = bool(cursor.fetchone()[0])
+        except Exception as e:
+            logger.warning("[CATALOGO_PRODUTOS] falha ao verificar catálogo em %s: %s", banco, e)
+            disponivel = False
+
+        with CatalogoProdutoService._lock:
+            CatalogoProdutoService._disponivel[banco] = (disponivel, agora)
+        return disponivel
+
+    @staticmethod
+    def limpar_cache(banco: str = None) -> None:
+        with CatalogoProdutoService._lock:
+            if banco is None:
+                CatalogoProdutoService._disponivel.clear()
+            else:
+                CatalogoProdutoService._disponivel.pop(banco, None)
+
+    @staticmethod
+    def anotar(queryset, banco: str, empresa_id, filial_id, campos: dict, zerar_nulos=()):
+        """
+        Anota o queryset de Produtos com colunas do catálogo da empresa/filial,
+        ex.: {'saldo_estoque': 'cata_sald'}. Preço sem cadastro na filial vem
+        None, a não ser que o nome esteja em ``zerar_nulos``; saldo ausente é 0.
+        Retorna None se o catálogo não puder ser usado (base sem catálogo ou
+        empresa/filial não informadas), para o chamador manter a consulta antiga.
+        """
+        if not empresa_id or not filial_id:
+            return None
+        try:
+            empresa = int(empresa_id)
+            filial = int(filial_id)
+        except (TypeError, ValueError):
+            return None
+        if not CatalogoProdutoService.disponivel(banco):
+            return None
+
+        queryset = queryset.annotate(
+            catalogo_filial=FilteredRelation(
+                'catalogo',
+                condition=Q(catalogo__cata_empr=empresa, catalogo__cata_fili=filial),
+            )
+        )
+        anotacoes = {}
+        for nome, coluna in campos.items():
+            valor = F(f'catalogo_filial__{coluna}')
+            if coluna == 'cata_sald' or nome in zerar_nulos:
+                valor = Coalesce(valor, V(0), output_field=DecimalField())
+            anotacoes[nome] = valor
+        return queryset.annotate(**anotacoes)
+
+    @staticmethod
+    def construir(banco: str) -> int:
+        """
+        Cria tabela, funções e triggers do catálogo e recarrega todas as
+        linhas. Retorna o número de linhas geradas.
+        """
+        with transaction.atomic(using=banco):
+            with connections[banco].cursor() as cursor:
+                cursor.execute(TABELA_CATALOGO)
+                cursor.execute(PRECOS_NULOS)
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS catalogoprodutos_prod ON catalogoprodutos (cata_prod, cata_empr)"
+                )
+                cursor.execute(FUNCAO_RECALCULAR)
+                cursor.execute(FUNCAO_TRIGGER)
+                for tabela in TABELAS_ORIGEM:
+                    for sql in _sql_triggers(tabela):
+                        cursor.execute(sql)
+                cursor.execute("TRUNCATE catalogoprodutos")
+                cursor.execute(f"INSERT INTO catalogoprodutos ({COLUNAS_CATALOGO}) {SELECT_CATALOGO}")
+                linhas = cursor.rowcount
+                cursor.execute("ANALYZE catalogoprodutos")
+        CatalogoProdutoService.limpar_cache(banco)
+        return linhas
@@ -1,7 +1,10 @@
+import logging
 from decimal import Decimal, ROUND_HALF_UP
 
-from django.db import connections, IntegrityError
+from django.db import connections
+from django.utils import timezone
 
+from core.persistencia_itens import atualizar_em_lote
 from Produtos.models import (
     FamiliaProduto,
     GrupoProduto,
@@ -9,19 +12,22 @@ from Produtos.models import (
     Produtos,
     SubgrupoProduto,
     Tabelaprecos,
+    Tabelaprecoshist,
 )
-from Produtos.preco_models import TabelaprecosPromocional
+from Produtos.preco_models import TabelaprecosPromocional, TabelaprecosPromocionalhist
 from Produtos.servicos.preco_promocional import (
-    atualizar_preco_com_historico as atualizar_preco_promocional_com_historico,
-    criar_preco_com_historico as criar_preco_promocional_com_historico,
+    montar_historico_atualizacao as montar_historico_promocional,
 )
 from Produtos.servicos.preco_servico import (
-    atualizar_preco_com_historico as atualizar_preco_normal_com_historico,
-    criar_preco_com_historico as criar_preco_normal_com_historico,
+    limpar_precos_caixa,
+    montar_historico_atualizacao as montar_historico_normal,
 )
 
+logger = logging.getLogger(__name__)
 
-
+CAMPOS_CHAVE_PRECO = ("tabe_empr", "tabe_fili", "tabe_prod")
+TAMANHO_LOTE = 500
+TAMANHO_LOTE_REAJUSTE = 1000
 
 
 class PrecoMassaService:
@@ -165,29 +171,83 @@ class PrecoMassaService:
     
     
     @classmethod
-    def _upsert_preco(cls, banco, empresa, filial, prod_codi, novos, tabela):
+    def _upsert_precos(cls, banco, empresa, filial, codigos, novos, tabela):
         """
-        Faz INSERT ... ON CONFLICT DO UPDATE direto no PostgreSQL.
-        Evita o problema do Django ORM com PK composta (tabe_empr só como pk).
+        INSERT ... ON CONFLICT DO UPDATE de vários produtos com os mesmos
+        valores, direto no PostgreSQL (o ORM não conhece a PK composta).
         """
+        if not codigos:
+            return
         campos = list(novos.keys())
-        valores = list(novos.values())
         insert_cols = ", ".join(["tabe_empr", "tabe_fili", "tabe_prod"] + campos)
-        placeholders = ", ".join(["%s"] * (3 + len(campos)))
+        linha = "(" + ", ".join(["%s"] * (3 + len(campos))) + ")"
         set_clause = ", ".join(f"{c} = EXCLUDED.{c}" for c in campos)
 
         sql = f"""
             INSERT INTO {tabela} ({insert_cols})
-            VALUES ({placeholders})
+            VALUES {", ".join([linha] * len(codigos))}
             ON CONFLICT (tabe_empr, tabe_fili, tabe_prod)
             DO UPDATE SET {set_clause}
         """
-        params = [int(empresa), int(filial), str(prod_codi)] + valores
+        params = []
+        for prod_codi in codigos:
+            params += [int(empresa), int(filial), str(prod_codi)] + list(novos.values())
 
         with connections[banco].cursor() as cursor:
             cursor.execute(sql, params)
-    
-    
+
+    @classmethod
+    def _reajustar_lote(cls, *, banco, empresa, filial, codigos, tabela, tipo, percentual, valores, campos, agora):
+        """
+        Reajusta uma tabela de preços para um lote de produtos: uma leitura,
+        um UPDATE ... FROM (VALUES ...), um bulk_create do histórico e, no tipo
+        'valor', um upsert dos produtos sem preço. Retorna quantos gravou.
+        """
+        model, model_hist, montar_historico, nome_tabela = tabela
+        existentes = {
+            p.tabe_prod: p
+            for p in model.objects.using(banco).filter(
+                tabe_empr=int(empresa), tabe_fili=int(filial), tabe_prod__in=codigos
+            )
+        }
+
+        alterados = []
+        historicos = []
+        campos_alterados = set()
+        for inst in existentes.values():
+            novos = cls._montar_novos_dados(
+                instancia=inst,
+                tipo=tipo,
+                percentual=percentual,
+                valores=valores,
+                campos=campos,
+            )
+            if not novos:
+                continue
+            historicos.append(model_hist(**montar_historico(inst, novos, data_hora=agora)))
+            for campo, valor in novos.items():
+                setattr(inst, campo, valor)
+            campos_alterados.update(novos)
+            alterados.append(inst)
+
+        if alterados:
+            atualizar_em_lote(model, banco, alterados, sorted(campos_alterados), CAMPOS_CHAVE_PRECO)
+            model_hist.objects.using(banco).bulk_create(historicos, batch_size=TAMANHO_LOTE)
+
+        gravados = len(alterados)
+        if tipo == "valor":
+            novos_create = cls._montar_novos_dados(
+                instancia=type("obj", (), {})(),
+                tipo=tipo,
+                percentual=percentual,
+                valores=valores,
+                campos=campos,
+            )
+            faltantes = [c for c in codigos if c not in existentes]
+            if novos_create and faltantes:
+                cls._upsert_precos(banco, empresa, filial, faltantes, novos_create, nome_tabela)
+                gravados += len(faltantes)
+        return gravados
 
     @classmethod
     def aplicar_reajuste(
@@ -205,6 +265,10 @@ class PrecoMassaService:
         codigos=None,
         **filtros,
     ):
+        """
+        Reajusta os preços dos produtos filtrados em lotes de
+        TAMANHO_LOTE_REAJUSTE, registrando o andamento no log a cada lote.
+        """
         campos = [c for c in (campos or cls.CAMPOS_SUPORTADOS) if c in cls.CAMPOS_SUPORTADOS]
         if not campos:
             raise ValueError("Nenhum campo válido para atualizar.")
@@ -214,95 +278,48 @@ class PrecoMassaService:
         qs = cls.montar_filtros(empresa=empresa, **filtros).using(banco)
         if codigos:
             qs = qs.filter(prod_codi__in=[str(c) for c in codigos if c])
-        produtos = list(qs.only("prod_codi"))
-        if not produtos:
+        codigos_prod = list(qs.order_by().values_list("prod_codi", flat=True))
+        if not codigos_prod:
             return {"total_produtos": 0, "atualizados_normal": 0, "atualizados_promocional": 0}
 
-        codigos_prod = [p.prod_codi for p in produtos]
-        normal_map = {}
-        promo_map = {}
-
+        tabelas = []
         if aplicar_normal:
-            for p in Tabelaprecos.objects.using(banco).filter(
-                tabe_empr=int(empresa), tabe_fili=int(filial), tabe_prod__in=codigos_prod
-            ):
-                normal_map[p.tabe_prod] = p
-
+            tabelas.append(("normal", (
+                Tabelaprecos, Tabelaprecoshist, montar_historico_normal, "tabelaprecos",
+            )))
         if aplicar_promocional:
-            for p in TabelaprecosPromocional.objects.using(banco).filter(
-                tabe_empr=int(empresa), tabe_fili=int(filial), tabe_prod__in=codigos_prod
-            ):
-                promo_map[p.tabe_prod] = p
-
-        atualizados_normal = 0
-        atualizados_promocional = 0
-
-        for prod_codi in codigos_prod:
-
-            # ── TABELA NORMAL ────────────────────────────────────────────
-            if aplicar_normal:
-                inst_normal = normal_map.get(prod_codi)
-                if inst_normal:
-                    # Registro existe no map → atualiza normalmente via ORM
-                    novos_normal = cls._montar_novos_dados(
-                        instancia=inst_normal,
-                        tipo=tipo,
-                        percentual=percentual,
-                        valores=valores,
-                        campos=campos,
-                    )
-                    if novos_normal:
-                        atualizar_preco_normal_com_historico(banco, inst_normal, novos_normal)
-                        atualizados_normal += 1
-                elif tipo == "valor":
-                    # Registro não existe → upsert raw SQL, sem tocar no ORM
-                    novos_create = cls._montar_novos_dados(
-                        instancia=type("obj", (), {})(),
-                        tipo=tipo,
-                        percentual=percentual,
-                        valores=valores,
-                        campos=campos,
-                    )
-                    if novos_create:
-                        cls._upsert_preco(
-                            banco, empresa, filial, prod_codi,
-                            novos_create, "tabelaprecos"
-                        )
-                        atualizados_normal += 1
-
-            # ── TABELA PROMOCIONAL ───────────────────────────────────────
-            if aplicar_promocional:
-                inst_promo = promo_map.get(prod_codi)
-                if inst_promo:
-                    novos_promo = cls._montar_novos_dados(
-                        instancia=inst_promo,
-                        tipo=tipo,
-                        percentual=percentual,
-                        valores=valores,
-                        campos=campos,
-                    )
-                    if novos_promo:
-                        atualizar_preco_promocional_com_historico(banco, inst_promo, novos_promo)
-                        atualizados_promocional += 1
-                elif tipo == "valor":
-                    novos_create = cls._montar_novos_dados(
-                        instancia=type("obj", (), {})(),
-                        tipo=tipo,
-                        percentual=percentual,
-                        valores=valores,
-                        campos=campos,
-                    )
-                    if novos_create:
-                        cls._upsert_preco(
-                            banco, empresa, filial, prod_codi,
-                            novos_create, "tabelaprecos_promocional"
-                        )
-                        atualizados_promocional += 1
+            tabelas.append(("promocional", (
+                TabelaprecosPromocional, TabelaprecosPromocionalhist,
+                montar_historico_promocional, "tabelaprecos_promocional",
+            )))
+
+        atualizados = {"normal": 0, "promocional": 0}
+        total = len(codigos_prod)
+        agora = timezone.now()
+
+        for inicio in range(0, total, TAMANHO_LOTE_REAJUSTE):
+            lote = codigos_prod[inicio:inicio + TAMANHO_LOTE_REAJUSTE]
+            for nome, tabela in tabelas:
+                atualizados[nome] += cls._reajustar_lote(
+                    banco=banco,
+                    empresa=empresa,
+                    filial=filial,
+                    codigos=lote,
+                    tabela=tabela,
+                    tipo=tipo,
+                    percentual=percentual,
+                    valores=valores,
+                    campos=campos,
+                    agora=agora,
+                )
+            processados = inicio + len(lote)
+            logger.info("[PRECO_MASSA] %s: %s/%s produtos reajustados", banco, processados, total)
 
+        limpar_precos_caixa(banco)
         return {
-            "total_produtos": len(codigos_prod),
-            "atualizados_normal": atualizados_normal,
-            "atualizados_promocional": atualizados_promocional,
+            "total_produtos": total,
+            "atualizados_normal": atualizados["normal"],
+            "atualizados_promocional": atualizados["promocional"],
         }
 
     @classmethod
@@ -3,6 +3,7 @@ from decimal import Decimal, InvalidOperation
 from django.utils import timezone
 
 from ..preco_models import TabelaprecosPromocional, TabelaprecosPromocionalhist
+from .preco_servico import limpar_precos_caixa
 
 
 def _filtrar_campos_model(model, dados):
@@ -58,12 +59,29 @@ def criar_preco_com_historico(banco, dados_preco, user=None):
     TabelaprecosPromocionalhist.objects.using(banco).create(
         **_filtrar_campos_model(TabelaprecosPromocionalhist, hist_data)
     )
+    limpar_precos_caixa(banco)
     return instancia_preco
 
 
 def atualizar_preco_com_historico(banco, instancia_preco, novos_dados, user=None):
     novos_dados = _filtrar_campos_model(TabelaprecosPromocional, novos_dados)
 
+    TabelaprecosPromocionalhist.objects.using(banco).create(
+        **montar_historico_atualizacao(instancia_preco, novos_dados)
+    )
+
+    for key, value in novos_dados.items():
+        setattr(instancia_preco, key, value)
+    instancia_preco.save(using=banco)
+    limpar_precos_caixa(banco)
+
+    return instancia_preco
+
+
+def montar_historico_atualizacao(instancia_preco, novos_dados, data_hora=None):
+    """Campos do TabelaprecosPromocionalhist de uma alteração, com os valores anteriores da instância."""
+    novos_dados = _filtrar_campos_model(TabelaprecosPromocional, novos_dados)
+
     velhos_valores = {
         'tabe_prco': instancia_preco.tabe_prco,
         'tabe_avis': instancia_preco.tabe_avis,
@@ -94,7 +112,7 @@ def atualizar_preco_com_historico(banco, instancia_preco, novos_dados, user=None
         'tabe_empr': instancia_preco.tabe_empr,
         'tabe_fili': instancia_preco.tabe_fili,
         'tabe_prod': instancia_preco.tabe_prod,
-        'tabe_data_hora': timezone.now(),
+        'tabe_data_hora': data_hora or timezone.now(),
         'tabe_hist': historico,
         'tabe_perc_reaj': novos_dados.get('tabe_perc_reaj'),
         'tabe_prco_ante': velhos_valores['tabe_prco'],
@@ -114,16 +132,7 @@ def atualizar_preco_com_historico(banco, instancia_preco, novos_dados, user=None
         'tabe_marg_novo': novos_dados.get('tabe_marg'),
         'tabe_praz_novo': novos_dados.get('tabe_praz'),
     }
-
-    TabelaprecosPromocionalhist.objects.using(banco).create(
-        **_filtrar_campos_model(TabelaprecosPromocionalhist, hist_data)
-    )
-
-    for key, value in novos_dados.items():
-        setattr(instancia_preco, key, value)
-    instancia_preco.save(using=banco)
-
-    return instancia_preco
+    return _filtrar_campos_model(TabelaprecosPromocionalhist, hist_data)
 
 
 def buscar_preco_promocional(*, banco, tabe_empr, tabe_fili, tabe_prod):
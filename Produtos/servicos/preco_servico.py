@@ -1,6 +1,18 @@
+from django.db import transaction
 from django.utils import timezone
 from ..models import Tabelaprecos, Tabelaprecoshist
 
+
+def limpar_precos_caixa(banco):
+    """
+    Descarta a tabela de preços em memória do caixa (PrecosCaixa) deste banco
+    quando a transação confirmar. Outros workers renovam em CAIXA_PRECOS_TTL.
+    """
+    from CaixaDiario.carrinho import PrecosCaixa
+
+    transaction.on_commit(lambda: PrecosCaixa.limpar_cache(banco), using=banco)
+
+
 def criar_preco_com_historico(banco, dados_preco, user=None):
     """
     Cria um novo preço e registra o histórico.
@@ -20,12 +32,29 @@ def criar_preco_com_historico(banco, dados_preco, user=None):
     }
     
     Tabelaprecoshist.objects.using(banco).create(**hist_data)
+    limpar_precos_caixa(banco)
     return instance
 
 def atualizar_preco_com_historico(banco, instance, novos_dados, user=None):
     """
     Atualiza um preço existente e registra o histórico das alterações.
     """
+    Tabelaprecoshist.objects.using(banco).create(**montar_historico_atualizacao(instance, novos_dados))
+
+    # Atualizar o objeto
+    for key, value in novos_dados.items():
+        setattr(instance, key, value)
+    instance.save(using=banco)
+    limpar_precos_caixa(banco)
+
+    return instance
+
+
+def montar_historico_atualizacao(instance, novos_dados, data_hora=None):
+    """
+    Monta os campos do Tabelaprecoshist de uma alteração (valores anteriores
+    vêm da instância, ainda não alterada).
+    """
     # Guardar valores antigos
     old_values = {
         'tabe_prco': instance.tabe_prco,
@@ -57,7 +86,7 @@ def atualizar_preco_com_historico(banco, instance, novos_dados, user=None):
         'tabe_empr': instance.tabe_empr,
         'tabe_fili': instance.tabe_fili,
         'tabe_prod': instance.tabe_prod,
-        'tabe_data_hora': timezone.now(),
+        'tabe_data_hora': data_hora or timezone.now(),
         'tabe_hist': historico,
         'tabe_perc_reaj': novos_dados.get('tabe_perc_reaj'),
         # Valores anteriores
@@ -89,15 +118,7 @@ def atualizar_preco_com_historico(banco, instance, novos_dados, user=None):
         'tabe_praz_novo': novos_dados.get('tabe_praz'),
         'tabe_valo_st_novo': novos_dados.get('tabe_valo_st'),
     }
-
-    Tabelaprecoshist.objects.using(banco).create(**hist_data)
-
-    # Atualizar o objeto
-    for key, value in novos_dados.items():
-        setattr(instance, key, value)
-    instance.save(using=banco)
-    
-    return instance
+    return hist_data
 
 
 def buscar_preco_normal(*, banco, tabe_empr, tabe_fili, tabe_prod):
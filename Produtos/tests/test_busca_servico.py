@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from Produtos.models import Produtos
+from Produtos.servicos import busca_servico
+from Produtos.servicos.busca_servico import BuscaProdutoService
+
+
+def _sql(queryset):
+    """SQL com os parâmetros no lugar, como o psycopg2 enviaria ao banco."""
+    sql, params = queryset.query.sql_with_params()
+    return sql % tuple(f"'{p}'" for p in params)
+
+
+class OrdemParametrosTests(SimpleTestCase):
+    def test_parametros_do_extra_na_posicao_de_cada_condicao(self):
+        qs = BuscaProdutoService.aplicar_busca(Produtos.objects.all(), '007 piso')
+        sql = _sql(qs)
+        cond = (
+            "(produtos.prod_codi = '007 piso' OR produtos.prod_codi = '7 piso' "
+            "OR produtos.prod_coba = '007 piso')"
+        )
+        rank = (
+            f"CASE WHEN {cond} THEN 0 "
+            "WHEN produtos.prod_nome ILIKE '007 piso%' THEN 1 "
+            "WHEN to_tsvector('simple', coalesce(produtos.prod_nome, '')) "
+            "@@ to_tsquery('simple', '007:* & piso:*') THEN 2 "
+            "WHEN produtos.prod_nome ILIKE '%007 piso%' THEN 3 ELSE 4 END"
+        )
+        self.assertIn(f"({rank}) AS \"busca_rank\"", sql)
+        self.assertIn("(similarity(produtos.prod_nome, '007 piso')) AS \"busca_simi\"", sql)
+        self.assertIn(
+            f"({cond} OR produtos.prod_nome ILIKE '007 piso%' OR to_tsvector", sql
+        )
+        self.assertIn(
+            "OR produtos.prod_nome ILIKE '%007 piso%' OR produtos.prod_nome % '007 piso')", sql
+        )
+
+    def test_termo_sem_palavras_nao_desloca_parametros(self):
+        qs = BuscaProdutoService.aplicar_busca(Produtos.objects.all(), '%_')
+        sql = _sql(qs)
+        self.assertIn("WHEN FALSE THEN 2 WHEN produtos.prod_nome ILIKE '%\\%\\_%' THEN 3", sql)
+        self.assertIn("(similarity(produtos.prod_nome, '%_')) AS \"busca_simi\"", sql)
+
+    def test_ordem_por_codigo_combinada_com_busca(self):
+        qs = BuscaProdutoService.aplicar_ordem_codigo(Produtos.objects.all())
+        qs = BuscaProdutoService.aplicar_busca(qs, '12').order_by('busca_rank', 'prod_codi_int')
+        sql = _sql(qs)
+        self.assertIn("(produtos.prod_codi_int) AS \"prod_codi_int\"", sql)
+        self.assertIn("(similarity(produtos.prod_nome, '12')) AS \"busca_simi\"", sql)
+        self.assertIn("OR produtos.prod_nome % '12')", sql)
+
+
+class ConstruirIndiceTests(SimpleTestCase):
+    def _executar(self, linhas_por_lote):
+        cursor = MagicMock()
+        type(cursor).rowcount = property(lambda _: linhas_por_lote.pop(0) if linhas_por_lote else 0)
+        conexao = MagicMock()
+        conexao.cursor.return_value.__enter__.return_value = cursor
+        with patch.object(busca_servico, 'connections', {'demo': conexao}):
+            BuscaProdutoService.construir_indice('demo', log=lambda msg: None)
+        return [c.args[0] for c in cursor.execute.call_args_list]
+
+    def test_coluna_comum_com_trigger_e_preenchimento_em_lotes(self):
+        comandos = self._executar([5000, 120])
+        self.assertIn("SET lock_timeout = '5s'", comandos)
+        self.assertFalse(any('GENERATED' in c for c in comandos))
+        self.assertEqual(comandos.count(busca_servico.PREENCHER_CODIGO_INT), 3)
+        self.assertTrue(any('CREATE TRIGGER produtos_codi_int' in c for c in comandos))
+
+    def test_sem_consulta_ao_catalogo_de_colunas(self):
+        comandos = self._executar([])
+        self.assertFalse(any('attgenerated' in c for c in comandos))
+        self.assertTrue(any('CREATE TRIGGER produtos_codi_int' in c for c in comandos))
+        self.assertEqual(comandos.count(busca_servico.PREENCHER_CODIGO_INT), 1)
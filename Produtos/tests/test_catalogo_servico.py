@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+from django.db.models import DecimalField, Q
+from django.db.models.functions import Coalesce
+from django.test import SimpleTestCase
+
+from Produtos.consultas.produto_consultas import _anotar_saldo_precos
+from Produtos.models import Produtos
+from Produtos.servicos import catalogo_servico
+from Produtos.servicos.catalogo_servico import CatalogoProdutoService
+
+
+class CatalogoPrecoFilialTests(SimpleTestCase):
+    def setUp(self):
+        patcher = patch.object(CatalogoProdutoService, 'disponivel', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _anotado(self, **kwargs):
+        return CatalogoProdutoService.anotar(Produtos.objects.all(), 'demo', 1, 2, {
+            'saldo_estoque': 'cata_sald',
+            'preco_vista': 'cata_avis',
+        }, **kwargs)
+
+    def test_preco_procurado_so_na_propria_filial(self):
+        consulta = catalogo_servico.SELECT_CATALOGO
+        self.assertIn("tabe_fili::text = f.empr_codi::text", consulta)
+        self.assertNotIn("ORDER BY (tabe_fili", consulta)
+        self.assertNotIn("COALESCE(t.tabe_avis", consulta)
+
+    def test_preco_sem_cadastro_vem_nulo(self):
+        qs = self._anotado()
+        saldo = qs.query.annotations['saldo_estoque']
+        self.assertIsInstance(saldo, Coalesce)
+        self.assertIsInstance(saldo.output_field, DecimalField)
+        self.assertNotIsInstance(qs.query.annotations['preco_vista'], Coalesce)
+        self.assertEqual(
+            qs.query._filtered_relations['catalogo_filial'].condition,
+            Q(catalogo__cata_empr=1, catalogo__cata_fili=2),
+        )
+
+    def test_zerar_nulos_mantem_zero_para_quem_pede(self):
+        preco = self._anotado(zerar_nulos=('preco_vista',)).query.annotations['preco_vista']
+        self.assertIsInstance(preco, Coalesce)
+        self.assertIsInstance(preco.output_field, DecimalField)
+
+    def test_recalculo_faz_upsert_e_propaga_erro(self):
+        self.assertIn("ON CONFLICT (cata_empr, cata_fili, cata_prod) DO UPDATE", catalogo_servico.FUNCAO_RECALCULAR)
+        self.assertNotIn("EXCEPTION WHEN OTHERS", catalogo_servico.FUNCAO_TRIGGER)
+
+    def test_sem_filial_nao_usa_catalogo(self):
+        self.assertIsNone(
+            CatalogoProdutoService.anotar(Produtos.objects.all(), 'demo', 1, None, {'preco_vista': 'cata_avis'})
+        )
+
+
+class ConsultaSemCatalogoTests(SimpleTestCase):
+    def test_preco_da_propria_filial_sem_catalogo(self):
+        qs = _anotar_saldo_precos(Produtos.objects.all(), 'default', 1, 2)
+        subquery = qs.query.annotations['prod_preco_vista'].get_source_expressions()[0]
+        filtros = {
+            filho.lhs.target.name: filho.rhs
+            for filho in subquery.queryset.query.where.children
+            if hasattr(filho, 'lhs') and not hasattr(filho.rhs, 'resolve_expression')
+        }
+        self.assertEqual(filtros.get('tabe_fili'), 2)
@@ -0,0 +1,105 @@
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from Produtos.servicos import preco_massa_service
+from Produtos.servicos.preco_massa_service import PrecoMassaService
+
+
+def _preco(prod, **valores):
+    return SimpleNamespace(tabe_empr=1, tabe_fili=2, tabe_prod=prod, **valores)
+
+
+class ReajusteLoteTests(SimpleTestCase):
+    def setUp(self):
+        self.model = MagicMock()
+        self.model_hist = MagicMock(side_effect=lambda **kw: kw)
+        self.montar = MagicMock(side_effect=lambda inst, novos, data_hora=None: {
+            'prod': inst.tabe_prod, 'novos': novos, 'data_hora': data_hora,
+        })
+        self.tabela = (self.model, self.model_hist, self.montar, 'tabelaprecos')
+        patcher = patch.object(preco_massa_service, 'atualizar_em_lote')
+        self.atualizar = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _reajustar(self, existentes, codigos, **kwargs):
+        self.model.objects.using.return_value.filter.return_value = existentes
+        return PrecoMassaService._reajustar_lote(
+            banco='demo', empresa='1', filial='2', codigos=codigos, tabela=self.tabela,
+            agora='agora', **kwargs,
+        )
+
+    def test_percentual_grava_um_update_e_um_historico_por_lote(self):
+        a = _preco('A', tabe_prco=Decimal('10.00'), tabe_avis=Decimal('9.99'))
+        b = _preco('B', tabe_prco=None, tabe_avis=Decimal('1.00'))
+        gravados = self._reajustar(
+            [a, b], ['A', 'B', 'C'], tipo='percentual', percentual='10', valores=None,
+            campos=['tabe_prco', 'tabe_avis'],
+        )
+
+        self.assertEqual(gravados, 2)
+        self.assertEqual((a.tabe_prco, a.tabe_avis), (Decimal('11.00'), Decimal('10.99')))
+        self.assertEqual((b.tabe_prco, b.tabe_avis), (Decimal('0.00'), Decimal('1.10')))
+        self.atualizar.assert_called_once_with(
+            self.model, 'demo', [a, b], ['tabe_avis', 'tabe_prco'], preco_massa_service.CAMPOS_CHAVE_PRECO
+        )
+        historicos = self.model_hist.objects.using.return_value.bulk_create.call_args.args[0]
+        self.assertEqual([h['prod'] for h in historicos], ['A', 'B'])
+        self.assertTrue(all(h['data_hora'] == 'agora' for h in historicos))
+        self.model.objects.using.return_value.filter.assert_called_once_with(
+            tabe_empr=1, tabe_fili=2, tabe_prod__in=['A', 'B', 'C']
+        )
+
+    def test_valor_cria_preco_dos_produtos_sem_tabela(self):
+        a = _preco('A', tabe_prco=Decimal('5'))
+        with patch.object(PrecoMassaService, '_upsert_precos') as upsert:
+            gravados = self._reajustar(
+                [a], ['A', 'B', 'C'], tipo='valor', percentual=None,
+                valores={'tabe_prco': '7,50', 'tabe_avis': ''}, campos=['tabe_prco', 'tabe_avis'],
+            )
+        self.assertEqual(gravados, 3)
+        self.assertEqual(a.tabe_prco, Decimal('7.50'))
+        upsert.assert_called_once_with('demo', '1', '2', ['B', 'C'], {'tabe_prco': Decimal('7.50')}, 'tabelaprecos')
+
+    def test_sem_alteracao_nao_grava(self):
+        gravados = self._reajustar(
+            [_preco('A', tabe_prco=1)], ['A'], tipo='valor', percentual=None, valores={}, campos=['tabe_prco'],
+        )
+        self.assertEqual(gravados, 0)
+        self.atualizar.assert_not_called()
+        self.model_hist.objects.using.return_value.bulk_create.assert_not_called()
+
+
+class AplicarReajusteTests(SimpleTestCase):
+    def _aplicar(self, codigos, **kwargs):
+        qs = MagicMock()
+        qs.using.return_value.order_by.return_value.values_list.return_value = codigos
+        with patch.object(PrecoMassaService, 'montar_filtros', return_value=qs), \
+                patch.object(PrecoMassaService, '_reajustar_lote', side_effect=lambda **kw: len(kw['codigos'])) as lote, \
+                patch.object(preco_massa_service, 'TAMANHO_LOTE_REAJUSTE', 2), \
+                patch.object(preco_massa_service, 'limpar_precos_caixa') as limpar:
+            resultado = PrecoMassaService.aplicar_reajuste(
+                banco='demo', empresa=1, filial=2, tipo='percentual', percentual=5, **kwargs
+            )
+        self.limpar = limpar
+        return resultado, lote
+
+    def test_processa_em_lotes_por_tabela(self):
+        resultado, lote = self._aplicar(['A', 'B', 'C'], aplicar_promocional=False)
+        self.assertEqual(resultado, {"total_produtos": 3, "atualizados_normal": 3, "atualizados_promocional": 0})
+        self.assertEqual([c.kwargs['codigos'] for c in lote.call_args_list], [['A', 'B'], ['C']])
+        self.assertEqual(len({c.kwargs['agora'] for c in lote.call_args_list}), 1)
+        self.limpar.assert_called_once_with('demo')
+
+    def test_sem_produtos(self):
+        resultado, lote = self._aplicar([])
+        self.assertEqual(resultado["total_produtos"], 0)
+        lote.assert_not_called()
+
+    def test_tipo_e_campos_invalidos(self):
+        with self.assertRaises(ValueError):
+            PrecoMassaService.aplicar_reajuste(banco='demo', empresa=1, filial=2, tipo='x')
+        with self.assertRaises(ValueError):
+            PrecoMassaService.aplicar_reajuste(banco='demo', empresa=1, filial=2, tipo='valor', campos=['prod_nome'])
@@ -0,0 +1,213 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+
+from core.tenant_connections import gerenciador_conexoes
+
+from .models import LogAcao
+
+logger = logging.getLogger(__name__)
+
+
+class FilaAuditoria:
+    """
+    Fila limitada entre o AuditoriaMiddleware e o banco de cada licença.
+
+    O middleware só enfileira um evento compacto (dict); uma thread de
+    gravação monta os LogAcao e grava em bulk_create, agrupando por banco.
+    Com a fila cheia o evento é descartado e contado, nunca bloqueia o request.
+
+    O alias do banco vem resolvido do request e fica retido no gerenciador de
+    conexões até o evento ser gravado: a thread de gravação nunca resolve
+    licença por conta própria (o que poderia evictar aliases de outras threads).
+    """
+
+    def __init__(self, montar_log, tamanho_maximo=None, tamanho_lote=None, intervalo=None):
+        self._montar_log = montar_log
+        self._tamanho_maximo = tamanho_maximo
+        self._tamanho_lote = tamanho_lote
+        self._intervalo = intervalo
+        self._lock = threading.Lock()
+        self._fila = None
+        self._thread = None
+        self._pid = None
+        self._parar = threading.Event()
+        self.enfileirados = 0
+        self.gravados = 0
+        self.descartados = 0
+        self.erros = 0
+        self.lotes = 0
+        atexit.register(self.parar)
+
+    @property
+    def tamanho_maximo(self):
+        return int(self._tamanho_maximo or getattr(settings, 'AUDITORIA_FILA_TAMANHO', 10000))
+
+    @property
+    def tamanho_lote(self):
+        return int(self._tamanho_lote or getattr(settings, 'AUDITORIA_FILA_LOTE', 500))
+
+    @property
+    def intervalo(self):
+        return float(self._intervalo or getattr(settings, 'AUDITORIA_FILA_INTERVALO', 2.0))
+
+    def enfileirar(self, evento: dict) -> bool:
+        """Enfileira o evento sem bloquear. Retorna False se foi descartado."""
+        if not getattr(settings, 'AUDITORIA_ASSINCRONA', True):
+            self.gravar([evento], fechar_conexoes=False)
+            return True
+
+        self._garantir_escritor()
+        gerenciador_conexoes.reter(evento['banco'])
+        try:
+            self._fila.put_nowait(evento)
+        except queue.Full:
+            gerenciador_conexoes.soltar(evento['banco'])
+            with self._lock:
+                self.descartados += 1
+                descartados = self.descartados
+            if descartados == 1 or descartados % 1000 == 0:
+                logger.warning(
+                    "[AUDITORIA] fila cheia (%s eventos), %s eventos descartados até agora",
+                    self.tamanho_maximo, descartados,
+                )
+            return False
+        with self._lock:
+            self.enfileirados += 1
+        return True
+
+    def estatisticas(self) -> dict:
+        fila = self._fila
+        return {
+            'pendentes': fila.qsize() if fila is not None else 0,
+            'capacidade': self.tamanho_maximo,
+            'enfileirados': self.enfileirados,
+            'gravados': self.gravados,
+            'descartados': self.descartados,
+            'erros': self.erros,
+            'lotes': self.lotes,
+            'escritor_ativo': bool(self._thread and self._thread.is_alive()),
+        }
+
+    def _garantir_escritor(self):
+        # Após fork (gunicorn --preload) a thread do processo pai não existe no filho
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid() or self._fila is None:
+                self._fila = queue.Queue(maxsize=self.tamanho_maximo)
+            self._pid = os.getpid()
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._executar, name='auditoria-escritor', daemon=True)
+            self._thread.start()
+
+    def _executar(self):
+        while not self._parar.is_set():
+            eventos = self._coletar(self.intervalo)
+            if eventos:
+                self.gravar(eventos)
+        self.descarregar()
+
+    def _coletar(self, espera):
+        """Bloqueia até o primeiro evento (ou ``espera``) e junta o que já estiver na fila."""
+        eventos = []
+        try:
+            eventos.append(self._fila.get(timeout=espera))
+        except queue.Empty:
+            return eventos
+        limite = time.monotonic() + espera
+        while len(eventos) < self.tamanho_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                eventos.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return eventos
+
+    def descarregar(self):
+        """Grava tudo o que estiver pendente na fila (usado no encerramento)."""
+        fila = self._fila
+        if fila is None:
+            return
+        while True:
+            eventos = []
+            while len(eventos) < self.tamanho_lote:
+                try:
+                    eventos.append(fila.get_nowait())
+                except queue.Empty:
+                    break
+            if not eventos:
+                return
+            self.gravar(eventos)
+
+    def parar(self, timeout=5):
+        self._parar.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+
+    def gravar(self, eventos: list, fechar_conexoes=True) -> None:
+        """
+        Grava os eventos agrupados por banco. ``fechar_conexoes`` é o caminho
+        da thread de gravação: fecha a conexão e solta os aliases retidos.
+        """
+        retidos = Counter(evento['banco'] for evento in eventos)
+        por_banco = defaultdict(list)
+        for evento in eventos:
+            try:
+                log = self._montar_log(evento)
+            except Exception as e:
+                with self._lock:
+                    self.erros += 1
+                logger.error("[AUDITORIA] erro ao montar log de %s %s: %s", evento.get('tipo_acao'), evento.get('url'), e)
+                continue
+            por_banco[evento['banco']].append((log, evento.get('usuario_id')))
+
+        for banco, itens in por_banco.items():
+            try:
+                self._gravar_banco(banco, itens)
+                with self._lock:
+                    self.gravados += len(itens)
+                    self.lotes += 1
+            except Exception as e:
+                with self._lock:
+                    self.erros += len(itens)
+                logger.error("[AUDITORIA] erro ao gravar %s logs em %s: %s", len(itens), banco, e)
+            finally:
+                # A thread de gravação não passa pelo ciclo de request: sem fechar,
+                # a conexão ficaria presa mesmo depois do alias sair do LRU de tenants.
+                if fechar_conexoes and banco in settings.DATABASES:
+                    connections[banco].close()
+
+        if fechar_conexoes:
+            for banco, quantidade in retidos.items():
+                gerenciador_conexoes.soltar(banco, quantidade)
+
+    def _gravar_banco(self, banco, itens):
+        if banco not in settings.DATABASES:
+            raise RuntimeError(f"alias {banco} não está registrado em DATABASES")
+
+        # Usuário precisa existir no banco da licença (FK); resolve o lote numa consulta
+        ids = {usuario_id for _, usuario_id in itens if usuario_id is not None}
+        existentes = set()
+        if ids:
+            existentes = set(
+                get_user_model().objects.using(banco).filter(pk__in=ids).values_list('pk', flat=True)
+            )
+        logs = []
+        for log, usuario_id in itens:
+            log.usuario_id = usuario_id if usuario_id in existentes else None
+            logs.append(log)
+        LogAcao.objects.using(banco).bulk_create(logs, batch_size=self.tamanho_lote)
@@ -1,4 +1,5 @@
 from django.utils import timezone
+from .fila import FilaAuditoria
 from .models import LogAcao
 from core.middleware import get_licenca_slug, get_modulos_disponiveis
 from rest_framework.request import Request
@@ -8,26 +9,145 @@ from django.utils import timezone
 import logging
 import json
 import re
+from functools import lru_cache
 from datetime import date, datetime
 from pprint import pformat
 from decimal import Decimal
+from core.rotas import indice_rotas
 from core.utils import get_licenca_db_config
-from django.contrib.auth import get_user_model
 
 logger = logging.getLogger(__name__)
-UserModel = get_user_model()
 
-def resolver_usuario_no_banco(usuario, banco):
-    if not usuario:
-        return None
-    pk = getattr(usuario, 'pk', None)
-    if pk is None:
-        return None
+# Corpo JSON guardado na fila de auditoria (HTML, arquivos etc. não entram)
+LIMITE_RESPOSTA = 64 * 1024
+
+# Padrões comuns de URL da API REST e WEB
+# /api/licenca/app/modelo/id/ ou /web/licenca/app/action/id
+PADRAO_URL = re.compile(r'/(?:api|web)/([^/]+)/([^/]+)(?:/([^/]+))?/?(?:([0-9]+))?')
+
+# Mapear nomes de apps para os nomes reais dos apps Django
+APP_MAPPING = {
+    'Assistente_Spart': 'Assistente_Spart',  
+    'assistente_spart': 'Assistente_Spart',
+    'assistente': 'Assistente_Spart',
+    'auditoria': 'auditoria',
+    'gestao-obras': 'GestaoObras',
+    'gestaoobras': 'GestaoObras',
+    'boletos': 'boletos',
+    'caixadiario': 'CaixaDiario',
+    'caixa-diario': 'CaixaDiario',
+    'centraldeajuda': 'centraldeajuda',
+    'centrodecustos': 'CentrodeCustos',
+    'cfop': 'CFOP',
+    'cfops': 'CFOP',
+    'contas_a_pagar': 'contas_a_pagar',
+    'contas_a_receber': 'contas_a_receber',
+    'contratos': 'contratos',
+    'controledevisitas': 'controledevisitas',
+    'dashboards': 'dashboards',
+    'entidades': 'Entidades',
+    'entradas_estoque': 'Entradas_Estoque',
+    'enviocobranca': 'EnvioCobranca',
+    'financeiro': 'Financeiro',
+    'importador': 'importador',
+    'licencas': 'Licencas',
+    'listacasamento': 'listacasamento',
+    'onboarding': 'onboarding',
+    'o_s': 'O_S',
+    'ordemdeservico': 'OrdemdeServico',
+    'orcamentos': 'Orcamentos',
+    'parametros_admin': 'parametros_admin',
+    'permissoes_modulos': 'permissoes_modulos',
+    'produtos': 'Produtos',
+    'pedidos': 'Pedidos',
+    'pisos': 'Pisos',  
+    'saidas_estoque': 'Saidas_Estoque',
+    'notasfiscais': 'Notas_Fiscais',
+    'notas_fiscais': 'Notas_Fiscais',
+    'series': 'series',     
+    'transportes': 'transportes',
+
+}
+
+# Mapear nomes de modelos com hífen para nomes reais dos modelos
+MODELO_MAPPING = {
+
+    'titulos-pagar': 'Titulospagar',
+    'titulos-receber': 'Titulosreceber',
+    'ordemdeservico': 'OrdemdeServico',
+    'orcamentos': 'Orcamentos',
+    'listacasamento': 'listacasamento',
+    'contratos': 'contratos',
+    'dashboards': 'dashboards',
+    'auditoria': 'auditoria',
+    'parametros_admin': 'parametros_admin',
+    'permissoes_modulos': 'permissoes_modulos',
+    'pisos': 'Pisos',
+    'Assistente_Spart': 'Assistente_Spart',
+    'assistente_spart': 'Assistente_Spart',
+    'assistente': 'Assistente_Spart',
+    'notas-fiscais': 'Nota',
+    'pedidos-geral': 'PedidoVenda',
+    'pedidos': 'PedidoVenda',
+    'entidades': 'Entidades',
+    'caixa': 'Caixageral',
+    'movicaixa': 'Movicaixa',
+    'ctes': 'Cte',
+    'veiculos': 'Veiculos',
+    'regras': 'RegraICMS',
+    'ncm-fiscal-padrao': 'NcmFiscalPadrao',
+    'ncmfiscalpadrao': 'NcmFiscalPadrao',
+    'criar': 'ignore',
+    'novo': 'ignore',
+    'adicionar': 'ignore',
+    'cadastrar': 'ignore',
+    'editar': 'ignore',
+    'visualizar': 'ignore',
+    'excluir': 'ignore',
+    'imprimir': 'ignore',
+    'transformar': 'ignore',
+    'detalhe': 'ignore',
+    'dashboard': 'ignore',
+    'por-cliente': 'ignore',
+    'emitir-nfe': 'ignore',
+    'cancelar': 'ignore',
+    'duplicar': 'ignore',
+    'baixar': 'ignore',
+    'faturar': 'ignore',
+    'preco': 'ignore',
+    'autocomplete': 'ignore',
+    'processamento': 'ignore',
+    'venda': 'ignore',
+    'saldo': 'ignore',
+    'resumo': 'ignore',
+    'abertos': 'ignore',
+    'obras': 'Obra',
+    'etapas': 'ObraEtapa',
+    'materiais': 'ObraMaterialMovimento',
+    'financeiro': 'ObraLancamentoFinanceiro',
+    'processos': 'ObraProcesso',
+}
+
+
+@lru_cache(maxsize=1024)
+def _obter_modelo(real_app_name, real_modelo_name, app_name, modelo_name):
+    """apps.get_model com fallback para os nomes originais da URL (memorizado por combinação)"""
+    try:
+        modelo = apps.get_model(real_app_name, real_modelo_name)
+        logger.debug(f'Modelo encontrado: {real_app_name}.{real_modelo_name}')
+        return modelo
+    except LookupError:
+        logger.debug(f'Modelo não encontrado: {real_app_name}.{real_modelo_name} (tentativa com {app_name}.{modelo_name})')
+    # Tentar com o nome original como fallback
     try:
-        return UserModel.objects.using(banco).filter(pk=pk).first()
-    except Exception:
+        modelo = apps.get_model(app_name, modelo_name)
+        logger.debug(f'Modelo encontrado com fallback: {app_name}.{modelo_name}')
+        return modelo
+    except LookupError:
+        logger.debug(f'Modelo não encontrado nem com fallback: {app_name}.{modelo_name}')
         return None
 
+
 def converter_para_json_serializavel(obj):
     """Converte objetos Python para tipos serializáveis em JSON"""
     if isinstance(obj, (date, datetime)):
@@ -48,13 +168,24 @@ class AuditoriaMiddleware:
         self.get_response = get_response
     
 
+    def extrair_modelo_e_id(self, request):
+        """
+        Modelo e ID do objeto pela view resolvida (índice de rotas); rotas
+        cuja view não declara modelo caem no mapeamento pelos segmentos da URL
+        """
+        match = indice_rotas.resolver(request)
+        rota = indice_rotas.rota(match)
+        if rota:
+            objeto_id = indice_rotas.objeto_id(match)
+            if objeto_id is None:
+                _, objeto_id = self.extrair_modelo_e_id_da_url(request.path)
+            return rota.model, objeto_id
+        return self.extrair_modelo_e_id_da_url(request.path)
+
     def extrair_modelo_e_id_da_url(self, url):
         """Extrai o nome do modelo e ID do objeto da URL"""
-        # Padrões comuns de URL da API REST e WEB
-        # /api/licenca/app/modelo/id/ ou /web/licenca/app/action/id
         # Atualizado para suportar listagens (sem modelo/ação explícito) e ações extras
-        padrao = r'/(?:api|web)/([^/]+)/([^/]+)(?:/([^/]+))?/?(?:([0-9]+))?'
-        match = re.search(padrao, url)
+        match = PADRAO_URL.search(url)
         
         if match:
             licenca_slug = match.group(1)  # casaa, por exemplo
@@ -71,114 +202,11 @@ class AuditoriaMiddleware:
                 objeto_id = modelo_name
                 modelo_name = 'infer_from_app'
             
-            # Mapear nomes de apps para os nomes reais dos apps Django
-            app_mapping = {
-                'Assistente_Spart': 'Assistente_Spart',  
-                'assistente_spart': 'Assistente_Spart',
-                'assistente': 'Assistente_Spart',
-                'auditoria': 'auditoria',
-                'gestao-obras': 'GestaoObras',
-                'gestaoobras': 'GestaoObras',
-                'boletos': 'boletos',
-                'caixadiario': 'CaixaDiario',
-                'caixa-diario': 'CaixaDiario',
-                'centraldeajuda': 'centraldeajuda',
-                'centrodecustos': 'CentrodeCustos',
-                'cfop': 'CFOP',
-                'cfops': 'CFOP',
-                'contas_a_pagar': 'contas_a_pagar',
-                'contas_a_receber': 'contas_a_receber',
-                'contratos': 'contratos',
-                'controledevisitas': 'controledevisitas',
-                'dashboards': 'dashboards',
-                'entidades': 'Entidades',
-                'entradas_estoque': 'Entradas_Estoque',
-                'enviocobranca': 'EnvioCobranca',
-                'financeiro': 'Financeiro',
-                'importador': 'importador',
-                'licencas': 'Licencas',
-                'listacasamento': 'listacasamento',
-                'onboarding': 'onboarding',
-                'o_s': 'O_S',
-                'ordemdeservico': 'OrdemdeServico',
-                'orcamentos': 'Orcamentos',
-                'parametros_admin': 'parametros_admin',
-                'permissoes_modulos': 'permissoes_modulos',
-                'produtos': 'Produtos',
-                'pedidos': 'Pedidos',
-                'pisos': 'Pisos',  
-                'saidas_estoque': 'Saidas_Estoque',
-                'notasfiscais': 'Notas_Fiscais',
-                'notas_fiscais': 'Notas_Fiscais',
-                'series': 'series',     
-                'transportes': 'transportes',
-
-            }
-            
-            # Mapear nomes de modelos com hífen para nomes reais dos modelos
-            modelo_mapping = {
-                
-                'titulos-pagar': 'Titulospagar',
-                'titulos-receber': 'Titulosreceber',
-                'ordemdeservico': 'OrdemdeServico',
-                'orcamentos': 'Orcamentos',
-                'listacasamento': 'listacasamento',
-                'contratos': 'contratos',
-                'dashboards': 'dashboards',
-                'auditoria': 'auditoria',
-                'parametros_admin': 'parametros_admin',
-                'permissoes_modulos': 'permissoes_modulos',
-                'pisos': 'Pisos',
-                'Assistente_Spart': 'Assistente_Spart',
-                'assistente_spart': 'Assistente_Spart',
-                'assistente': 'Assistente_Spart',
-                'notas-fiscais': 'Nota',
-                'pedidos-geral': 'PedidoVenda',
-                'pedidos': 'PedidoVenda',
-                'entidades': 'Entidades',
-                'caixa': 'Caixageral',
-                'movicaixa': 'Movicaixa',
-                'ctes': 'Cte',
-                'veiculos': 'Veiculos',
-                'regras': 'RegraICMS',
-                'ncm-fiscal-padrao': 'NcmFiscalPadrao',
-                'ncmfiscalpadrao': 'NcmFiscalPadrao',
-                'criar': 'ignore',
-                'novo': 'ignore',
-                'adicionar': 'ignore',
-                'cadastrar': 'ignore',
-                'editar': 'ignore',
-                'visualizar': 'ignore',
-                'excluir': 'ignore',
-                'imprimir': 'ignore',
-                'transformar': 'ignore',
-                'detalhe': 'ignore',
-                'dashboard': 'ignore',
-                'por-cliente': 'ignore',
-                'emitir-nfe': 'ignore',
-                'cancelar': 'ignore',
-                'duplicar': 'ignore',
-                'baixar': 'ignore',
-                'faturar': 'ignore',
-                'preco': 'ignore',
-                'autocomplete': 'ignore',
-                'processamento': 'ignore',
-                'venda': 'ignore',
-                'saldo': 'ignore',
-                'resumo': 'ignore',
-                'abertos': 'ignore',
-                'obras': 'Obra',
-                'etapas': 'ObraEtapa',
-                'materiais': 'ObraMaterialMovimento',
-                'financeiro': 'ObraLancamentoFinanceiro',
-                'processos': 'ObraProcesso',
-            }
-            
             # Usar o nome real do app
-            real_app_name = app_mapping.get(app_name.lower(), app_name)
+            real_app_name = APP_MAPPING.get(app_name.lower(), app_name)
             
             # Usar o nome real do modelo se houver mapeamento
-            real_modelo_name = modelo_mapping.get(modelo_name, modelo_name)
+            real_modelo_name = MODELO_MAPPING.get(modelo_name, modelo_name)
 
             if app_name.lower() == 'produtos' and real_modelo_name == 'NcmFiscalPadrao':
                 real_app_name = 'CFOP'
@@ -203,25 +231,11 @@ class AuditoriaMiddleware:
                     # Transportes não tem um modelo único, melhor ignorar do que tentar carregar
                     pass
             
-            # Tentar obter o modelo real
-            try:
-                # Evita tentar carregar modelos "ignore" ou "infer_from_app" que falharam na inferência
-                if real_modelo_name in ('ignore', 'infer_from_app'):
-                    return None, objeto_id
-
-                modelo = apps.get_model(real_app_name, real_modelo_name)
-                logger.debug(f'Modelo encontrado: {real_app_name}.{real_modelo_name}')
-                return modelo, objeto_id
-            except LookupError:
-                logger.debug(f'Modelo não encontrado: {real_app_name}.{real_modelo_name} (tentativa com {app_name}.{modelo_name})')
-                # Tentar com o nome original como fallback
-                try:
-                    modelo = apps.get_model(app_name, modelo_name)
-                    logger.debug(f'Modelo encontrado com fallback: {app_name}.{modelo_name}')
-                    return modelo, objeto_id
-                except LookupError:
-                    logger.debug(f'Modelo não encontrado nem com fallback: {app_name}.{modelo_name}')
-                    return None, objeto_id
+            # Evita tentar carregar modelos "ignore" ou "infer_from_app" que falharam na inferência
+            if real_modelo_name in ('ignore', 'infer_from_app'):
+                return None, objeto_id
+
+            return _obter_modelo(real_app_name, real_modelo_name, app_name, modelo_name), objeto_id
         
         return None, None
     
@@ -262,7 +276,8 @@ class AuditoriaMiddleware:
             logger.error(f'Erro inesperado ao obter dados antes: {modelo.__name__} ID {objeto_id} - Erro: {str(e)}')
             return None
     
-    def comparar_dados(self, dados_antes, dados_depois):
+    @staticmethod
+    def comparar_dados(dados_antes, dados_depois):
         """Compara dois dicionários e retorna as diferenças"""
         if not dados_antes or not dados_depois:
             return None
@@ -293,15 +308,26 @@ class AuditoriaMiddleware:
         
         return alteracoes if alteracoes else None
     
-    def processar_dados_resposta(self, response):
-        """Extrai dados da resposta para capturar estado posterior"""
+    @staticmethod
+    def capturar_resposta(response):
+        """Guarda os dados da resposta sem decodificar (o parse fica para a fila)"""
+        if hasattr(response, 'data') and response.data:
+            return response.data
+        tipo = response.get('Content-Type', '') if hasattr(response, 'get') else ''
+        if tipo.startswith('application/json') and hasattr(response, 'content'):
+            return response.content[:LIMITE_RESPOSTA]
+        return None
+
+    @staticmethod
+    def processar_dados_resposta(resposta):
+        """Extrai dados da resposta capturada para o estado posterior"""
         try:
-            if hasattr(response, 'data') and response.data:
-                return response.data
-            elif hasattr(response, 'content'):
-                content = response.content.decode('utf-8')
+            if isinstance(resposta, bytes):
+                content = resposta.decode('utf-8')
                 if content:
                     return json.loads(content)
+                return None
+            return resposta or None
         except (json.JSONDecodeError, UnicodeDecodeError) as e:
             pass
         
@@ -414,7 +440,7 @@ class AuditoriaMiddleware:
         
         if logical_method in ['PUT', 'PATCH', 'DELETE']:
             pass
-            modelo, objeto_id = self.extrair_modelo_e_id_da_url(request.path)
+            modelo, objeto_id = self.extrair_modelo_e_id(request)
             pass
             if modelo and objeto_id:
                 dados_antes = self.obter_dados_objeto(modelo, objeto_id)
@@ -496,25 +522,15 @@ class AuditoriaMiddleware:
             # Dados já foram capturados antes do processamento da resposta
             # Remover a captura duplicada aqui
 
-            # Capturar dados depois da alteração
-            dados_depois = None
-            campos_alterados = None
-            
+            # Só um evento compacto sai do request: consulta do usuário no banco,
+            # diff, serialização e gravação ficam com a thread da fila_auditoria.
+            resposta = None
             if logical_method in ['POST', 'PUT', 'PATCH']:
-                dados_depois = self.processar_dados_resposta(response)
-                
-                # Para atualizações, comparar dados antes e depois
-                if logical_method in ['PUT', 'PATCH'] and dados_antes and dados_depois:
-                    campos_alterados = self.comparar_dados(dados_antes, dados_depois)
-                    pass
-            
-            # Para DELETE, usar dados_antes como dados_depois (o que foi excluído)
-            elif logical_method == 'DELETE' and dados_antes:
-                dados_depois = dados_antes
+                resposta = self.capturar_resposta(response)
 
             # Extrair informações do modelo se ainda não foram obtidas
             if not modelo or not objeto_id:
-                modelo, objeto_id = self.extrair_modelo_e_id_da_url(request.path)
+                modelo, objeto_id = self.extrair_modelo_e_id(request)
             
             # Extrair o nome da empresa da URL (licença)
             path_parts = request.path.strip('/').split('/')
@@ -522,126 +538,22 @@ class AuditoriaMiddleware:
             if len(path_parts) > 2 and path_parts[0] == 'api' and path_parts[1] in ('emitir', 'imprimir', 'calcular'):
                 empresa = path_parts[2]
 
-            # Debug dos dados que serão salvos
-            pass
-            
-            # Converter dados para tipos serializáveis em JSON
-            # Serializar objetos Python diretamente (sem json.dumps) para JSONField
-            banco = get_licenca_db_config(request)
-            
-            dados_json = None
-            dados_antes_json = None
-            dados_depois_json = None
-            campos_alterados_json = None
-
-            try:
-                data_serializavel = converter_para_json_serializavel(data) if data else None
-                dados_json = json.dumps(data_serializavel, ensure_ascii=False) if data_serializavel is not None else None
-            except Exception as e:
-                logger.error(f"Erro ao serializar dados (input): {e}")
-
-            try:
-                dados_antes_serializavel = converter_para_json_serializavel(dados_antes) if dados_antes else None
-                dados_antes_json = json.dumps(dados_antes_serializavel, ensure_ascii=False) if dados_antes_serializavel is not None else None
-            except Exception as e:
-                logger.error(f"Erro ao serializar dados_antes: {e}")
-
-            try:
-                dados_depois_serializavel = converter_para_json_serializavel(dados_depois) if dados_depois else None
-                dados_depois_json = json.dumps(dados_depois_serializavel, ensure_ascii=False) if dados_depois_serializavel is not None else None
-            except Exception as e:
-                logger.error(f"Erro ao serializar dados_depois: {e}")
-
-            try:
-                campos_alterados_serializavel = converter_para_json_serializavel(campos_alterados) if campos_alterados else None
-                campos_alterados_json = json.dumps(campos_alterados_serializavel, ensure_ascii=False) if campos_alterados_serializavel is not None else None
-            except Exception as e:
-                logger.error(f"Erro ao serializar campos_alterados: {e}")
-            
-            # Tratamento especial para Notas Fiscais (logging detalhado)
-            try:
-                if '/notasfiscais/notas-fiscais/notas/' in url and method in ['POST', 'PUT', 'PATCH']:
-                    base_payload = dados_depois if dados_depois is not None else data
-                    if base_payload is not None:
-                        try:
-                            printable = base_payload
-                            if isinstance(printable, str):
-                                try:
-                                    printable = json.loads(printable)
-                                except Exception:
-                                    import ast
-                                    try:
-                                        printable = ast.literal_eval(printable)
-                                    except Exception:
-                                        printable = {"raw": printable}
-                            printable = converter_para_json_serializavel(printable)
-                            logger.info(f"Nota Fiscal Payload: {json.dumps(printable, ensure_ascii=False)}")
-                        except Exception:
-                            pass
-                        if isinstance(printable, dict):
-                            try:
-                                def fmt_nota(p):
-                                    linhas = []
-                                    nid = p.get('id') or p.get('nota')
-                                    linhas.append(f"Nota id: {nid}")
-                                    linhas.append(f"Modelo/Série/Número: {p.get('modelo')}-{p.get('serie')} #{p.get('numero')}")
-                                    linhas.append(f"Datas: emissao={p.get('data_emissao')} saida={p.get('data_saida')}")
-                                    emi = p.get('emitente') or {}
-                                    linhas.append(f"Emitente: {emi.get('empr_nome')} CNPJ={emi.get('empr_docu')}")
-                                    dest = p.get('destinatario') or {}
-                                    doc = dest.get('enti_cnpj') or dest.get('enti_cpf') or ''
-                                    linhas.append(f"Destinatario: {dest.get('enti_nome')} Doc={doc}")
-                                    linhas.append(f"Status/Ambiente: {p.get('status')}/{p.get('ambiente')}")
-                                    linhas.append(f"Chave: {p.get('chave_acesso')} Protocolo: {p.get('protocolo_autorizacao')}")
-                                    itens = p.get('itens') or []
-                                    linhas.append(f"Itens: {len(itens)}")
-                                    for i, it in enumerate(itens, 1):
-                                        linhas.append(f"  Item {i} id={it.get('id')} prod={it.get('produto')} quant={it.get('quantidade')} unit={it.get('unitario')} desc={it.get('desconto')} total={it.get('total')} cfop={it.get('cfop')} ncm={it.get('ncm')} cst_icms={it.get('cst_icms')} cst_pis={it.get('cst_pis')} cst_cofins={it.get('cst_cofins')}")
-                                        imp = it.get('impostos') or {}
-                                        if imp:
-                                            linhas.append(f"    Impostos: icms_base={imp.get('icms_base')} aliq={imp.get('icms_aliquota')} icms_valor={imp.get('icms_valor')} ipi={imp.get('ipi_valor')} pis={imp.get('pis_valor')} cofins={imp.get('cofins_valor')} fcp={imp.get('fcp_valor')}")
-                                    tr = p.get('transporte') or {}
-                                    if tr:
-                                        linhas.append(f"Transporte: modalidade={tr.get('modalidade_frete')} placa={tr.get('placa_veiculo')} uf={tr.get('uf_veiculo')} transportadora={tr.get('transportadora')}")
-                                    return "\n".join(linhas)
-                                logger.info(fmt_nota(printable))
-                            except Exception:
-                                pass
-                if '/notasfiscais/notas-fiscais/emitir/' in url and isinstance(dados_depois_serializavel, dict):
-                    xml_str = dados_depois_serializavel.get('xml')
-                    if xml_str:
-                        try:
-                            from xml.dom import minidom
-                            parsed = minidom.parseString(xml_str)
-                            logger.info(f"XML NFe: {parsed.toprettyxml(indent='  ')}")
-                        except Exception:
-                            pass
-            except Exception as e:
-                logger.error(f"Erro no logging detalhado de NFe: {e}")
-            
-            # Criar o log no banco da licença
-            try:
-                usuario_no_banco = resolver_usuario_no_banco(user, banco)
-                log = LogAcao.objects.using(banco).create(
-                    usuario=usuario_no_banco,
-                    data_hora=timezone.now(),
-                    tipo_acao=method,
-                    url=url,
-                    ip=ip,
-                    navegador=user_agent,
-                    dados=dados_json,
-                    dados_antes=dados_antes_json,
-                    dados_depois=dados_depois_json,
-                    campos_alterados=campos_alterados_json,
-                    objeto_id=objeto_id,
-                    modelo=modelo.__name__ if modelo else None,
-                    empresa=empresa,
-                    licenca=licenca_slug
-                )
-
-                logger.info(f'Log criado com sucesso: {log.id} - {method} {url}')
-            except Exception as e:
-                logger.error(f"FATAL: Erro ao criar registro LogAcao: {e}")
+            fila_auditoria.enfileirar({
+                'banco': get_licenca_db_config(request),
+                'usuario_id': getattr(user, 'pk', None),
+                'data_hora': timezone.now(),
+                'tipo_acao': method,
+                'url': url,
+                'ip': ip,
+                'navegador': user_agent,
+                'dados': data,
+                'dados_antes': dados_antes,
+                'resposta': resposta,
+                'objeto_id': objeto_id,
+                'modelo': modelo.__name__ if modelo else None,
+                'empresa': empresa,
+                'licenca': licenca_slug,
+            })
 
         except Exception as e:
             logger.error(f"Erro não tratado no AuditoriaMiddleware: {e}", exc_info=True)
@@ -657,3 +569,119 @@ class AuditoriaMiddleware:
         except Exception:
             pass
         return response
+
+
+def _serializar(valor, nome):
+    try:
+        serializavel = converter_para_json_serializavel(valor) if valor else None
+        return serializavel, (json.dumps(serializavel, ensure_ascii=False) if serializavel is not None else None)
+    except Exception as e:
+        logger.error(f"Erro ao serializar {nome}: {e}")
+        return None, None
+
+
+def montar_log_acao(evento):
+    """Monta o LogAcao de um evento enfileirado pelo AuditoriaMiddleware (roda na thread da fila)"""
+    method = evento['tipo_acao']
+    url = evento['url']
+    data = evento.get('dados')
+    dados_antes = evento.get('dados_antes')
+
+    # Capturar dados depois da alteração
+    dados_depois = None
+    campos_alterados = None
+    if method in ['POST', 'PUT', 'PATCH']:
+        dados_depois = AuditoriaMiddleware.processar_dados_resposta(evento.get('resposta'))
+
+        # Para atualizações, comparar dados antes e depois
+        if method in ['PUT', 'PATCH'] and dados_antes and dados_depois:
+            campos_alterados = AuditoriaMiddleware.comparar_dados(dados_antes, dados_depois)
+
+    # Para DELETE, usar dados_antes como dados_depois (o que foi excluído)
+    elif method == 'DELETE' and dados_antes:
+        dados_depois = dados_antes
+
+    _, dados_json = _serializar(data, 'dados (input)')
+    _, dados_antes_json = _serializar(dados_antes, 'dados_antes')
+    dados_depois_serializavel, dados_depois_json = _serializar(dados_depois, 'dados_depois')
+    _, campos_alterados_json = _serializar(campos_alterados, 'campos_alterados')
+
+    # Tratamento especial para Notas Fiscais (logging detalhado)
+    try:
+        if '/notasfiscais/notas-fiscais/notas/' in url and method in ['POST', 'PUT', 'PATCH']:
+            base_payload = dados_depois if dados_depois is not None else data
+            if base_payload is not None:
+                try:
+                    printable = base_payload
+                    if isinstance(printable, str):
+                        try:
+                            printable = json.loads(printable)
+                        except Exception:
+                            import ast
+                            try:
+                                printable = ast.literal_eval(printable)
+                            except Exception:
+                                printable = {"raw": printable}
+                    printable = converter_para_json_serializavel(printable)
+                    logger.info(f"Nota Fiscal Payload: {json.dumps(printable, ensure_ascii=False)}")
+                except Exception:
+                    pass
+                if isinstance(printable, dict):
+                    try:
+                        def fmt_nota(p):
+                            linhas = []
+                            nid = p.get('id') or p.get('nota')
+                            linhas.append(f"Nota id: {nid}")
+                            linhas.append(f"Modelo/Série/Número: {p.get('modelo')}-{p.get('serie')} #{p.get('numero')}")
+                            linhas.append(f"Datas: emissao={p.get('data_emissao')} saida={p.get('data_saida')}")
+                            emi = p.get('emitente') or {}
+                            linhas.append(f"Emitente: {emi.get('empr_nome')} CNPJ={emi.get('empr_docu')}")
+                            dest = p.get('destinatario') or {}
+                            doc = dest.get('enti_cnpj') or dest.get('enti_cpf') or ''
+                            linhas.append(f"Destinatario: {dest.get('enti_nome')} Doc={doc}")
+                            linhas.append(f"Status/Ambiente: {p.get('status')}/{p.get('ambiente')}")
+                            linhas.append(f"Chave: {p.get('chave_acesso')} Protocolo: {p.get('protocolo_autorizacao')}")
+                            itens = p.get('itens') or []
+                            linhas.append(f"Itens: {len(itens)}")
+                            for i, it in enumerate(itens, 1):
+                                linhas.append(f"  Item {i} id={it.get('id')} prod={it.get('produto')} quant={it.get('quantidade')} unit={it.get('unitario')} desc={it.get('desconto')} total={it.get('total')} cfop={it.get('cfop')} ncm={it.get('ncm')} cst_icms={it.get('cst_icms')} cst_pis={it.get('cst_pis')} cst_cofins={it.get('cst_cofins')}")
+                                imp = it.get('impostos') or {}
+                                if imp:
+                                    linhas.append(f"    Impostos: icms_base={imp.get('icms_base')} aliq={imp.get('icms_aliquota')} icms_valor={imp.get('icms_valor')} ipi={imp.get('ipi_valor')} pis={imp.get('pis_valor')} cofins={imp.get('cofins_valor')} fcp={imp.get('fcp_valor')}")
+                            tr = p.get('transporte') or {}
+                            if tr:
+                                linhas.append(f"Transporte: modalidade={tr.get('modalidade_frete')} placa={tr.get('placa_veiculo')} uf={tr.get('uf_veiculo')} transportadora={tr.get('transportadora')}")
+                            return "\n".join(linhas)
+                        logger.info(fmt_nota(printable))
+                    except Exception:
+                        pass
+        if '/notasfiscais/notas-fiscais/emitir/' in url and isinstance(dados_depois_serializavel, dict):
+            xml_str = dados_depois_serializavel.get('xml')
+            if xml_str:
+                try:
+                    from xml.dom import minidom
+                    parsed = minidom.parseString(xml_str)
+                    logger.info(f"XML NFe: {parsed.toprettyxml(indent='  ')}")
+                except Exception:
+                    pass
+    except Exception as e:
+        logger.error(f"Erro no logging detalhado de NFe: {e}")
+
+    return LogAcao(
+        data_hora=evento['data_hora'],
+        tipo_acao=method,
+        url=url,
+        ip=evento.get('ip'),
+        navegador=evento.get('navegador') or '',
+        dados=dados_json,
+        dados_antes=dados_antes_json,
+        dados_depois=dados_depois_json,
+        campos_alterados=campos_alterados_json,
+        objeto_id=evento.get('objeto_id'),
+        modelo=evento.get('modelo'),
+        empresa=evento.get('empresa'),
+        licenca=evento.get('licenca'),
+    )
+
+
+fila_auditoria = FilaAuditoria(montar_log_acao)
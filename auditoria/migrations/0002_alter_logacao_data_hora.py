@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logacao',
+            name='data_hora',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 # Removido JSONField para evitar erro de encoding no PostgreSQL ao salvar com caracteres Unicode
 
 class LogAcao(models.Model):
@@ -12,7 +13,8 @@ class LogAcao(models.Model):
     ]
 
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
-    data_hora = models.DateTimeField(auto_now_add=True)
+    # default em vez de auto_now_add: a fila grava depois e precisa manter o horário do request
+    data_hora = models.DateTimeField(default=timezone.now)
     tipo_acao = models.CharField(max_length=10, choices=TIPO_ACAO_CHOICES)
     url = models.TextField()
     ip = models.GenericIPAddressField(null=True)
@@ -0,0 +1,83 @@
+import json
+import queue
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from auditoria import fila as fila_modulo
+from auditoria.fila import FilaAuditoria
+from auditoria.middleware import LIMITE_RESPOSTA, AuditoriaMiddleware, montar_log_acao
+
+
+def _evento(banco='casaa', **extra):
+    evento = {
+        'banco': banco,
+        'usuario_id': 1,
+        'data_hora': timezone.now(),
+        'tipo_acao': 'POST',
+        'url': '/api/casaa/produtos/produtos/',
+        'navegador': 'teste',
+    }
+    evento.update(extra)
+    return evento
+
+
+@override_settings(AUDITORIA_ASSINCRONA=True)
+class TestFilaAuditoria(SimpleTestCase):
+    def test_descarta_quando_fila_cheia(self):
+        fila = FilaAuditoria(montar_log_acao, tamanho_maximo=1)
+        fila._fila = queue.Queue(maxsize=1)
+        with mock.patch.object(fila, '_garantir_escritor'), \
+                mock.patch.object(fila_modulo, 'gerenciador_conexoes') as gerenciador:
+            self.assertTrue(fila.enfileirar(_evento()))
+            self.assertFalse(fila.enfileirar(_evento()))
+
+        self.assertEqual(gerenciador.reter.call_count, 2)
+        gerenciador.soltar.assert_called_once_with('casaa')
+
+        stats = fila.estatisticas()
+        self.assertEqual(stats['enfileirados'], 1)
+        self.assertEqual(stats['descartados'], 1)
+        self.assertEqual(stats['pendentes'], 1)
+
+    def test_grava_um_lote_por_banco(self):
+        fila = FilaAuditoria(montar_log_acao)
+        with mock.patch.object(fila, '_gravar_banco') as gravar_banco:
+            fila.gravar([_evento('a'), _evento('b'), _evento('a')], fechar_conexoes=False)
+
+        lotes = {c.args[0]: len(c.args[1]) for c in gravar_banco.call_args_list}
+        self.assertEqual(lotes, {'a': 2, 'b': 1})
+        self.assertEqual(fila.gravados, 3)
+
+    def test_escritor_usa_alias_do_request_e_solta_depois_de_gravar(self):
+        fila = FilaAuditoria(montar_log_acao)
+        with mock.patch.object(fila_modulo, 'gerenciador_conexoes') as gerenciador, \
+                mock.patch('core.utils.get_db_from_slug') as get_db:
+            fila.gravar([_evento('alias_evictado'), _evento('alias_evictado')])
+
+        get_db.assert_not_called()
+        self.assertEqual(fila.erros, 2)
+        gerenciador.soltar.assert_called_once_with('alias_evictado', 2)
+
+
+class TestMontarLogAcao(SimpleTestCase):
+    def test_diff_calculado_a_partir_da_resposta_bruta(self):
+        log = montar_log_acao(_evento(
+            tipo_acao='PUT',
+            dados_antes={'nome': 'A', 'preco': 1},
+            resposta=json.dumps({'nome': 'B', 'preco': 1}).encode('utf-8'),
+        ))
+
+        self.assertEqual(json.loads(log.campos_alterados), {'nome': {'antes': 'A', 'depois': 'B'}})
+        self.assertEqual(json.loads(log.dados_depois), {'nome': 'B', 'preco': 1})
+
+
+class TestCapturarResposta(SimpleTestCase):
+    def test_so_guarda_json_truncado(self):
+        html = HttpResponse(b'<html></html>', content_type='text/html')
+        grande = HttpResponse(b'[' + b'1,' * LIMITE_RESPOSTA + b'1]', content_type='application/json')
+
+        self.assertIsNone(AuditoriaMiddleware.capturar_resposta(html))
+        self.assertEqual(len(AuditoriaMiddleware.capturar_resposta(grande)), LIMITE_RESPOSTA)
@@ -6,6 +6,7 @@ from django_filters import rest_framework as django_filters
 from django.http import HttpResponse
 from datetime import datetime, timedelta
 from django.utils import timezone
+from .middleware import fila_auditoria
 from .models import LogAcao
 from .serializers import LogAcaoSerializer
 from .utils import (
@@ -266,6 +267,13 @@ class LogAcaoViewSet(viewsets.ReadOnlyModelViewSet):
         
         return Response(comparacao)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def fila(self, request):
+        """
+        Situação da fila de gravação deste worker (pendentes, descartados, erros)
+        """
+        return Response(fila_auditoria.estatisticas())
+
     @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
     def admin(self, request, slug= None):
         
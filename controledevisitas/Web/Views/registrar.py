@@ -2,6 +2,7 @@ from django.views.generic import FormView
 from django.contrib import messages
 import logging
 from core.utils import get_licenca_db_config
+from core.numeracao import NumeracaoService
 from django.urls import reverse
 from django.http import HttpResponseRedirect
 from controledevisitas.models import Controlevisita, ItensVisita
@@ -126,27 +127,16 @@ class ControleVisitaCreateView(VendedorEntidadeMixin, FormView):
             messages.error(self.request, 'Filial inválida')
             return self.form_invalid(form)
 
-        # Número da visita máximo por empresa+filial
-        from django.db.models import Max
-        max_numero = Controlevisita.objects.using(self.db_alias).filter(
-            ctrl_empresa_id=empresa_id,
-            ctrl_filial=filial_id,
-        ).aggregate(Max('ctrl_numero')).get('ctrl_numero__max') or 0
-
-        # ID máximo por empresa+filial (conforme solicitado) e global para garantir unicidade
-        max_id_pair = Controlevisita.objects.using(self.db_alias).filter(
-            ctrl_empresa_id=empresa_id,
-            ctrl_filial=filial_id,
-        ).aggregate(Max('ctrl_id')).get('ctrl_id__max') or 0
-        max_id_global = Controlevisita.objects.using(self.db_alias).aggregate(Max('ctrl_id')).get('ctrl_id__max') or 0
-        new_ctrl_id = max(max_id_pair, max_id_global) + 1
         try:
-            logging.info(f"Criando visita: empresa_id={empresa_id}, filial_id={filial_id}, ctrl_id={new_ctrl_id}, ctrl_numero={int(max_numero)+1}")
+            # ctrl_numero por empresa+filial; ctrl_id é a chave, único na base
+            numero = NumeracaoService.proximo(self.db_alias, 'visita_numero', empresa_id, filial_id)
+            new_ctrl_id = NumeracaoService.proximo(self.db_alias, 'visita', empresa_id, filial_id)
+            logging.info(f"Criando visita: empresa_id={empresa_id}, filial_id={filial_id}, ctrl_id={new_ctrl_id}, ctrl_numero={numero}")
             obj = Controlevisita.objects.using(self.db_alias).create(
                 ctrl_id=int(new_ctrl_id),
                 ctrl_empresa=empresa_obj,
                 ctrl_filial=filial_id,
-                ctrl_numero=int(max_numero) + 1,
+                ctrl_numero=numero,
                 ctrl_cliente=cliente,
                 ctrl_data=dados['ctrl_data'],
                 ctrl_vendedor=vendedor,
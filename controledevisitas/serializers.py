@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from rest_framework import status
 from django.db.models import Max
-from django.db import models  # Adicionar esta linha
+from django.db import models, transaction  # Adicionar esta linha
 from .models import Controlevisita, Etapavisita, ItensVisita
 from Produtos.models import Produtos
 from Entidades.models import Entidades
@@ -9,6 +9,7 @@ from Licencas.models import Empresas
 from Orcamentos.models import Orcamentos, ItensOrcamento
 from core.serializers import BancoContextMixin
 from core.utils import get_licenca_db_config
+from core.numeracao import NumeracaoService
 from rest_framework.exceptions import NotFound
 import logging
 from .services import exportar_visita_para_orcamento
@@ -154,19 +155,20 @@ class ControleVisitaSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Banco não encontrado")
         
         # Gerar próximo número se não fornecido
-        if not validated_data.get('ctrl_numero'):
-            max_numero = Controlevisita.objects.using(banco).filter(
-                ctrl_empresa=validated_data['ctrl_empresa'],
-                ctrl_filial=validated_data['ctrl_filial']
-            ).aggregate(Max('ctrl_numero'))['ctrl_numero__max'] or 0
-            validated_data['ctrl_numero'] = max_numero + 1
-        
-        # Gerar próximo ctrl_id sequencial manualmente
-        if not validated_data.get('ctrl_id'):
-            max_id = Controlevisita.objects.using(banco).aggregate(Max('ctrl_id'))['ctrl_id__max'] or 0
-            validated_data['ctrl_id'] = max_id + 1
-        
-        return Controlevisita.objects.using(banco).create(**validated_data)
+        with transaction.atomic(using=banco):
+            empresa = getattr(validated_data.get('ctrl_empresa'), 'pk', validated_data.get('ctrl_empresa'))
+            filial = validated_data.get('ctrl_filial')
+            if not validated_data.get('ctrl_numero'):
+                validated_data['ctrl_numero'] = NumeracaoService.proximo(banco, 'visita_numero', empresa, filial)
+            else:
+                NumeracaoService.registrar_uso(banco, 'visita_numero', empresa, filial, validated_data['ctrl_numero'])
+
+            if not validated_data.get('ctrl_id'):
+                validated_data['ctrl_id'] = NumeracaoService.proximo(banco, 'visita', empresa, filial)
+            else:
+                NumeracaoService.registrar_uso(banco, 'visita', empresa, filial, validated_data['ctrl_id'])
+        
+            return Controlevisita.objects.using(banco).create(**validated_data)
     
     def update(self, instance, validated_data):
         banco = self.context.get('banco')
@@ -1,7 +1,7 @@
 from .models import Controlevisita, ItensVisita
 from Orcamentos.models import Orcamentos, ItensOrcamento
 from Pisos.models import Orcamentopisos, Itensorcapisos
-from django.db.models import Max
+from core.numeracao import NumeracaoService
 from core.decorator import get_modulos_usuario_db
 from Pisos.services.cliente_service import ClienteEnderecoService
 
@@ -20,16 +20,13 @@ def exportar_visita_para_orcamento(visita: Controlevisita, banco: str):
     if not itens_visita.exists():
         raise ValueError("Nenhum item encontrado para esta visita.")
 
-    max_numero = Orcamentos.objects.using(banco).filter(
-        pedi_empr=visita.ctrl_empresa.pk,
-        pedi_fili=visita.ctrl_filial.pk  
-    ).aggregate(Max('pedi_nume'))['pedi_nume__max'] or 0
+    numero = NumeracaoService.proximo(banco, 'orcamento', visita.ctrl_empresa.pk, visita.ctrl_filial.pk)
 
     # Criar orçamento
     orc = Orcamentos.objects.using(banco).create(
         pedi_empr=visita.ctrl_empresa.pk,
         pedi_fili=visita.ctrl_filial.pk,
-        pedi_nume=max_numero + 1,
+        pedi_nume=numero,
         pedi_forn=str(visita.ctrl_cliente.pk) if visita.ctrl_cliente else '',
         pedi_data=visita.ctrl_data,
         pedi_vend=str(visita.ctrl_vendedor.pk) if visita.ctrl_vendedor else '',
@@ -87,16 +84,13 @@ def exportar_visita_para_orcamento_pisos(visita: Controlevisita, banco: str, req
         raise ValueError("Nenhum item encontrado para esta visita.")
 
     # Gerar próximo número do orçamento de pisos
-    max_numero = Orcamentopisos.objects.using(banco).filter(
-        orca_empr=visita.ctrl_empresa.pk,
-        orca_fili=visita.ctrl_filial.pk
-    ).aggregate(Max('orca_nume'))['orca_nume__max'] or 0
+    numero = NumeracaoService.proximo(banco, 'orcamento_pisos', visita.ctrl_empresa.pk, visita.ctrl_filial.pk)
 
     # Criar orçamento de pisos
     orc_pisos = Orcamentopisos.objects.using(banco).create(
         orca_empr=visita.ctrl_empresa.pk,
         orca_fili=visita.ctrl_filial.pk,
-        orca_nume=max_numero + 1,
+        orca_nume=numero,
         orca_clie=visita.ctrl_cliente.pk if visita.ctrl_cliente else None,
         orca_data=visita.ctrl_data,
         orca_vend=visita.ctrl_vendedor.pk if visita.ctrl_vendedor else None,
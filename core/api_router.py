@@ -65,6 +65,8 @@ urlpatterns = [
     path("<slug>/transportes/", include("transportes.api.urls")),
     path("<slug>/comissoes-webapi/", include("comissoes.Rest.urls")),
     path("<slug>/processos/", include("processos.rest.urls")),
+    path("<slug>/sync/", include("sincronizacao.urls")),
+    path("<slug>/midias/", include("midias.urls")),
 
     # Documentação da API
     path("schema/", SpectacularAPIView.as_view(), name="schema"),
@@ -2,8 +2,8 @@ import logging
 import time
 from django.db import connections
 from django.conf import settings
-from decouple import config
 from core.licenca_context import get_licencas_map
+from core.tenant_connections import gerenciador_conexoes
 
 logger = logging.getLogger(__name__)
 
@@ -14,46 +14,18 @@ def preload_database_connections():
     
     loaded_connections = 0
     
-    for licenca in get_licencas_map():
+    # Respeita o limite do gerenciador: não faz sentido abrir mais do que ele mantém
+    for licenca in get_licencas_map()[:gerenciador_conexoes.max_aliases]:
         try:
             slug = licenca["slug"]
             
             # Pular se já existe
             if slug in settings.DATABASES:
                 continue
-                
-            # Configurar conexão
-            prefixo = slug.upper()
-            db_user = licenca.get("db_user") or config(f"{prefixo}_DB_USER", default=None)
-            db_password = licenca.get("db_password") or config(f"{prefixo}_DB_PASSWORD", default=None)
-            
-            if not db_user or not db_password:
-                logger.warning(f"⚠️  Credenciais não encontradas para {slug}")
-                continue
-            
-            settings.DATABASES[slug] = {
-                'ENGINE': 'django.db.backends.postgresql',
-                'NAME': licenca["db_name"],
-                'USER': db_user,
-                'PASSWORD': db_password,
-                'HOST': licenca["db_host"],
-                'PORT': licenca["db_port"],
-                'OPTIONS': {
-                    'options': '-c timezone=America/Araguaina',
-                    'connect_timeout': 10,
-                    'application_name': 'mobile_sps_preload',
-                },
-                'CONN_MAX_AGE': 600,
-                'CONN_HEALTH_CHECKS': True,
-                'TEST': {
-                    'MIRROR': 'default',
-                    'DEPENDENCIES': [],
-                },
-            }
-            
-            # Preparar conexão
-            connections.ensure_defaults(slug)
-            connections.prepare_test_settings(slug)
+
+            gerenciador_conexoes.obter_alias(
+                slug, licenca, application_name='mobile_sps_preload', connect_timeout=10
+            )
             
             # Testar conexão
             conn = connections[slug]
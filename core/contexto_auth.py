@@ -0,0 +1,159 @@
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TTL = 60
+_NAO_CARREGADO = object()
+
+
+def _versao_usuarios(banco):
+    key = f'usuario_ver_{banco}'
+    ver = cache.get(key)
+    if ver is None:
+        # Começa no timestamp para não voltar a uma versão antiga se a chave sumir
+        ver = int(time.time())
+        cache.add(key, ver, None)
+        ver = cache.get(key) or ver
+    return ver
+
+
+def limpar_snapshot_usuarios(banco):
+    """Invalida os snapshots de usuário da licença (signal de Usuarios)."""
+    key = f'usuario_ver_{banco}'
+    ver = _versao_usuarios(banco)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, ver + 1, None)
+
+
+def _campos_snapshot():
+    from Licencas.models import Usuarios
+
+    # A senha fica fora do cache; se alguém ler, o Django carrega sob demanda
+    return [f.attname for f in Usuarios._meta.concrete_fields if f.attname != 'password']
+
+
+class ContextoAuth:
+    """
+    Autenticação da requisição resolvida uma vez: token JWT decodificado e
+    verificado, slug, empresa/filial, usuário do banco da licença e perfil.
+    Fica no HttpRequest e é lido pelo LicencaMiddleware, pelo
+    PerfilPermissionMiddleware e pela CustomJWTAuthentication.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        auth = request.META.get('HTTP_AUTHORIZATION', '')
+        self.token = auth.split(' ', 1)[1].strip() if auth.startswith('Bearer ') else None
+        self._claims = _NAO_CARREGADO
+        self._usuarios = {}
+        self._perfis = {}
+        self.slug = None
+        self.empresa = None
+        self.filial = None
+
+    @classmethod
+    def obter(cls, request):
+        request = getattr(request, '_request', request)  # rest_framework.request.Request
+        contexto = getattr(request, '_contexto_auth', None)
+        if contexto is None:
+            contexto = cls(request)
+            request._contexto_auth = contexto
+        return contexto
+
+    @property
+    def claims(self):
+        """Payload do JWT (assinatura e expiração verificadas) ou None."""
+        if self._claims is _NAO_CARREGADO:
+            self._claims = None
+            if self.token:
+                from rest_framework_simplejwt.exceptions import TokenBackendError
+                from rest_framework_simplejwt.state import token_backend
+
+                try:
+                    self._claims = token_backend.decode(self.token, verify=True)
+                except TokenBackendError as e:
+                    logger.info("[contexto_auth] token inválido: %s", e)
+        return self._claims
+
+    @property
+    def slug_token(self):
+        return (self.claims or {}).get('lice_slug')
+
+    @property
+    def usuario_id(self):
+        from rest_framework_simplejwt.settings import api_settings
+
+        claims = self.claims or {}
+        uid = claims.get(api_settings.USER_ID_CLAIM) or claims.get('usuario_id') or claims.get('user_id')
+        try:
+            return int(uid) if uid is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    @property
+    def username(self):
+        claims = self.claims or {}
+        return claims.get('username') or claims.get('usua_nome')
+
+    def definir_licenca(self, slug, empresa=None, filial=None):
+        self.slug = slug
+        self.empresa = empresa
+        self.filial = filial
+
+    def usuario(self, banco, usuario_id=None, username=None):
+        """
+        Usuário do token no banco da licença, carregado uma vez por request.
+        O snapshot das colunas fica em cache (SNAPSHOT_TTL) chaveado pela
+        versão de usuários da licença.
+        """
+        usuario_id = usuario_id if usuario_id is not None else self.usuario_id
+        username = username or self.username
+        chave = (banco, usuario_id, username)
+        if chave in self._usuarios:
+            return self._usuarios[chave]
+
+        usuario = None
+        if usuario_id is not None:
+            usuario = self._usuario_por_id(banco, usuario_id)
+        if usuario is None and username:
+            from Licencas.models import Usuarios
+
+            usuario = Usuarios.objects.using(banco).filter(usua_nome__iexact=username).first()
+            if usuario is not None:
+                self._guardar_snapshot(banco, usuario)
+        self._usuarios[chave] = usuario
+        return usuario
+
+    def _usuario_por_id(self, banco, usuario_id):
+        from Licencas.models import Usuarios
+
+        campos = _campos_snapshot()
+        key = f'usuario_snap_{banco}_{usuario_id}_v{_versao_usuarios(banco)}'
+        valores = cache.get(key)
+        if valores is not None:
+            return Usuarios.from_db(banco, campos, valores)
+
+        usuario = Usuarios.objects.using(banco).filter(pk=usuario_id).first()
+        if usuario is not None:
+            self._guardar_snapshot(banco, usuario)
+        return usuario
+
+    @staticmethod
+    def _guardar_snapshot(banco, usuario):
+        campos = _campos_snapshot()
+        key = f'usuario_snap_{banco}_{usuario.pk}_v{_versao_usuarios(banco)}'
+        cache.set(key, [getattr(usuario, campo) for campo in campos], SNAPSHOT_TTL)
+
+    def perfil(self, usuario):
+        """Perfil ativo do usuário (perfilweb), resolvido uma vez por request."""
+        chave = getattr(usuario, 'pk', None)
+        if chave not in self._perfis:
+            from perfilweb.services import get_perfil_ativo
+
+            self._perfis[chave] = get_perfil_ativo(usuario)
+        return self._perfis[chave]
@@ -9,30 +9,22 @@ def set_current_request(request):
 def get_current_request():
     return getattr(_thread_locals, 'request', None)
 
-import json
 import logging
-from pathlib import Path
 
-json_path = Path(__file__).resolve().parent / 'licencas.json'
 logger = logging.getLogger(__name__)
 
 def get_licencas_map():
-    try:
-        from core.licencas_loader import carregar_licencas_dict
-        data = carregar_licencas_dict()
-        if data:
-            
-            return data
-    except Exception:
-        logger.warning("[LICENCAS_CONTEXT] erro ao carregar da tabela, usando fallback JSON")
-    
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data
-    except Exception as e:
-        logger.error(f"[LICENCAS_CONTEXT] Erro fatal ao ler JSON de fallback: {e}")
-        return []
+    from core.licencas_registry import registro_licencas
+    return registro_licencas.listar()
+
+def get_licenca(slug):
+    """Busca O(1) no registro de licenças do worker."""
+    from core.licencas_registry import registro_licencas
+    return registro_licencas.get_licenca(slug)
+
+def get_licenca_por_documento(docu):
+    from core.licencas_registry import registro_licencas
+    return registro_licencas.get_licenca_por_documento(docu)
 
 def get_licencas_login_clientes():
     """
@@ -0,0 +1,184 @@
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+json_path = Path(__file__).resolve().parent / 'licencas.json'
+
+VERSAO_CACHE_KEY = "licencas:registro:versao"
+# Intervalo mínimo (s) entre consultas ao carimbo de versão no cache compartilhado.
+INTERVALO_VERIFICACAO = 15
+# Recarga forçada (s), cobre alterações feitas direto no banco sem passar pelo ORM.
+TTL_MAXIMO = 600
+# Recarga (s) quando a tabela veio vazia ou falhou (lista vazia ou JSON de fallback).
+TTL_FALLBACK = 30
+
+
+def _normalizar_slug(slug):
+    return str(slug or "").strip().lower()
+
+
+def _normalizar_doc(doc):
+    return re.sub(r"\D", "", str(doc or ""))
+
+
+class RegistroLicencas:
+    """
+    Registro de licenças mantido em memória por worker.
+
+    Carrega a tabela ``licencas_web`` uma única vez e indexa por slug e por
+    documento. A cada ``intervalo`` segundos compara a versão local com o
+    carimbo gravado no cache compartilhado (Redis) e só recarrega quando ele
+    muda ou quando ``ttl_maximo`` expira. Uma carga sem a tabela vale só
+    ``ttl_fallback`` segundos.
+    """
+
+    def __init__(self, intervalo=INTERVALO_VERIFICACAO, ttl_maximo=TTL_MAXIMO, ttl_fallback=TTL_FALLBACK):
+        self.intervalo = intervalo
+        self.ttl_maximo = ttl_maximo
+        self.ttl_fallback = ttl_fallback
+        self._ttl = ttl_maximo
+        self._lock = threading.Lock()
+        self._lista = []
+        self._por_slug = {}
+        self._por_doc = {}
+        self._versao = None
+        self._carregado_em = None
+        self._verificado_em = 0.0
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def listar(self):
+        self._garantir_atualizado()
+        return list(self._lista)
+
+    def get_licenca(self, slug):
+        if not slug:
+            return None
+        self._garantir_atualizado()
+        return self._por_slug.get(_normalizar_slug(slug))
+
+    def get_licenca_por_documento(self, docu):
+        digits = _normalizar_doc(docu)
+        if not digits:
+            return None
+        self._garantir_atualizado()
+        return self._por_doc.get(digits)
+
+    def existe(self, slug):
+        return self.get_licenca(slug) is not None
+
+    def recarregar(self):
+        with self._lock:
+            self._carregar()
+
+    def limpar(self):
+        with self._lock:
+            self._carregado_em = None
+            self._versao = None
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _garantir_atualizado(self):
+        if self._precisa_recarregar():
+            with self._lock:
+                # Outra thread pode ter recarregado enquanto aguardávamos o lock
+                if self._precisa_recarregar():
+                    self._carregar()
+
+    def _precisa_recarregar(self):
+        if self._carregado_em is None:
+            return True
+        agora = time.monotonic()
+        if agora - self._carregado_em >= self._ttl:
+            return True
+        if agora - self._verificado_em < self.intervalo:
+            return False
+        self._verificado_em = agora
+        return _versao_atual() != self._versao
+
+    def _carregar(self):
+        versao = _versao_atual()
+        dados = _carregar_da_tabela()
+        ttl = self.ttl_maximo
+        if not dados:
+            dados = _carregar_do_json()
+            ttl = self.ttl_fallback
+
+        por_slug = {}
+        por_doc = {}
+        for item in dados:
+            slug = _normalizar_slug(item.get("slug"))
+            if not slug:
+                continue
+            por_slug[slug] = item
+            doc = _normalizar_doc(item.get("cnpj"))
+            if doc and doc not in por_doc:
+                por_doc[doc] = item
+
+        self._lista = dados
+        self._por_slug = por_slug
+        self._por_doc = por_doc
+        self._versao = versao
+        self._ttl = ttl
+        agora = time.monotonic()
+        self._carregado_em = agora
+        self._verificado_em = agora
+        logger.info("[LICENCAS_REGISTRY] %s licenças carregadas (versao=%s)", len(por_slug), versao)
+
+
+def _versao_atual():
+    try:
+        versao = cache.get(VERSAO_CACHE_KEY)
+        if versao is None:
+            versao = time.time_ns()
+            if not cache.add(VERSAO_CACHE_KEY, versao, None):
+                versao = cache.get(VERSAO_CACHE_KEY)
+        return versao
+    except Exception as e:
+        logger.warning("[LICENCAS_REGISTRY] carimbo de versão indisponível: %s", e)
+        return None
+
+
+def _carregar_da_tabela():
+    try:
+        from core.licencas_loader import carregar_licencas_dict
+        return carregar_licencas_dict() or []
+    except Exception:
+        logger.warning("[LICENCAS_REGISTRY] erro ao carregar da tabela, usando fallback JSON")
+        return []
+
+
+def _carregar_do_json():
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return json.load(f) or []
+    except Exception as e:
+        logger.error(f"[LICENCAS_REGISTRY] Erro fatal ao ler JSON de fallback: {e}")
+        return []
+
+
+registro_licencas = RegistroLicencas()
+
+
+def get_licenca(slug):
+    return registro_licencas.get_licenca(slug)
+
+
+def invalidar_registro_licencas():
+    """Publica nova versão para que todos os workers recarreguem o registro."""
+    try:
+        cache.set(VERSAO_CACHE_KEY, time.time_ns(), None)
+    except Exception as e:
+        logger.warning("[LICENCAS_REGISTRY] falha ao publicar nova versão: %s", e)
+    registro_licencas.limpar()
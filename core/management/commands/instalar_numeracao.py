@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.licencas_loader import carregar_licencas_dict
+from core.numeracao import TABELA_NUMERACAO, instalar_tabela
+from core.utils import get_db_from_slug
+
+
+class Command(BaseCommand):
+    help = f"Cria a tabela {TABELA_NUMERACAO} com os contadores de numeração de documentos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slug", help="Processa apenas a licença informada")
+
+    def handle(self, *args, **options):
+        licencas = carregar_licencas_dict()
+        if not licencas:
+            raise CommandError("Nenhuma licença encontrada")
+
+        if options.get("slug"):
+            licencas = [lic for lic in licencas if lic["slug"] == options["slug"]]
+            if not licencas:
+                raise CommandError(f"Licença {options['slug']} não encontrada")
+
+        for lic in licencas:
+            slug = lic["slug"]
+            try:
+                banco = get_db_from_slug(slug)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Banco indisponível: {e}"))
+                continue
+
+            try:
+                if instalar_tabela(banco):
+                    self.stdout.write(self.style.SUCCESS(f"[{slug}] Tabela de numeração criada"))
+                else:
+                    self.stdout.write(f"[{slug}] Tabela de numeração já existia")
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Erro ao criar tabela de numeração: {e}"))
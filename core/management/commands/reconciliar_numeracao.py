@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.licencas_loader import carregar_licencas_dict
+from core.numeracao import DOCUMENTOS, NumeracaoService, instalar_tabela
+from core.utils import get_db_from_slug
+
+
+class Command(BaseCommand):
+    help = "Reconcilia os contadores de numeração (pedido, orçamento, OS) com o maior número gravado em cada base"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slug", help="Processa apenas a licença informada")
+        parser.add_argument("--tipo", choices=sorted(DOCUMENTOS.keys()), help="Processa apenas um tipo de documento")
+
+    def handle(self, *args, **options):
+        licencas = carregar_licencas_dict()
+        if not licencas:
+            raise CommandError("Nenhuma licença encontrada")
+
+        if options.get("slug"):
+            licencas = [lic for lic in licencas if lic["slug"] == options["slug"]]
+            if not licencas:
+                raise CommandError(f"Licença {options['slug']} não encontrada")
+
+        tipos = [options["tipo"]] if options.get("tipo") else sorted(DOCUMENTOS.keys())
+
+        for lic in licencas:
+            slug = lic["slug"]
+            try:
+                banco = get_db_from_slug(slug)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Banco indisponível: {e}"))
+                continue
+
+            try:
+                instalar_tabela(banco)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Erro ao criar tabela de numeração: {e}"))
+                continue
+
+            for tipo in tipos:
+                try:
+                    with connections[banco].cursor() as cursor:
+                        cursor.execute(DOCUMENTOS[tipo]["sql_escopos"])
+                        escopos = cursor.fetchall()
+                    for empresa, filial in escopos:
+                        anterior, atual = NumeracaoService.reconciliar(banco, tipo, empresa, filial)
+                        if anterior != atual:
+                            self.stdout.write(self.style.WARNING(
+                                f"[{slug}] {tipo} empr={empresa} fili={filial}: {anterior} -> {atual}"
+                            ))
+                    self.stdout.write(self.style.SUCCESS(f"[{slug}] {tipo} reconciliado"))
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"[{slug}] Erro ao reconciliar {tipo}: {e}"))
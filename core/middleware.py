@@ -5,7 +5,8 @@ from django.core.cache import cache
 from django.core.exceptions import SuspiciousOperation
 from django.conf import settings
 from django.http import JsonResponse, HttpResponseRedirect
-from core.licenca_context import set_current_request, get_licencas_map
+from core.contexto_auth import ContextoAuth
+from core.licenca_context import set_current_request, get_licenca
 from core.utils import get_licenca_db_config
 from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
 from django.utils.cache import patch_vary_headers
@@ -229,6 +230,9 @@ class LicencaMiddleware:
         set_current_request(request)
 
         self._apply_empresa_filial_api_safe(request)
+        ContextoAuth.obter(request).definir_licenca(
+            slug, getattr(request, "empresa", None), getattr(request, "filial", None)
+        )
 
         self._load_modulos(request)
 
@@ -347,32 +351,17 @@ class LicencaMiddleware:
         set_modulos_disponiveis(mods)
 
     def _slug_from_jwt(self, request):
-        """Extrai slug do JWT com fallback para sessão."""
-        auth = request.headers.get("Authorization", "")
-        if not auth.startswith("Bearer "):
-            return self._session_get(request, "slug")
-        
-        try:
-            import jwt
-
-            token = auth.split(" ")[1]
-            dec = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            slug = dec.get("lice_slug")
-            
-            if slug:
-                return slug
-            
-            # Fallback para sessão
-            return self._session_get(request, "slug")
-        except Exception as e:
-            logger.error("Erro JWT: %s", e)
-            return self._session_get(request, "slug")
+        """Extrai slug do JWT (decodificado uma vez no ContextoAuth) com fallback para sessão."""
+        slug = ContextoAuth.obter(request).slug_token
+        if slug:
+            return slug
+        return self._session_get(request, "slug")
 
     def _get_licenca(self, slug):
-        """Busca licença no mapa."""
+        """Busca licença no registro do worker."""
         if not slug:
             return None
-        return next((x for x in get_licencas_map() if x["slug"] == slug), None)
+        return get_licenca(slug)
 
     # ======================================================
     # Respostas seguras
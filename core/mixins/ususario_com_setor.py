@@ -4,7 +4,7 @@ from core.middleware import get_licenca_slug
 
 
 
-from core.licenca_context import get_licencas_map
+from core.licenca_context import get_licenca
 
 SETOR_OBRIGATORIO_SLUGS = {"savexml144", "saveweb144"}
 
@@ -13,8 +13,7 @@ class UsuarioComSetorMixin:
         super().initial(request, *args, **kwargs)
         slug = get_licenca_slug()
         db_alias = get_licenca_db_config(request)
-        licencas = get_licencas_map()
-        licenca_info = next((l for l in licencas if l.get('slug') == slug), None)
+        licenca_info = get_licenca(slug)
         
         db_name = licenca_info.get('db_name', '') if licenca_info else ''
         is_banco_144 = slug in SETOR_OBRIGATORIO_SLUGS
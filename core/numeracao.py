@@ -0,0 +1,318 @@
+import logging
+import threading
+
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+TABELA_NUMERACAO = 'numeracaodocumentos'
+
+# Cada tipo de documento informa de onde vem o maior número já usado (semente e
+# reconciliação), quais (empresa, filial) existem na base e se a numeração é
+# única na base inteira ou por empresa/filial.
+# pedidosvenda e orcamentosvenda têm pedi_nume como chave primária, então o
+# contador é global (empresa/filial 0).
+DOCUMENTOS = {
+    'pedido': {
+        'global': True,
+        'sql_maximo': """
+            SELECT GREATEST(
+                COALESCE((SELECT MAX(pedi_nume)::bigint FROM pedidosvenda), 0),
+                COALESCE((
+                    SELECT MAX(movi_nume_vend)::bigint FROM movicaixa
+                    WHERE movi_empr = %(empresa)s AND movi_fili = %(filial)s
+                ), 0),
+                COALESCE((
+                    SELECT MAX(NULLIF(regexp_replace(said_obse, '\\D', '', 'g'), '')::bigint)
+                    FROM saidasestoque
+                    WHERE said_empr = %(empresa)s
+                      AND said_fili = %(filial)s
+                      AND said_obse LIKE 'Saída automática - Pedido %%'
+                ), 0)
+            )
+        """,
+        'sql_ocupado': "SELECT 1 FROM pedidosvenda WHERE pedi_nume BETWEEN %(inicio)s AND %(fim)s LIMIT 1",
+        'sql_escopos': "SELECT DISTINCT pedi_empr, pedi_fili FROM pedidosvenda",
+    },
+    'orcamento': {
+        'global': True,
+        'sql_maximo': "SELECT COALESCE(MAX(pedi_nume)::bigint, 0) FROM orcamentosvenda",
+        'sql_ocupado': "SELECT 1 FROM orcamentosvenda WHERE pedi_nume BETWEEN %(inicio)s AND %(fim)s LIMIT 1",
+        'sql_escopos': "SELECT 0, 0",
+    },
+    'orcamento_pisos': {
+        'global': True,
+        'sql_maximo': "SELECT COALESCE(MAX(orca_nume)::bigint, 0) FROM orcamentopisos",
+        'sql_ocupado': "SELECT 1 FROM orcamentopisos WHERE orca_nume BETWEEN %(inicio)s AND %(fim)s LIMIT 1",
+        'sql_escopos': "SELECT 0, 0",
+    },
+    'pedido_pisos': {
+        'global': True,
+        'sql_maximo': "SELECT COALESCE(MAX(pedi_nume)::bigint, 0) FROM pedidospisos",
+        'sql_ocupado': "SELECT 1 FROM pedidospisos WHERE pedi_nume BETWEEN %(inicio)s AND %(fim)s LIMIT 1",
+        'sql_escopos': "SELECT 0, 0",
+    },
+    'os': {
+        'global': False,
+        'sql_maximo': """
+            SELECT COALESCE(MAX(os_os)::bigint, 0) FROM os
+            WHERE os_empr = %(empresa)s AND os_fili = %(filial)s
+        """,
+        'sql_ocupado': """
+            SELECT 1 FROM os
+            WHERE os_empr = %(empresa)s AND os_fili = %(filial)s AND os_os BETWEEN %(inicio)s AND %(fim)s
+            LIMIT 1
+        """,
+        'sql_escopos': "SELECT DISTINCT os_empr, os_fili FROM os",
+    },
+    # controlevisita.ctrl_id é a chave primária (base inteira); ctrl_numero é
+    # o número mostrado ao usuário, por empresa/filial.
+    'visita': {
+        'global': True,
+        'sql_maximo': "SELECT COALESCE(MAX(ctrl_id)::bigint, 0) FROM controlevisita",
+        'sql_ocupado': "SELECT 1 FROM controlevisita WHERE ctrl_id BETWEEN %(inicio)s AND %(fim)s LIMIT 1",
+        'sql_escopos': "SELECT 0, 0",
+    },
+    'visita_numero': {
+        'global': False,
+        'sql_maximo': """
+            SELECT COALESCE(MAX(ctrl_numero)::bigint, 0) FROM controlevisita
+            WHERE ctrl_empresa = %(empresa)s AND ctrl_filial = %(filial)s
+        """,
+        'sql_ocupado': """
+            SELECT 1 FROM controlevisita
+            WHERE ctrl_empresa = %(empresa)s AND ctrl_filial = %(filial)s
+              AND ctrl_numero BETWEEN %(inicio)s AND %(fim)s
+            LIMIT 1
+        """,
+        'sql_escopos': "SELECT DISTINCT ctrl_empresa, ctrl_filial FROM controlevisita WHERE ctrl_empresa IS NOT NULL",
+    },
+}
+
+# Quantas vezes o contador é realinhado com o MAX da tabela quando o número
+# reservado já foi gravado por outro caminho (cliente, sistema legado, importação).
+TENTATIVAS_COLISAO = 3
+
+_tabelas_prontas = set()
+_tabelas_lock = threading.Lock()
+
+
+class NumeracaoService:
+    """
+    Numeração sequencial de documentos baseada em uma linha de contador por
+    (empresa, filial, tipo). O incremento é um único UPDATE ... RETURNING, que
+    trava só a linha do contador até o fim da transação do chamador: se a
+    transação for desfeita o número volta junto, sem buracos.
+    """
+
+    @staticmethod
+    def proximo(banco: str, tipo: str, empresa: int, filial: int) -> int:
+        inicio, _ = NumeracaoService.reservar(banco, tipo, empresa, filial, quantidade=1)
+        return inicio
+
+    @staticmethod
+    def reservar(banco: str, tipo: str, empresa: int, filial: int, quantidade: int = 1):
+        """
+        Reserva ``quantidade`` números consecutivos. Retorna (primeiro, último).
+        Se algum já estiver gravado (outro gravador passou do contador), o
+        contador é realinhado com o MAX da tabela e a reserva é refeita.
+        """
+        if quantidade < 1:
+            raise ValueError("Quantidade de números a reservar deve ser positiva")
+        doc = NumeracaoService._documento(tipo)
+        empr, fili = NumeracaoService._escopo(doc, empresa, filial)
+        _conferir_tabela(banco)
+
+        with transaction.atomic(using=banco):
+            with connections[banco].cursor() as cursor:
+                ultimo = NumeracaoService._incrementar(cursor, tipo, empr, fili, quantidade)
+                if ultimo is None:
+                    semente = NumeracaoService._maximo_atual(cursor, doc, empresa, filial)
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {TABELA_NUMERACAO} (nume_empr, nume_fili, nume_tipo, nume_ulti)
+                        VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (nume_empr, nume_fili, nume_tipo) DO NOTHING
+                        """,
+                        [empr, fili, tipo, semente],
+                    )
+                    ultimo = NumeracaoService._incrementar(cursor, tipo, empr, fili, quantidade)
+
+                for _ in range(TENTATIVAS_COLISAO):
+                    ultimo = int(ultimo)
+                    if not NumeracaoService._ocupado(cursor, doc, empresa, filial, ultimo - quantidade + 1, ultimo):
+                        break
+                    maximo = NumeracaoService._maximo_atual(cursor, doc, empresa, filial)
+                    logger.warning(
+                        "[NUMERACAO] %s %s: número %s já usado; contador realinhado com %s",
+                        banco, tipo, ultimo, maximo,
+                    )
+                    cursor.execute(
+                        f"""
+                        UPDATE {TABELA_NUMERACAO}
+                           SET nume_ulti = GREATEST(nume_ulti, %s) + %s
+                         WHERE nume_empr = %s AND nume_fili = %s AND nume_tipo = %s
+                        RETURNING nume_ulti
+                        """,
+                        [maximo, quantidade, empr, fili, tipo],
+                    )
+                    ultimo = cursor.fetchone()[0]
+                else:
+                    raise RuntimeError(f"Não foi possível reservar número livre para {tipo}")
+
+        ultimo = int(ultimo)
+        return ultimo - quantidade + 1, ultimo
+
+    @staticmethod
+    def espiar(banco: str, tipo: str, empresa: int, filial: int) -> int:
+        """Próximo número provável, só para exibição: não reserva nem cria o contador."""
+        doc = NumeracaoService._documento(tipo)
+        empr, fili = NumeracaoService._escopo(doc, empresa, filial)
+        with connections[banco].cursor() as cursor:
+            maximo = NumeracaoService._maximo_atual(cursor, doc, empresa, filial)
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [TABELA_NUMERACAO])
+            if cursor.fetchone()[0]:
+                cursor.execute(
+                    f"""
+                    SELECT nume_ulti FROM {TABELA_NUMERACAO}
+                     WHERE nume_empr = %s AND nume_fili = %s AND nume_tipo = %s
+                    """,
+                    [empr, fili, tipo],
+                )
+                row = cursor.fetchone()
+                if row:
+                    maximo = max(maximo, int(row[0]))
+        return maximo + 1
+
+    @staticmethod
+    def registrar_uso(banco: str, tipo: str, empresa: int, filial: int, numero: int) -> None:
+        """Avança o contador quando um número foi informado pelo cliente (ex.: app offline)."""
+        doc = NumeracaoService._documento(tipo)
+        empr, fili = NumeracaoService._escopo(doc, empresa, filial)
+        _conferir_tabela(banco)
+        with connections[banco].cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {TABELA_NUMERACAO}
+                   SET nume_ulti = GREATEST(nume_ulti, %s)
+                 WHERE nume_empr = %s AND nume_fili = %s AND nume_tipo = %s
+                """,
+                [int(numero), empr, fili, tipo],
+            )
+
+    @staticmethod
+    def reconciliar(banco: str, tipo: str, empresa: int = 0, filial: int = 0):
+        """
+        Ajusta o contador para nunca ficar atrás do maior número gravado na
+        tabela do documento. Retorna (valor_anterior, valor_atual).
+        """
+        doc = NumeracaoService._documento(tipo)
+        empr, fili = NumeracaoService._escopo(doc, empresa, filial)
+        _conferir_tabela(banco)
+        with transaction.atomic(using=banco):
+            with connections[banco].cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT nume_ulti FROM {TABELA_NUMERACAO}
+                     WHERE nume_empr = %s AND nume_fili = %s AND nume_tipo = %s
+                     FOR UPDATE
+                    """,
+                    [empr, fili, tipo],
+                )
+                row = cursor.fetchone()
+                anterior = int(row[0]) if row else None
+                maximo = NumeracaoService._maximo_atual(cursor, doc, empresa, filial)
+                atual = max(anterior or 0, maximo)
+                cursor.execute(
+                    f"""
+                    INSERT INTO {TABELA_NUMERACAO} (nume_empr, nume_fili, nume_tipo, nume_ulti)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (nume_empr, nume_fili, nume_tipo)
+                    DO UPDATE SET nume_ulti = EXCLUDED.nume_ulti
+                    """,
+                    [empr, fili, tipo, atual],
+                )
+        return anterior, atual
+
+    @staticmethod
+    def _incrementar(cursor, tipo, empr, fili, quantidade):
+        cursor.execute(
+            f"""
+            UPDATE {TABELA_NUMERACAO}
+               SET nume_ulti = nume_ulti + %s
+             WHERE nume_empr = %s AND nume_fili = %s AND nume_tipo = %s
+            RETURNING nume_ulti
+            """,
+            [quantidade, empr, fili, tipo],
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _ocupado(cursor, doc, empresa, filial, inicio, fim) -> bool:
+        cursor.execute(doc['sql_ocupado'], {'empresa': empresa, 'filial': filial, 'inicio': inicio, 'fim': fim})
+        return cursor.fetchone() is not None
+
+    @staticmethod
+    def _maximo_atual(cursor, doc, empresa, filial) -> int:
+        cursor.execute(doc['sql_maximo'], {'empresa': empresa, 'filial': filial})
+        row = cursor.fetchone()
+        return int(row[0] or 0) if row else 0
+
+    @staticmethod
+    def _documento(tipo):
+        doc = DOCUMENTOS.get(tipo)
+        if doc is None:
+            raise ValueError(f"Tipo de documento sem numeração configurada: {tipo}")
+        return doc
+
+    @staticmethod
+    def _escopo(doc, empresa, filial):
+        if doc['global']:
+            return 0, 0
+        return int(empresa), int(filial)
+
+
+def instalar_tabela(banco: str) -> bool:
+    """
+    Cria a tabela dos contadores. Roda só pelos comandos ``instalar_numeracao``
+    e ``reconciliar_numeracao``. Devolve False se ela já existia.
+    """
+    with connections[banco].cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [TABELA_NUMERACAO])
+        existia = cursor.fetchone()[0]
+        if not existia:
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {TABELA_NUMERACAO} (
+                    nume_empr integer NOT NULL,
+                    nume_fili integer NOT NULL,
+                    nume_tipo varchar(20) NOT NULL,
+                    nume_ulti bigint NOT NULL DEFAULT 0,
+                    PRIMARY KEY (nume_empr, nume_fili, nume_tipo)
+                )
+                """
+            )
+            logger.info("[NUMERACAO] Tabela %s criada em %s", TABELA_NUMERACAO, banco)
+    if not connections[banco].in_atomic_block:
+        _marcar(banco)
+    return not existia
+
+
+def _conferir_tabela(banco: str) -> None:
+    """Exige a tabela dos contadores (consulta uma vez por processo, sem DDL)."""
+    if banco in _tabelas_prontas:
+        return
+    with connections[banco].cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [TABELA_NUMERACAO])
+        existe = cursor.fetchone()[0]
+    if not existe:
+        raise RuntimeError(
+            f"Tabela {TABELA_NUMERACAO} não instalada em {banco}: rode manage.py instalar_numeracao"
+        )
+    _marcar(banco)
+
+
+def _marcar(banco: str) -> None:
+    with _tabelas_lock:
+        _tabelas_prontas.add(banco)
@@ -0,0 +1,101 @@
+import logging
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_CHAVE_ITENS = ('iped_empr', 'iped_fili', 'iped_pedi', 'iped_item')
+TAMANHO_LOTE = 500
+
+
+def sincronizar_itens(model, banco: str, filtro: dict, itens: list, campos_chave=CAMPOS_CHAVE_ITENS) -> dict:
+    """
+    Grava os itens de um documento comparando com o que já está no banco.
+
+    ``filtro`` identifica o documento (ex.: empresa, filial e número) e
+    ``itens`` são instâncias não salvas do ``model`` com a chave completa
+    preenchida. Itens novos vão num bulk_create, itens alterados num único
+    UPDATE ... FROM (VALUES ...) e itens que sumiram num único DELETE.
+
+    As tabelas de itens têm chave composta que o ORM não conhece (o pk do
+    model é fictício), por isso o UPDATE é montado à mão pela chave completa.
+    """
+    campo_item = campos_chave[-1]
+    existentes = {
+        getattr(row, campo_item): row
+        for row in model.objects.using(banco).filter(**filtro)
+    }
+
+    campos = [
+        f for f in model._meta.concrete_fields
+        if f.attname not in campos_chave
+    ]
+
+    inserir = []
+    atualizar = []
+    vistos = set()
+    for item in itens:
+        numero = getattr(item, campo_item)
+        vistos.add(numero)
+        atual = existentes.get(numero)
+        if atual is None:
+            inserir.append(item)
+            continue
+        for f in campos:
+            if getattr(f, 'auto_now', False):
+                continue
+            if f.to_python(getattr(item, f.attname)) != f.to_python(getattr(atual, f.attname)):
+                atualizar.append(item)
+                break
+
+    remover = [n for n in existentes if n not in vistos]
+
+    if remover:
+        model.objects.using(banco).filter(**filtro, **{f"{campo_item}__in": remover}).delete()
+    if atualizar:
+        atualizar_em_lote(model, banco, atualizar, [f.name for f in campos], campos_chave)
+    if inserir:
+        model.objects.using(banco).bulk_create(inserir, batch_size=TAMANHO_LOTE)
+
+    for item in itens:
+        item._state.db = banco
+        item._state.adding = False
+
+    return {'inseridos': len(inserir), 'atualizados': len(atualizar), 'removidos': len(remover)}
+
+
+def atualizar_em_lote(model, banco: str, itens: list, campos: list, campos_chave) -> None:
+    """
+    UPDATE ... FROM (VALUES ...) de ``campos`` das instâncias, casando pela
+    chave real da tabela (``campos_chave``), em lotes de TAMANHO_LOTE.
+    """
+    conn = connections[banco]
+    tabela = conn.ops.quote_name(model._meta.db_table)
+    campos_chave_obj = [model._meta.get_field(c) for c in campos_chave]
+    campos = [model._meta.get_field(c) for c in campos]
+    todos = campos_chave_obj + campos
+    colunas = [conn.ops.quote_name(f.column) for f in todos]
+
+    # Tipos explícitos: sem eles o PostgreSQL trata NULL/literais do VALUES como text
+    linha = "(" + ", ".join(f"%s::{f.db_type(conn)}" for f in todos) + ")"
+    set_sql = ", ".join(
+        f"{conn.ops.quote_name(f.column)} = v.{conn.ops.quote_name(f.column)}" for f in campos
+    )
+    where_sql = " AND ".join(
+        f"t.{conn.ops.quote_name(f.column)} = v.{conn.ops.quote_name(f.column)}" for f in campos_chave_obj
+    )
+
+    with conn.cursor() as cursor:
+        for inicio in range(0, len(itens), TAMANHO_LOTE):
+            lote = itens[inicio:inicio + TAMANHO_LOTE]
+            params = []
+            for item in lote:
+                for f in todos:
+                    valor = f.pre_save(item, False) if getattr(f, 'auto_now', False) else getattr(item, f.attname)
+                    params.append(f.get_db_prep_save(valor, connection=conn))
+            sql = (
+                f"UPDATE {tabela} AS t SET {set_sql} "
+                f"FROM (VALUES {', '.join([linha] * len(lote))}) AS v ({', '.join(colunas)}) "
+                f"WHERE {where_sql}"
+            )
+            cursor.execute(sql, params)
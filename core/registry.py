@@ -6,7 +6,8 @@ from django.conf import settings
 from django.db import connections
 from core.licenca_context import get_current_request
 from core.middleware import get_licenca_slug 
-from core.licenca_context import get_licencas_map
+from core.licenca_context import get_licenca, get_licenca_por_documento
+from core.tenant_connections import gerenciador_conexoes
 
 json_path = Path(__file__).resolve().parent / 'licencas.json'
 
@@ -30,7 +31,7 @@ def get_licenca_db_config(request_or_slug):
     if not slug:
         return "default"  # Ou lança erro, se quiser
 
-    licenca = next((lic for lic in get_licencas_map() if lic["slug"] == slug), None)
+    licenca = get_licenca(slug)
     if not licenca:
         alt_slug = None
         try:
@@ -43,44 +44,15 @@ def get_licenca_db_config(request_or_slug):
             except Exception:
                 alt_slug = None
         if alt_slug and hasattr(request_or_slug, "user") and getattr(request_or_slug.user, "is_authenticated", False):
-            licenca = next((lic for lic in get_licencas_map() if lic["slug"] == alt_slug), None)
+            licenca = get_licenca(alt_slug)
             if licenca:
                 slug = alt_slug
         if not licenca:
             raise Exception(f"Licença com slug '{slug}' não encontrada.")
 
-    if slug in settings.DATABASES:
-        return slug
-
-    prefixo = slug.upper()
-    db_user = licenca.get("db_user") or config(f"{prefixo}_DB_USER", default=None)
-    db_password = licenca.get("db_password") or config(f"{prefixo}_DB_PASSWORD", default=None)
-    if not db_user or not db_password:
-        raise Exception(f"Credenciais não encontradas para {slug}")
-
-    settings.DATABASES[slug] = {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': licenca["db_name"],
-        'USER': db_user,
-        'PASSWORD': db_password,
-        'HOST': licenca["db_host"],
-        'PORT': licenca["db_port"],
-        'OPTIONS': {
-            'connect_timeout': 3,
-        },
-        'TEST': {
-            'MIRROR': 'default',
-            'DEPENDENCIES': [],
-        },
-    }
-
-    connections.ensure_defaults(slug)
-    connections.prepare_test_settings(slug)
-
-    return slug
+    return gerenciador_conexoes.obter_alias(slug, licenca, connect_timeout=3)
 
 
 def get_modulos_por_docu(docu):
-    docu_digits = limpar_cnpj(str(docu or ""))
-    licenca = next((x for x in get_licencas_map() if limpar_cnpj(str(x.get('cnpj') or "")) == docu_digits), None)
+    licenca = get_licenca_por_documento(docu)
     return licenca.get('modulos', []) if licenca else []
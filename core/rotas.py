@@ -0,0 +1,102 @@
+import logging
+import threading
+from collections import namedtuple
+
+from django.db import models
+from django.urls import Resolver404, URLPattern, URLResolver, get_resolver, resolve
+
+logger = logging.getLogger(__name__)
+
+RotaModelo = namedtuple('RotaModelo', ['app_label', 'model_name', 'model'])
+
+# kwargs da URL que identificam o objeto (primeiro encontrado vale)
+CHAVES_OBJETO = ('pk', 'id')
+
+
+def _modelo_da_view(callback):
+    """Modelo atendido pela view: atributo model, queryset ou Meta.model do serializer."""
+    cls = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+    if cls is None:
+        return None
+    model = getattr(cls, 'model', None)
+    if model is None:
+        queryset = getattr(cls, 'queryset', None)
+        model = getattr(queryset, 'model', None)
+    if model is None:
+        serializer = getattr(cls, 'serializer_class', None)
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if isinstance(model, type) and issubclass(model, models.Model):
+        return model
+    return None
+
+
+class IndiceRotas:
+    """
+    Índice view → (app_label, model_name, model) montado uma vez a partir do
+    URLconf. A consulta por requisição é um dict lookup pela view resolvida,
+    sem regex nem acesso a banco.
+    """
+
+    def __init__(self, urlconf=None):
+        self._urlconf = urlconf
+        self._por_view = None
+        self._lock = threading.Lock()
+
+    def _construir(self):
+        por_view = {}
+        pendentes = list(get_resolver(self._urlconf).url_patterns)
+        while pendentes:
+            padrao = pendentes.pop()
+            if isinstance(padrao, URLResolver):
+                pendentes.extend(padrao.url_patterns)
+            elif isinstance(padrao, URLPattern):
+                model = _modelo_da_view(padrao.callback)
+                if model is not None:
+                    por_view[padrao.callback] = RotaModelo(model._meta.app_label, model._meta.model_name, model)
+        logger.info("[ROTAS] índice montado com %s views com modelo", len(por_view))
+        return por_view
+
+    @property
+    def por_view(self):
+        if self._por_view is None:
+            with self._lock:
+                if self._por_view is None:
+                    self._por_view = self._construir()
+        return self._por_view
+
+    def limpar(self):
+        with self._lock:
+            self._por_view = None
+
+    def resolver(self, request):
+        """
+        ResolverMatch da requisição: o do handler, se já resolvido, ou um
+        resolve() guardado no request para os demais middlewares.
+        """
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            return match
+        if not hasattr(request, '_match_rota'):
+            try:
+                request._match_rota = resolve(request.path_info)
+            except Resolver404:
+                request._match_rota = None
+        return request._match_rota
+
+    def rota(self, match):
+        if match is None:
+            return None
+        return self.por_view.get(match.func)
+
+    @staticmethod
+    def objeto_id(match):
+        if match is None:
+            return None
+        for chave in CHAVES_OBJETO:
+            valor = match.kwargs.get(chave)
+            if valor not in (None, ''):
+                return str(valor)
+        return None
+
+
+indice_rotas = IndiceRotas()
@@ -77,6 +77,40 @@ logger.warning("🧠 BASE USADA: %s", "LOCAL" if USE_LOCAL_DB else "REMOTA")
 
 DATABASE_ROUTERS = ['core.db_router.LicencaDBRouter']
 
+# Máximo de aliases de tenant mantidos por worker (LRU em core.tenant_connections)
+TENANT_MAX_CONEXOES = config('TENANT_MAX_CONEXOES', default=32, cast=int)
+
+# Fila de gravação do AuditoriaMiddleware (auditoria.fila)
+AUDITORIA_ASSINCRONA = config('AUDITORIA_ASSINCRONA', default=True, cast=bool)
+AUDITORIA_FILA_TAMANHO = config('AUDITORIA_FILA_TAMANHO', default=10000, cast=int)
+AUDITORIA_FILA_LOTE = config('AUDITORIA_FILA_LOTE', default=500, cast=int)
+AUDITORIA_FILA_INTERVALO = config('AUDITORIA_FILA_INTERVALO', default=2.0, cast=float)
+
+# Certificados A1 abertos em memória (Notas_Fiscais.infrastructure.certificado_cache)
+CERTIFICADO_CACHE_TTL = config('CERTIFICADO_CACHE_TTL', default=1800, cast=int)
+CERTIFICADO_CACHE_MAX = config('CERTIFICADO_CACHE_MAX', default=64, cast=int)
+# Processos do pool de assinatura da emissão em lote de NF-e (Notas_Fiscais.infrastructure.assinatura_lote)
+NFE_LOTE_PROCESSOS = config('NFE_LOTE_PROCESSOS', default=min(4, os.cpu_count() or 1), cast=int)
+
+# Carrinho do caixa em cache e tabela de preços em memória (CaixaDiario.carrinho)
+CAIXA_CARRINHO_TTL = config('CAIXA_CARRINHO_TTL', default=43200, cast=int)
+CAIXA_PRECOS_TTL = config('CAIXA_PRECOS_TTL', default=120, cast=int)
+
+# Dias recalculados a cada consolidação dos fatos diários do DRE/dashboards (DRE.servicos.fatos_servico)
+FATOS_DIAS_RECALCULO = config('FATOS_DIAS_RECALCULO', default=45, cast=int)
+
+# Sincronização incremental do app offline (sincronizacao.servico)
+SYNC_PAGINA = config('SYNC_PAGINA', default=500, cast=int)
+SYNC_PAGINA_MAX = config('SYNC_PAGINA_MAX', default=2000, cast=int)
+SYNC_PUSH_MAX = config('SYNC_PUSH_MAX', default=200, cast=int)
+SYNC_RETENCAO_DIAS = config('SYNC_RETENCAO_DIAS', default=30, cast=int)
+
+# Fotografia dos parâmetros por licença/empresa/filial (parametros_admin.snapshot)
+PARAMETROS_SNAPSHOT_TTL = config('PARAMETROS_SNAPSHOT_TTL', default=600, cast=int)
+
+# Miniaturas de fotos/anexos servidas por hash (midias.servico)
+MIDIA_MINIATURA_TTL = config('MIDIA_MINIATURA_TTL', default=604800, cast=int)
+
 # Definir aplicativos instalados
 INSTALLED_APPS = [
     'core',  # Adicionar core como app
@@ -119,6 +153,8 @@ INSTALLED_APPS = [
     "comissoes",
     "EnvioCobranca",
     "DRE",
+    "sincronizacao",
+    "midias",
     #"Gerencial",
     "OrdemProducao",
     'parametros_admin',
@@ -607,6 +643,18 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'planos.tasks.verificar_trials_expirados',
         'schedule': 86400,  # 24h em segundos — sem precisar importar nada
     },
+    'atualizar-fatos-diarios': {
+        'task': 'DRE.tasks.atualizar_fatos_diarios',
+        'schedule': 86400,
+    },
+    'expurgar-sincronizacao': {
+        'task': 'sincronizacao.tasks.expurgar_alteracoes',
+        'schedule': 86400,
+    },
+    'notificacoes-diarias': {
+        'task': 'notificacoes.tasks.enviar_notificacoes_diarias',
+        'schedule': 86400,
+    },
 }
 
 # ============================================================================
@@ -0,0 +1,205 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from celery.signals import task_postrun
+from decouple import config
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Aliases que nunca entram no LRU (bancos fixos do settings).
+ALIASES_FIXOS = frozenset({'default'})
+MINIMO_ALIASES = 2
+
+
+def montar_config_tenant(licenca, application_name='mobile_sps', connect_timeout=30):
+    """Monta o dicionário de DATABASES para a licença (credenciais da tabela ou do .env)."""
+    slug = licenca["slug"]
+    prefixo = slug.upper()
+    db_user = licenca.get("db_user") or config(f"{prefixo}_DB_USER", default=None)
+    db_password = licenca.get("db_password") or config(f"{prefixo}_DB_PASSWORD", default=None)
+    if not db_user or not db_password:
+        raise Exception(f"Credenciais não encontradas para {slug}")
+
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': licenca["db_name"],
+        'USER': db_user,
+        'PASSWORD': db_password,
+        'HOST': licenca["db_host"],
+        'PORT': licenca["db_port"],
+        'OPTIONS': {
+            'options': '-c timezone=America/Araguaina',
+            'connect_timeout': connect_timeout,
+            'application_name': application_name,
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {
+            'MIRROR': 'default',
+            'DEPENDENCIES': [],
+        },
+    }
+
+
+class GerenciadorConexoesTenant:
+    """
+    Controla quantos aliases de tenant ficam registrados em ``settings.DATABASES``
+    por worker. Ao passar do limite, o alias usado há mais tempo sai do LRU.
+
+    Conexões do Django são por thread: uma thread não consegue fechar a conexão
+    de outra. Por isso o alias evictado só sai de ``DATABASES`` quando nenhuma
+    thread tem mais conexão com ele; até lá fica pendente, e cada thread fecha a
+    sua conexão ao fim da requisição (``request_finished``/``task_postrun``).
+    Trabalho fora do ciclo de request (ex.: fila de auditoria) segura o alias
+    com ``reter``/``soltar`` em vez de resolvê-lo de novo na outra thread.
+    """
+
+    def __init__(self, max_aliases=None):
+        self._max_aliases = max_aliases
+        self._aliases = OrderedDict()
+        # alias → idents das threads que abriram conexão com ele
+        self._threads = {}
+        # aliases fora do LRU esperando as threads fecharem suas conexões
+        self._pendentes = set()
+        # alias → usos retidos fora do request ainda não concluídos
+        self._retidos = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_aliases(self):
+        limite = self._max_aliases
+        if limite is None:
+            limite = getattr(settings, 'TENANT_MAX_CONEXOES', 32)
+        return max(int(limite), MINIMO_ALIASES)
+
+    def obter_alias(self, slug, licenca, **config_kwargs):
+        """Garante o alias da licença registrado e marca como usado mais recentemente."""
+        self.liberar_thread()
+        with self._lock:
+            if slug in settings.DATABASES:
+                self.hits += 1
+                # Alias configurado fora do gerenciador passa a ser controlado pelo LRU
+                novo = slug not in self._aliases and slug not in ALIASES_FIXOS
+                self._pendentes.discard(slug)
+                self._tocar(slug)
+                if novo:
+                    self._evictar_excedentes()
+                return slug
+
+            self.misses += 1
+            settings.DATABASES[slug] = montar_config_tenant(licenca, **config_kwargs)
+            connections.ensure_defaults(slug)
+            connections.prepare_test_settings(slug)
+            self._tocar(slug)
+            self._evictar_excedentes()
+            return slug
+
+    def remover(self, alias):
+        with self._lock:
+            self._aliases.pop(alias, None)
+            self._retirar(alias)
+
+    def reter(self, alias):
+        """Mantém o alias em ``DATABASES`` mesmo se sair do LRU, até o ``soltar`` correspondente."""
+        if alias in ALIASES_FIXOS:
+            return
+        with self._lock:
+            self._retidos[alias] = self._retidos.get(alias, 0) + 1
+
+    def soltar(self, alias, quantidade=1):
+        if alias in ALIASES_FIXOS:
+            return
+        with self._lock:
+            restante = self._retidos.get(alias, 0) - quantidade
+            if restante > 0:
+                self._retidos[alias] = restante
+                return
+            self._retidos.pop(alias, None)
+            if alias in self._pendentes:
+                self._retirar(alias)
+
+    def liberar_thread(self, **kwargs):
+        """Fecha as conexões desta thread com aliases evictados (receiver de sinais)."""
+        ident = threading.get_ident()
+        with self._lock:
+            for alias in [a for a in self._pendentes if ident in self._threads.get(a, ())]:
+                self._fechar_nesta_thread(alias)
+                self._threads[alias].discard(ident)
+                self._retirar(alias)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'abertos': len(self._aliases),
+                'limite': self.max_aliases,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'pendentes': len(self._pendentes),
+            }
+
+    def aliases(self):
+        with self._lock:
+            return list(self._aliases.keys())
+
+    def _tocar(self, alias):
+        if alias in ALIASES_FIXOS:
+            return
+        self._aliases[alias] = time.monotonic()
+        self._aliases.move_to_end(alias)
+        self._threads.setdefault(alias, set()).add(threading.get_ident())
+
+    def _evictar_excedentes(self):
+        while len(self._aliases) > self.max_aliases:
+            alias, _ = self._aliases.popitem(last=False)
+            self.evictions += 1
+            logger.info("[TENANT_CONN] alias %s removido por LRU", alias)
+            self._retirar(alias)
+
+    def _retirar(self, alias):
+        """
+        Fecha a conexão desta thread e tira o alias de ``DATABASES`` se nenhuma
+        outra thread viva ainda estiver com conexão nem houver uso retido;
+        senão deixa pendente.
+        """
+        if alias in ALIASES_FIXOS:
+            return
+        self._fechar_nesta_thread(alias)
+        vivas = {t.ident for t in threading.enumerate()}
+        restantes = self._threads.get(alias, set())
+        restantes.discard(threading.get_ident())
+        restantes &= vivas
+        if restantes or self._retidos.get(alias):
+            self._threads[alias] = restantes
+            self._pendentes.add(alias)
+            return
+        self._threads.pop(alias, None)
+        self._pendentes.discard(alias)
+        settings.DATABASES.pop(alias, None)
+
+    def _fechar_nesta_thread(self, alias):
+        conn = getattr(connections._connections, alias, None)
+        if conn is None:
+            return
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning("[TENANT_CONN] erro ao fechar %s: %s", alias, e)
+        try:
+            delattr(connections._connections, alias)
+        except AttributeError:
+            pass
+
+
+gerenciador_conexoes = GerenciadorConexoesTenant()
+
+request_finished.connect(gerenciador_conexoes.liberar_thread, dispatch_uid='tenant_conn_liberar_thread')
+task_postrun.connect(gerenciador_conexoes.liberar_thread, weak=False, dispatch_uid='tenant_conn_liberar_task')
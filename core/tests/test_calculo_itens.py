@@ -0,0 +1,29 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from core.utils import (
+    calcular_subtotal_item_bruto,
+    calcular_total_item_com_desconto,
+    calcular_totais_itens,
+)
+
+
+class TestCalcularTotaisItens(SimpleTestCase):
+    def test_mesmo_resultado_do_calculo_por_item(self):
+        valores = [
+            (Decimal('3'), Decimal('10.333335'), Decimal('0')),
+            (Decimal('1.5'), Decimal('2.005'), Decimal('1.00')),
+            (Decimal('2'), Decimal('5'), Decimal('20')),
+        ]
+        totais = calcular_totais_itens(valores)
+
+        self.assertEqual(totais['subtotais'], [calcular_subtotal_item_bruto(q, u) for q, u, _ in valores])
+        self.assertEqual(totais['totais'], [calcular_total_item_com_desconto(q, u, d) for q, u, d in valores])
+        self.assertEqual(totais['subtotal'], sum(totais['subtotais']))
+        self.assertEqual(totais['total'], sum(totais['totais']))
+        self.assertTrue(totais['tem_desconto'])
+
+    def test_limite_do_subtotal(self):
+        with self.assertRaises(ValueError):
+            calcular_totais_itens([(Decimal('100000'), Decimal('100000'), Decimal('0'))])
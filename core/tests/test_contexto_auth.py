@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+from rest_framework.request import Request
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.contexto_auth import ContextoAuth
+from Licencas.authentication import CustomJWTAuthentication
+
+
+class TestContextoAuth(SimpleTestCase):
+    def setUp(self):
+        token = AccessToken()
+        token['usua_codi'] = 7
+        token['lice_slug'] = 'demo'
+        token['username'] = 'ana'
+        self.raw = str(token)
+        self.request = RequestFactory().get('/api/demo/x/', HTTP_AUTHORIZATION=f'Bearer {self.raw}')
+
+    def test_claims_decodificadas_uma_vez(self):
+        from rest_framework_simplejwt.state import token_backend
+
+        with mock.patch.object(token_backend, 'decode', wraps=token_backend.decode) as decode:
+            contexto = ContextoAuth.obter(self.request)
+            self.assertEqual(contexto.slug_token, 'demo')
+            self.assertEqual(contexto.usuario_id, 7)
+            self.assertEqual(contexto.username, 'ana')
+            self.assertIs(ContextoAuth.obter(Request(self.request)), contexto)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_token_invalido_sem_claims(self):
+        request = RequestFactory().get('/api/demo/x/', HTTP_AUTHORIZATION=f'Bearer {self.raw}x')
+        contexto = ContextoAuth.obter(request)
+        self.assertIsNone(contexto.claims)
+        self.assertIsNone(contexto.slug_token)
+
+    def test_autenticacao_reaproveita_claims(self):
+        autenticacao = CustomJWTAuthentication()
+        autenticacao.contexto = ContextoAuth.obter(self.request)
+        autenticacao.contexto.claims
+        with mock.patch('rest_framework_simplejwt.state.token_backend.decode') as decode:
+            token = autenticacao.get_validated_token(self.raw.encode())
+        decode.assert_not_called()
+        self.assertEqual(token['usua_codi'], 7)
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from unittest.mock import patch
+
+from core.licencas_registry import RegistroLicencas, invalidar_registro_licencas
+
+
+LICENCAS = [
+    {"slug": "save1", "cnpj": "13446907000120", "db_name": "savexml1"},
+    {"slug": "ipa", "cnpj": "12.345.678/0001-90", "db_name": "savexml2"},
+]
+
+
+class TestRegistroLicencas(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch('core.licencas_registry._carregar_da_tabela', return_value=LICENCAS)
+    def test_carrega_uma_vez_e_busca_por_slug(self, carregar):
+        registro = RegistroLicencas(intervalo=3600)
+        self.assertEqual(registro.get_licenca('save1')['db_name'], 'savexml1')
+        self.assertEqual(registro.get_licenca(' IPA ')['db_name'], 'savexml2')
+        self.assertIsNone(registro.get_licenca('inexistente'))
+        self.assertEqual(len(registro.listar()), 2)
+        self.assertEqual(carregar.call_count, 1)
+
+    @patch('core.licencas_registry._carregar_da_tabela', return_value=LICENCAS)
+    def test_busca_por_documento(self, carregar):
+        registro = RegistroLicencas(intervalo=3600)
+        self.assertEqual(registro.get_licenca_por_documento('12345678000190')['slug'], 'ipa')
+        self.assertIsNone(registro.get_licenca_por_documento(''))
+
+    @patch('core.licencas_registry._carregar_da_tabela', return_value=LICENCAS)
+    def test_recarrega_quando_versao_muda(self, carregar):
+        registro = RegistroLicencas(intervalo=0)
+        registro.get_licenca('save1')
+        registro.get_licenca('save1')
+        self.assertEqual(carregar.call_count, 1)
+
+        invalidar_registro_licencas()
+        registro.get_licenca('save1')
+        self.assertEqual(carregar.call_count, 2)
+
+    @patch('core.licencas_registry._carregar_do_json', return_value=LICENCAS[:1])
+    @patch('core.licencas_registry._carregar_da_tabela', return_value=[])
+    def test_fallback_json_quando_tabela_vazia(self, carregar, carregar_json):
+        registro = RegistroLicencas(intervalo=3600)
+        self.assertIsNotNone(registro.get_licenca('save1'))
+        self.assertIsNone(registro.get_licenca('ipa'))
+
+    @patch('core.licencas_registry._carregar_do_json', return_value=[])
+    @patch('core.licencas_registry._carregar_da_tabela')
+    def test_carga_sem_tabela_expira_logo(self, carregar, carregar_json):
+        carregar.side_effect = [[], LICENCAS]
+        registro = RegistroLicencas(intervalo=3600, ttl_fallback=0)
+        self.assertIsNone(registro.get_licenca('save1'))
+        self.assertEqual(registro.get_licenca('save1')['db_name'], 'savexml1')
+        self.assertEqual(carregar.call_count, 2)
+
+        # carga boa volta ao TTL longo
+        registro.get_licenca('save1')
+        self.assertEqual(carregar.call_count, 2)
@@ -0,0 +1,109 @@
+from contextlib import nullcontext
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from core import numeracao
+from core.numeracao import NumeracaoService
+
+
+class _BancoFalso:
+    """Contador e pedidosvenda em memória, respondendo só aos SQL do NumeracaoService."""
+
+    def __init__(self, pedidos=()):
+        self.contador = {}
+        self.pedidos = set(pedidos)
+        self.tabela = True
+        self.ddl = []
+        self._linha = None
+
+    def execute(self, sql, params=None):
+        self._linha = None
+        if 'CREATE TABLE' in sql:
+            self.ddl.append(sql)
+            self.tabela = True
+            return
+        if 'INSERT INTO numeracaodocumentos' in sql:
+            empr, fili, tipo, semente = params
+            self.contador.setdefault((empr, fili, tipo), semente)
+        elif 'to_regclass' in sql:
+            self._linha = (self.tabela,)
+        elif 'nume_ulti = nume_ulti +' in sql:
+            quantidade, empr, fili, tipo = params
+            if (empr, fili, tipo) in self.contador:
+                self.contador[(empr, fili, tipo)] += quantidade
+                self._linha = (self.contador[(empr, fili, tipo)],)
+        elif 'GREATEST(nume_ulti, %s) +' in sql:
+            maximo, quantidade, empr, fili, tipo = params
+            chave = (empr, fili, tipo)
+            self.contador[chave] = max(self.contador[chave], maximo) + quantidade
+            self._linha = (self.contador[chave],)
+        elif 'GREATEST(nume_ulti, %s)' in sql:
+            numero, empr, fili, tipo = params
+            if (empr, fili, tipo) in self.contador:
+                self.contador[(empr, fili, tipo)] = max(self.contador[(empr, fili, tipo)], numero)
+        elif 'SELECT nume_ulti' in sql:
+            valor = self.contador.get(tuple(params))
+            self._linha = (valor,) if valor is not None else None
+        elif 'BETWEEN' in sql:
+            ocupado = any(params['inicio'] <= n <= params['fim'] for n in self.pedidos)
+            self._linha = (1,) if ocupado else None
+        elif 'MAX(pedi_nume)' in sql:
+            self._linha = (max(self.pedidos, default=0),)
+        else:
+            raise AssertionError(sql)
+
+    def fetchone(self):
+        return self._linha
+
+
+class NumeracaoServiceTests(SimpleTestCase):
+    def setUp(self):
+        numeracao._tabelas_prontas.clear()
+        self.banco = _BancoFalso(pedidos={1, 2})
+        conexao = MagicMock(in_atomic_block=False)
+        conexao.cursor.return_value.__enter__.return_value = self.banco
+        for alvo, valor in (
+            ('connections', {'demo': conexao}),
+            ('transaction', MagicMock(atomic=lambda using=None: nullcontext())),
+        ):
+            patcher = patch.object(numeracao, alvo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _gravar_legado(self, numero):
+        # Caminho que grava pedido sem passar pelo contador (app antigo, importação)
+        self.banco.pedidos.add(numero)
+
+    def test_alocadores_intercalados_nao_repetem_numero(self):
+        self.assertEqual(NumeracaoService.proximo('demo', 'pedido', 1, 1), 3)
+        self.banco.pedidos.add(3)
+        self._gravar_legado(4)
+        self._gravar_legado(5)
+        self.assertEqual(NumeracaoService.proximo('demo', 'pedido', 1, 1), 6)
+        self.banco.pedidos.add(6)
+
+        NumeracaoService.registrar_uso('demo', 'pedido', 1, 1, 10)
+        self.assertEqual(NumeracaoService.proximo('demo', 'pedido', 2, 1), 11)
+
+    def test_espiar_nao_reserva(self):
+        self.assertEqual(NumeracaoService.espiar('demo', 'pedido', 1, 1), 3)
+        self.assertEqual(self.banco.contador, {})
+        NumeracaoService.proximo('demo', 'pedido', 1, 1)
+        self.assertEqual(NumeracaoService.espiar('demo', 'pedido', 1, 1), 4)
+        self.assertEqual(NumeracaoService.espiar('demo', 'pedido', 1, 1), 4)
+
+    def test_requisicao_nao_cria_tabela(self):
+        self.banco.tabela = False
+        with self.assertRaisesRegex(RuntimeError, 'instalar_numeracao'):
+            NumeracaoService.proximo('demo', 'pedido', 1, 1)
+        self.assertEqual(self.banco.ddl, [])
+
+        self.assertTrue(numeracao.instalar_tabela('demo'))
+        self.assertFalse(numeracao.instalar_tabela('demo'))
+        self.assertEqual(len(self.banco.ddl), 1)
+        self.assertEqual(NumeracaoService.proximo('demo', 'pedido', 1, 1), 3)
+
+    def test_documentos_tem_consulta_de_colisao(self):
+        for tipo, doc in numeracao.DOCUMENTOS.items():
+            self.assertIn('%(inicio)s', doc['sql_ocupado'], tipo)
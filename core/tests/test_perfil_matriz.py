@@ -0,0 +1,31 @@
+import pickle
+
+from django.test import SimpleTestCase
+
+from perfilweb.services import MatrizPermissoes
+
+
+class TestMatrizPermissoes(SimpleTestCase):
+    def setUp(self):
+        self.matriz = MatrizPermissoes.compilar([
+            (10, 'listar'),
+            (10, 'editar'),
+            (10, 'listar'),
+            (20, 'visualizar'),
+            (20, 'aprovar'),
+        ])
+
+    def test_permite_por_ctype_e_acao(self):
+        self.assertTrue(self.matriz.permite(10, 'editar'))
+        self.assertFalse(self.matriz.permite(10, 'excluir'))
+        self.assertFalse(self.matriz.permite(30, 'listar'))
+        self.assertTrue(self.matriz.permite(20, 'aprovar'))
+
+    def test_acoes_e_total(self):
+        self.assertEqual(self.matriz.acoes(10), {'listar', 'editar'})
+        self.assertEqual(self.matriz.acoes(20), {'visualizar', 'aprovar'})
+        self.assertEqual(self.matriz.total(), 4)
+
+    def test_serializa_para_o_cache(self):
+        copia = pickle.loads(pickle.dumps(self.matriz))
+        self.assertEqual((copia.bits, copia.extras), (self.matriz.bits, self.matriz.extras))
@@ -0,0 +1,37 @@
+from django.contrib.contenttypes.models import ContentType
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import path, resolve
+from django.views.generic import DetailView, TemplateView
+
+from core.rotas import IndiceRotas
+
+
+class ContentTypeDetalhe(DetailView):
+    model = ContentType
+
+
+urlpatterns = [
+    path('api/<slug:slug>/tipos/<int:pk>/', ContentTypeDetalhe.as_view(), name='tipo_detalhe'),
+    path('web/<slug:slug>/inicio/', TemplateView.as_view(template_name='x.html'), name='inicio'),
+]
+
+
+class TestIndiceRotas(SimpleTestCase):
+    def setUp(self):
+        self.indice = IndiceRotas(urlconf=__name__)
+
+    def test_rota_com_modelo(self):
+        match = resolve('/api/casaa/tipos/7/', urlconf=__name__)
+        rota = self.indice.rota(match)
+
+        self.assertEqual((rota.app_label, rota.model_name, rota.model), ('contenttypes', 'contenttype', ContentType))
+        self.assertEqual(self.indice.objeto_id(match), '7')
+
+    def test_rota_sem_modelo(self):
+        match = resolve('/web/casaa/inicio/', urlconf=__name__)
+        self.assertIsNone(self.indice.rota(match))
+
+    def test_resolver_reaproveita_match_do_request(self):
+        request = RequestFactory().get('/qualquer/')
+        request.resolver_match = resolve('/api/casaa/tipos/1/', urlconf=__name__)
+        self.assertIs(self.indice.resolver(request), request.resolver_match)
@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.db import connections
+from django.test import SimpleTestCase
+from unittest.mock import patch
+
+from core.tenant_connections import GerenciadorConexoesTenant
+
+
+def _config_sqlite(licenca, **kwargs):
+    return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+
+
+@patch('core.tenant_connections.montar_config_tenant', side_effect=_config_sqlite)
+class TestGerenciadorConexoesTenant(SimpleTestCase):
+    SLUGS = ('tenant_a', 'tenant_b', 'tenant_c')
+
+    def tearDown(self):
+        for slug in self.SLUGS:
+            settings.DATABASES.pop(slug, None)
+            if hasattr(connections._connections, slug):
+                delattr(connections._connections, slug)
+
+    def test_evicta_alias_menos_usado(self, montar):
+        gerenciador = GerenciadorConexoesTenant(max_aliases=2)
+        gerenciador.obter_alias('tenant_a', {'slug': 'tenant_a'})
+        gerenciador.obter_alias('tenant_b', {'slug': 'tenant_b'})
+        gerenciador.obter_alias('tenant_a', {'slug': 'tenant_a'})
+        gerenciador.obter_alias('tenant_c', {'slug': 'tenant_c'})
+
+        self.assertEqual(gerenciador.aliases(), ['tenant_a', 'tenant_c'])
+        self.assertNotIn('tenant_b', settings.DATABASES)
+        self.assertIn('tenant_a', settings.DATABASES)
+        self.assertEqual(
+            gerenciador.estatisticas(),
+            {'abertos': 2, 'limite': 2, 'hits': 1, 'misses': 3, 'evictions': 1, 'pendentes': 0},
+        )
+
+    def test_fecha_conexao_ao_evictar(self, montar):
+        gerenciador = GerenciadorConexoesTenant(max_aliases=2)
+        gerenciador.obter_alias('tenant_a', {'slug': 'tenant_a'})
+        conn = connections['tenant_a']
+        with patch.object(conn, 'close') as close:
+            gerenciador.obter_alias('tenant_b', {'slug': 'tenant_b'})
+            gerenciador.obter_alias('tenant_c', {'slug': 'tenant_c'})
+        close.assert_called_once()
+        self.assertFalse(hasattr(connections._connections, 'tenant_a'))
+
+    def test_nunca_evicta_default(self, montar):
+        gerenciador = GerenciadorConexoesTenant(max_aliases=2)
+        gerenciador.obter_alias('default', {'slug': 'default'})
+        self.assertEqual(gerenciador.aliases(), [])
+        self.assertIn('default', settings.DATABASES)
+
+    def test_alias_em_uso_por_outra_thread_fica_pendente(self, montar):
+        import threading
+
+        gerenciador = GerenciadorConexoesTenant(max_aliases=2)
+        usando, pode_sair, terminou = threading.Event(), threading.Event(), threading.Event()
+        fechou = []
+
+        def outra_thread():
+            gerenciador.obter_alias('tenant_a', {'slug': 'tenant_a'})
+            conn = connections['tenant_a']
+            usando.set()
+            pode_sair.wait(5)
+            with patch.object(conn, 'close') as close:
+                gerenciador.liberar_thread()
+            fechou.append(close.called)
+            terminou.set()
+
+        thread = threading.Thread(target=outra_thread)
+        thread.start()
+        usando.wait(5)
+        gerenciador.obter_alias('tenant_b', {'slug': 'tenant_b'})
+        gerenciador.obter_alias('tenant_c', {'slug': 'tenant_c'})
+
+        # Evictado do LRU, mas a outra thread ainda tem conexão aberta
+        self.assertNotIn('tenant_a', gerenciador.aliases())
+        self.assertIn('tenant_a', settings.DATABASES)
+        self.assertEqual(gerenciador.estatisticas()['pendentes'], 1)
+
+        pode_sair.set()
+        terminou.wait(5)
+        thread.join(5)
+        self.assertEqual(fechou, [True])
+        self.assertNotIn('tenant_a', settings.DATABASES)
+        self.assertEqual(gerenciador.estatisticas()['pendentes'], 0)
+
+    def test_alias_retido_so_sai_depois_de_soltar(self, montar):
+        gerenciador = GerenciadorConexoesTenant(max_aliases=2)
+        gerenciador.obter_alias('tenant_a', {'slug': 'tenant_a'})
+        gerenciador.reter('tenant_a')
+        gerenciador.reter('tenant_a')
+        gerenciador.obter_alias('tenant_b', {'slug': 'tenant_b'})
+        gerenciador.obter_alias('tenant_c', {'slug': 'tenant_c'})
+
+        self.assertIn('tenant_a', settings.DATABASES)
+        gerenciador.soltar('tenant_a')
+        self.assertIn('tenant_a', settings.DATABASES)
+        gerenciador.soltar('tenant_a')
+        self.assertNotIn('tenant_a', settings.DATABASES)
+        self.assertEqual(gerenciador.estatisticas()['pendentes'], 0)
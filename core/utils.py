@@ -2,8 +2,9 @@
 from decouple import config
 from django.db import connections
 from core import settings
-from core.licenca_context import get_licencas_map
-from decimal import Decimal, ROUND_HALF_UP
+from core.licenca_context import get_licenca
+from core.tenant_connections import gerenciador_conexoes
+from decimal import Decimal, ROUND_HALF_UP, ROUND_HALF_EVEN
 
 
 def get_db_from_slug(slug):
@@ -16,41 +17,15 @@ def get_db_from_slug(slug):
     if not slug:
         return "default"
 
-    licenca = next((lic for lic in get_licencas_map() if lic["slug"] == slug), None)
+    licenca = get_licenca(slug)
     if not licenca:
         raise Exception(f"Licença com slug '{slug}' não encontrada.")
 
     if slug in settings.DATABASES:
+        gerenciador_conexoes.obter_alias(slug, licenca)
         return slug
-    
-    prefixo = slug.upper()
-    db_user = licenca.get("db_user") or config(f"{prefixo}_DB_USER", default=None)
-    db_password = licenca.get("db_password") or config(f"{prefixo}_DB_PASSWORD", default=None)
-    if not db_user or not db_password:
-        raise Exception(f"Credenciais não encontradas para {slug}")
-
-    settings.DATABASES[slug] = {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': licenca["db_name"],
-        'USER': db_user,
-        'PASSWORD': db_password,
-        'HOST': licenca["db_host"],
-        'PORT': licenca["db_port"],
-        'OPTIONS': {
-            'options': '-c timezone=America/Araguaina',
-            'connect_timeout': 30,
-            'application_name': 'mobile_sps',
-        },
-        'CONN_MAX_AGE': 600,
-        'CONN_HEALTH_CHECKS': True,
-        'TEST': {
-            'MIRROR': 'default',
-            'DEPENDENCIES': [],
-        },
-    }
 
-    connections.ensure_defaults(slug)
-    connections.prepare_test_settings(slug)
+    gerenciador_conexoes.obter_alias(slug, licenca)
     
     total_time = (time.time() - start_time) * 1000
     logger.warning(f"⏱️  Conexão {slug} criada em {total_time:.2f}ms")
@@ -239,10 +214,61 @@ def calcular_total_item_com_desconto(quantidade, valor_unitario, desconto_item=N
     # Validar se não excede o limite do campo
     if resultado >= Decimal('10000000000000.00'):  # 10^13
         raise ValueError(f"Total do item calculado ({resultado}) excede o limite máximo do campo (9999999999999.99)")
-    
+
     return resultado
 
 
+_LIMITE_SUBTOTAL_ITEM = Decimal('10000000000.00000')
+_LIMITE_TOTAL_ITEM = Decimal('10000000000000.00')
+_CASAS_SUBTOTAL = Decimal('0.00001')
+_CASAS_TOTAL = Decimal('0.01')
+
+
+def calcular_totais_itens(valores):
+    """
+    Calcula subtotal bruto e total com desconto de vários itens numa passada,
+    com o mesmo arredondamento e limites de calcular_subtotal_item_bruto e
+    calcular_total_item_com_desconto.
+
+    Args:
+        valores: iterável de (quantidade, valor_unitario, desconto) já em Decimal
+
+    Returns:
+        dict: subtotais, totais (listas na ordem dos itens), subtotal e total
+        (somas) e tem_desconto (algum item com desconto > 0)
+    """
+    zero = Decimal('0.00')
+    subtotais = []
+    totais = []
+    soma_subtotal = zero
+    soma_total = zero
+    tem_desconto = False
+
+    for quantidade, valor_unitario, desconto in valores:
+        bruto = (quantidade or zero) * (valor_unitario or zero)
+        subtotal = bruto.quantize(_CASAS_SUBTOTAL, rounding=ROUND_HALF_EVEN)
+        if subtotal >= _LIMITE_SUBTOTAL_ITEM:
+            raise ValueError(f"Subtotal calculado ({subtotal}) excede o limite máximo do campo (9999999999.99999)")
+        total = max(bruto - (desconto or zero), zero).quantize(_CASAS_TOTAL, rounding=ROUND_HALF_EVEN)
+        if total >= _LIMITE_TOTAL_ITEM:
+            raise ValueError(f"Total do item calculado ({total}) excede o limite máximo do campo (9999999999999.99)")
+
+        subtotais.append(subtotal)
+        totais.append(total)
+        soma_subtotal += subtotal
+        soma_total += total
+        if desconto and desconto > 0:
+            tem_desconto = True
+
+    return {
+        'subtotais': subtotais,
+        'totais': totais,
+        'subtotal': soma_subtotal,
+        'total': soma_total,
+        'tem_desconto': tem_desconto,
+    }
+
+
 import logging
 import sys
 
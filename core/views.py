@@ -94,7 +94,8 @@ def warm_cache_endpoint(request):
 
 def health_check(request):
     """Health check endpoint"""
-    return JsonResponse({'status': 'ok'})
+    from core.tenant_connections import gerenciador_conexoes
+    return JsonResponse({'status': 'ok', 'conexoes_tenant': gerenciador_conexoes.estatisticas()})
 
 def index(request):
     return render(request, 'index.html')
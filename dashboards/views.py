@@ -14,6 +14,7 @@ from rest_framework import status
 from Saidas_Estoque.models import SaidasEstoque
 from core.decorator import modulo_necessario, ModuloRequeridoMixin
 from core.middleware import get_licenca_slug
+from DRE.servicos.fatos_servico import FatosDiariosService
 from .serializers import DashboardSerializer
 from django.db.models import Sum, F, OuterRef, Subquery, Max, Count
 from django.db.models.functions import Cast
@@ -82,12 +83,6 @@ class DashboardAPIView(UsuarioComSetorMixin, APIView):
         
         # Monta dados com base no dashboard_mode
         if dashboard_mode == 'default':
-            filtros_pedidos = {}
-            if empresa:
-                filtros_pedidos['pedi_empr'] = empresa
-            if filial:
-                filtros_pedidos['pedi_fili'] = filial
-
             saldos = (
                 SaldoProduto.objects.filter(**filtros_base)
                 .values(nome=F('produto_codigo__prod_nome'))
@@ -95,28 +90,22 @@ class DashboardAPIView(UsuarioComSetorMixin, APIView):
                 .order_by('-total')[:10]
             )
 
-            cliente_nome = Entidades.objects.filter(
-                enti_clie=Cast(OuterRef('pedi_forn'), BigIntegerField())
-            ).values('enti_nome')[:1]
-
-            pedidos_query = PedidoVenda.objects.filter(**filtros_pedidos)
-            
-            pedidos = (
-                pedidos_query.annotate(
-                    cliente_nome=Subquery(cliente_nome)
-                )
-                .values('cliente_nome')
-                .annotate(
-                    total=Sum('pedi_tota'),
-                    data=Max('pedi_data')
-                )
-                .order_by('-total')[:10] 
-                .values(
-                    cliente=F('cliente_nome'),
-                    total=F('total'),
-                    data=F('data')
-                )
+            # Vendas por cliente vêm dos fatos diários consolidados (DRE.servicos)
+            vendas = FatosDiariosService.vendas_por_cliente(slug, empresa=empresa, filial=filial)
+            codigos = [int(cliente) for cliente, _, _ in vendas if str(cliente or '').isdigit()]
+            nomes = dict(
+                Entidades.objects.using(slug)
+                .filter(enti_clie__in=codigos)
+                .values_list('enti_clie', 'enti_nome')
             )
+            pedidos = [
+                {
+                    'cliente': nomes.get(int(cliente)) if str(cliente or '').isdigit() else None,
+                    'total': total,
+                    'data': ultima_data,
+                }
+                for cliente, total, ultima_data in vendas
+            ]
 
             for item in saldos:
                 item['total'] = safe_decimal(item['total'])
@@ -274,11 +263,10 @@ class DashboardVendasView(APIView):
             data_fim = datetime.combine(data_fim.date(), time.max)
 
 
-            pedidos_periodo = PedidoVenda.objects.using(slug).filter(pedi_data__range=(data_ini, data_fim))
-            logger.debug(f"Pedidos no período: {pedidos_periodo.count()}")
-
-            total_pedidos = pedidos_periodo.count()
-            total_faturado = pedidos_periodo.aggregate(Sum('pedi_tota'))['pedi_tota__sum'] or 0
+            total_pedidos, total_faturado = FatosDiariosService.totais_vendas(
+                slug, data_ini.date(), data_fim.date()
+            )
+            logger.debug(f"Pedidos no período: {total_pedidos}")
             ticket_medio = total_faturado / total_pedidos if total_pedidos else 0
             logger.debug(f"Total faturado: {total_faturado}, Ticket médio: {ticket_medio}")
 
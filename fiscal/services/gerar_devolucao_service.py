@@ -464,11 +464,10 @@ class GerarDevolucaoService:
         if not filial_obj:
             raise ValidationError("Filial não encontrada para validar certificado.")
 
-        cert_path, cert_pass = CertificadoLoader(filial_obj).load()
-        if not cert_path:
-            raise ValidationError("Certificado não encontrado para a filial.")
-        if cert_pass is None:
-            raise ValidationError("Senha do certificado não encontrada para a filial.")
+        try:
+            CertificadoLoader(filial_obj).carregar()
+        except Exception as e:
+            raise ValidationError(f"Certificado inválido ou não encontrado para a filial: {e}")
 
 
 def _to_decimal(value):
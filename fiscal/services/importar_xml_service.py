@@ -84,11 +84,10 @@ class ImportarXMLService:
         ambi = str(getattr(filial_obj, "empr_ambi_nfe", "") or "1").strip()
         homologacao = ambi == "2"
 
-        cert_path, cert_pass = CertificadoLoader(filial_obj).load()
+        certificado = CertificadoLoader(filial_obj).carregar()
         xml_baixado = _consultar_xml_por_chave(
             uf=uf,
-            cert_path=cert_path,
-            cert_pass=str(cert_pass or ""),
+            certificado=certificado,
             cnpj=cnpj,
             chave=chave_digits,
             homologacao=homologacao,
@@ -117,9 +116,9 @@ def _only_digits(value) -> str:
     return "".join(ch for ch in str(value or "") if ch.isdigit())
 
 
-def _consultar_xml_por_chave(*, uf: str, cert_path: str, cert_pass: str, cnpj: str, chave: str, homologacao: bool) -> str:
+def _consultar_xml_por_chave(*, uf: str, certificado, cnpj: str, chave: str, homologacao: bool) -> str:
     try:
-        from pynfe.processamento.comunicacao import ComunicacaoSefaz
+        from Notas_Fiscais.infrastructure.sefaz_adapter import ComunicacaoSefazMemoria
     except Exception:
         raise ValidationError("Dependência 'pynfe' não está instalada no servidor.")
 
@@ -127,7 +126,7 @@ def _consultar_xml_por_chave(*, uf: str, cert_path: str, cert_pass: str, cnpj: s
     import gzip as _gzip
     import xml.etree.ElementTree as ET
 
-    con = ComunicacaoSefaz(uf, cert_path, cert_pass, homologacao)
+    con = ComunicacaoSefazMemoria(uf, certificado, homologacao)
     resp = con.consulta_distribuicao(cnpj=cnpj, chave=chave)
     content = getattr(resp, "text", None) or getattr(resp, "content", b"")
     if isinstance(content, bytes):
@@ -1,20 +1,25 @@
 # importador_produtos/pipeline.py
-import pandas as pd
 from .services.leitor_xls import LeitorXLS
 from .services.mapeamento_campos import MapeamentoCampos
 from .services.normalizadores import Normalizadores
 from .services.resolvers_fk import ResolvedorFK
+from .services.sql_lote import gravar_em_lotes
 from .services.valida_produto import ValidadorProduto
 from .services.upsert_produto import UpsertProduto
 from .services.upsert_precos import UpsertPrecos
 
+# Linhas gravadas por transação
+TAMANHO_LOTE = 1000
+
 
 class ImportadorProdutosPipeline:
-    def __init__(self, file, empresa, filial, db):
+    def __init__(self, file, empresa, filial, db, progresso=None):
         self.file = file
         self.empresa = empresa
         self.filial = filial
         self.db = db
+        # progresso(linhas_gravadas, total) chamado a cada lote
+        self.progresso = progresso
 
     def processar(self):
         # 1) Leitura XLS
@@ -35,44 +40,31 @@ class ImportadorProdutosPipeline:
             "nomes_duplicados": []
         }
 
-        import unicodedata, re
-        nomes_vistos = set()
-        def chave_nome(x):
-            s = str(x or "").strip().lower()
-            s = unicodedata.normalize('NFKD', s)
-            s = ''.join(c for c in s if not unicodedata.combining(c))
-            s = re.sub(r"\s+", " ", s)
-            return s
-        for idx, row in enumerate(df.to_dict("records"), start=2):
-            try:
-                # 4) Resolver FKs
-                resolved = ResolvedorFK(row, self.db).resolver()
-
-                # 5) Validar
-                ValidadorProduto(resolved).validar()
-                chave = chave_nome(resolved.get("prod_nome"))
-                if not chave:
-                    raise ValueError("Produto sem nome")
-                if chave in nomes_vistos:
-                    relatorio["duplicatas_arquivo"] += 1
-                    relatorio["nomes_duplicados"].append(resolved.get("prod_nome") or "")
-                    raise ValueError("Descricao duplicada no arquivo")
-                nomes_vistos.add(chave)
-
-                # 6) Criar/Atualizar Produto
-                prod, criado = UpsertProduto(resolved, self.empresa, self.db).executar()
+        # 4) Validar (coluna inteira; descrição repetida no arquivo é recusada)
+        erros, duplicadas = ValidadorProduto(df).validar()
+        relatorio["duplicatas_arquivo"] = int(duplicadas.sum())
+        relatorio["nomes_duplicados"] = df.loc[duplicadas, "prod_nome"].tolist() if duplicadas.any() else []
 
-                # 7) Criar/Atualizar Preço
-                UpsertPrecos(prod, resolved, self.empresa, self.filial, self.db).executar()
+        # 5) Resolver FKs (tabelas lidas uma vez)
+        validas = ResolvedorFK(self.db).resolver(df[erros.isna()])
+        sem_unidade = validas["prod_unme"].isna()
+        erros[validas.index[sem_unidade]] = "Unidade inválida"
+        validas = validas[~sem_unidade]
 
-                if criado:
-                    relatorio["criadas"] += 1
-                else:
-                    relatorio["atualizadas"] += 1
+        # 6) Destino de cada linha e gravação em lotes (produto + preço)
+        upsert = UpsertProduto(self.empresa, self.db)
+        validas = upsert.identificar(validas)
+        precos = UpsertPrecos(self.empresa, self.filial, self.db, df.columns).carregar()
 
-                relatorio["precos"] += 1
+        def gravar(lote):
+            upsert.executar(lote)
+            precos.executar(lote)
 
-            except Exception as e:
-                relatorio["erros"].append(f"Linha {idx}: {str(e)}")
+        gravadas = gravar_em_lotes(validas, gravar, self.db, erros, TAMANHO_LOTE, self.progresso)
 
+        criadas = int(validas.loc[gravadas, "_criado"].sum())
+        relatorio["criadas"] = criadas
+        relatorio["atualizadas"] = len(gravadas) - criadas
+        relatorio["precos"] = len(gravadas)
+        relatorio["erros"] = [f"Linha {idx + 2}: {msg}" for idx, msg in erros.dropna().sort_index().items()]
         return relatorio
@@ -1,15 +1,21 @@
 from .services.leitor_xls import LeitorXLS
 from .services.mapeamento_entidades import MapeamentoCamposEntidades
 from .services.normalizadores_entidades import NormalizadoresEntidades
+from .services.sql_lote import gravar_em_lotes
 from .services.valida_entidade import ValidadorEntidade
 from .services.upsert_entidade import UpsertEntidade
 
+# Linhas gravadas por transação
+TAMANHO_LOTE = 1000
+
 
 class ImportadorEntidadesPipeline:
-    def __init__(self, file, empresa, db):
+    def __init__(self, file, empresa, db, progresso=None):
         self.file = file
         self.empresa = empresa
         self.db = db
+        # progresso(linhas_gravadas, total) chamado a cada lote
+        self.progresso = progresso
 
     def processar(self):
         df = LeitorXLS(self.file).to_dataframe()
@@ -18,15 +24,13 @@ class ImportadorEntidadesPipeline:
 
         relatorio = {"criadas": 0, "atualizadas": 0, "erros": []}
 
-        for idx, row in enumerate(df.to_dict("records"), start=2):
-            try:
-                ValidadorEntidade(row).validar()
-                _, criado = UpsertEntidade(row, self.empresa, self.db).executar()
-                if criado:
-                    relatorio["criadas"] += 1
-                else:
-                    relatorio["atualizadas"] += 1
-            except Exception as exc:
-                relatorio["erros"].append(f"Linha {idx}: {str(exc)}")
+        erros = ValidadorEntidade(df).validar()
+        upsert = UpsertEntidade(self.empresa, self.db)
+        validas = upsert.identificar(df[erros.isna()])
+        gravadas = gravar_em_lotes(validas, upsert.executar, self.db, erros, TAMANHO_LOTE, self.progresso)
 
+        criadas = int(validas.loc[gravadas, "_criado"].sum())
+        relatorio["criadas"] = criadas
+        relatorio["atualizadas"] = len(gravadas) - criadas
+        relatorio["erros"] = [f"Linha {idx + 2}: {msg}" for idx, msg in erros.dropna().sort_index().items()]
         return relatorio
@@ -17,8 +17,7 @@ class LeitorXLS:
             return pd.DataFrame()
 
         df.columns = [str(c).replace("\ufeff", "").strip() for c in df.columns]
-        df = df.fillna("")
-        df = df.applymap(lambda value: str(value).strip() if value is not None else "")
+        df = df.fillna("").astype(str).apply(lambda col: col.str.strip())
         df = df.loc[:, [col for col in df.columns if col]]
         df = df[(df != "").any(axis=1)]
         return df.reset_index(drop=True)
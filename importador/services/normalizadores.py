@@ -1,6 +1,8 @@
 # importador_produtos/services/normalizadores.py
 import re
 
+import pandas as pd
+
 
 class Normalizadores:
     def __init__(self, df):
@@ -19,22 +21,34 @@ class Normalizadores:
             n = n[:8]
         return n
 
+    def primeiro_preenchido(self, colunas):
+        """Primeiro valor não vazio entre as colunas, linha a linha (operação por coluna)."""
+        resultado = None
+        for col in colunas:
+            valores = self.df[col].fillna("").astype(str).str.strip()
+            resultado = valores if resultado is None else resultado.mask(resultado == "", valores)
+        return resultado
+
+    def normalizar_precos(self, serie):
+        # "1.234,56" -> 1234.56; vazio ou inválido -> 0.0
+        s = serie.fillna("").astype(str).str.strip()
+        s = s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+        s = s.str.replace(r"[^0-9\.]", "", regex=True)
+        return pd.to_numeric(s.where(s != "", "0"), errors="coerce").fillna(0.0).astype(float)
+
     def aplicar(self):
         # Consolidar colunas duplicadas mapeadas como <campo>__2, <campo>__3...
         for base_col in ["prod_nome", "prod_ncm", "prod_gtin", "prod_marc", "prod_grup", "prod_sugr", "prod_fami", "prod_unme", "prod_loca", "prod_orig_merc", "preco", "preco_compra", "preco_vista", "preco_prazo"]:
             duplicadas = [c for c in self.df.columns if c == base_col or c.startswith(f"{base_col}__")]
             if len(duplicadas) <= 1:
                 continue
-            self.df[base_col] = self.df[duplicadas].apply(
-                lambda row: next((str(v).strip() for v in row if str(v or "").strip()), ""),
-                axis=1,
-            )
+            self.df[base_col] = self.primeiro_preenchido(duplicadas)
             for col in duplicadas:
                 if col != base_col:
                     self.df.drop(columns=[col], inplace=True)
 
         if "prod_nome" in self.df:
-            self.df["prod_nome"] = self.df["prod_nome"].apply(self.normalizar_texto)
+            self.df["prod_nome"] = self.df["prod_nome"].fillna("").astype(str).str.strip()
         else:
             # Fallback: tenta encontrar colunas possíveis e promovê-las a prod_nome
             for candidate in [
@@ -45,20 +59,10 @@ class Normalizadores:
                     break
 
         if "prod_ncm" in self.df:
-            self.df["prod_ncm"] = self.df["prod_ncm"].apply(self.normalizar_ncm)
+            self.df["prod_ncm"] = self.df["prod_ncm"].fillna("").astype(str).str.replace(r"\D", "", regex=True).str[:8]
 
-        def _norm_price(v):
-            s = str(v or "").strip()
-            if not s:
-                return 0.0
-            s = s.replace(".", "").replace(",", ".")
-            s = re.sub(r"[^0-9\.]", "", s)
-            try:
-                return float(s or 0)
-            except Exception:
-                return 0.0
         for col in ["preco", "preco_compra", "preco_vista", "preco_prazo"]:
             if col in self.df:
-                self.df[col] = self.df[col].apply(_norm_price)
+                self.df[col] = self.normalizar_precos(self.df[col])
 
         return self.df
@@ -1,20 +1,12 @@
-import re
-
-
 class NormalizadoresEntidades:
     def __init__(self, df):
         self.df = df
 
-    def _first_not_empty(self, values):
-        for v in values:
-            s = str(v or "").strip()
-            if s:
-                return s
-        return ""
+    def _texto(self, col):
+        return self.df[col].fillna("").astype(str).str.strip()
 
-    def _digits(self, value, max_len=None):
-        raw = re.sub(r"\D", "", str(value or ""))
-        return raw[:max_len] if max_len else raw
+    def _so_digitos(self, col, max_len):
+        return self.df[col].fillna("").astype(str).str.replace(r"\D", "", regex=True).str[:max_len]
 
     def aplicar(self):
         campos_base = [
@@ -26,40 +18,36 @@ class NormalizadoresEntidades:
             duplicadas = [c for c in self.df.columns if c == campo or c.startswith(f"{campo}__")]
             if len(duplicadas) <= 1:
                 continue
-            self.df[campo] = self.df[duplicadas].apply(lambda row: self._first_not_empty(row), axis=1)
+            resultado = None
+            for col in duplicadas:
+                valores = self._texto(col)
+                resultado = valores if resultado is None else resultado.mask(resultado == "", valores)
+            self.df[campo] = resultado
             for col in duplicadas:
                 if col != campo:
                     self.df.drop(columns=[col], inplace=True)
 
         for col in ["enti_nome", "enti_fant", "enti_ende", "enti_cida", "enti_bair", "enti_comp", "enti_emai"]:
             if col in self.df:
-                self.df[col] = self.df[col].apply(lambda v: str(v or "").strip())
+                self.df[col] = self._texto(col)
 
         if "enti_esta" in self.df:
-            self.df["enti_esta"] = self.df["enti_esta"].apply(lambda v: str(v or "").strip().upper()[:2])
+            self.df["enti_esta"] = self._texto("enti_esta").str.upper().str[:2]
 
         if "enti_tipo_enti" in self.df:
             mapa_tipo = {
                 "cliente": "CL", "fornecedor": "FO", "ambos": "AM", "outros": "OU", "vendedor": "VE", "funcionarios": "FU",
             }
-            self.df["enti_tipo_enti"] = self.df["enti_tipo_enti"].apply(
-                lambda v: mapa_tipo.get(str(v or "").strip().lower(), str(v or "").strip().upper()[:2] or "CL")
-            )
+            tipo = self._texto("enti_tipo_enti")
+            sigla = tipo.str.upper().str[:2]
+            self.df["enti_tipo_enti"] = tipo.str.lower().map(mapa_tipo).fillna(sigla.where(sigla != "", "CL"))
 
         if "enti_situ" in self.df:
-            self.df["enti_situ"] = self.df["enti_situ"].apply(
-                lambda v: "1" if str(v or "").strip().lower() in {"1", "ativo", "a", "sim", "s", "true"} else "0"
-            )
+            ativo = self._texto("enti_situ").str.lower().isin({"1", "ativo", "a", "sim", "s", "true"})
+            self.df["enti_situ"] = ativo.map({True: "1", False: "0"})
 
-        if "enti_cpf" in self.df:
-            self.df["enti_cpf"] = self.df["enti_cpf"].apply(lambda v: self._digits(v, 11))
-        if "enti_cnpj" in self.df:
-            self.df["enti_cnpj"] = self.df["enti_cnpj"].apply(lambda v: self._digits(v, 14))
-        if "enti_cep" in self.df:
-            self.df["enti_cep"] = self.df["enti_cep"].apply(lambda v: self._digits(v, 8))
-        if "enti_fone" in self.df:
-            self.df["enti_fone"] = self.df["enti_fone"].apply(lambda v: self._digits(v, 14))
-        if "enti_celu" in self.df:
-            self.df["enti_celu"] = self.df["enti_celu"].apply(lambda v: self._digits(v, 15))
+        for col, tamanho in (("enti_cpf", 11), ("enti_cnpj", 14), ("enti_cep", 8), ("enti_fone", 14), ("enti_celu", 15)):
+            if col in self.df:
+                self.df[col] = self._so_digitos(col, tamanho)
 
         return self.df
@@ -1,120 +1,108 @@
 # importador_produtos/services/resolvers_fk.py
-from Produtos.models import Produtos
+import pandas as pd
+
 from Produtos.models import Marca
 from Produtos.models import GrupoProduto, SubgrupoProduto, FamiliaProduto
 from Produtos.models import UnidadeMedida
 
+from .sql_lote import coluna
 
-class ResolvedorFK:
-    def __init__(self, row, db):
-        self.row = row
-        self.db = db
-
-    def normalizar_nome(self, nome):
-        return str(nome).strip().upper()
-
-    def resolve_unidade(self, nome):
-        nome = self.normalizar_nome(nome or "UN")
-        un = UnidadeMedida.objects.using(self.db).filter(unid_codi__iexact=nome).first()
-
-        if not un:
-            un = UnidadeMedida.objects.using(self.db).create(
-                unid_codi=nome,
-                unid_desc=nome
-            )
-        return un
-
-    def resolve_marca(self, nome):
-        if not nome:
-            return None
-
-        nome = self.normalizar_nome(nome)
-        m = Marca.objects.using(self.db).filter(nome__iexact=nome).first()
 
-        if not m:
-            maior = Marca.objects.using(self.db).order_by('-codigo').first()
-            proximo = (maior.codigo + 1) if maior and isinstance(maior.codigo, int) else 1
-            m = Marca.objects.using(self.db).create(codigo=proximo, nome=nome)
+def normalizar_nome(serie):
+    return serie.fillna("").astype(str).str.strip().str.upper()
 
-        return m
 
-    def resolve_grupo(self, nome):
-        if not nome:
-            return None
+def _mapear(nomes, mapa):
+    # dtype object: códigos inteiros não viram float quando há linhas sem valor
+    return pd.Series([mapa.get(n) if n else None for n in nomes], index=nomes.index, dtype=object)
 
-        nome = self.normalizar_nome(nome)
-        g = GrupoProduto.objects.using(self.db).filter(descricao__iexact=nome).first()
-
-        if not g:
-            base = nome[:3].upper()
-            # Se já existir com o código base, reaproveita
-            g = GrupoProduto.objects.using(self.db).filter(codigo=base).first()
-            if g:
-                return g
-            codigo = base
-            i = 1
-            while GrupoProduto.objects.using(self.db).filter(codigo=codigo).exists():
-                codigo = f"{base}{i}"
-                i += 1
-            g = GrupoProduto.objects.using(self.db).create(
-                codigo=codigo,
-                descricao=nome
-            )
-        return g
 
-    def resolve_subgrupo(self, nome):
-        if not nome:
-            return None
-
-        nome = self.normalizar_nome(nome)
-        sg = SubgrupoProduto.objects.using(self.db).filter(descricao__iexact=nome).first()
+class ResolvedorFK:
+    """
+    Resolve as colunas de unidade, marca, grupo, subgrupo e família da
+    planilha inteira: cada tabela é lida uma vez para um dict (nome → código),
+    os nomes que faltam são criados num bulk_create e as colunas viram
+    códigos via Series.map.
+    """
+
+    def __init__(self, db):
+        self.db = db
 
-        if not sg:
-            base = nome[:3].upper()
-            sg = SubgrupoProduto.objects.using(self.db).filter(codigo=base).first()
-            if sg:
-                return sg
-            codigo = base
-            i = 1
-            while SubgrupoProduto.objects.using(self.db).filter(codigo=codigo).exists():
-                codigo = f"{base}{i}"
-                i += 1
-            sg = SubgrupoProduto.objects.using(self.db).create(
-                codigo=codigo,
-                descricao=nome
+    def resolve_unidades(self, serie):
+        nomes = normalizar_nome(serie).replace("", "UN")
+        mapa = {
+            str(codigo).strip().upper(): codigo
+            for codigo in UnidadeMedida.objects.using(self.db).values_list("unid_codi", flat=True)
+        }
+        novas = [n for n in nomes.unique() if n not in mapa and len(n) <= 10]
+        if novas:
+            UnidadeMedida.objects.using(self.db).bulk_create(
+                [UnidadeMedida(unid_codi=n, unid_desc=n) for n in novas], ignore_conflicts=True
             )
-        return sg
-
-    def resolve_familia(self, nome):
-        if not nome:
-            return None
-
-        nome = self.normalizar_nome(nome)
-        f = FamiliaProduto.objects.using(self.db).filter(descricao__iexact=nome).first()
-
-        if not f:
+            mapa.update({n: n for n in novas})
+        return _mapear(nomes, mapa)
+
+    def resolve_marcas(self, serie):
+        nomes = normalizar_nome(serie)
+        mapa = {}
+        maior = 0
+        for codigo, nome in Marca.objects.using(self.db).order_by("codigo").values_list("codigo", "nome"):
+            mapa.setdefault(str(nome or "").strip().upper(), codigo)
+            if isinstance(codigo, int):
+                maior = max(maior, codigo)
+        novas = []
+        for nome in nomes.unique():
+            if nome and nome not in mapa:
+                maior += 1
+                mapa[nome] = maior
+                novas.append(Marca(codigo=maior, nome=nome))
+        if novas:
+            Marca.objects.using(self.db).bulk_create(novas)
+        return _mapear(nomes, mapa)
+
+    def _resolve_codificado(self, modelo, serie):
+        # Mesmo critério de código do cadastro: 3 primeiras letras (reaproveita
+        # o registro se o código já existe), com sufixo numérico se preciso.
+        nomes = normalizar_nome(serie)
+        mapa = {}
+        codigos = set()
+        for codigo, descricao in modelo.objects.using(self.db).values_list("codigo", "descricao"):
+            mapa.setdefault(str(descricao or "").strip().upper(), codigo)
+            codigos.add(codigo)
+        novos = []
+        for nome in nomes.unique():
+            if not nome or nome in mapa:
+                continue
             base = nome[:3].upper()
-            f = FamiliaProduto.objects.using(self.db).filter(codigo=base).first()
-            if f:
-                return f
-            codigo = base
-            i = 1
-            while FamiliaProduto.objects.using(self.db).filter(codigo=codigo).exists():
+            if base in codigos:
+                mapa[nome] = base
+                continue
+            codigo, i = base, 1
+            while codigo in codigos:
                 codigo = f"{base}{i}"
                 i += 1
-            f = FamiliaProduto.objects.using(self.db).create(
-                codigo=codigo,
-                descricao=nome
-            )
-        return f
-
-    def resolver(self):
-        row = self.row.copy()
-
-        row["prod_unme"] = self.resolve_unidade(row.get("prod_unme"))
-        row["prod_marc"] = self.resolve_marca(row.get("prod_marc"))
-        row["prod_grup"] = self.resolve_grupo(row.get("prod_grup"))
-        row["prod_sugr"] = self.resolve_subgrupo(row.get("prod_sugr"))
-        row["prod_fami"] = self.resolve_familia(row.get("prod_fami"))
-
-        return row
+            codigos.add(codigo)
+            mapa[nome] = codigo
+            novos.append(modelo(codigo=codigo, descricao=nome))
+        if novos:
+            modelo.objects.using(self.db).bulk_create(novos)
+        return _mapear(nomes, mapa)
+
+    def resolve_grupos(self, serie):
+        return self._resolve_codificado(GrupoProduto, serie)
+
+    def resolve_subgrupos(self, serie):
+        return self._resolve_codificado(SubgrupoProduto, serie)
+
+    def resolve_familias(self, serie):
+        return self._resolve_codificado(FamiliaProduto, serie)
+
+    def resolver(self, df):
+        """Copia de ``df`` com prod_unme/marc/grup/sugr/fami trocados pelos códigos."""
+        df = df.copy()
+        df["prod_unme"] = self.resolve_unidades(coluna(df, "prod_unme", ""))
+        df["prod_marc"] = self.resolve_marcas(coluna(df, "prod_marc", ""))
+        df["prod_grup"] = self.resolve_grupos(coluna(df, "prod_grup", ""))
+        df["prod_sugr"] = self.resolve_subgrupos(coluna(df, "prod_sugr", ""))
+        df["prod_fami"] = self.resolve_familias(coluna(df, "prod_fami", ""))
+        return df
@@ -0,0 +1,117 @@
+# importador_produtos/services/sql_lote.py
+import logging
+
+import pandas as pd
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar_chave(serie):
+    """Chave de comparação de nomes (minúsculas, sem acento, espaços simples), coluna inteira."""
+    s = serie.fillna("").astype(str).str.strip().str.lower().str.normalize("NFKD")
+    s = s.str.replace("[\u0300-\u036f]", "", regex=True)
+    return s.str.replace(r"\s+", " ", regex=True)
+
+
+def coluna(df, nome, padrao=None):
+    """Coluna do DataFrame ou série constante quando a planilha não a trouxe."""
+    if nome in df:
+        return df[nome]
+    return pd.Series([padrao] * len(df), index=df.index, dtype=object)
+
+
+def _nulo(valor):
+    try:
+        return valor is None or valor != valor
+    except Exception:
+        return False
+
+
+def limpar(valor):
+    return None if _nulo(valor) else valor
+
+
+def update_valores(cursor, tabela, chaves, colunas, linhas, tipos=None):
+    """
+    UPDATE em várias linhas num comando só:
+    UPDATE tabela SET c = v.c ... FROM (VALUES (...), ...) v(...) WHERE chaves.
+    ``linhas`` são tuplas (chaves..., colunas...); ``tipos`` força o cast de
+    colunas que podem vir só com NULL (ex.: {"prod_marc": "integer"}).
+    """
+    if not linhas:
+        return 0
+    tipos = tipos or {}
+    nomes = list(chaves) + list(colunas)
+    marcador = "(" + ", ".join(
+        f"%s::{tipos[n]}" if n in tipos else "%s" for n in nomes
+    ) + ")"
+    sets = ", ".join(f"{c} = v.{c}" for c in colunas)
+    where = " AND ".join(f"t.{c} = v.{c}" for c in chaves)
+    sql = (
+        f"UPDATE {tabela} t SET {sets} FROM (VALUES "
+        + ", ".join([marcador] * len(linhas))
+        + f") AS v({', '.join(nomes)}) WHERE {where}"
+    )
+    cursor.execute(sql, [limpar(v) for linha in linhas for v in linha])
+    return cursor.rowcount
+
+
+def conferir_atualizadas(atualizadas, linhas, nome):
+    """
+    Falha se o UPDATE não achou todas as ``linhas`` (registro apagado depois
+    do identificar). A fatia é então regravada linha a linha e só a linha
+    ausente fica com erro, em vez de contar como atualizada.
+    """
+    faltando = len(linhas) - atualizadas
+    if faltando <= 0:
+        return
+    if len(linhas) == 1:
+        raise ValueError(f"{nome} {linhas[0][1]} não encontrado para atualização")
+    raise ValueError(f"{faltando} registro(s) de {nome} não encontrado(s) para atualização")
+
+
+def upsert_valores(cursor, tabela, chaves, colunas, linhas):
+    """INSERT ... ON CONFLICT (chaves) DO UPDATE em várias linhas num comando só."""
+    if not linhas:
+        return 0
+    nomes = list(chaves) + list(colunas)
+    marcador = "(" + ", ".join(["%s"] * len(nomes)) + ")"
+    sql = (
+        f"INSERT INTO {tabela} ({', '.join(nomes)}) VALUES "
+        + ", ".join([marcador] * len(linhas))
+        + f" ON CONFLICT ({', '.join(chaves)}) DO UPDATE SET "
+        + ", ".join(f"{c} = EXCLUDED.{c}" for c in colunas)
+    )
+    cursor.execute(sql, [limpar(v) for linha in linhas for v in linha])
+    return cursor.rowcount
+
+
+def gravar_em_lotes(df, gravar, db, erros, tamanho=1000, progresso=None):
+    """
+    Chama ``gravar(lote)`` em fatias de ``tamanho`` linhas, cada uma numa
+    transação. Se a fatia falha, as linhas são regravadas uma a uma para
+    que só as problemáticas recebam o erro em ``erros``. Retorna os índices
+    gravados.
+    """
+    gravadas = []
+    total = len(df)
+    for inicio in range(0, total, tamanho):
+        lote = df.iloc[inicio:inicio + tamanho]
+        try:
+            with transaction.atomic(using=db):
+                gravar(lote)
+            gravadas.extend(lote.index)
+        except Exception:
+            logger.warning("[IMPORTADOR] Lote %s-%s falhou; gravando linha a linha", inicio, inicio + len(lote), exc_info=True)
+            for idx in lote.index:
+                try:
+                    with transaction.atomic(using=db):
+                        gravar(lote.loc[[idx]])
+                    gravadas.append(idx)
+                except Exception as exc:
+                    erros[idx] = str(exc)
+        if progresso:
+            progresso(min(inicio + tamanho, total), total)
+        logger.info("[IMPORTADOR] %s/%s linhas gravadas", min(inicio + tamanho, total), total)
+    return gravadas
@@ -1,80 +1,111 @@
-from Entidades.models import Entidades
-
-
-class UpsertEntidade:
-    def __init__(self, row, empresa, db):
-        self.row = row
-        self.empresa = int(empresa)
-        self.db = db
+from django.db import connections
 
-    def _proximo_codigo(self):
-        ultimo = Entidades.objects.using(self.db).filter(enti_empr=self.empresa).order_by("-enti_clie").first()
-        return (int(ultimo.enti_clie) + 1) if ultimo else 1
+from Entidades.models import Entidades
 
-    def _find_existente(self):
-        codigo = self.row.get("enti_clie")
-        if str(codigo or "").isdigit():
-            entidade = Entidades.objects.using(self.db).filter(enti_empr=self.empresa, enti_clie=int(codigo)).first()
-            if entidade:
-                return entidade
+from .sql_lote import coluna, conferir_atualizadas, limpar, update_valores
 
-        cnpj = self.row.get("enti_cnpj")
-        if cnpj:
-            entidade = Entidades.objects.using(self.db).filter(enti_empr=self.empresa, enti_cnpj=cnpj).first()
-            if entidade:
-                return entidade
+COLUNAS_ENTIDADE = (
+    "enti_nome", "enti_tipo_enti", "enti_fant", "enti_cpf", "enti_cnpj", "enti_insc_esta",
+    "enti_cep", "enti_ende", "enti_nume", "enti_cida", "enti_esta", "enti_pais",
+    "enti_codi_pais", "enti_codi_cida", "enti_bair", "enti_comp", "enti_fone",
+    "enti_celu", "enti_emai", "enti_situ",
+)
 
-        cpf = self.row.get("enti_cpf")
-        if cpf:
-            entidade = Entidades.objects.using(self.db).filter(enti_empr=self.empresa, enti_cpf=cpf).first()
-            if entidade:
-                return entidade
 
-        nome = (self.row.get("enti_nome") or "").strip()
-        if nome:
-            return Entidades.objects.using(self.db).filter(enti_empr=self.empresa, enti_nome__iexact=nome).first()
+class UpsertEntidade:
+    """
+    Cria/atualiza entidades da empresa em lote. ``identificar`` procura cada
+    linha por código, CNPJ, CPF e nome (nessa ordem) nos cadastros lidos uma
+    vez; linhas novas repetidas no arquivo caem na mesma entidade.
+    ``executar`` grava uma fatia com bulk_create e um UPDATE de várias linhas.
+    """
 
-        return None
+    def __init__(self, empresa, db):
+        self.empresa = int(empresa)
+        self.db = db
 
-    def executar(self):
-        existente = self._find_existente()
+    def identificar(self, df):
+        """Acrescenta ``_codigo`` (entidade de destino) e ``_criado`` a uma cópia de ``df``."""
+        da_empresa = set()
+        por_cnpj, por_cpf, por_nome = {}, {}, {}
+        maior = 0
+        existentes = (
+            Entidades.objects.using(self.db)
+            .filter(enti_empr=self.empresa)
+            .order_by("enti_clie")
+            .values_list("enti_clie", "enti_cnpj", "enti_cpf", "enti_nome")
+        )
+        for codigo, cnpj, cpf, nome in existentes.iterator():
+            da_empresa.add(codigo)
+            maior = max(maior, codigo)
+            if cnpj:
+                por_cnpj.setdefault(cnpj, codigo)
+            if cpf:
+                por_cpf.setdefault(cpf, codigo)
+            por_nome.setdefault(str(nome or "").strip().upper(), codigo)
+        # enti_clie é único na tabela: código novo não pode colidir com outra empresa
+        usados = set(Entidades.objects.using(self.db).values_list("enti_clie", flat=True).iterator())
 
-        dados = {
-            "enti_empr": self.empresa,
-            "enti_nome": self.row.get("enti_nome"),
-            "enti_tipo_enti": self.row.get("enti_tipo_enti", "CL"),
-            "enti_fant": self.row.get("enti_fant"),
-            "enti_cpf": self.row.get("enti_cpf"),
-            "enti_cnpj": self.row.get("enti_cnpj"),
-            "enti_insc_esta": self.row.get("enti_insc_esta"),
-            "enti_cep": self.row.get("enti_cep"),
-            "enti_ende": self.row.get("enti_ende"),
-            "enti_nume": self.row.get("enti_nume"),
-            "enti_cida": self.row.get("enti_cida"),
-            "enti_esta": self.row.get("enti_esta"),
-            "enti_pais": self.row.get("enti_pais", "1058"),
-            "enti_codi_pais": self.row.get("enti_codi_pais", "1058"),
-            "enti_codi_cida": self.row.get("enti_codi_cida", "0000000"),
-            "enti_bair": self.row.get("enti_bair"),
-            "enti_comp": self.row.get("enti_comp"),
-            "enti_fone": self.row.get("enti_fone"),
-            "enti_celu": self.row.get("enti_celu"),
-            "enti_emai": self.row.get("enti_emai"),
-            "enti_situ": self.row.get("enti_situ", "1"),
-        }
+        df = df.copy()
+        informados = coluna(df, "enti_clie", "").fillna("").astype(str).str.strip()
+        numericos = informados.where(informados.str.isdigit())
+        cnpj = coluna(df, "enti_cnpj", "").fillna("").astype(str)
+        cpf = coluna(df, "enti_cpf", "").fillna("").astype(str)
+        nomes = coluna(df, "enti_nome", "").fillna("").astype(str).str.strip().str.upper()
 
-        if existente:
-            for k, v in dados.items():
-                setattr(existente, k, v)
-            existente.save(using=self.db)
-            return existente, False
+        destino = (
+            numericos.map(lambda c: int(c) if isinstance(c, str) and int(c) in da_empresa else None)
+            .combine_first(cnpj.map(lambda c: por_cnpj.get(c) if c else None))
+            .combine_first(cpf.map(lambda c: por_cpf.get(c) if c else None))
+            .combine_first(nomes.map(lambda n: por_nome.get(n) if n else None))
+            .astype(object)
+        )
+        criado = destino.isna()
 
-        codigo = self.row.get("enti_clie")
-        if not str(codigo or "").isdigit():
-            codigo = self._proximo_codigo()
+        # Linhas novas com o mesmo código/CNPJ/CPF/nome viram uma entidade só
+        chave = (
+            numericos.radd("c").combine_first(cnpj.where(cnpj != "").radd("j"))
+            .combine_first(cpf.where(cpf != "").radd("f"))
+            .combine_first(nomes.radd("n"))
+        )
+        alocados = {}
+        for idx in destino.index[criado]:
+            if chave[idx] in alocados:
+                destino[idx] = alocados[chave[idx]]
+                criado[idx] = False
+                continue
+            codigo = int(numericos[idx]) if isinstance(numericos[idx], str) else maior + 1
+            while codigo in usados:
+                codigo += 1
+            usados.add(codigo)
+            maior = max(maior, codigo)
+            destino[idx] = alocados[chave[idx]] = codigo
+        df["_codigo"] = destino.map(int)
+        df["_criado"] = criado
+        return df
 
-        while Entidades.objects.using(self.db).filter(enti_empr=self.empresa, enti_clie=int(codigo)).exists():
-            codigo = int(codigo) + 1
+    def executar(self, lote):
+        valores = {c: coluna(lote, c) for c in COLUNAS_ENTIDADE}
+        # Várias linhas para a mesma entidade: vale a última, como na gravação linha a linha
+        ultimas = lote.drop_duplicates("_codigo", keep="last")
+        novos = ultimas.index[ultimas["_codigo"].isin(lote.loc[lote["_criado"], "_codigo"])]
+        if len(novos):
+            Entidades.objects.using(self.db).bulk_create([
+                Entidades(
+                    enti_empr=self.empresa,
+                    enti_clie=int(lote.at[idx, "_codigo"]),
+                    **{c: limpar(valores[c][idx]) for c in COLUNAS_ENTIDADE},
+                )
+                for idx in novos
+            ])
 
-        novo = Entidades.objects.using(self.db).create(enti_clie=int(codigo), **dados)
-        return novo, True
+        linhas = [
+            (self.empresa, int(lote.at[idx, "_codigo"])) + tuple(valores[c][idx] for c in COLUNAS_ENTIDADE)
+            for idx in ultimas.index.difference(novos)
+        ]
+        with connections[self.db].cursor() as cursor:
+            atualizadas = update_valores(
+                cursor, "entidades", ("enti_empr", "enti_clie"), COLUNAS_ENTIDADE, linhas,
+                tipos={"enti_empr": "integer", "enti_clie": "bigint"},
+            )
+        conferir_atualizadas(atualizadas, linhas, "Entidade")
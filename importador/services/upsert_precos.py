@@ -1,79 +1,82 @@
 # importador_produtos/services/upsert_precos.py
-from Produtos.models import Tabelaprecos, Tabelaprecoshist
-from django.db import IntegrityError
+from django.db import connections
 from django.utils import timezone
 
+from Produtos.models import Tabelaprecos, Tabelaprecoshist
+
+from .sql_lote import upsert_valores
+
 
 class UpsertPrecos:
-    def __init__(self, produto, row, empresa, filial, db):
-        self.produto = produto
-        self.row = row
-        self.empresa = empresa
-        self.filial = filial
+    """
+    Grava os preços da planilha na tabela da filial (INSERT ... ON CONFLICT
+    de várias linhas) com o histórico em bulk_create. Os preços atuais, para
+    os campos *_ante do histórico, são lidos uma vez em ``carregar``.
+    """
+
+    def __init__(self, empresa, filial, db, colunas):
+        self.empresa = int(empresa)
+        self.filial = int(filial)
         self.db = db
+        self.colunas = set(colunas)
+        self.atuais = {}
 
-    def executar(self):
-        base = self.row.get("preco")
-        compra = self.row.get("preco_compra") if self.row.get("preco_compra") is not None else base
-        vista = self.row.get("preco_vista") if self.row.get("preco_vista") is not None else base
-        prazo = self.row.get("preco_prazo") if self.row.get("preco_prazo") is not None else base
-        if base is None and compra is None and vista is None and prazo is None:
-            return None
+    def carregar(self):
+        self.atuais = {
+            str(prod): (prco, cuge, avis, apra)
+            for prod, prco, cuge, avis, apra in Tabelaprecos.objects.using(self.db)
+            .filter(tabe_empr=self.empresa, tabe_fili=self.filial)
+            .values_list("tabe_prod", "tabe_prco", "tabe_cuge", "tabe_avis", "tabe_apra")
+            .iterator()
+        }
+        return self
 
-        # Valores atuais (antes)
-        atual = Tabelaprecos.objects.using(self.db).filter(
-            tabe_empr=self.empresa,
-            tabe_fili=self.filial,
-            tabe_prod=str(self.produto.prod_codi),
-        ).first()
-        ante_prco = getattr(atual, "tabe_prco", None) if atual else None
-        ante_cuge = getattr(atual, "tabe_cuge", None) if atual else None
-        ante_avis = getattr(atual, "tabe_avis", None) if atual else None
-        ante_apra = getattr(atual, "tabe_apra", None) if atual else None
+    def _serie(self, lote, nome, padrao=None):
+        return lote[nome] if nome in self.colunas else padrao
 
-        # Novos valores
-        novo_prco = (base if base is not None else (vista if vista is not None else (prazo if prazo is not None else compra)))
-        dados_tabela = {
-            "tabe_empr": self.empresa,
-            "tabe_fili": self.filial,
-            "tabe_prod": str(self.produto.prod_codi),
-            "tabe_prco": novo_prco,
-            "tabe_cuge": compra,
-            "tabe_avis": vista,
-            "tabe_apra": prazo,
-        }
+    def executar(self, lote):
+        # Coluna ausente na planilha herda o preço base, como no cadastro manual
+        base = self._serie(lote, "preco")
+        compra = self._serie(lote, "preco_compra", base)
+        vista = self._serie(lote, "preco_vista", base)
+        prazo = self._serie(lote, "preco_prazo", base)
+        if base is None and compra is None and vista is None and prazo is None:
+            return 0
+        novo = next(s for s in (base, vista, prazo, compra) if s is not None)
 
-        # Atualiza/cria preço atual com filtro por empresa/filial/produto
-        chave = {
-            "tabe_empr": self.empresa,
-            "tabe_fili": self.filial,
-            "tabe_prod": str(self.produto.prod_codi),
-        }
-        update_fields = {
-            k: v for k, v in dados_tabela.items()
-            if k not in ("tabe_empr", "tabe_fili", "tabe_prod")
-        }
-        qs = Tabelaprecos.objects.using(self.db).filter(**chave)
-        if qs.exists():
-            qs.update(**update_fields)
-            obj = qs.first()
-        else:
-            obj = Tabelaprecos.objects.using(self.db).create(**{**chave, **update_fields})
+        def valor(serie, idx):
+            return None if serie is None else float(serie[idx])
 
-        # Criar registro de histórico com auto now
-        hist = {
-            "tabe_empr": self.empresa,
-            "tabe_fili": self.filial,
-            "tabe_prod": str(self.produto.prod_codi),
-            "tabe_data_hora": timezone.now(),
-            "tabe_prco_ante": ante_prco,
-            "tabe_prco_novo": novo_prco,
-            "tabe_cuge_ante": ante_cuge,
-            "tabe_cuge_novo": compra,
-            "tabe_avis_ante": ante_avis,
-            "tabe_avis_novo": vista,
-            "tabe_apra_ante": ante_apra,
-            "tabe_apra_novo": prazo,
-        }
-        Tabelaprecoshist.objects.using(self.db).create(**hist)
-        return obj
+        agora = timezone.now()
+        precos = {}
+        historico = []
+        for idx in lote.index:
+            prod = str(lote.at[idx, "_codigo"])
+            prco, cuge, avis, apra = valor(novo, idx), valor(compra, idx), valor(vista, idx), valor(prazo, idx)
+            ante = self.atuais.get(prod, (None, None, None, None))
+            historico.append(Tabelaprecoshist(
+                tabe_empr=self.empresa,
+                tabe_fili=self.filial,
+                tabe_prod=prod,
+                tabe_data_hora=agora,
+                tabe_prco_ante=ante[0],
+                tabe_prco_novo=prco,
+                tabe_cuge_ante=ante[1],
+                tabe_cuge_novo=cuge,
+                tabe_avis_ante=ante[2],
+                tabe_avis_novo=avis,
+                tabe_apra_ante=ante[3],
+                tabe_apra_novo=apra,
+            ))
+            precos[prod] = (prco, cuge, avis, apra)
+
+        with connections[self.db].cursor() as cursor:
+            upsert_valores(
+                cursor, "tabelaprecos",
+                ("tabe_empr", "tabe_fili", "tabe_prod"),
+                ("tabe_prco", "tabe_cuge", "tabe_avis", "tabe_apra"),
+                [(self.empresa, self.filial, prod) + v for prod, v in precos.items()],
+            )
+        Tabelaprecoshist.objects.using(self.db).bulk_create(historico)
+        self.atuais.update(precos)
+        return len(precos)
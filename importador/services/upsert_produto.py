@@ -1,57 +1,107 @@
 # importador_produtos/services/upsert_produto.py
+from django.db import connections
+
 from Produtos.models import Produtos
 
+from .sql_lote import coluna, conferir_atualizadas, limpar, update_valores
+
+COLUNAS_PRODUTO = (
+    "prod_nome", "prod_unme", "prod_marc", "prod_grup", "prod_sugr", "prod_fami",
+    "prod_loca", "prod_ncm", "prod_gtin", "prod_orig_merc",
+)
+
 
 class UpsertProduto:
-    def __init__(self, row, empresa, db):
-        self.row = row
-        self.empresa = empresa
+    """
+    Cria/atualiza produtos da empresa em lote. ``identificar`` decide o
+    destino de cada linha (código existente, descrição existente ou código
+    novo) com os produtos carregados uma vez; ``executar`` grava uma fatia com
+    um bulk_create e um UPDATE de várias linhas.
+    """
+
+    def __init__(self, empresa, db):
+        self.empresa = str(empresa)
         self.db = db
 
-    def executar(self):
-        codigo = self.row.get("prod_codi")
-        prod = Produtos.objects.using(self.db).filter(prod_codi=codigo).first() if codigo else None
-
-        dados = {
-            "prod_empr": self.empresa,
-            "prod_nome": self.row["prod_nome"],
-            "prod_unme": self.row["prod_unme"],
-            "prod_marc": self.row["prod_marc"],
-            "prod_grup": self.row["prod_grup"],
-            "prod_sugr": self.row["prod_sugr"],
-            "prod_fami": self.row["prod_fami"],
-            "prod_loca": self.row.get("prod_loca"),
-            "prod_ncm": self.row.get("prod_ncm"),
-            "prod_gtin": self.row.get("prod_gtin") or "SEM GTIN",
-            "prod_orig_merc": self.row.get("prod_orig_merc", "0")
+    def identificar(self, df):
+        """Acrescenta ``_codigo`` (produto de destino) e ``_criado`` a uma cópia de ``df``."""
+        codigos = set()
+        por_nome = {}
+        maior = 0
+        existentes = (
+            Produtos.objects.using(self.db)
+            .filter(prod_empr=self.empresa)
+            .order_by("prod_codi")
+            .values_list("prod_codi", "prod_nome")
+        )
+        for codigo, nome in existentes.iterator():
+            codigo = str(codigo)
+            codigos.add(codigo)
+            por_nome.setdefault(str(nome or "").strip().upper(), codigo)
+            if codigo.isdigit():
+                maior = max(maior, int(codigo))
+
+        df = df.copy()
+        informados = coluna(df, "prod_codi", "").fillna("").astype(str).str.strip()
+        nomes = coluna(df, "prod_nome", "").fillna("").astype(str).str.strip().str.upper()
+        destino = informados.where(informados.isin(codigos)).combine_first(nomes.map(por_nome))
+
+        criado = destino.isna()
+        for idx in destino.index[criado]:
+            maior += 1
+            while str(maior) in codigos:
+                maior += 1
+            destino[idx] = str(maior)
+        df["_codigo"] = destino
+        df["_criado"] = criado
+        return df
+
+    def _valores(self, lote):
+        gtin = coluna(lote, "prod_gtin", "").fillna("").astype(str)
+        return {
+            "prod_nome": lote["prod_nome"],
+            "prod_unme": lote["prod_unme"],
+            "prod_marc": lote["prod_marc"],
+            "prod_grup": lote["prod_grup"],
+            "prod_sugr": lote["prod_sugr"],
+            "prod_fami": lote["prod_fami"],
+            "prod_loca": coluna(lote, "prod_loca"),
+            "prod_ncm": coluna(lote, "prod_ncm"),
+            "prod_gtin": gtin.where(gtin != "", "SEM GTIN"),
+            "prod_orig_merc": coluna(lote, "prod_orig_merc", "0"),
         }
 
-        if not prod:
-            nome = (self.row.get("prod_nome") or "").strip()
-            empresa_str = str(self.empresa)
-            existente_por_nome = Produtos.objects.using(self.db).filter(prod_empr=empresa_str, prod_nome__iexact=nome).first() if nome else None
-            if existente_por_nome:
-                for k, v in dados.items():
-                    setattr(existente_por_nome, k, v)
-                existente_por_nome.save(using=self.db)
-                return existente_por_nome, False
-            ultimo = (
-                Produtos.objects.using(self.db)
-                .filter(prod_empr=empresa_str)
-                .order_by('-prod_codi')
-                .first()
+    def executar(self, lote):
+        valores = self._valores(lote)
+        novos = lote.index[lote["_criado"]]
+        if len(novos):
+            Produtos.objects.using(self.db).bulk_create([
+                Produtos(
+                    prod_codi=lote.at[idx, "_codigo"],
+                    prod_empr=self.empresa,
+                    prod_nome=valores["prod_nome"][idx],
+                    prod_unme_id=valores["prod_unme"][idx],
+                    prod_marc_id=limpar(valores["prod_marc"][idx]),
+                    prod_grup_id=limpar(valores["prod_grup"][idx]),
+                    prod_sugr_id=limpar(valores["prod_sugr"][idx]),
+                    prod_fami_id=limpar(valores["prod_fami"][idx]),
+                    prod_loca=limpar(valores["prod_loca"][idx]),
+                    prod_ncm=limpar(valores["prod_ncm"][idx]),
+                    prod_gtin=valores["prod_gtin"][idx],
+                    prod_orig_merc=limpar(valores["prod_orig_merc"][idx]),
+                )
+                for idx in novos
+            ])
+
+        # Mais de uma linha para o mesmo produto: vale a última, como na gravação linha a linha
+        existentes = lote[~lote["_criado"]].drop_duplicates("_codigo", keep="last").index
+        linhas = [
+            (self.empresa, lote.at[idx, "_codigo"]) + tuple(valores[c][idx] for c in COLUNAS_PRODUTO)
+            for idx in existentes
+        ]
+        with connections[self.db].cursor() as cursor:
+            atualizadas = update_valores(
+                cursor, "produtos", ("prod_empr", "prod_codi"), COLUNAS_PRODUTO, linhas,
+                tipos={"prod_marc": "integer"},
             )
-            try:
-                proximo = int(getattr(ultimo, 'prod_codi', '0')) + 1 if (ultimo and str(getattr(ultimo, 'prod_codi', '')).isdigit()) else 1
-            except Exception:
-                proximo = 1
-            while Produtos.objects.using(self.db).filter(prod_codi=str(proximo), prod_empr=empresa_str).exists():
-                proximo += 1
-            novo_codigo = str(proximo)
-            novo = Produtos.objects.using(self.db).create(prod_codi=novo_codigo, **dados)
-            return novo, True
-
-        for k, v in dados.items():
-            setattr(prod, k, v)
-        prod.save(using=self.db)
-        return prod, False
+        conferir_atualizadas(atualizadas, linhas, "Produto")
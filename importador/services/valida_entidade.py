@@ -1,29 +1,33 @@
+import pandas as pd
 
-class ValidadorEntidade:
-    def __init__(self, row):
-        self.row = row
+from .sql_lote import coluna
 
-    def validar(self):
-        if not self.row.get("enti_nome"):
-            raise ValueError("Entidade sem nome")
+PADROES_ENTIDADE = {
+    "enti_ende": "NÃO INFORMADO",
+    "enti_nume": "S/N",
+    "enti_cida": "NÃO INFORMADA",
+    "enti_bair": "NÃO INFORMADO",
+    "enti_esta": "TO",
+    "enti_cep": "00000000",
+    "enti_tipo_enti": "CL",
+    "enti_situ": "1",
+    "enti_pais": "1058",
+    "enti_codi_pais": "1058",
+    "enti_codi_cida": "0000000",
+}
 
-        if not self.row.get("enti_ende"):
-            self.row["enti_ende"] = "NÃO INFORMADO"
-        if not self.row.get("enti_nume"):
-            self.row["enti_nume"] = "S/N"
-        if not self.row.get("enti_cida"):
-            self.row["enti_cida"] = "NÃO INFORMADA"
-        if not self.row.get("enti_bair"):
-            self.row["enti_bair"] = "NÃO INFORMADO"
-        if not self.row.get("enti_esta"):
-            self.row["enti_esta"] = "TO"
-        if not self.row.get("enti_cep"):
-            self.row["enti_cep"] = "00000000"
 
-        self.row["enti_tipo_enti"] = self.row.get("enti_tipo_enti") or "CL"
-        self.row["enti_situ"] = self.row.get("enti_situ") or "1"
-        self.row["enti_pais"] = self.row.get("enti_pais") or "1058"
-        self.row["enti_codi_pais"] = self.row.get("enti_codi_pais") or "1058"
-        self.row["enti_codi_cida"] = self.row.get("enti_codi_cida") or "0000000"
+class ValidadorEntidade:
+    def __init__(self, df):
+        self.df = df
+
+    def validar(self):
+        """Preenche os padrões dos campos obrigatórios e devolve a série de erros por linha."""
+        for campo, padrao in PADROES_ENTIDADE.items():
+            valores = coluna(self.df, campo, "").fillna("").astype(str)
+            self.df[campo] = valores.where(valores.str.strip() != "", padrao)
 
-        return True
+        nomes = coluna(self.df, "enti_nome", "").fillna("").astype(str).str.strip()
+        erros = pd.Series(None, index=self.df.index, dtype=object)
+        erros[nomes == ""] = "Entidade sem nome"
+        return erros
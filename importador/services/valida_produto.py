@@ -1,16 +1,27 @@
 # importador_produtos/services/valida_produto.py
+import pandas as pd
+
+from .sql_lote import coluna, normalizar_chave
+
+
 class ValidadorProduto:
-    def __init__(self, row):
-        self.row = row
+    def __init__(self, df):
+        self.df = df
 
     def validar(self):
-        if not self.row.get("prod_nome"):
-            raise ValueError("Produto sem nome")
-
-        if not self.row.get("prod_unme"):
-            raise ValueError("Unidade inválida")
+        """
+        Série com a mensagem de erro de cada linha (None = linha válida). A
+        segunda ocorrência de uma descrição no arquivo é recusada.
+        """
+        nomes = coluna(self.df, "prod_nome", "").fillna("").astype(str).str.strip()
+        ncm = coluna(self.df, "prod_ncm", "").fillna("").astype(str).str.strip()
 
-        if not self.row.get("prod_ncm"):
-            raise ValueError("NCM inválido")
+        erros = pd.Series(None, index=self.df.index, dtype=object)
+        erros[nomes == ""] = "Produto sem nome"
+        erros[erros.isna() & (ncm == "")] = "NCM inválido"
 
-        return True
+        validas = erros.isna()
+        chaves = normalizar_chave(nomes)
+        duplicadas = validas & chaves.where(validas).duplicated(keep="first") & (chaves != "")
+        erros[duplicadas] = "Descricao duplicada no arquivo"
+        return erros, duplicadas
@@ -0,0 +1,195 @@
+from contextlib import nullcontext
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from Entidades.models import Entidades
+from Produtos.models import Produtos
+from importador.services import upsert_entidade, upsert_produto
+from importador.services.normalizadores import Normalizadores
+from importador.services.sql_lote import gravar_em_lotes, update_valores
+from importador.services.upsert_entidade import UpsertEntidade
+from importador.services.upsert_produto import UpsertProduto
+from importador.services.valida_produto import ValidadorProduto
+
+
+def _conexao(rowcount=None):
+    cursor = MagicMock()
+    cursor.execute.side_effect = lambda sql, params: setattr(
+        cursor, "rowcount", rowcount if rowcount is not None else sql.count("(%s")
+    )
+    conexao = MagicMock()
+    conexao.cursor.return_value.__enter__.return_value = cursor
+    return {"t": conexao}, cursor
+
+
+class ValidadorProdutoTests(SimpleTestCase):
+    def test_recusa_sem_nome_ncm_e_duplicada(self):
+        df = pd.DataFrame({
+            "prod_nome": ["Café", "", "cafe ", "Açúcar"],
+            "prod_ncm": ["09012100", "1", "09012100", ""],
+        })
+        erros, duplicadas = ValidadorProduto(df).validar()
+
+        self.assertTrue(pd.isna(erros[0]))
+        self.assertEqual(
+            erros[1:].tolist(),
+            ["Produto sem nome", "Descricao duplicada no arquivo", "NCM inválido"],
+        )
+        self.assertEqual(duplicadas.tolist(), [False, False, True, False])
+
+
+class NormalizadoresTests(SimpleTestCase):
+    def test_precos_formato_brasileiro(self):
+        df = pd.DataFrame({"preco": ["1.234,56", "", "abc", "10"]})
+        valores = Normalizadores(df).normalizar_precos(df["preco"])
+        self.assertEqual(valores.tolist(), [1234.56, 0.0, 0.0, 10.0])
+
+
+class SqlLoteTests(SimpleTestCase):
+    def test_update_valores_um_comando(self):
+        cursor = MagicMock()
+        update_valores(
+            cursor, "produtos", ("prod_empr", "prod_codi"), ("prod_nome", "prod_marc"),
+            [("1", "10", "A", None), ("1", "11", "B", float("nan"))],
+            tipos={"prod_marc": "integer"},
+        )
+        sql, params = cursor.execute.call_args[0]
+        self.assertEqual(cursor.execute.call_count, 1)
+        self.assertIn("FROM (VALUES (%s, %s, %s, %s::integer), (%s, %s, %s, %s::integer))", sql)
+        self.assertIn("WHERE t.prod_empr = v.prod_empr AND t.prod_codi = v.prod_codi", sql)
+        self.assertEqual(params, ["1", "10", "A", None, "1", "11", "B", None])
+
+    @patch("importador.services.sql_lote.transaction.atomic", return_value=nullcontext())
+    def test_lote_com_falha_regrava_linha_a_linha(self, _atomic):
+        df = pd.DataFrame({"v": [1, 2, 3]})
+        chamadas = []
+
+        def gravar(lote):
+            chamadas.append(list(lote.index))
+            if 1 in lote.index:
+                raise ValueError("falhou")
+
+        erros = pd.Series(None, index=df.index, dtype=object)
+        progresso = MagicMock()
+        gravadas = gravar_em_lotes(df, gravar, "default", erros, tamanho=3, progresso=progresso)
+
+        self.assertEqual(gravadas, [0, 2])
+        self.assertEqual(chamadas, [[0, 1, 2], [0], [1], [2]])
+        self.assertEqual(erros[1], "falhou")
+        progresso.assert_called_once_with(3, 3)
+
+
+class UpsertProdutoTests(SimpleTestCase):
+    def setUp(self):
+        patcher = patch.object(Produtos, "objects")
+        self.objetos = patcher.start()
+        self.addCleanup(patcher.stop)
+        filtro = self.objetos.using.return_value.filter.return_value
+        filtro.order_by.return_value.values_list.return_value.iterator.return_value = [
+            ("1", "Café"), ("7", "ACUCAR"), ("A1", "SAL"),
+        ]
+
+    def _identificar(self):
+        df = pd.DataFrame({
+            "prod_codi": ["7", "", "", "99"],
+            "prod_nome": ["Açúcar refinado", "café ", "Arroz", "Feijão"],
+            "prod_unme": ["UN"] * 4,
+            "prod_marc": [None, 3, None, None],
+            "prod_grup": [None] * 4,
+            "prod_sugr": [None] * 4,
+            "prod_fami": [None] * 4,
+        })
+        return UpsertProduto(1, "t").identificar(df)
+
+    def test_identificar_por_codigo_nome_ou_codigo_novo(self):
+        df = self._identificar()
+        self.assertEqual(df["_codigo"].tolist(), ["7", "1", "8", "9"])
+        self.assertEqual(df["_criado"].tolist(), [False, False, True, True])
+
+    def test_executar_cria_em_lote_e_atualiza_num_comando(self):
+        df = self._identificar()
+        conexoes, cursor = _conexao()
+        with patch.object(upsert_produto, "connections", conexoes):
+            UpsertProduto(1, "t").executar(df)
+
+        criados = self.objetos.using.return_value.bulk_create.call_args.args[0]
+        self.assertEqual([(p.prod_codi, p.prod_nome, p.prod_gtin) for p in criados], [
+            ("8", "Arroz", "SEM GTIN"), ("9", "Feijão", "SEM GTIN"),
+        ])
+        sql, params = cursor.execute.call_args.args
+        self.assertTrue(sql.startswith("UPDATE produtos t SET prod_nome = v.prod_nome"))
+        self.assertEqual(params[:3] + params[12:15], ["1", "7", "Açúcar refinado", "1", "1", "café "])
+
+    def test_executar_falha_se_produto_sumiu(self):
+        df = self._identificar()
+        conexoes, _ = _conexao(rowcount=1)
+        with patch.object(upsert_produto, "connections", conexoes), self.assertRaises(ValueError):
+            UpsertProduto(1, "t").executar(df)
+
+    @patch("importador.services.sql_lote.transaction.atomic", return_value=nullcontext())
+    def test_produto_apagado_vira_erro_da_linha(self, _atomic):
+        df = self._identificar()
+        conexoes, cursor = _conexao()
+        original = cursor.execute.side_effect
+
+        def execute(sql, params):
+            original(sql, params)
+            if "7" in params[:2]:
+                cursor.rowcount -= 1
+
+        cursor.execute.side_effect = execute
+        erros = pd.Series(None, index=df.index, dtype=object)
+        with patch.object(upsert_produto, "connections", conexoes), \
+                self.assertLogs("importador.services.sql_lote", level="WARNING"):
+            gravadas = gravar_em_lotes(df, UpsertProduto(1, "t").executar, "t", erros)
+
+        self.assertEqual(gravadas, [1, 2, 3])
+        self.assertEqual(erros[0], "Produto 7 não encontrado para atualização")
+
+
+class UpsertEntidadeTests(SimpleTestCase):
+    def setUp(self):
+        patcher = patch.object(Entidades, "objects")
+        objetos = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.using = objetos.using.return_value
+        self.using.filter.return_value.order_by.return_value.values_list.return_value.iterator.return_value = [
+            (5, "111", None, "Alfa"), (6, None, "222", "BETA"),
+        ]
+        # 9 já é de outra empresa (enti_clie é único na tabela)
+        self.using.values_list.return_value.iterator.return_value = [5, 6, 9]
+
+    def _identificar(self):
+        df = pd.DataFrame({
+            "enti_clie": ["5", "", "", "", "", "9"],
+            "enti_cnpj": ["", "111", "", "", "", ""],
+            "enti_cpf": ["", "", "222", "", "", ""],
+            "enti_nome": ["Alfa", "Alfa Ltda", "Beta", "Gama", "GAMA", "Delta"],
+        })
+        return UpsertEntidade(1, "t").identificar(df)
+
+    def test_identificar_por_codigo_cnpj_cpf_e_nome(self):
+        df = self._identificar()
+        self.assertEqual(df["_codigo"].tolist(), [5, 5, 6, 7, 7, 10])
+        self.assertEqual(df["_criado"].tolist(), [False, False, False, True, False, True])
+
+    def test_executar_grava_ultima_linha_de_cada_entidade(self):
+        df = self._identificar()
+        conexoes, cursor = _conexao()
+        with patch.object(upsert_entidade, "connections", conexoes):
+            UpsertEntidade(1, "t").executar(df)
+
+        criadas = self.using.bulk_create.call_args.args[0]
+        self.assertEqual([(e.enti_clie, e.enti_nome) for e in criadas], [(7, "GAMA"), (10, "Delta")])
+        sql, params = cursor.execute.call_args.args
+        self.assertIn("WHERE t.enti_empr = v.enti_empr AND t.enti_clie = v.enti_clie", sql)
+        self.assertEqual(sql.count("(%s::integer, %s::bigint"), 2)
+        self.assertEqual([params[i:i + 3] for i in (0, 22)], [[1, 5, "Alfa Ltda"], [1, 6, "Beta"]])
+
+    def test_executar_falha_se_entidade_sumiu(self):
+        df = self._identificar()
+        conexoes, _ = _conexao(rowcount=0)
+        with patch.object(upsert_entidade, "connections", conexoes), self.assertRaises(ValueError):
+            UpsertEntidade(1, "t").executar(df)
@@ -5,3 +5,5 @@ class LicencasWebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'licencas_web'
 
+    def ready(self):
+        import licencas_web.signals
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.licencas_registry import invalidar_registro_licencas
+
+from .models import LicencaWeb
+
+
+@receiver(post_save, sender=LicencaWeb)
+@receiver(post_delete, sender=LicencaWeb)
+def licenca_web_alterada(sender, instance, **kwargs):
+    invalidar_registro_licencas()
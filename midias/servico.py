@@ -0,0 +1,304 @@
+"""
+Blobs gravados em BinaryField (fotos, assinaturas, anexos, logos, boletos)
+servidos por URL em vez de base64 dentro do JSON.
+
+Cada fonte é uma coluna bytea identificada pelas chaves da linha. O hash de
+conteúdo (md5) e o tamanho são calculados no banco, sem trazer o blob, e
+entram na URL como ``v=``: conteúdo novo, URL nova, então a resposta pode
+ser cacheada como imutável pelo navegador/app. Miniaturas ficam no cache
+do Django pelo hash, de modo que repetir uma miniatura não lê o blob.
+"""
+import io
+import logging
+from urllib.parse import urlencode
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, F, Func, IntegerField
+from django.http import HttpResponse
+
+from core.excecoes import ErroDominio
+
+logger = logging.getLogger(__name__)
+
+FONTES = {
+    'produto': {
+        'modelo': 'Produtos.Produtos',
+        'campo': 'prod_foto',
+        'chaves': ('prod_empr', 'prod_codi'),
+    },
+    'os_arquivo': {
+        'modelo': 'OrdemdeServico.Osarquivos',
+        'campo': 'arqu_arqu',
+        'chaves': ('arqu_empr', 'arqu_fili', 'arqu_os', 'arqu_codi_arqu'),
+    },
+    'os_assinatura_cliente': {
+        'modelo': 'O_S.Os',
+        'campo': 'os_assi_clie',
+        'chaves': ('os_empr', 'os_fili', 'os_os'),
+    },
+    'os_assinatura_operador': {
+        'modelo': 'O_S.Os',
+        'campo': 'os_assi_oper',
+        'chaves': ('os_empr', 'os_fili', 'os_os'),
+    },
+    'ordem_producao_antes': {
+        'modelo': 'OrdemProducao.Ordemprodfotos',
+        'campo': 'orpr_foto_ante',
+        'chaves': ('orpr_empr', 'orpr_fili', 'orpr_codi', 'orpr_nume_foto'),
+    },
+    'ordem_producao_atual': {
+        'modelo': 'OrdemProducao.Ordemprodfotos',
+        'campo': 'orpr_foto_atua',
+        'chaves': ('orpr_empr', 'orpr_fili', 'orpr_codi', 'orpr_nume_foto'),
+    },
+    'filial_logo': {
+        'modelo': 'Licencas.Filiais',
+        'campo': 'empr_logo',
+        'chaves': ('empr_empr', 'empr_codi'),
+    },
+    'boleto': {
+        'modelo': 'EnvioCobranca.EnviarCobranca',
+        'campo': 'boleto',
+        'chaves': ('empresa', 'filial', 'numero_titulo', 'serie', 'parcela'),
+    },
+}
+
+TAMANHOS_MINIATURA = (64, 128, 256, 512)
+
+
+class Md5(Func):
+    function = 'md5'
+    output_field = CharField()
+
+
+class OctetLength(Func):
+    function = 'octet_length'
+    output_field = IntegerField()
+
+
+def detectar_mime(dados):
+    """Mime pelos primeiros bytes do blob (assinaturas que o sistema grava)."""
+    try:
+        head = bytes(dados[:12])
+    except TypeError:
+        return "application/octet-stream"
+    if head[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"%PDF":
+        return "application/pdf"
+    return "application/octet-stream"
+
+
+def _fonte(nome):
+    fonte = FONTES.get(nome)
+    if not fonte:
+        raise ErroDominio(f"Mídia '{nome}' não suportada.", codigo="midia_invalida")
+    return fonte
+
+
+def anotar(queryset, fonte, prefixo='midia'):
+    """
+    Acrescenta ``<prefixo>_hash`` e ``<prefixo>_tamanho`` ao queryset sem
+    carregar o blob (use junto com ``.defer(campo)`` quando a linha inteira
+    é lida). Linhas sem conteúdo ficam com os dois valores nulos.
+    """
+    campo = _fonte(fonte)['campo']
+    return queryset.annotate(**{
+        f'{prefixo}_hash': Md5(F(campo)),
+        f'{prefixo}_tamanho': OctetLength(F(campo)),
+    })
+
+
+def url(slug, fonte, chaves, versao=None, tamanho=None):
+    """URL da API de mídias para a linha ``chaves`` (dict campo → valor) da fonte."""
+    definicao = _fonte(fonte)
+    params = [(c, chaves[c]) for c in definicao['chaves']]
+    if versao:
+        params.append(('v', versao))
+    if tamanho:
+        params.append(('tam', tamanho))
+    return f"/api/{slug}/midias/{fonte}/?{urlencode(params)}"
+
+
+class MidiaService:
+
+    @staticmethod
+    def _filtro(fonte, chaves):
+        definicao = _fonte(fonte)
+        faltando = [c for c in definicao['chaves'] if chaves.get(c) in (None, '')]
+        if faltando:
+            raise ErroDominio(
+                f"Parâmetros obrigatórios: {', '.join(faltando)}.", codigo="dados_obrigatorios"
+            )
+        modelo = apps.get_model(definicao['modelo'])
+        return modelo, definicao['campo'], {c: chaves[c] for c in definicao['chaves']}
+
+    @staticmethod
+    def assinatura(banco, fonte, chaves):
+        """(hash, tamanho) do conteúdo, ou None se a linha não tem blob."""
+        modelo, campo, filtro = MidiaService._filtro(fonte, chaves)
+        linha = (
+            modelo.objects.using(banco).filter(**filtro).exclude(**{f'{campo}__isnull': True})
+            .annotate(_hash=Md5(F(campo)), _tamanho=OctetLength(F(campo)))
+            .values_list('_hash', '_tamanho')
+            .first()
+        )
+        if not linha or not linha[1]:
+            return None
+        return linha
+
+    @staticmethod
+    def conteudo(banco, fonte, chaves):
+        """Só a coluna do blob (nunca a linha inteira), em bytes."""
+        modelo, campo, filtro = MidiaService._filtro(fonte, chaves)
+        dados = (
+            modelo.objects.using(banco).filter(**filtro).exclude(**{f'{campo}__isnull': True})
+            .values_list(campo, flat=True)
+            .first()
+        )
+        return bytes(dados) if dados else None
+
+    @staticmethod
+    def miniatura(dados, hash_conteudo, tamanho):
+        """
+        JPEG/PNG reduzido para caber em ``tamanho`` x ``tamanho``, já na
+        orientação do EXIF, cacheado por hash. Devolve (bytes, mime), False
+        se o conteúdo não é imagem (também cacheado) ou None quando ``dados``
+        é None e não há nada no cache.
+        """
+        chave = f"midia:mini:{hash_conteudo}:{tamanho}"
+        if dados is None:
+            return cache.get(chave)
+        from PIL import Image, ImageOps
+
+        ttl = getattr(settings, 'MIDIA_MINIATURA_TTL', 604800)
+        try:
+            # a miniatura sai sem EXIF: aplica a rotação antes de reduzir
+            imagem = ImageOps.exif_transpose(Image.open(io.BytesIO(dados)))
+            imagem.thumbnail((tamanho, tamanho))
+            saida = io.BytesIO()
+            if imagem.mode in ('RGBA', 'LA', 'P'):
+                imagem.save(saida, format='PNG', optimize=True)
+                mime = 'image/png'
+            else:
+                imagem.convert('RGB').save(saida, format='JPEG', quality=85, optimize=True)
+                mime = 'image/jpeg'
+        except Exception:
+            logger.info("[MIDIAS] Conteúdo %s não é imagem; miniatura ignorada", hash_conteudo)
+            cache.set(chave, False, ttl)
+            return False
+        resultado = (saida.getvalue(), mime)
+        cache.set(chave, resultado, ttl)
+        return resultado
+
+
+def _etag_confere(request, etag):
+    cabecalho = request.META.get('HTTP_IF_NONE_MATCH')
+    if not cabecalho:
+        return False
+    candidatos = [c.strip() for c in cabecalho.split(',')]
+    return '*' in candidatos or any(c.replace('W/', '', 1) == etag for c in candidatos)
+
+
+def _intervalo(cabecalho, total):
+    """
+    (inicio, fim) inclusivos de um ``Range: bytes=...`` com um intervalo só;
+    None quando não há cabeçalho utilizável (responde o conteúdo inteiro) e
+    False quando o intervalo está fora do conteúdo (416).
+    """
+    if not cabecalho or not cabecalho.startswith('bytes=') or ',' in cabecalho:
+        return None
+    inicio, _, fim = cabecalho[6:].strip().partition('-')
+    try:
+        if not inicio:
+            sufixo = int(fim)
+            if sufixo <= 0:
+                return False
+            return max(total - sufixo, 0), total - 1
+        inicio = int(inicio)
+        fim = min(int(fim), total - 1) if fim else total - 1
+    except ValueError:
+        return None
+    if inicio >= total or fim < inicio:
+        return False
+    return inicio, fim
+
+
+def responder(request, dados, etag, mime=None, imutavel=False):
+    """
+    HttpResponse do blob com ETag (304 em If-None-Match), Accept-Ranges e
+    206/416 para ``Range`` de um intervalo só.
+    """
+    etag = f'"{etag}"'
+    if imutavel:
+        cache_control = 'private, max-age=31536000, immutable'
+    else:
+        cache_control = 'private, no-cache'
+
+    if _etag_confere(request, etag):
+        resposta = HttpResponse(status=304)
+        resposta['ETag'] = etag
+        resposta['Cache-Control'] = cache_control
+        return resposta
+
+    total = len(dados)
+    intervalo = None
+    if request.META.get('HTTP_IF_RANGE', etag) == etag:
+        intervalo = _intervalo(request.META.get('HTTP_RANGE'), total)
+    if intervalo is False:
+        resposta = HttpResponse(status=416)
+        resposta['Content-Range'] = f'bytes */{total}'
+        return resposta
+
+    if intervalo:
+        inicio, fim = intervalo
+        resposta = HttpResponse(dados[inicio:fim + 1], status=206, content_type=mime or detectar_mime(dados))
+        resposta['Content-Range'] = f'bytes {inicio}-{fim}/{total}'
+    else:
+        resposta = HttpResponse(dados, content_type=mime or detectar_mime(dados))
+    resposta['Accept-Ranges'] = 'bytes'
+    resposta['ETag'] = etag
+    resposta['Cache-Control'] = cache_control
+    return resposta
+
+
+def servir(request, banco, fonte, chaves, tamanho=None):
+    """
+    Resposta completa para a mídia: confere o hash no banco, responde 304
+    sem ler o blob quando o cliente já tem a versão, e serve original ou
+    miniatura. ``v=`` igual ao hash atual torna a resposta imutável.
+    """
+    assinatura = MidiaService.assinatura(banco, fonte, chaves)
+    if not assinatura:
+        return None
+    hash_conteudo, _ = assinatura
+    imutavel = request.GET.get('v') == hash_conteudo
+    dados = None
+
+    if tamanho:
+        etag = f"{hash_conteudo}-{tamanho}"
+        if _etag_confere(request, f'"{etag}"'):
+            return responder(request, b'', etag, imutavel=imutavel)
+        mini = MidiaService.miniatura(None, hash_conteudo, tamanho)
+        if mini is None:
+            dados = MidiaService.conteudo(banco, fonte, chaves)
+            if dados:
+                mini = MidiaService.miniatura(dados, hash_conteudo, tamanho)
+        if mini:
+            return responder(request, mini[0], etag, mime=mini[1], imutavel=imutavel)
+
+    if _etag_confere(request, f'"{hash_conteudo}"'):
+        return responder(request, b'', hash_conteudo, imutavel=imutavel)
+    if dados is None:
+        dados = MidiaService.conteudo(banco, fonte, chaves)
+    if not dados:
+        return None
+    return responder(request, dados, hash_conteudo, imutavel=imutavel)
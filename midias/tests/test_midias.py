@@ -0,0 +1,123 @@
+import io
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from PIL import Image
+
+from core.excecoes import ErroDominio
+from midias import servico
+from midias.servico import MidiaService, _intervalo, detectar_mime, responder, servir, url
+
+
+def _png(tamanho=(600, 300)):
+    saida = io.BytesIO()
+    Image.new('RGB', tamanho, (200, 10, 10)).save(saida, format='PNG')
+    return saida.getvalue()
+
+
+class IntervaloTests(SimpleTestCase):
+    def test_formatos(self):
+        self.assertEqual(_intervalo('bytes=0-9', 100), (0, 9))
+        self.assertEqual(_intervalo('bytes=90-', 100), (90, 99))
+        self.assertEqual(_intervalo('bytes=-10', 100), (90, 99))
+        self.assertEqual(_intervalo('bytes=50-500', 100), (50, 99))
+        self.assertIsNone(_intervalo('bytes=0-1,5-6', 100))
+        self.assertIsNone(_intervalo(None, 100))
+        self.assertIs(_intervalo('bytes=100-', 100), False)
+
+
+class ResponderTests(SimpleTestCase):
+    def setUp(self):
+        self.rf = RequestFactory()
+
+    def test_etag_e_304(self):
+        resposta = responder(self.rf.get('/'), b'%PDF-1.4 conteudo', 'abc', imutavel=True)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['ETag'], '"abc"')
+        self.assertEqual(resposta['Content-Type'], 'application/pdf')
+        self.assertIn('immutable', resposta['Cache-Control'])
+
+        resposta = responder(self.rf.get('/', HTTP_IF_NONE_MATCH='W/"abc"'), b'xx', 'abc')
+        self.assertEqual(resposta.status_code, 304)
+        self.assertEqual(resposta.content, b'')
+
+    def test_range(self):
+        dados = bytes(range(100))
+        resposta = responder(self.rf.get('/', HTTP_RANGE='bytes=10-19'), dados, 'h')
+        self.assertEqual(resposta.status_code, 206)
+        self.assertEqual(resposta.content, dados[10:20])
+        self.assertEqual(resposta['Content-Range'], 'bytes 10-19/100')
+
+        resposta = responder(self.rf.get('/', HTTP_RANGE='bytes=200-'), dados, 'h')
+        self.assertEqual(resposta.status_code, 416)
+        # If-Range com outra versão: conteúdo inteiro
+        resposta = responder(self.rf.get('/', HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"velho"'), dados, 'h')
+        self.assertEqual(resposta.status_code, 200)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ServirTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.rf = RequestFactory()
+        self.chaves = {'prod_empr': '1', 'prod_codi': '10'}
+
+    def test_url_e_fonte_invalida(self):
+        self.assertEqual(
+            url('demo', 'produto', self.chaves, versao='abc', tamanho=128),
+            '/api/demo/midias/produto/?prod_empr=1&prod_codi=10&v=abc&tam=128',
+        )
+        with self.assertRaises(ErroDominio):
+            url('demo', 'inexistente', {})
+
+    def test_miniatura_cacheada_nao_le_o_blob(self):
+        dados = _png()
+        with patch.object(MidiaService, 'assinatura', return_value=('h1', len(dados))), \
+                patch.object(MidiaService, 'conteudo', return_value=dados) as conteudo:
+            resposta = servir(self.rf.get('/', {'v': 'h1'}), 'banco', 'produto', self.chaves, tamanho=128)
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual(resposta['ETag'], '"h1-128"')
+            self.assertIn('immutable', resposta['Cache-Control'])
+            self.assertEqual(max(Image.open(io.BytesIO(resposta.content)).size), 128)
+
+            servir(self.rf.get('/'), 'banco', 'produto', self.chaves, tamanho=128)
+            resposta = servir(self.rf.get('/', HTTP_IF_NONE_MATCH='"h1"'), 'banco', 'produto', self.chaves)
+        self.assertEqual(resposta.status_code, 304)
+        self.assertEqual(conteudo.call_count, 1)
+
+    def test_sem_conteudo(self):
+        with patch.object(MidiaService, 'assinatura', return_value=None):
+            self.assertIsNone(servir(self.rf.get('/'), 'banco', 'produto', self.chaves))
+
+    def test_conteudo_que_nao_e_imagem_vai_inteiro(self):
+        dados = b'%PDF-1.4 boleto'
+        self.assertEqual(detectar_mime(dados), 'application/pdf')
+        self.assertEqual(detectar_mime(None), 'application/octet-stream')
+        with patch.object(MidiaService, 'assinatura', return_value=('h2', len(dados))), \
+                patch.object(MidiaService, 'conteudo', return_value=dados) as conteudo:
+            resposta = servir(self.rf.get('/'), 'banco', 'boleto', {}, tamanho=64)
+            self.assertEqual(conteudo.call_count, 1)
+            # "não é imagem" fica no cache: a segunda vez lê o blob só para servir
+            servir(self.rf.get('/'), 'banco', 'boleto', {}, tamanho=64)
+            self.assertEqual(conteudo.call_count, 2)
+        self.assertEqual(resposta.content, dados)
+        self.assertEqual(resposta['ETag'], '"h2"')
+        self.assertNotIn('immutable', resposta['Cache-Control'])
+
+    def test_miniatura_respeita_orientacao_exif(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # girada 90° (foto de celular em pé)
+        saida = io.BytesIO()
+        Image.new('RGB', (600, 300), (200, 10, 10)).save(saida, format='JPEG', exif=exif)
+        conteudo, mime = MidiaService.miniatura(saida.getvalue(), 'h3', 128)
+        self.assertEqual(mime, 'image/jpeg')
+        self.assertEqual(Image.open(io.BytesIO(conteudo)).size, (64, 128))
+
+    def test_fontes_apontam_para_campos_binarios(self):
+        from django.apps import apps
+        for nome, fonte in servico.FONTES.items():
+            modelo = apps.get_model(fonte['modelo'])
+            self.assertEqual(modelo._meta.get_field(fonte['campo']).get_internal_type(), 'BinaryField', nome)
+            for chave in fonte['chaves']:
+                modelo._meta.get_field(chave)
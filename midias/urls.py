@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import MidiaView
+
+urlpatterns = [
+    path('<str:fonte>/', MidiaView.as_view(), name='midia'),
+]
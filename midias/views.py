@@ -0,0 +1,42 @@
+from django.http import Http404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.dominio_handler import tratar_erro
+from core.excecoes import ErroDominio
+from core.registry import get_licenca_db_config
+
+from .servico import FONTES, TAMANHOS_MINIATURA, servir
+
+
+class MidiaView(APIView):
+    """
+    GET /api/<slug>/midias/<fonte>/?<chaves da fonte>&v=<hash>&tam=128
+
+    Serve o blob cru (ou a miniatura em ``tam``) com ETag e Range. As
+    listagens devolvem essa URL já com ``v=`` no lugar do base64.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, slug=None, fonte=None):
+        try:
+            if fonte not in FONTES:
+                raise Http404('Mídia não encontrada')
+            banco = get_licenca_db_config(request)
+            if not banco:
+                raise ErroDominio("Banco de dados não encontrado.", codigo="banco_nao_encontrado")
+            tamanho = request.query_params.get('tam')
+            if tamanho:
+                if not tamanho.isdigit() or int(tamanho) not in TAMANHOS_MINIATURA:
+                    raise ErroDominio(
+                        f"tam deve ser um de {', '.join(map(str, TAMANHOS_MINIATURA))}.",
+                        codigo="parametros_invalidos",
+                    )
+                tamanho = int(tamanho)
+            chaves = {c: request.query_params.get(c) for c in FONTES[fonte]['chaves']}
+            resposta = servir(request, banco, fonte, chaves, tamanho=tamanho or None)
+            if resposta is None:
+                raise Http404('Mídia não encontrada')
+            return resposta
+        except ErroDominio as e:
+            return tratar_erro(e)
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.licencas_loader import carregar_licencas_dict
+from core.utils import get_db_from_slug
+from notificacoes.servico import instalar_estrutura
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria a coluna chave e o índice único que evitam notificações "
+        "automáticas repetidas no mesmo dia"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slug", help="Processa apenas a licença informada")
+
+    def handle(self, *args, **options):
+        licencas = carregar_licencas_dict()
+        if not licencas:
+            raise CommandError("Nenhuma licença encontrada")
+
+        if options.get("slug"):
+            licencas = [lic for lic in licencas if lic["slug"] == options["slug"]]
+            if not licencas:
+                raise CommandError(f"Licença {options['slug']} não encontrada")
+
+        for lic in licencas:
+            slug = lic["slug"]
+            try:
+                banco = get_db_from_slug(slug)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Banco indisponível: {e}"))
+                continue
+
+            try:
+                if instalar_estrutura(banco):
+                    self.stdout.write(self.style.SUCCESS(f"[{slug}] Deduplicação de notificações instalada"))
+                else:
+                    self.stdout.write(f"[{slug}] Deduplicação de notificações já instalada")
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Erro ao instalar notificações: {e}"))
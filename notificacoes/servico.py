@@ -0,0 +1,323 @@
+"""
+Distribuição das notificações automáticas (estoque, financeiro, vendas e
+resumo) para todos os usuários de uma licença.
+
+Cada tipo de alerta é uma consulta que devolve (chave, titulo, mensagem).
+Um único comando cruza os alertas com os usuários e grava tudo com
+``INSERT ... SELECT``. A repetição no mesmo dia é barrada pelo índice único
+em ``notificacoes.chave``: md5 de usuário, tipo, dia e chave natural do alerta
+(produto, título...). ``forcar`` grava com a chave nula, fora do índice.
+Coluna e índice são instalados pelo comando ``instalar_notificacoes``; o
+caminho das requisições só confere que eles existem. Sem o índice, a
+repetição é barrada por ``NOT EXISTS`` na própria tabela (usuário, tipo,
+título e mensagem no mesmo dia).
+"""
+import logging
+import threading
+from datetime import date, datetime
+
+from django.db import connections
+from django.db.models import Count, Sum
+
+logger = logging.getLogger(__name__)
+
+# indisvalid do índice: nenhuma linha se ele não existe
+SQL_INDICE = """
+    SELECT i.indisvalid FROM pg_index i
+     WHERE i.indexrelid = to_regclass('notificacoes_chave_uniq')
+"""
+
+ESTRUTURA = (
+    "SET lock_timeout = '5s'",
+    "ALTER TABLE notificacoes ADD COLUMN IF NOT EXISTS chave varchar(32)",
+    "RESET lock_timeout",
+    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS notificacoes_chave_uniq ON notificacoes (chave)",
+)
+
+# tipo da notificação → consulta dos alertas (chave, titulo, mensagem)
+ALERTAS = {
+    'estoque': (
+        'estoque',
+        """
+        SELECT concat_ws('|', s.sapr_empr, s.sapr_fili, s.sapr_prod),
+               'Estoque Baixo',
+               concat('Produto ', p.prod_nome, ' está com ', s.sapr_sald, ' unidade(s) em estoque.')
+          FROM saldosprodutos s
+          JOIN produtos p ON p.prod_codi = s.sapr_prod AND p.prod_empr = s.sapr_empr
+         WHERE s.sapr_sald < 0
+        """,
+    ),
+    'pagar': (
+        'financeiro',
+        """
+        SELECT concat_ws('|', 'pagar', titu_empr, titu_fili, titu_forn, titu_titu, titu_seri, titu_parc),
+               'Conta a Pagar Hoje',
+               concat('Título ', titu_titu, ' - Valor: R$ ', to_char(coalesce(titu_valo, 0), 'FM999999999999990.00'),
+                      ' - Vencimento: ', to_char(titu_venc, 'DD/MM/YYYY'))
+          FROM titulospagar
+         WHERE titu_venc = %s AND titu_aber = 'A'
+        """,
+    ),
+    'receber': (
+        'financeiro',
+        """
+        SELECT concat_ws('|', 'receber', titu_empr, titu_fili, titu_clie, titu_titu, titu_seri, titu_parc),
+               'Recebimento Hoje',
+               concat('Título ', titu_titu, ' - Valor: R$ ', to_char(coalesce(titu_valo, 0), 'FM999999999999990.00'),
+                      ' - Vencimento: ', to_char(titu_venc, 'DD/MM/YYYY'))
+          FROM titulosreceber
+         WHERE titu_venc = %s AND titu_aber = 'A'
+        """,
+    ),
+}
+
+_estrutura_pronta = set()
+_estrutura_lock = threading.Lock()
+
+
+def instalar_estrutura(banco):
+    """
+    Coluna ``chave`` e índice único em ``notificacoes``. Roda só pelo comando
+    ``instalar_notificacoes``, fora de transação: o índice é criado
+    CONCURRENTLY para não travar as gravações. Devolve False se já existia.
+    """
+    if connections[banco].in_atomic_block:
+        raise RuntimeError("instalar_estrutura não pode rodar dentro de uma transação")
+    with connections[banco].cursor() as cursor:
+        cursor.execute(SQL_INDICE)
+        linha = cursor.fetchone()
+        if linha and linha[0]:
+            _marcar(banco)
+            return False
+        if linha:
+            # CONCURRENTLY interrompido deixa o índice inválido
+            cursor.execute("DROP INDEX CONCURRENTLY IF EXISTS notificacoes_chave_uniq")
+        for comando in ESTRUTURA:
+            cursor.execute(comando)
+    logger.info("[NOTIFICACOES] Chave de deduplicação criada em %s", banco)
+    _marcar(banco)
+    return True
+
+
+def conferir_estrutura(banco):
+    """
+    True se o índice de deduplicação está instalado. Só o resultado positivo
+    fica guardado no processo: depois do ``instalar_notificacoes`` a licença
+    passa a usar o índice sem reiniciar.
+    """
+    if banco in _estrutura_pronta:
+        return True
+    with connections[banco].cursor() as cursor:
+        cursor.execute(SQL_INDICE)
+        linha = cursor.fetchone()
+    if not (linha and linha[0]):
+        logger.warning(
+            "[NOTIFICACOES] %s sem índice de deduplicação (rode manage.py instalar_notificacoes); "
+            "usando NOT EXISTS", banco,
+        )
+        return False
+    _marcar(banco)
+    return True
+
+
+def _marcar(banco):
+    with _estrutura_lock:
+        _estrutura_pronta.add(banco)
+
+
+def _contagem(alertas, candidatas, criadas):
+    return {'alertas': alertas, 'criadas': criadas, 'puladas': candidatas - criadas}
+
+
+class NotificacaoService:
+
+    @staticmethod
+    def distribuir(banco, tipo, sql_alertas, params=(), forcar=False, hoje=None):
+        """
+        Grava uma notificação de cada alerta de ``sql_alertas`` para cada
+        usuário, num comando só. Devolve alertas, criadas e puladas (já
+        notificadas hoje).
+        """
+        hoje = hoje or date.today()
+        if not conferir_estrutura(banco):
+            return NotificacaoService._distribuir_sem_indice(banco, tipo, sql_alertas, params, forcar, hoje)
+        sql = f"""
+            WITH alertas (chave, titulo, mensagem) AS ({sql_alertas}),
+            candidatas AS (
+                SELECT u.usua_codi AS usuario_id, a.titulo, a.mensagem,
+                       CASE WHEN %s THEN NULL
+                            ELSE md5(concat_ws('|', u.usua_codi, %s, %s, a.chave)) END AS chave
+                  FROM usuarios u
+                 CROSS JOIN alertas a
+            ),
+            inseridas AS (
+                INSERT INTO notificacoes (usuario_id, titulo, mensagem, tipo, data_criacao, lida, chave)
+                SELECT usuario_id, titulo, mensagem, %s, %s, false, chave
+                  FROM candidatas
+                ON CONFLICT (chave) DO NOTHING
+                RETURNING 1
+            )
+            SELECT (SELECT count(*) FROM alertas),
+                   (SELECT count(*) FROM candidatas),
+                   (SELECT count(*) FROM inseridas)
+        """
+        valores = list(params) + [bool(forcar), tipo, hoje.isoformat(), tipo, datetime.now()]
+        with connections[banco].cursor() as cursor:
+            cursor.execute(sql, valores)
+            alertas, candidatas, criadas = cursor.fetchone()
+        logger.debug(
+            "[NOTIFICACOES] %s tipo=%s alertas=%s criadas=%s", banco, tipo, alertas, criadas
+        )
+        return _contagem(alertas, candidatas, criadas)
+
+    @staticmethod
+    def _distribuir_sem_indice(banco, tipo, sql_alertas, params, forcar, hoje):
+        """Mesma gravação sem a coluna ``chave``: repetição barrada por NOT EXISTS."""
+        sql = f"""
+            WITH alertas (chave, titulo, mensagem) AS ({sql_alertas}),
+            candidatas AS (
+                SELECT u.usua_codi AS usuario_id, a.titulo, a.mensagem
+                  FROM usuarios u
+                 CROSS JOIN alertas a
+            ),
+            inseridas AS (
+                INSERT INTO notificacoes (usuario_id, titulo, mensagem, tipo, data_criacao, lida)
+                SELECT c.usuario_id, c.titulo, c.mensagem, %s, %s, false
+                  FROM candidatas c
+                 WHERE %s OR NOT EXISTS (
+                        SELECT 1 FROM notificacoes n
+                         WHERE n.usuario_id = c.usuario_id AND n.tipo = %s
+                           AND n.titulo = c.titulo AND n.mensagem = c.mensagem
+                           AND n.data_criacao >= %s AND n.data_criacao < %s::date + 1
+                 )
+                RETURNING 1
+            )
+            SELECT (SELECT count(*) FROM alertas),
+                   (SELECT count(*) FROM candidatas),
+                   (SELECT count(*) FROM inseridas)
+        """
+        valores = list(params) + [tipo, datetime.now(), bool(forcar), tipo, hoje, hoje]
+        with connections[banco].cursor() as cursor:
+            cursor.execute(sql, valores)
+            alertas, candidatas, criadas = cursor.fetchone()
+        return _contagem(alertas, candidatas, criadas)
+
+    @staticmethod
+    def _alerta(banco, nome, forcar, hoje, params=()):
+        tipo, sql = ALERTAS[nome]
+        return NotificacaoService.distribuir(banco, tipo, sql, params, forcar=forcar, hoje=hoje)
+
+    @staticmethod
+    def _valores(banco, tipo, linhas, forcar, hoje):
+        """Alertas já calculados, passados como VALUES (chave, titulo, mensagem)."""
+        if not linhas:
+            return _contagem(0, 0, 0)
+        sql = "VALUES " + ", ".join(["(%s, %s, %s)"] * len(linhas))
+        params = [valor for linha in linhas for valor in linha]
+        return NotificacaoService.distribuir(banco, tipo, sql, params, forcar=forcar, hoje=hoje)
+
+    @staticmethod
+    def estoque(banco, forcar=False, hoje=None):
+        r = NotificacaoService._alerta(banco, 'estoque', forcar, hoje)
+        return {
+            "status": "ok",
+            "notificacoes_criadas": r['criadas'],
+            "notificacoes_puladas": r['puladas'],
+            "produtos_baixo_estoque": r['alertas'],
+        }
+
+    @staticmethod
+    def financeiro(banco, forcar=False, hoje=None):
+        hoje = hoje or date.today()
+        pagar = NotificacaoService._alerta(banco, 'pagar', forcar, hoje, [hoje])
+        receber = NotificacaoService._alerta(banco, 'receber', forcar, hoje, [hoje])
+        return {
+            "status": "ok",
+            "notificacoes_criadas": pagar['criadas'] + receber['criadas'],
+            "notificacoes_puladas": pagar['puladas'] + receber['puladas'],
+            "contas_pagar": pagar['alertas'],
+            "contas_receber": receber['alertas'],
+        }
+
+    @staticmethod
+    def _movimento_do_dia(banco, hoje):
+        from Orcamentos.models import Orcamentos
+        from Pedidos.models import PedidoVenda
+
+        pedidos = PedidoVenda.objects.using(banco).filter(pedi_data=hoje).aggregate(
+            total=Count('pedi_nume'), valor=Sum('pedi_tota')
+        )
+        orcamentos = Orcamentos.objects.using(banco).filter(pedi_data=hoje).aggregate(
+            total=Count('pedi_nume'), valor=Sum('pedi_tota')
+        )
+        return pedidos, orcamentos
+
+    @staticmethod
+    def vendas(banco, forcar=False, hoje=None):
+        hoje = hoje or date.today()
+        pedidos, orcamentos = NotificacaoService._movimento_do_dia(banco, hoje)
+        total_pedidos, valor_pedidos = pedidos['total'], pedidos['valor'] or 0
+        total_orcamentos, valor_orcamentos = orcamentos['total'], orcamentos['valor'] or 0
+        if total_pedidos == 0 and total_orcamentos == 0:
+            return {"status": "sem_dados"}
+
+        linhas = []
+        if total_pedidos:
+            linhas.append((
+                'pedidos', 'Vendas do Dia',
+                f'Hoje foram realizados {total_pedidos} pedido(s) totalizando R$ {valor_pedidos:.2f}',
+            ))
+        if total_orcamentos:
+            linhas.append((
+                'orcamentos', 'Orçamentos do Dia',
+                f'Hoje foram criados {total_orcamentos} orçamento(s) totalizando R$ {valor_orcamentos:.2f}',
+            ))
+        r = NotificacaoService._valores(banco, 'vendas', linhas, forcar, hoje)
+        return {
+            "status": "ok",
+            "notificacoes_criadas": r['criadas'],
+            "notificacoes_puladas": r['puladas'],
+            "pedidos": total_pedidos,
+            "valor_pedidos": float(valor_pedidos),
+            "orcamentos": total_orcamentos,
+            "valor_orcamentos": float(valor_orcamentos),
+        }
+
+    @staticmethod
+    def resumo(banco, forcar=False, hoje=None):
+        from contas_a_pagar.models import Titulospagar
+        from contas_a_receber.models import Titulosreceber
+        from Produtos.models import SaldoProduto
+
+        hoje = hoje or date.today()
+        pedidos, orcamentos = NotificacaoService._movimento_do_dia(banco, hoje)
+        resumo = {
+            "pedidos": pedidos['total'],
+            "orcamentos": orcamentos['total'],
+            "contas_pagar": Titulospagar.objects.using(banco).filter(titu_venc=hoje, titu_aber='A').count(),
+            "contas_receber": Titulosreceber.objects.using(banco).filter(titu_venc=hoje, titu_aber='A').count(),
+            "produtos_sem_estoque": SaldoProduto.objects.using(banco).filter(saldo_estoque=0).count(),
+        }
+        mensagem = f"""Resumo do dia {hoje.strftime('%d/%m/%Y')}:
+            • {resumo['pedidos']} pedido(s) realizados
+            • {resumo['orcamentos']} orçamento(s) criados
+            • {resumo['contas_pagar']} conta(s) a pagar vencendo
+            • {resumo['contas_receber']} conta(s) a receber vencendo
+            • {resumo['produtos_sem_estoque']} produto(s) sem estoque"""
+        r = NotificacaoService._valores(banco, 'resumo', [('resumo', 'Resumo Diário', mensagem)], forcar, hoje)
+        return {
+            "status": "ok",
+            "notificacoes_criadas": r['criadas'],
+            "notificacoes_puladas": r['puladas'],
+            "resumo": resumo,
+        }
+
+    @staticmethod
+    def tudo(banco, forcar=False, hoje=None):
+        hoje = hoje or date.today()
+        return {
+            "estoque": NotificacaoService.estoque(banco, forcar, hoje),
+            "financeiro": NotificacaoService.financeiro(banco, forcar, hoje),
+            "vendas": NotificacaoService.vendas(banco, forcar, hoje),
+            "resumo": NotificacaoService.resumo(banco, forcar, hoje),
+        }
@@ -1,58 +1,35 @@
-from celery import shared_task
-from .views import NotificaTudoView
-from rest_framework.test import APIRequestFactory
-from django.contrib.auth.models import AnonymousUser
-from core.utils import get_licenca_db_config
+from celery import group, shared_task
+from core.utils import get_db_from_slug
 from Licencas.models import Licencas
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+@shared_task
+def notificar_licenca(slug, forcar=False):
+    """Gera as notificações automáticas do dia de uma licença."""
+    from .servico import NotificacaoService
+
+    banco = get_db_from_slug(slug)
+    resultado = NotificacaoService.tudo(banco, forcar=forcar)
+    logger.info(f"[NOTIFICACOES] {slug}: {resultado}")
+    return resultado
+
+
 @shared_task
 def enviar_notificacoes_diarias(slug=None):
     """
-    Task otimizada para enviar notificações diárias automaticamente
-    Agora usa o sistema de controle de duplicatas
+    Roda diariamente via Celery Beat.
+    Cada licença vira uma task própria, processada em paralelo pelos workers.
     """
-    resultados = {}
-    
-    try:
-        # Se não especificar slug, processa todas as licenças ativas
-        if slug:
-            slugs = [slug]
-        else:
-            slugs = Licencas.objects.filter(ativo=True).values_list('slug', flat=True)
-        
-        for licenca_slug in slugs:
-            try:
-                factory = APIRequestFactory()
-                # Criar request com dados mínimos necessários
-                request = factory.post('/', data={}, format='json')
-                request.user = AnonymousUser()  # Será tratado pela view
-                
-                # Usar a view otimizada que já tem controle de duplicatas
-                view = NotificaTudoView()
-                response = view.post(request, slug=licenca_slug)
-                
-                resultados[licenca_slug] = {
-                    'status': 'sucesso',
-                    'dados': response.data
-                }
-                
-                logger.info(f"Notificações processadas para {licenca_slug}: {response.data}")
-                
-            except Exception as e:
-                resultados[licenca_slug] = {
-                    'status': 'erro',
-                    'erro': str(e)
-                }
-                logger.error(f"Erro ao processar notificações para {licenca_slug}: {str(e)}")
-    
-    except Exception as e:
-        resultados['erro_geral'] = str(e)
-        logger.error(f"Erro geral na task de notificações: {str(e)}")
-    
-    return resultados
+    if slug:
+        return {slug: notificar_licenca(slug)}
+
+    slugs = list(Licencas.objects.filter(ativo=True).values_list('slug', flat=True))
+    group(notificar_licenca.s(licenca_slug) for licenca_slug in slugs).apply_async()
+    logger.info(f"[NOTIFICACOES] Disparadas {len(slugs)} licença(s)")
+    return {"licencas": len(slugs)}
 
 @shared_task
 def limpar_notificacoes_antigas(dias_manter=30, apenas_lidas=True):
@@ -62,7 +39,6 @@ def limpar_notificacoes_antigas(dias_manter=30, apenas_lidas=True):
     """
     from datetime import datetime, timedelta
     from .models import Notificacao
-    from Licencas.models import Licencas
     from django.utils import timezone
     
     resultados = {}
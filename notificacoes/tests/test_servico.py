@@ -0,0 +1,119 @@
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from notificacoes import servico, tasks
+from notificacoes.servico import NotificacaoService, conferir_estrutura, instalar_estrutura
+
+
+def _conexao(fetchone=()):
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = list(fetchone)
+    conexao = MagicMock()
+    conexao.in_atomic_block = False
+    conexao.cursor.return_value.__enter__.return_value = cursor
+    return conexao, cursor
+
+
+class EstruturaTests(SimpleTestCase):
+    def setUp(self):
+        servico._estrutura_pronta.clear()
+
+    def test_instala_chave_com_indice_concorrente(self):
+        conexao, cursor = _conexao(fetchone=[None, (True,)])
+        with patch.object(servico, 'connections', {'demo': conexao}):
+            self.assertTrue(instalar_estrutura('demo'))
+            conferir_estrutura('demo')
+        comandos = [c.args[0] for c in cursor.execute.call_args_list]
+        self.assertEqual(comandos[1:], list(servico.ESTRUTURA))
+        self.assertIn("CONCURRENTLY", comandos[-1])
+
+    def test_indice_invalido_e_refeito(self):
+        conexao, cursor = _conexao(fetchone=[(False,)])
+        with patch.object(servico, 'connections', {'demo': conexao}):
+            instalar_estrutura('demo')
+        self.assertIn("DROP INDEX CONCURRENTLY", cursor.execute.call_args_list[1].args[0])
+
+    def test_instalar_recusa_transacao(self):
+        conexao, cursor = _conexao()
+        conexao.in_atomic_block = True
+        with patch.object(servico, 'connections', {'demo': conexao}), self.assertRaises(RuntimeError):
+            instalar_estrutura('demo')
+        cursor.execute.assert_not_called()
+
+    def test_requisicao_so_confere_uma_vez(self):
+        conexao, cursor = _conexao(fetchone=[(True,)])
+        with patch.object(servico, 'connections', {'demo': conexao}):
+            conferir_estrutura('demo')
+            conferir_estrutura('demo')
+        self.assertEqual(cursor.execute.call_count, 1)
+        self.assertNotIn("ALTER", cursor.execute.call_args.args[0])
+
+    def test_sem_indice_deduplica_por_not_exists(self):
+        conexao, cursor = _conexao(fetchone=[None, (1, 3, 2)])
+        hoje = date(2024, 5, 10)
+        with patch.object(servico, 'connections', {'demo': conexao}):
+            resultado = NotificacaoService.estoque('demo', hoje=hoje)
+        self.assertEqual(resultado['notificacoes_criadas'], 2)
+        self.assertEqual(resultado['notificacoes_puladas'], 1)
+        self.assertEqual(cursor.execute.call_count, 2)
+        sql, params = cursor.execute.call_args.args
+        self.assertNotIn("ALTER", sql)
+        self.assertNotIn("chave)", sql.split("INSERT INTO")[1])
+        self.assertIn("NOT EXISTS", sql)
+        self.assertEqual(params[2:], [False, 'estoque', hoje, hoje])
+        # sem índice o resultado não fica guardado: a próxima chamada confere de novo
+        self.assertNotIn('demo', servico._estrutura_pronta)
+
+
+class DistribuirTests(SimpleTestCase):
+    def setUp(self):
+        servico._estrutura_pronta.clear()
+        servico._estrutura_pronta.add('demo')
+
+    def test_um_comando_por_tipo_de_alerta(self):
+        conexao, cursor = _conexao(fetchone=[(2, 6, 4), (1, 3, 0)])
+        hoje = date(2024, 5, 10)
+        with patch.object(servico, 'connections', {'demo': conexao}):
+            resultado = NotificacaoService.financeiro('demo', hoje=hoje)
+        self.assertEqual(resultado, {
+            "status": "ok", "notificacoes_criadas": 4, "notificacoes_puladas": 5,
+            "contas_pagar": 2, "contas_receber": 1,
+        })
+        self.assertEqual(cursor.execute.call_count, 2)
+        sql, params = cursor.execute.call_args_list[0].args
+        self.assertIn("ON CONFLICT (chave) DO NOTHING", sql)
+        self.assertIn("FROM titulospagar", sql)
+        self.assertEqual(params[:4], [hoje, False, 'financeiro', '2024-05-10'])
+        # mensagem é NOT NULL: concat trata coluna nula como texto vazio
+        for _, sql_alerta in servico.ALERTAS.values():
+            self.assertNotIn("||", sql_alerta)
+
+    def test_valores_calculados_e_forcar(self):
+        conexao, cursor = _conexao(fetchone=[(1, 3, 3)])
+        with patch.object(servico, 'connections', {'demo': conexao}):
+            resultado = NotificacaoService._valores(
+                'demo', 'resumo', [('resumo', 'Resumo Diário', 'texto')], True, date(2024, 5, 10)
+            )
+        self.assertEqual(resultado, {'alertas': 1, 'criadas': 3, 'puladas': 0})
+        sql, params = cursor.execute.call_args.args
+        self.assertIn("AS (VALUES (%s, %s, %s))", sql)
+        self.assertEqual(params[:5], ['resumo', 'Resumo Diário', 'texto', True, 'resumo'])
+
+    def test_sem_alertas_calculados_nao_consulta(self):
+        with patch.object(servico, 'connections') as connections:
+            resultado = NotificacaoService._valores('demo', 'vendas', [], False, date.today())
+        self.assertEqual(resultado, {'alertas': 0, 'criadas': 0, 'puladas': 0})
+        connections.__getitem__.assert_not_called()
+
+
+class TarefasTests(SimpleTestCase):
+    def test_uma_task_por_licenca(self):
+        with patch.object(tasks.Licencas, 'objects') as licencas, patch.object(tasks, 'group') as grupo:
+            licencas.filter.return_value.values_list.return_value = ['a', 'b']
+            self.assertEqual(tasks.enviar_notificacoes_diarias(), {'licencas': 2})
+        licencas.filter.assert_called_once_with(ativo=True)
+        assinaturas = list(grupo.call_args.args[0])
+        self.assertEqual([s.args for s in assinaturas], [('a',), ('b',)])
+        grupo.return_value.apply_async.assert_called_once()
@@ -2,7 +2,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from django.db.models import Sum, Count, Q
+from django.db.models import Count, Q
 from django.db import models
 from datetime import date, datetime, timedelta
 from django.utils import timezone
@@ -10,25 +10,15 @@ from core.utils import get_licenca_db_config
 from Licencas.models import Usuarios
 from Produtos.models import Produtos, SaldoProduto
 from .models import Notificacao
+from .servico import NotificacaoService
 from contas_a_pagar.models import Titulospagar
 from contas_a_receber.models import Titulosreceber
 from Pedidos.models import PedidoVenda
 from Orcamentos.models import Orcamentos
 
 
-def ja_notificado_hoje(banco, usuario, tipo, chave_unica=None):
-    """Verifica se já foi criada uma notificação do mesmo tipo hoje para o usuário"""
-    hoje = timezone.now().date()
-    filtros = {
-        'usuario': usuario,
-        'tipo': tipo,
-        'data_criacao__date': hoje
-    }
-    
-    if chave_unica:
-        filtros['mensagem__contains'] = chave_unica
-        
-    return Notificacao.objects.using(banco).filter(**filtros).exists()
+def _forcar(request):
+    return str(request.data.get('forcar', False)).lower() in ('1', 'true')
 
 
 class NotificaEstoqueView(APIView):
@@ -38,41 +28,7 @@ class NotificaEstoqueView(APIView):
         banco = get_licenca_db_config(request)
         if not banco:
             return Response({"error": "Licença não encontrada."}, status=status.HTTP_404_NOT_FOUND)
-
-        # Verificar se deve forçar criação mesmo se já existe
-        forcar = request.data.get('forcar', False)
-
-        produtos_baixo_estoque = SaldoProduto.objects.using(banco).filter(
-            saldo_estoque__lt=0
-        ).select_related('produto_codigo')
-
-        usuarios = Usuarios.objects.using(banco).all()
-        total = 0
-        pulados = 0
-
-        for usuario in usuarios:
-            for saldo in produtos_baixo_estoque:
-                chave_produto = saldo.produto_codigo.prod_nome
-                
-                # Verificar se já foi notificado hoje sobre este produto
-                if not forcar and ja_notificado_hoje(banco, usuario, 'estoque', chave_produto):
-                    pulados += 1
-                    continue
-                    
-                Notificacao.objects.using(banco).create(
-                    usuario=usuario,
-                    titulo='Estoque Baixo',
-                    mensagem=f'Produto {saldo.produto_codigo.prod_nome} está com {saldo.saldo_estoque} unidade(s) em estoque.',
-                    tipo='estoque',
-                )
-                total += 1
-
-        return Response({
-            "status": "ok",
-            "notificacoes_criadas": total,
-            "notificacoes_puladas": pulados,
-            "produtos_baixo_estoque": produtos_baixo_estoque.count()
-        })
+        return Response(NotificacaoService.estoque(banco, forcar=_forcar(request)))
 
 
 class NotificaFinanceiroView(APIView):
@@ -82,62 +38,7 @@ class NotificaFinanceiroView(APIView):
         banco = get_licenca_db_config(request)
         if not banco:
             return Response({"error": "Licença não encontrada."}, status=status.HTTP_404_NOT_FOUND)
-
-        forcar = request.data.get('forcar', False)
-        hoje = date.today()
-        usuarios = Usuarios.objects.using(banco).all()
-
-        titulos_pagar = Titulospagar.objects.using(banco).filter(
-            titu_venc=hoje,
-            titu_aber='A'
-        )
-
-        titulos_receber = Titulosreceber.objects.using(banco).filter(
-            titu_venc=hoje,
-            titu_aber='A'
-        )
-
-        total = 0
-        pulados = 0
-
-        for usuario in usuarios:
-            for titulo in titulos_pagar:
-                chave_titulo = titulo.titu_titu
-                
-                if not forcar and ja_notificado_hoje(banco, usuario, 'financeiro', chave_titulo):
-                    pulados += 1
-                    continue
-                    
-                Notificacao.objects.using(banco).create(
-                    usuario=usuario,
-                    titulo='Conta a Pagar Hoje',
-                    mensagem=f'Título {titulo.titu_titu} - Valor: R$ {titulo.titu_valo:.2f} - Vencimento: {titulo.titu_venc.strftime("%d/%m/%Y")}',
-                    tipo='financeiro',
-                )
-                total += 1
-
-            for titulo in titulos_receber:
-                chave_titulo = titulo.titu_titu
-                
-                if not forcar and ja_notificado_hoje(banco, usuario, 'financeiro', chave_titulo):
-                    pulados += 1
-                    continue
-                    
-                Notificacao.objects.using(banco).create(
-                    usuario=usuario,
-                    titulo='Recebimento Hoje',
-                    mensagem=f'Título {titulo.titu_titu} - Valor: R$ {titulo.titu_valo:.2f} - Vencimento: {titulo.titu_venc.strftime("%d/%m/%Y")}',
-                    tipo='financeiro',
-                )
-                total += 1
-
-        return Response({
-            "status": "ok",
-            "notificacoes_criadas": total,
-            "notificacoes_puladas": pulados,
-            "contas_pagar": titulos_pagar.count(),
-            "contas_receber": titulos_receber.count()
-        })
+        return Response(NotificacaoService.financeiro(banco, forcar=_forcar(request)))
 
 
 class NotificaVendasView(APIView):
@@ -147,58 +48,7 @@ class NotificaVendasView(APIView):
         banco = get_licenca_db_config(request)
         if not banco:
             return Response({"error": "Licença não encontrada."}, status=status.HTTP_404_NOT_FOUND)
-
-        forcar = request.data.get('forcar', False)
-        hoje = date.today()
-        pedidos_hoje = PedidoVenda.objects.using(banco).filter(pedi_data=hoje)
-        total_pedidos = pedidos_hoje.count()
-        valor_total_pedidos = pedidos_hoje.aggregate(Sum('pedi_tota'))['pedi_tota__sum'] or 0
-
-        orcamentos_hoje = Orcamentos.objects.using(banco).filter(pedi_data=hoje)
-        total_orcamentos = orcamentos_hoje.count()
-        valor_total_orcamentos = orcamentos_hoje.aggregate(Sum('pedi_tota'))['pedi_tota__sum'] or 0
-
-        if total_pedidos == 0 and total_orcamentos == 0:
-            return Response({"status": "sem_dados"})
-
-        usuarios = Usuarios.objects.using(banco).all()
-        total_notificacoes = 0
-        pulados = 0
-
-        for usuario in usuarios:
-            if total_pedidos > 0:
-                if not forcar and ja_notificado_hoje(banco, usuario, 'vendas', 'Vendas do Dia'):
-                    pulados += 1
-                else:
-                    Notificacao.objects.using(banco).create(
-                        usuario=usuario,
-                        titulo='Vendas do Dia',
-                        mensagem=f'Hoje foram realizados {total_pedidos} pedido(s) totalizando R$ {valor_total_pedidos:.2f}',
-                        tipo='vendas',
-                    )
-                    total_notificacoes += 1
-
-            if total_orcamentos > 0:
-                if not forcar and ja_notificado_hoje(banco, usuario, 'vendas', 'Orçamentos do Dia'):
-                    pulados += 1
-                else:
-                    Notificacao.objects.using(banco).create(
-                        usuario=usuario,
-                        titulo='Orçamentos do Dia',
-                        mensagem=f'Hoje foram criados {total_orcamentos} orçamento(s) totalizando R$ {valor_total_orcamentos:.2f}',
-                        tipo='vendas',
-                    )
-                    total_notificacoes += 1
-
-        return Response({
-            "status": "ok",
-            "notificacoes_criadas": total_notificacoes,
-            "notificacoes_puladas": pulados,
-            "pedidos": total_pedidos,
-            "valor_pedidos": float(valor_total_pedidos),
-            "orcamentos": total_orcamentos,
-            "valor_orcamentos": float(valor_total_orcamentos)
-        })
+        return Response(NotificacaoService.vendas(banco, forcar=_forcar(request)))
 
 
 class NotificaResumoView(APIView):
@@ -208,52 +58,7 @@ class NotificaResumoView(APIView):
         banco = get_licenca_db_config(request)
         if not banco:
             return Response({"error": "Licença não encontrada."}, status=status.HTTP_404_NOT_FOUND)
-
-        forcar = request.data.get('forcar', False)
-        hoje = date.today()
-
-        pedidos_count = PedidoVenda.objects.using(banco).filter(pedi_data=hoje).count()
-        orcamentos_count = Orcamentos.objects.using(banco).filter(pedi_data=hoje).count()
-        titulos_vencer = Titulospagar.objects.using(banco).filter(titu_venc=hoje, titu_aber='A').count()
-        titulos_receber = Titulosreceber.objects.using(banco).filter(titu_venc=hoje, titu_aber='A').count()
-        produtos_sem_estoque = SaldoProduto.objects.using(banco).filter(saldo_estoque=0).count()
-
-        usuarios = Usuarios.objects.using(banco).all()
-        total_notificacoes = 0
-        pulados = 0
-
-        for usuario in usuarios:
-            if not forcar and ja_notificado_hoje(banco, usuario, 'resumo', 'Resumo Diário'):
-                pulados += 1
-                continue
-                
-            mensagem = f"""Resumo do dia {hoje.strftime('%d/%m/%Y')}:
-            • {pedidos_count} pedido(s) realizados
-            • {orcamentos_count} orçamento(s) criados
-            • {titulos_vencer} conta(s) a pagar vencendo
-            • {titulos_receber} conta(s) a receber vencendo
-            • {produtos_sem_estoque} produto(s) sem estoque"""
-
-            Notificacao.objects.using(banco).create(
-                usuario=usuario,
-                titulo='Resumo Diário',
-                mensagem=mensagem,
-                tipo='resumo',
-            )
-            total_notificacoes += 1
-
-        return Response({
-            "status": "ok",
-            "notificacoes_criadas": total_notificacoes,
-            "notificacoes_puladas": pulados,
-            "resumo": {
-                "pedidos": pedidos_count,
-                "orcamentos": orcamentos_count,
-                "contas_pagar": titulos_vencer,
-                "contas_receber": titulos_receber,
-                "produtos_sem_estoque": produtos_sem_estoque
-            }
-        })
+        return Response(NotificacaoService.resumo(banco, forcar=_forcar(request)))
 
 
 class NotificacaoListView(APIView):
@@ -362,17 +167,10 @@ class NotificaTudoView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, slug=None):
-        estoque = NotificaEstoqueView().post(request, slug=slug).data
-        financeiro = NotificaFinanceiroView().post(request, slug=slug).data
-        vendas = NotificaVendasView().post(request, slug=slug).data
-        resumo = NotificaResumoView().post(request, slug=slug).data
-
-        return Response({
-            "estoque": estoque,
-            "financeiro": financeiro,
-            "vendas": vendas,
-            "resumo": resumo,
-        })
+        banco = get_licenca_db_config(request)
+        if not banco:
+            return Response({"error": "Licença não encontrada."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(NotificacaoService.tudo(banco, forcar=_forcar(request)))
 
 
 class LimparNotificacoesView(APIView):
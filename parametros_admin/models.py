@@ -3,6 +3,17 @@ from django.apps import apps
 from django.core.cache import cache
 import logging
 
+def _invalidar_snapshot(obj, kwargs):
+    """Módulos e parâmetros alterados: vence a fotografia de parâmetros da licença (snapshot.py)."""
+    from .snapshot import invalidar
+
+    alias = kwargs.get('using') or getattr(getattr(obj, '_state', None), 'db', None) or 'default'
+    try:
+        invalidar(alias)
+    except Exception:
+        logging.getLogger(__name__).warning("Falha ao invalidar snapshot de parâmetros banco=%s", alias, exc_info=True)
+
+
 class Modulo(models.Model):
     modu_codi = models.AutoField(primary_key=True)
     modu_nome = models.CharField(max_length=50, unique=True, help_text="Nome do módulo")
@@ -15,6 +26,15 @@ class Modulo(models.Model):
         db_table = 'modulosmobile'        
         ordering = ['modu_orde', 'modu_nome']
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _invalidar_snapshot(self, kwargs)
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        _invalidar_snapshot(self, kwargs)
+        return resultado
+
     @classmethod
     def _installed_app_slugs(cls):
         slugs = []
@@ -179,6 +199,15 @@ class ParametroSistema(models.Model):
         unique_together = ('para_empr', 'para_fili', 'para_modu', 'para_nome')
         ordering = ['para_modu', 'para_nome']
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _invalidar_snapshot(self, kwargs)
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        _invalidar_snapshot(self, kwargs)
+        return resultado
+
 
 class LogParametroSistema(models.Model):
     log_codi = models.AutoField(primary_key=True)
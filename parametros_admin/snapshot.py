@@ -0,0 +1,179 @@
+"""
+Fotografia dos parâmetros de uma licença/empresa/filial.
+
+Os ``verificar_*`` e ``obter_parametros_*`` liam o módulo e cada parâmetro
+com uma consulta própria. Aqui todos os módulos e parâmetros da
+empresa/filial são lidos de uma vez num objeto imutável, guardado no cache
+junto com a versão da licença. Qualquer gravação de ``ParametroSistema`` ou
+``Modulo`` troca a versão (após o commit) e a próxima leitura remonta a
+fotografia. Versão e fotografia vêm num único ``get_many``. Com o cache
+fora do ar (o Redis de produção não ignora exceções) a fotografia é montada
+direto do banco.
+"""
+import logging
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.cache_service import build_cache_key
+
+logger = logging.getLogger(__name__)
+
+PARAMETRO_AUSENTE = {'valor': 'false', 'ativo': False, 'existe': False}
+
+
+def _normalizar(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return valor
+
+
+def _chave_versao(banco):
+    return build_cache_key('parametros', banco, 'versao')
+
+
+def _chave_snapshot(banco, empresa, filial):
+    return build_cache_key('parametros', banco, empresa, filial)
+
+
+@dataclass(frozen=True)
+class SnapshotParametros:
+    banco: str
+    empresa: int
+    filial: int
+    versao: str
+    # ((modu_codi, modu_nome), ...) na ordenação do cadastro (modu_orde, modu_nome)
+    modulos: tuple
+    # {(modu_codi, para_nome): (para_valo, para_ativ)}
+    valores: dict
+
+    def modulo(self, nome=None, contendo=None):
+        """
+        Código do primeiro módulo com o ``nome`` exato ou, com ``contendo``,
+        cujo nome contém o texto sem diferenciar maiúsculas (o mesmo que
+        ``filter(modu_nome__icontains=...).first()``).
+        """
+        for codigo, modu_nome in self.modulos:
+            if nome is not None and modu_nome == nome:
+                return codigo
+            if contendo is not None and contendo.lower() in (modu_nome or '').lower():
+                return codigo
+        return None
+
+    def modulo_com_mais(self, nomes):
+        """Módulo que tem mais parâmetros entre ``nomes`` nesta empresa/filial."""
+        nomes = set(nomes)
+        contagem = {}
+        for modulo, nome in self.valores:
+            if nome in nomes:
+                contagem[modulo] = contagem.get(modulo, 0) + 1
+        if not contagem:
+            return None
+        return max(contagem, key=contagem.get)
+
+    def parametro(self, modulo, nome):
+        """Mesmo formato dos ``obter_parametros_*``: valor/ativo/existe."""
+        if (modulo, nome) not in self.valores:
+            return dict(PARAMETRO_AUSENTE)
+        valor, ativo = self.valores[(modulo, nome)]
+        return {'valor': valor, 'ativo': ativo, 'existe': True}
+
+    def parametros(self, modulo, nomes):
+        return {nome: self.parametro(modulo, nome) for nome in nomes}
+
+    def ligado(self, modulo, nome):
+        """Parâmetro existe, está ativo e com valor verdadeiro."""
+        valor, ativo = self.valores.get((modulo, nome), (False, False))
+        if isinstance(valor, bool):
+            return bool(ativo) and valor
+        return bool(ativo) and str(valor).lower() == 'true'
+
+
+def montar(banco, empresa, filial, versao):
+    from .models import Modulo, ParametroSistema
+
+    modulos = tuple(Modulo.objects.using(banco).values_list('modu_codi', 'modu_nome'))
+    valores = {}
+    linhas = (
+        ParametroSistema.objects.using(banco)
+        .filter(para_empr=empresa, para_fili=filial)
+        .order_by('para_codi')
+        .values_list('para_modu_id', 'para_nome', 'para_valo', 'para_ativ')
+    )
+    for modulo, nome, valor, ativo in linhas:
+        valores.setdefault((modulo, nome), (valor, ativo))
+    return SnapshotParametros(
+        banco=banco, empresa=empresa, filial=filial, versao=versao,
+        modulos=modulos, valores=valores,
+    )
+
+
+def carregar(banco, empresa, filial):
+    """Fotografia dos parâmetros de ``empresa``/``filial``, do cache quando a versão confere."""
+    empresa, filial = _normalizar(empresa), _normalizar(filial)
+    chave_versao = _chave_versao(banco)
+    chave = _chave_snapshot(banco, empresa, filial)
+    try:
+        encontrados = cache.get_many([chave_versao, chave])
+        versao = encontrados.get(chave_versao)
+        snapshot = encontrados.get(chave)
+        if versao is not None and snapshot is not None and snapshot.versao == versao:
+            return snapshot
+
+        if versao is None:
+            cache.add(chave_versao, uuid.uuid4().hex, None)
+            versao = cache.get(chave_versao)
+    except Exception as exc:
+        logger.warning("[PARAMETROS] Cache indisponível, lendo do banco %s: %s", banco, exc)
+        return montar(banco, empresa, filial, None)
+
+    # A versão é lida antes do banco: uma gravação concorrente troca a versão
+    # e a fotografia montada aqui já nasce vencida.
+    snapshot = montar(banco, empresa, filial, versao)
+    try:
+        cache.set(chave, snapshot, getattr(settings, 'PARAMETROS_SNAPSHOT_TTL', 600))
+    except Exception as exc:
+        logger.warning("[PARAMETROS] Snapshot não gravado no cache %s: %s", banco, exc)
+        return snapshot
+    logger.debug("[PARAMETROS] Snapshot montado banco=%s empr=%s fili=%s", banco, empresa, filial)
+    return snapshot
+
+
+def carregar_da_requisicao(request, banco, empresa, filial):
+    """
+    Como ``carregar``, mas guarda a fotografia na própria requisição: os
+    vários ``verificar_*`` de um mesmo save não voltam ao cache.
+    """
+    chave = (banco, _normalizar(empresa), _normalizar(filial))
+    memo = getattr(request, '_snapshots_parametros', None) if request is not None else None
+    if memo is not None and chave in memo:
+        return memo[chave]
+    snapshot = carregar(banco, empresa, filial)
+    if request is not None:
+        if memo is None:
+            memo = {}
+            try:
+                request._snapshots_parametros = memo
+            except AttributeError:
+                return snapshot
+        memo[chave] = snapshot
+    return snapshot
+
+
+def invalidar(banco):
+    """Troca a versão da licença depois do commit; as fotografias antigas deixam de valer."""
+    def trocar():
+        try:
+            cache.set(_chave_versao(banco), uuid.uuid4().hex, None)
+        except Exception as exc:
+            # a gravação já foi commitada; a fotografia antiga vence pelo TTL
+            logger.error("[PARAMETROS] Versão de %s não trocada no cache: %s", banco, exc)
+
+    try:
+        transaction.on_commit(trocar, using=banco)
+    except Exception:
+        trocar()
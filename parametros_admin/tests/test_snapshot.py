@@ -0,0 +1,97 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.http import HttpRequest
+from django.test import SimpleTestCase, override_settings
+
+from parametros_admin import snapshot
+from parametros_admin.snapshot import SnapshotParametros
+from parametros_admin.utils_estoque import obter_parametros_estoque
+from parametros_admin.utils_orcamentos import verificar_baixa_estoque_orcamento
+from parametros_admin.utils_pedidos import (
+    obter_parametros_pedidos, verificar_baixa_estoque_pedido, verificar_usar_preco_prazo,
+    verificar_validar_estoque_pedido,
+)
+
+
+def _snapshot(banco, empresa, filial, versao):
+    return SnapshotParametros(
+        banco=banco, empresa=empresa, filial=filial, versao=versao,
+        modulos=((1, 'Entradas_Estoque'), (2, 'Pedidos'), (3, 'Orcamentos')),
+        valores={
+            (2, 'usar_preco_prazo'): (True, True),
+            (2, 'validar_estoque_pedido'): (True, False),
+            (2, 'baixa_estoque_pedido'): (True, True),
+            (3, 'baixa_estoque_orcamento'): (True, True),
+            (1, 'alerta_estoque_minimo'): (False, True),
+        },
+    )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SnapshotTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = patch.object(snapshot, 'montar', side_effect=_snapshot)
+        self.montar = patcher.start()
+        self.addCleanup(patcher.stop)
+        banco = patch('parametros_admin.utils_pedidos.get_licenca_db_config', return_value='demo')
+        banco.start()
+        self.addCleanup(banco.stop)
+
+    def test_cache_por_versao(self):
+        primeiro = snapshot.carregar('demo', '1', '1')
+        self.assertEqual(snapshot.carregar('demo', 1, 1), primeiro)
+        self.assertEqual(self.montar.call_count, 1)
+
+        snapshot.invalidar('demo')
+        self.assertNotEqual(snapshot.carregar('demo', 1, 1).versao, primeiro.versao)
+        self.assertEqual(self.montar.call_count, 2)
+
+        snapshot.carregar('demo', 1, 2)
+        snapshot.carregar('outro', 1, 1)
+        self.assertEqual(self.montar.call_count, 4)
+
+    def test_cache_fora_do_ar_le_do_banco(self):
+        with patch.object(snapshot.cache, 'get_many', side_effect=ConnectionError('redis')), \
+                self.assertLogs('parametros_admin.snapshot', level='WARNING'):
+            foto = snapshot.carregar('demo', 1, 1)
+        self.assertIsNone(foto.versao)
+        self.assertTrue(foto.ligado(2, 'usar_preco_prazo'))
+
+        with patch.object(snapshot.cache, 'set', side_effect=ConnectionError('redis')), \
+                self.assertLogs('parametros_admin.snapshot', level='WARNING'):
+            self.assertEqual(snapshot.carregar('demo', 1, 1).empresa, 1)
+            snapshot.invalidar('demo')
+        self.assertEqual(self.montar.call_count, 2)
+
+    def test_helpers_de_pedido_usam_uma_fotografia_por_requisicao(self):
+        request = HttpRequest()
+        parametros = obter_parametros_pedidos(1, 1, request)
+        self.assertEqual(parametros['usar_preco_prazo'], {'valor': True, 'ativo': True, 'existe': True})
+        self.assertEqual(parametros['desconto_pedido'], {'valor': 'false', 'ativo': False, 'existe': False})
+        self.assertTrue(verificar_usar_preco_prazo(1, 1, request))
+        self.assertFalse(verificar_validar_estoque_pedido(1, 1, request))
+        with patch.object(snapshot.cache, 'get_many', wraps=snapshot.cache.get_many) as get_many:
+            verificar_usar_preco_prazo(1, 1, request)
+        get_many.assert_not_called()
+        self.assertEqual(self.montar.call_count, 1)
+
+    def test_modulos_de_orcamento_e_estoque(self):
+        self.assertTrue(verificar_baixa_estoque_pedido(1, 1, banco='demo'))
+        with patch('parametros_admin.utils_orcamentos.get_licenca_db_config', return_value='demo'):
+            self.assertTrue(verificar_baixa_estoque_orcamento(1, 1, HttpRequest()))
+        with patch('parametros_admin.utils_estoque.get_licenca_db_config', return_value='demo'):
+            estoque = obter_parametros_estoque(1, 1, HttpRequest())
+        self.assertEqual(estoque['alerta_estoque_minimo'], {'valor': False, 'ativo': True, 'existe': True})
+        self.assertFalse(estoque['permitir_estoque_negativo']['existe'])
+
+    def test_modulo_pelo_maior_numero_de_parametros(self):
+        foto = SnapshotParametros(
+            banco='demo', empresa=1, filial=1, versao='v',
+            modulos=((7, 'Vendas'), (8, 'Outro')),
+            valores={(7, 'usar_preco_prazo'): (True, True), (7, 'desconto_pedido'): (True, True), (8, 'x'): (True, True)},
+        )
+        self.assertIsNone(foto.modulo(contendo='pedido'))
+        self.assertEqual(foto.modulo_com_mais(['usar_preco_prazo', 'desconto_pedido']), 7)
+        self.assertEqual(foto.modulo(contendo='VEND'), 7)
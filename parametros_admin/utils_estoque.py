@@ -1,5 +1,6 @@
 from .models import ParametroSistema, Modulo
 from core.utils import get_licenca_db_config
+from .snapshot import carregar_da_requisicao
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 import logging
@@ -24,32 +25,12 @@ def obter_parametros_estoque(empresa_id, filial_id, request):
             'calculo_automatico_custo': 'Entradas_Estoque'
         }
         
+        snapshot = carregar_da_requisicao(request, banco, empresa_id, filial_id)
         parametros = {}
         for nome_param, nome_modulo in parametros_modulos.items():
             # Buscar o módulo específico
-            modulo = Modulo.objects.using(banco).filter(
-                modu_nome=nome_modulo
-            ).first()
-            
-            if modulo:
-                param = ParametroSistema.objects.using(banco).filter(
-                    para_empr=empresa_id,
-                    para_fili=filial_id,
-                    para_modu=modulo,
-                    para_nome=nome_param
-                ).first()
-                
-                parametros[nome_param] = {
-                    'valor': param.para_valo if param else 'false',
-                    'ativo': param.para_ativ if param else False,
-                    'existe': param is not None
-                }
-            else:
-                parametros[nome_param] = {
-                    'valor': 'false',
-                    'ativo': False,
-                    'existe': False
-                }
+            modulo = snapshot.modulo(nome=nome_modulo)
+            parametros[nome_param] = snapshot.parametro(modulo, nome_param)
         
         return parametros
         
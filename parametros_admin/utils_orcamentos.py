@@ -1,5 +1,6 @@
 from .models import ParametroSistema, Modulo
 from core.utils import get_licenca_db_config
+from .snapshot import carregar_da_requisicao
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 import logging
@@ -14,18 +15,16 @@ def obter_parametros_orcamentos(empresa_id, filial_id, request):
     try:
         banco = get_licenca_db_config(request)
         
+        snapshot = carregar_da_requisicao(request, banco, empresa_id, filial_id)
+
         # Buscar módulo de orçamentos
-        modulo_orcamentos = Modulo.objects.using(banco).filter(
-            modu_nome__icontains='orcamento'
-        ).first()
+        modulo_orcamentos = snapshot.modulo(contendo='orcamento')
         
         # Se não encontrar, buscar módulo de pedidos (orçamentos podem usar o mesmo)
-        if not modulo_orcamentos:
-            modulo_orcamentos = Modulo.objects.using(banco).filter(
-                modu_nome__icontains='pedido'
-            ).first()
+        if modulo_orcamentos is None:
+            modulo_orcamentos = snapshot.modulo(contendo='pedido')
         
-        if not modulo_orcamentos:
+        if modulo_orcamentos is None:
             logger.warning("Módulo de orçamentos não encontrado")
             return {}
         
@@ -38,22 +37,7 @@ def obter_parametros_orcamentos(empresa_id, filial_id, request):
             'conversao_automatica_pedido'
         ]
         
-        parametros = {}
-        for nome_param in parametros_nomes:
-            param = ParametroSistema.objects.using(banco).filter(
-                para_empr=empresa_id,
-                para_fili=filial_id,
-                para_modu=modulo_orcamentos,
-                para_nome=nome_param
-            ).first()
-            
-            parametros[nome_param] = {
-                'valor': param.para_valo if param else 'false',
-                'ativo': param.para_ativ if param else False,
-                'existe': param is not None
-            }
-        
-        return parametros
+        return snapshot.parametros(modulo_orcamentos, parametros_nomes)
         
     except Exception as e:
         logger.error(f"Erro ao obter parâmetros de orçamentos: {e}")
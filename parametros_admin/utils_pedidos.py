@@ -1,32 +1,17 @@
 from .models import ParametroSistema, Modulo
 from core.utils import get_licenca_db_config
+from .snapshot import carregar_da_requisicao
 from django.core.exceptions import ValidationError
-from django.db.models import Count
 from decimal import Decimal, ROUND_HALF_UP
 import logging
 
 logger = logging.getLogger(__name__)
 
-def _resolver_modulo_pedidos(banco: str, empresa_id: int, filial_id: int, parametros_nomes: list[str]):
-    modulo = Modulo.objects.using(banco).filter(modu_nome__icontains='pedido').first()
-    if modulo:
+def _modulo_pedidos(snapshot, parametros_nomes):
+    modulo = snapshot.modulo(contendo='pedido')
+    if modulo is not None:
         return modulo
-
-    row = (
-        ParametroSistema.objects.using(banco)
-        .filter(
-            para_empr=empresa_id,
-            para_fili=filial_id,
-            para_nome__in=parametros_nomes,
-        )
-        .values('para_modu_id')
-        .annotate(qtd=Count('para_nome'))
-        .order_by('-qtd')
-        .first()
-    )
-    if not row:
-        return None
-    return Modulo.objects.using(banco).filter(modu_codi=row.get('para_modu_id')).first()
+    return snapshot.modulo_com_mais(parametros_nomes)
 
 
 def obter_parametros_pedidos(empresa_id, filial_id, request):
@@ -56,27 +41,13 @@ def obter_parametros_pedidos(empresa_id, filial_id, request):
             'pedido_volta_estoque',
         ]
 
-        modulo_pedidos = _resolver_modulo_pedidos(banco, empresa_id, filial_id, parametros_nomes)
-        if not modulo_pedidos:
+        snapshot = carregar_da_requisicao(request, banco, empresa_id, filial_id)
+        modulo_pedidos = _modulo_pedidos(snapshot, parametros_nomes)
+        if modulo_pedidos is None:
             logger.warning("Módulo de pedidos não encontrado")
             return {}
         
-        parametros = {}
-        for nome_param in parametros_nomes:
-            param = ParametroSistema.objects.using(banco).filter(
-                para_empr=empresa_id,
-                para_fili=filial_id,
-                para_modu=modulo_pedidos,
-                para_nome=nome_param
-            ).first()
-            
-            parametros[nome_param] = {
-                'valor': param.para_valo if param else 'false',
-                'ativo': param.para_ativ if param else False,
-                'existe': param is not None
-            }
-        
-        return parametros
+        return snapshot.parametros(modulo_pedidos, parametros_nomes)
         
     except Exception as e:
         logger.error(f"Erro ao obter parâmetros de pedidos: {e}")
@@ -160,39 +131,21 @@ def verificar_baixa_estoque_pedido(empresa_id, filial_id, request=None, banco=No
             logger.warning("[verificar_baixa_estoque_pedido] banco não resolvido")
             return False
 
-        # Buscar módulo diretamente pelo banco já resolvido
-        modulo = Modulo.objects.using(banco).filter(
-            modu_nome__icontains='pedido'
-        ).first()
+        snapshot = carregar_da_requisicao(request, banco, empresa_id, filial_id)
+        modulo = snapshot.modulo(contendo='pedido')
 
-        if not modulo:
+        if modulo is None:
             logger.warning("[verificar_baixa_estoque_pedido] módulo pedido não encontrado banco=%s", banco)
             return False
 
-        param = ParametroSistema.objects.using(banco).filter(
-            para_empr=empresa_id,
-            para_fili=filial_id,
-            para_modu=modulo,
-            para_nome='baixa_estoque_pedido'
-        ).first()
+        param = snapshot.parametro(modulo, 'baixa_estoque_pedido')
 
         logger.warning(
             "[verificar_baixa_estoque_pedido] banco=%s empr=%s fili=%s existe=%s ativo=%s valor=%r",
-            banco, empresa_id, filial_id,
-            param is not None,
-            param.para_ativ if param else None,
-            param.para_valo if param else None,
+            banco, empresa_id, filial_id, param['existe'], param['ativo'], param['valor'],
         )
 
-        if not param:
-            return False
-
-        ativo = param.para_ativ
-        valor = param.para_valo
-
-        if isinstance(valor, bool):
-            return bool(ativo) and valor
-        return bool(ativo) and str(valor).lower() == 'true'
+        return snapshot.ligado(modulo, 'baixa_estoque_pedido')
 
     except Exception as e:
         logger.error("[verificar_baixa_estoque_pedido] erro: %s", e)
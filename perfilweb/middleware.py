@@ -1,5 +1,5 @@
 from django.http import HttpResponseForbidden
-from django.urls import resolve
+from core.rotas import indice_rotas
 from .services import verificar_por_url
 from .permission_map import PERMISSION_MAP
 from .services import (
@@ -16,9 +16,8 @@ from core.middleware import get_licenca_slug
 from core.middleware import set_licenca_slug
 from core.utils import get_db_from_slug
 from django.conf import settings
-from Licencas.models import Usuarios
-import jwt
-from core.licenca_context import get_licencas_map
+from core.contexto_auth import ContextoAuth
+from core.licenca_context import get_licenca
 from django.contrib import messages
 from django.shortcuts import redirect
 
@@ -44,6 +43,9 @@ class PerfilPermissionMiddleware:
         if not (p.startswith('/web/') or p.startswith('/api/')):
             return self.get_response(request)
 
+        # Token decodificado uma vez por request, compartilhado com LicencaMiddleware e DRF
+        contexto = ContextoAuth.obter(request)
+
         try:
             parts_init = p.strip('/').split('/')
             slug_res = None
@@ -51,32 +53,25 @@ class PerfilPermissionMiddleware:
                 if parts_init[1] == 'home':
                     if len(parts_init) >= 3 and parts_init[2] != 'selecionar-empresa':
                         cand = (parts_init[2] or '').strip().lower()
-                        if any((x.get('slug') or '').strip().lower() == cand for x in get_licencas_map()):
+                        if get_licenca(cand) is not None:
                             slug_res = cand
                 else:
                     # Somente considera slug quando há um app após o slug
                     if len(parts_init) >= 3:
                             cand = (parts_init[1] or '').strip().lower()
-                            if any((x.get('slug') or '').strip().lower() == cand for x in get_licencas_map()):
+                            if get_licenca(cand) is not None:
                                 slug_res = cand
             elif len(parts_init) >= 2 and parts_init[0] == 'api':
                 cand = (parts_init[1] or '').strip().lower()
                 if cand in ('null', 'undefined'):
                     slug_res = None
                 else:
-                    if any((x.get('slug') or '').strip().lower() == cand for x in get_licencas_map()):
+                    if get_licenca(cand) is not None:
                         slug_res = cand
                     else:
                         slug_res = None
             if not slug_res:
-                try:
-                    auth = request.headers.get('Authorization', '')
-                    if auth.startswith('Bearer '):
-                        token = auth.split(' ')[1]
-                        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-                        slug_res = claims.get('lice_slug') or slug_res
-                except Exception:
-                    pass
+                slug_res = contexto.slug_token or slug_res
             if slug_res:
                 try:
                     set_licenca_slug(slug_res)
@@ -115,57 +110,45 @@ class PerfilPermissionMiddleware:
             if session_id:
                 return self.get_response(request)
 
-        if not usuario and request.path.startswith('/api/'):
-            auth = request.headers.get('Authorization', '')
-            if auth.startswith('Bearer '):
+        if not usuario and request.path.startswith('/api/') and contexto.token:
+            if contexto.claims is None:
+                self.logger.warning("[perfil_mw] jwt inválido ou expirado")
+            else:
+                uid = contexto.usuario_id
+                uname = contexto.username
+                slug_claim = contexto.slug_token
+                slug_ctx = None
+                banco_ctx = None
                 try:
-                    token = auth.split(' ')[1]
-                    claims = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-                    uid = claims.get('usuario_id') or claims.get('user_id')
-                    try:
-                        uid = int(uid) if uid is not None else None
-                    except Exception:
-                        uid = None
-                    uname = claims.get('username') or claims.get('usua_nome')
-                    slug_claim = claims.get('lice_slug')
-                    slug_ctx = None
-                    banco_ctx = None
                     try:
                         slug_ctx = get_licenca_slug() or slug_claim
                         banco_ctx = get_db_from_slug(slug_ctx)
                     except Exception:
                         slug_ctx = slug_claim
                         banco_ctx = get_db_from_slug(slug_ctx) if slug_ctx else None
-                    try:
-                        if slug_ctx:
-                            set_licenca_slug(slug_ctx)
-                        self.logger.info(f"[perfil_mw] jwt uid={uid} uname={uname} slug={slug_ctx} banco={banco_ctx}")
-                    except Exception:
-                        pass
+                    if slug_ctx:
+                        set_licenca_slug(slug_ctx)
+                    self.logger.info(f"[perfil_mw] jwt uid={uid} uname={uname} slug={slug_ctx} banco={banco_ctx}")
                     if banco_ctx:
-                        if uid:
-                            usuario = Usuarios.objects.using(banco_ctx).filter(usua_codi=uid).first()
-                        if not usuario and uname:
-                            usuario = Usuarios.objects.using(banco_ctx).filter(usua_nome__iexact=uname).first()
-                        try:
-                            self.logger.info(f"[perfil_mw] jwt usuario_resolvido={getattr(usuario,'usua_nome',None)}")
-                        except Exception:
-                            pass
+                        usuario = contexto.usuario(banco_ctx)
+                        self.logger.info(f"[perfil_mw] jwt usuario_resolvido={getattr(usuario,'usua_nome',None)}")
                 except Exception as e:
-                    try:
-                        self.logger.warning(f"[perfil_mw] jwt_decode_error={e}")
-                    except Exception:
-                        pass
+                    self.logger.warning(f"[perfil_mw] jwt_usuario_error={e}")
 
         # Prosseguir mesmo sem usuário para negar acesso a rotas protegidas (exceto whitelists acima)
 
+        # listar_permissoes/acoes_permitidas abaixo só alimentam log: consultam o
+        # banco a cada request, então ficam restritas ao nível DEBUG
+        diagnostico = self.logger.isEnabledFor(logging.DEBUG)
+
         try:
-            perfil_snap = get_perfil_ativo(usuario)
+            perfil_snap = contexto.perfil(usuario)
             self.logger.info(f"[perfil_mw] perfil_resolvido={getattr(perfil_snap,'perf_nome',None)} usuario={getattr(usuario,'usua_nome',None)}")
-            try:
-                listar_permissoes(perfil_snap)
-            except Exception:
-                pass
+            if diagnostico:
+                try:
+                    listar_permissoes(perfil_snap)
+                except Exception:
+                    pass
         except Exception:
             perfil_snap = None
             pass
@@ -208,7 +191,7 @@ class PerfilPermissionMiddleware:
             pass
 
         try:
-            match = resolve(request.path_info)
+            match = indice_rotas.resolver(request)
         except Exception as e:
             try:
                 self.logger.warning(f"[perfil_mw] resolve_error path={request.path_info} err={e}")
@@ -241,12 +224,13 @@ class PerfilPermissionMiddleware:
                         self.logger.info(f"[perfil_mw] cbv view={view_class.__name__} app={app_label} model={model_name} acao={acao}")
                     except Exception:
                         pass
-                    perfil = get_perfil_ativo(usuario)
-                    try:
-                        efet = sorted(list(acoes_permitidas(perfil, app_label, model_name)))
-                        self.logger.info(f"[perfil_mw] efetivo app={app_label} model={model_name} acoes={efet}")
-                    except Exception:
-                        pass
+                    perfil = contexto.perfil(usuario)
+                    if diagnostico:
+                        try:
+                            efet = sorted(list(acoes_permitidas(perfil, app_label, model_name)))
+                            self.logger.debug(f"[perfil_mw] efetivo app={app_label} model={model_name} acoes={efet}")
+                        except Exception:
+                            pass
                     permitido = tem_permissao(perfil, app_label, model_name, acao)
                     try:
                         self.logger.info(f"[perfil_mw] perfil={getattr(perfil,'perf_nome',None)} permitido={permitido}")
@@ -290,12 +274,13 @@ class PerfilPermissionMiddleware:
                         self.logger.info(f"[perfil_mw] api app={app_label} model={model_name} acao={acao} uid={getattr(usuario,'usua_codi',None)}")
                     except Exception:
                         pass
-                    perfil = get_perfil_ativo(usuario)
-                    try:
-                        efet = sorted(list(acoes_permitidas(perfil, app_label, model_name)))
-                        self.logger.info(f"[perfil_mw] efetivo app={app_label} model={model_name} acoes={efet}")
-                    except Exception:
-                        pass
+                    perfil = contexto.perfil(usuario)
+                    if diagnostico:
+                        try:
+                            efet = sorted(list(acoes_permitidas(perfil, app_label, model_name)))
+                            self.logger.debug(f"[perfil_mw] efetivo app={app_label} model={model_name} acoes={efet}")
+                        except Exception:
+                            pass
                     permitido = tem_permissao(perfil, app_label, model_name, acao)
                     try:
                         self.logger.info(f"[perfil_mw] api perfil={getattr(perfil,'perf_nome',None)} permitido={permitido}")
@@ -338,12 +323,13 @@ class PerfilPermissionMiddleware:
                             acao = 'visualizar'
                         else:
                             acao = 'listar'
-                        perfil = get_perfil_ativo(usuario)
-                        try:
-                            efet = sorted(list(acoes_permitidas(perfil, app_label, default_model)))
-                            self.logger.info(f"[perfil_mw] efetivo app={app_label} model={default_model} acoes={efet}")
-                        except Exception:
-                            pass
+                        perfil = contexto.perfil(usuario)
+                        if diagnostico:
+                            try:
+                                efet = sorted(list(acoes_permitidas(perfil, app_label, default_model)))
+                                self.logger.debug(f"[perfil_mw] efetivo app={app_label} model={default_model} acoes={efet}")
+                            except Exception:
+                                pass
                         permitido = tem_permissao(perfil, app_label, default_model, acao)
                         try:
                             self.logger.info(f"[perfil_mw] web app={app_label} model={default_model} acao={acao} permitido={permitido}")
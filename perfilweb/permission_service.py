@@ -1,7 +1,7 @@
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
 from .models import PermissaoPerfil, PermissaoLog, PerfilHeranca, UsuarioPerfil
-from .services import limpar_cache_perfil
+from .services import chave_perfil_ativo, limpar_cache_perfil
 from core.middleware import get_licenca_slug
 from core.utils import get_db_from_slug
 from django.core.cache import cache
@@ -66,7 +66,7 @@ def salvar_usuarios_perfil(perfil, usuarios_ids):
         UsuarioPerfil.objects.using(banco).bulk_create(objs)
     for uid in uids:
         try:
-            cache.delete(f'perfil_ativo_{banco}_{uid}')
+            cache.delete(chave_perfil_ativo(banco, uid))
         except Exception:
             pass
     limpar_cache_perfil(perfil.id)
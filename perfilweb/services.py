@@ -2,14 +2,32 @@ from django.core.cache import cache
 from django.contrib.contenttypes.models import ContentType
 from .models import UsuarioPerfil, PermissaoPerfil, Perfil, PerfilHeranca
 from .permission_map import PERMISSION_MAP
+from .constants import ACOES_PADRAO
 from core.middleware import get_licenca_slug
 from core.utils import get_db_from_slug
 import logging
+import threading
+import time
+from collections import OrderedDict
 from Licencas.models import Usuarios
 from django.apps import apps
 
 CACHE_TIMEOUT = 60  # Reduzir para 1 minuto durante debug
+CONTENTTYPE_TTL = 600
+MATRIZ_TIMEOUT = 3600  # chaves versionadas: alteração de perfil já invalida
+MAX_MATRIZES_MEMORIA = 512
+BIT_ACAO = {acao: 1 << i for i, acao in enumerate(ACOES_PADRAO)}
+_contenttypes = {}
+_contenttypes_lock = threading.Lock()
+_matrizes = OrderedDict()
+_matrizes_lock = threading.Lock()
 logger = logging.getLogger('perfilweb.services')
+_CAMPOS_PERFIL = [f.attname for f in Perfil._meta.concrete_fields]
+
+
+def chave_perfil_ativo(banco, usuario_id):
+    # v2: valor é a lista de colunas do Perfil (antes era a instância)
+    return f'perfil_ativo_v2_{banco}_{usuario_id}'
 
 # Bancos/Licenças que não utilizam o sistema de perfis (permissão total/hardcoded)
 EXCLUDED_DBS = ['savexml1', 'savexml206', 'spartacus', 'savexml144', 'savexml1014']
@@ -33,11 +51,14 @@ def get_perfil_ativo(usuario):
         logger.warning(f"[perfil_services] get_perfil_ativo: usuario_id None para usuario={usuario}")
         return None
     
-    key = f'perfil_ativo_{banco}_{usuario_id}'
-    perfil = cache.get(key)
-    
-    if perfil:
-        logger.info(f"[perfil_services] perfil_ativo CACHE HIT: usuario_id={usuario_id} perfil={getattr(perfil,'perf_nome',None)}")
+    # Guarda só os valores das colunas (ou False para "sem perfil"), não a instância
+    key = chave_perfil_ativo(banco, usuario_id)
+    cacheado = cache.get(key)
+    if cacheado is False:
+        return None
+    if cacheado:
+        perfil = Perfil.from_db(banco, _CAMPOS_PERFIL, cacheado)
+        logger.info(f"[perfil_services] perfil_ativo CACHE HIT: usuario_id={usuario_id} perfil={perfil.perf_nome}")
         return perfil
 
     rels = list(
@@ -46,7 +67,7 @@ def get_perfil_ativo(usuario):
         .filter(perf_usua_id=usuario_id, perf_ativ=True, perf_perf__perf_ativ=True)
     )
     if not rels:
-        cache.set(key, None, CACHE_TIMEOUT)
+        cache.set(key, False, CACHE_TIMEOUT)
         logger.warning(f"[perfil_services] perfil_ativo NÃO ENCONTRADO: usuario_id={usuario_id} banco={banco}")
         return None
     melhor = None
@@ -54,8 +75,7 @@ def get_perfil_ativo(usuario):
     try:
         for rel in rels:
             p = rel.perf_perf
-            cadeia = _cadeia_perfis(p)
-            count = PermissaoPerfil.objects.using(banco).filter(perf_perf_id__in=cadeia).count()
+            count = _matriz_perfil(banco, p.id).total()
             if count > melhor_count:
                 melhor = p
                 melhor_count = count
@@ -70,40 +90,56 @@ def get_perfil_ativo(usuario):
             UsuarioPerfil.objects.using(banco).filter(perf_usua_id=usuario_id, perf_perf_id__in=outros_ids).delete()
     except Exception:
         pass
-    cache.set(key, melhor, CACHE_TIMEOUT)
+    cache.set(key, [getattr(melhor, campo) for campo in _CAMPOS_PERFIL], CACHE_TIMEOUT)
     logger.info(f"[perfil_services] perfil_ativo DB: usuario_id={usuario_id} banco={banco} perfil={melhor.perf_nome} perms_count={melhor_count}")
     return melhor
 
 
-def _perfil_version(perfil_id):
-    banco = get_db_from_slug(get_licenca_slug())
-    key = f'perfil_ver_{banco}_{perfil_id}'
+def _versao_banco(banco):
+    """
+    Versão das permissões da licença. Qualquer alteração de perfil, herança ou
+    permissão incrementa; matrizes e herança em cache são chaveadas por ela.
+    Começa no timestamp para não voltar a um número antigo se a chave sumir.
+    """
+    key = f'perfil_ver_{banco}'
     ver = cache.get(key)
     if ver is None:
-        ver = 1
-        cache.set(key, ver, CACHE_TIMEOUT)
+        ver = int(time.time())
+        cache.add(key, ver, None)
+        ver = cache.get(key) or ver
     return ver
 
 
 def limpar_cache_perfil(perfil_id):
-    """Limpa o cache de um perfil incrementando sua versão"""
+    """Limpa o cache de permissões incrementando a versão da licença"""
     banco = get_db_from_slug(get_licenca_slug())
-    key = f'perfil_ver_{banco}_{perfil_id}'
-    ver = cache.get(key) or 1
-    cache.set(key, ver + 1, CACHE_TIMEOUT)
-    logger.info(f"[perfil_services] cache_limpo perfil_id={perfil_id} nova_versao={ver+1}")
-
-
-def _cadeia_perfis(perfil):
-    """Retorna a cadeia de herança de perfis (perfil + todos os pais)"""
-    if not perfil:
-        return []
-    
-    ids = [perfil.id]
-    banco = get_db_from_slug(get_licenca_slug())
-    pais = list(PerfilHeranca.objects.using(banco).filter(perf_filho=perfil).values_list('perf_pai_id', flat=True))
-    visitados = set(ids)
-    
+    key = f'perfil_ver_{banco}'
+    ver = _versao_banco(banco)
+    try:
+        ver = cache.incr(key)
+    except ValueError:
+        ver += 1
+        cache.set(key, ver, None)
+    logger.info(f"[perfil_services] cache_limpo perfil_id={perfil_id} nova_versao={ver}")
+
+
+def _heranca(banco, ver):
+    """Mapa perfil filho -> pais da licença, numa única consulta por versão"""
+    key = f'perfil_heranca_{banco}_v{ver}'
+    mapa = cache.get(key)
+    if mapa is None:
+        mapa = {}
+        for filho, pai in PerfilHeranca.objects.using(banco).values_list('perf_filho_id', 'perf_pai_id'):
+            mapa.setdefault(filho, []).append(pai)
+        cache.set(key, mapa, MATRIZ_TIMEOUT)
+    return mapa
+
+
+def _cadeia_ids(banco, perfil_id, ver=None):
+    mapa = _heranca(banco, ver if ver is not None else _versao_banco(banco))
+    ids = [perfil_id]
+    visitados = {perfil_id}
+    pais = list(mapa.get(perfil_id, ()))
     while pais:
         novo = []
         for pid in pais:
@@ -111,13 +147,102 @@ def _cadeia_perfis(perfil):
                 continue
             ids.append(pid)
             visitados.add(pid)
-            novo.extend(list(PerfilHeranca.objects.using(banco).filter(perf_filho_id=pid).values_list('perf_pai_id', flat=True)))
+            novo.extend(mapa.get(pid, ()))
         pais = novo
+    return ids
+
+
+def _cadeia_perfis(perfil):
+    """Retorna a cadeia de herança de perfis (perfil + todos os pais)"""
+    if not perfil:
+        return []
     
+    banco = get_db_from_slug(get_licenca_slug())
+    ids = _cadeia_ids(banco, perfil.id)
     logger.info(f"[perfil_services] cadeia_perfis base={perfil.perf_nome} cadeia_ids={ids}")
     return ids
 
 
+class MatrizPermissoes:
+    """
+    Permissões efetivas de um perfil (com herança) por ContentType: um
+    bitset das ACOES_PADRAO por ctype e, à parte, ações fora do padrão.
+    """
+
+    __slots__ = ('bits', 'extras')
+
+    def __init__(self, bits=None, extras=None):
+        self.bits = bits or {}
+        self.extras = extras or {}
+
+    @classmethod
+    def compilar(cls, linhas):
+        """``linhas``: pares (ctype_id, acao)"""
+        bits = {}
+        extras = {}
+        for ctype_id, acao in linhas:
+            bit = BIT_ACAO.get(acao)
+            if bit is None:
+                extras.setdefault(ctype_id, set()).add(acao)
+            else:
+                bits[ctype_id] = bits.get(ctype_id, 0) | bit
+        return cls(bits, {ct: sorted(acoes) for ct, acoes in extras.items()})
+
+    def permite(self, ctype_id, acao):
+        bit = BIT_ACAO.get(acao)
+        if bit is not None:
+            return bool(self.bits.get(ctype_id, 0) & bit)
+        return acao in self.extras.get(ctype_id, ())
+
+    def acoes(self, ctype_id):
+        mascara = self.bits.get(ctype_id, 0)
+        acoes = {acao for acao, bit in BIT_ACAO.items() if mascara & bit}
+        acoes.update(self.extras.get(ctype_id, ()))
+        return acoes
+
+    def total(self):
+        return sum(bin(m).count('1') for m in self.bits.values()) + sum(len(a) for a in self.extras.values())
+
+    def __getstate__(self):
+        return (self.bits, self.extras)
+
+    def __setstate__(self, estado):
+        self.bits, self.extras = estado
+
+
+def _matriz_perfil(banco, perfil_id):
+    """
+    Matriz do perfil na versão atual da licença: memória do processo, depois
+    cache compartilhado e, só na falta dos dois, duas consultas (herança e
+    PermissaoPerfil da cadeia).
+    """
+    ver = _versao_banco(banco)
+    chave = (banco, perfil_id, ver)
+    with _matrizes_lock:
+        matriz = _matrizes.get(chave)
+        if matriz is not None:
+            _matrizes.move_to_end(chave)
+            return matriz
+
+    key = f'perfil_matriz_{banco}_{perfil_id}_v{ver}'
+    matriz = cache.get(key)
+    if matriz is None:
+        cadeia = _cadeia_ids(banco, perfil_id, ver)
+        matriz = MatrizPermissoes.compilar(
+            PermissaoPerfil.objects.using(banco)
+            .filter(perf_perf_id__in=cadeia)
+            .values_list('perf_ctype_id', 'perf_acao')
+        )
+        cache.set(key, matriz, MATRIZ_TIMEOUT)
+        logger.info(f"[perfil_services] matriz compilada: banco={banco} perfil_id={perfil_id} v{ver} cadeia={cadeia} ctypes={len(matriz.bits)}")
+
+    with _matrizes_lock:
+        _matrizes[chave] = matriz
+        while len(_matrizes) > MAX_MATRIZES_MEMORIA:
+            _matrizes.popitem(last=False)
+    return matriz
+
+
 def normalizar_app_label(app_label):
     """Normaliza app_label para lowercase e remove caracteres especiais"""
     norm = (app_label or '').strip().lower()
@@ -150,7 +275,34 @@ def _buscar_contenttype(banco, app_label, model_name):
     """
     Busca ContentType com múltiplas estratégias de fallback
     Retorna: (ContentType ou None, mensagem de debug)
+
+    O resultado encontrado fica memorizado por banco/app/model no processo
+    (CONTENTTYPE_TTL); "não encontrado" não é memorizado.
     """
+    chave = (banco, normalizar_app_label(app_label), _normalizar_model_name(model_name))
+    agora = time.monotonic()
+    with _contenttypes_lock:
+        cache_ct = _contenttypes.get(chave)
+    if cache_ct and agora - cache_ct[2] < CONTENTTYPE_TTL:
+        return cache_ct[0], cache_ct[1]
+
+    ct, estrategia = _buscar_contenttype_banco(banco, app_label, model_name)
+    if ct is not None:
+        with _contenttypes_lock:
+            _contenttypes[chave] = (ct, estrategia, agora)
+    return ct, estrategia
+
+
+def limpar_cache_contenttypes(banco=None):
+    with _contenttypes_lock:
+        if banco is None:
+            _contenttypes.clear()
+        else:
+            for chave in [c for c in _contenttypes if c[0] == banco]:
+                _contenttypes.pop(chave, None)
+
+
+def _buscar_contenttype_banco(banco, app_label, model_name):
     app_norm = normalizar_app_label(app_label)
     model_norm = _normalizar_model_name(model_name)
     
@@ -351,72 +503,63 @@ def tem_permissao(perfil, app_label, model, acao):
         logger.warning(f"[perfil_services] tem_permissao: perfil None para app={app_label} model={model} acao={acao}")
         return False
 
-    cadeia = _cadeia_perfis(perfil)
-    ver = _perfil_version(perfil.id)
-    # banco já foi obtido acima
-    
-    # Normalizar antes de criar a chave de cache
     model_norm = _normalizar_model_name(model)
-    
-    key = f'perm_{banco}_{perfil.id}_v{ver}_{",".join(map(str,cadeia))}_{app_norm}_{model_norm}_{acao}'
-    permitido = cache.get(key)
-    
-    if permitido is not None:
-        logger.info(f"[perfil_services] tem_permissao CACHE: perfil={perfil.perf_nome} app={app_norm} model={model_norm} acao={acao} permitido={permitido}")
-        return permitido
 
     if (getattr(perfil, 'perf_nome', '') or '').strip().lower() == 'superadmin':
-        cache.set(key, True, CACHE_TIMEOUT)
         logger.info(f"[perfil_services] tem_permissao RESULTADO: perfil={perfil.perf_nome} app={app_norm} model={model_norm} acao={acao} permitido=True estrategia=superadmin_total")
         return True
 
-    logger.info(f"[perfil_services] tem_permissao VERIFICANDO: perfil={perfil.perf_nome} app={app_label}→{app_norm} model={model}→{model_norm} acao={acao} cadeia={cadeia}")
-    
-    ct_ids = []
-    ct1, estrategia = _buscar_contenttype(banco, app_label, model)
-    if ct1:
-        ct_ids.append(ct1.id)
-
-    if app_norm == 'dash':
-        for alias_label in _app_labels_equivalentes('dash'):
-            try:
-                ct2 = ContentType.objects.using(banco).get(
-                    app_label__iexact=alias_label,
-                    model__iexact=model_norm,
-                )
-                if ct2 and ct2.id not in ct_ids:
-                    ct_ids.append(ct2.id)
-                    logger.info(f"[perfil_services] ContentType SECUNDÁRIO ENCONTRADO: id={ct2.id} app={ct2.app_label}")
-            except ContentType.DoesNotExist:
-                pass
-    
+    ct_ids, estrategia = _contenttype_ids(banco, app_label, model)
     if not ct_ids:
         # NÃO fazer cache de False aqui! Pode ser problema temporário
         logger.error(f"[perfil_services] tem_permissao NEGADO (ContentType não encontrado): perfil={perfil.perf_nome} app={app_label} model={model}")
         return False
 
     # Verificar se existe a permissão em QUALQUER UM dos ContentTypes encontrados
-    permitido = PermissaoPerfil.objects.using(banco).filter(
-        perf_perf_id__in=cadeia,
-        perf_ctype_id__in=ct_ids,
-        perf_acao=acao
-    ).exists()
+    matriz = _matriz_perfil(banco, perfil.id)
+    permitido = any(matriz.permite(ct_id, acao) for ct_id in ct_ids)
 
-    cache.set(key, permitido, CACHE_TIMEOUT)
-    
     logger.info(f"[perfil_services] tem_permissao RESULTADO: perfil={perfil.perf_nome} app={app_norm} model={model_norm} ct_ids={ct_ids} acao={acao} permitido={permitido} estrategia={estrategia}")
     
     # Se negado, listar o que o perfil TEM para estes ContentTypes
     if not permitido:
-        acoes_disponiveis = list(PermissaoPerfil.objects.using(banco).filter(
-            perf_perf_id__in=cadeia,
-            perf_ctype_id__in=ct_ids
-        ).values_list('perf_acao', flat=True))
+        acoes_disponiveis = sorted(set().union(*(matriz.acoes(ct_id) for ct_id in ct_ids)))
         logger.warning(f"[perfil_services] ACESSO NEGADO: perfil={perfil.perf_nome} solicitou acao={acao} mas tem apenas: {acoes_disponiveis}")
     
     return permitido
 
 
+def _contenttype_ids(banco, app_label, model):
+    """ContentTypes que valem para app/model (no dash, todos os aliases do app)"""
+    app_norm = normalizar_app_label(app_label)
+    model_norm = _normalizar_model_name(model)
+    ct_ids = []
+    ct1, estrategia = _buscar_contenttype(banco, app_label, model)
+    if ct1:
+        ct_ids.append(ct1.id)
+
+    if app_norm == 'dash':
+        for alias_label in _app_labels_equivalentes('dash'):
+            ct2 = _contenttype_exato(banco, alias_label, model_norm)
+            if ct2 and ct2.id not in ct_ids:
+                ct_ids.append(ct2.id)
+    return ct_ids, estrategia
+
+
+def _contenttype_exato(banco, app_label, model_norm):
+    chave = (banco, 'exato', app_label, model_norm)
+    agora = time.monotonic()
+    with _contenttypes_lock:
+        cache_ct = _contenttypes.get(chave)
+    if cache_ct and agora - cache_ct[2] < CONTENTTYPE_TTL:
+        return cache_ct[0]
+    # Aqui a ausência também é memorizada: são aliases opcionais do dash
+    ct = ContentType.objects.using(banco).filter(app_label__iexact=app_label, model__iexact=model_norm).first()
+    with _contenttypes_lock:
+        _contenttypes[chave] = (ct, 'exato', agora)
+    return ct
+
+
 def acoes_permitidas(perfil, app_label, model):
     """Retorna conjunto de ações permitidas para o modelo"""
     # EXCEÇÃO 1: Apps específicos
@@ -438,32 +581,14 @@ def acoes_permitidas(perfil, app_label, model):
         return {'criar', 'editar', 'excluir', 'visualizar', 'listar', 'imprimir', 'exportar'}
 
     model_norm = _normalizar_model_name(model)
-    
-    ct_ids = []
-    ct1, estrategia = _buscar_contenttype(banco, app_label, model)
-    if ct1:
-        ct_ids.append(ct1.id)
-        
-    if app_norm == 'dash':
-        for alias_label in _app_labels_equivalentes('dash'):
-            try:
-                ct2 = ContentType.objects.using(banco).get(app_label__iexact=alias_label, model__iexact=model_norm)
-                if ct2 and ct2.id not in ct_ids:
-                    ct_ids.append(ct2.id)
-            except ContentType.DoesNotExist:
-                pass
+    ct_ids, _ = _contenttype_ids(banco, app_label, model)
 
     if not ct_ids:
-        if (getattr(perfil, 'perf_nome', '') or '').strip().lower() == 'superadmin':
-            return {'criar', 'editar', 'excluir', 'visualizar', 'listar', 'imprimir', 'exportar'}
         logger.error(f"[perfil_services] acoes_permitidas: ContentType não encontrado app={app_label} model={model}")
         return set()
     
-    cadeia = _cadeia_perfis(perfil)
-    acoes = set(PermissaoPerfil.objects.using(banco).filter(
-        perf_perf_id__in=cadeia,
-        perf_ctype_id__in=ct_ids
-    ).values_list('perf_acao', flat=True))
+    matriz = _matriz_perfil(banco, perfil.id)
+    acoes = set().union(*(matriz.acoes(ct_id) for ct_id in ct_ids))
     
     logger.info(f"[perfil_services] acoes_permitidas: perfil={perfil.perf_nome} app={app_norm} model={model_norm} acoes={sorted(acoes)}")
     return acoes
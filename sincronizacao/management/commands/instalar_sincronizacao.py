@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.licencas_loader import carregar_licencas_dict
+from core.utils import get_db_from_slug
+from sincronizacao.servico import SincronizacaoService
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria o log de alterações (sync_alteracoes) e as triggers que alimentam "
+        "a sincronização incremental do app"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slug", help="Processa apenas a licença informada")
+
+    def handle(self, *args, **options):
+        licencas = carregar_licencas_dict()
+        if not licencas:
+            raise CommandError("Nenhuma licença encontrada")
+
+        if options.get("slug"):
+            licencas = [lic for lic in licencas if lic["slug"] == options["slug"]]
+            if not licencas:
+                raise CommandError(f"Licença {options['slug']} não encontrada")
+
+        for lic in licencas:
+            slug = lic["slug"]
+            try:
+                banco = get_db_from_slug(slug)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Banco indisponível: {e}"))
+                continue
+
+            try:
+                SincronizacaoService.instalar(banco)
+                self.stdout.write(self.style.SUCCESS(f"[{slug}] Sincronização incremental instalada"))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{slug}] Erro ao instalar sincronização: {e}"))
@@ -0,0 +1,133 @@
+import logging
+
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_INTEIROS_OS = ['os_resp', 'os_clie', 'os_prof_aber', 'os_fabr', 'os_marc', 'os_mode', 'os_situ']
+ITENS_OS = (('pecas', 'peca_os'), ('servicos', 'serv_os'), ('horas', 'os_hora_os'))
+# lista do envio → prefixo dos campos do item
+PREFIXOS_ITENS = {'pecas': 'peca', 'servicos': 'serv', 'horas': 'os_hora'}
+
+
+def gravar_os(banco, registro, usuario):
+    """
+    Grava uma OS criada offline, com o mesmo preparo do POST de OsViewSet.
+    ``os_auto`` (UUID do app) é obrigatório e torna o envio idempotente:
+    reenviar a mesma OS devolve a que já existe. Envios simultâneos do mesmo
+    ``os_auto`` são serializados por advisory lock até o commit.
+    Retorna (situacao, dados) com situacao 'criado' ou 'existente' e dados
+    com a chave da OS e os ``id_mappings`` (id local → id gravado) dos itens.
+    """
+    from O_S.models import Os
+    from core.excecoes import ErroDominio
+
+    dados = dict(registro)
+    os_auto = dados.get('os_auto')
+    if not os_auto:
+        raise ErroDominio("os_auto é obrigatório para enviar OS offline.", codigo="dados_obrigatorios")
+    empresa = dados.get('os_empr') or dados.get('empr')
+    filial = dados.get('os_fili') or dados.get('fili')
+    if not empresa or not filial:
+        raise ErroDominio("Empresa e Filial são obrigatórios.", codigo="dados_obrigatorios")
+
+    with transaction.atomic(using=banco):
+        with connections[banco].cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"os_auto:{os_auto}"])
+        existente = Os.objects.using(banco).filter(os_empr=empresa, os_fili=filial, os_auto=os_auto).first()
+        if existente:
+            return 'existente', _resultado_os(existente, _mapear_itens(banco, existente, dados))
+        return _criar_os(banco, dados, empresa, filial, os_auto, usuario)
+
+
+def _criar_os(banco, dados, empresa, filial, os_auto, usuario):
+    from O_S.REST.serializers import OsSerializer
+    from O_S.services.os_service import OsService
+
+    # Itens apontam para a OS que ainda vai ser numerada
+    for lista, campo in ITENS_OS:
+        for item in dados.get(lista) or []:
+            if not isinstance(item.get(campo), int):
+                item[campo] = 0
+    for campo in CAMPOS_INTEIROS_OS:
+        if dados.get(campo) in ("", "null", False):
+            dados[campo] = None
+    dados['os_empr'], dados['os_fili'] = empresa, filial
+    dados['os_seto'] = dados.get('os_seto') or 1
+    dados['os_stat_os'] = 0
+    dados['os_os'] = "0"
+    if usuario and usuario.pk:
+        dados['os_usua_aber'] = usuario.pk
+        dados['os_resp'] = usuario.pk
+        dados['os_prof_aber'] = usuario.pk
+
+    serializer = OsSerializer(data=dados, context={'banco': banco})
+    serializer.is_valid(raise_exception=True)
+    os_data = dict(serializer.validated_data)
+    pecas = os_data.pop('pecas', [])
+    servicos = os_data.pop('servicos', [])
+    horas = os_data.pop('horas', [])
+    os_data.pop('os_os', None)
+    os_data['os_auto'] = os_auto
+
+    ordem = OsService.create_os(banco, os_data, pecas, servicos, horas)
+    return 'criado', _resultado_os(ordem, getattr(ordem, 'id_mappings', None))
+
+
+def _mapear_itens(banco, ordem, dados):
+    """Reenvio: casa os itens enviados com os gravados, na ordem do número do item."""
+    from O_S.models import OsHora, PecasOs, ServicosOs
+
+    modelos = {'pecas': PecasOs, 'servicos': ServicosOs, 'horas': OsHora}
+    id_mappings = {}
+    for lista, prefixo in PREFIXOS_ITENS.items():
+        campo = f'{prefixo}_item'
+        gravados = modelos[lista].objects.using(banco).filter(**{
+            f'{prefixo}_empr': ordem.os_empr, f'{prefixo}_fili': ordem.os_fili, f'{prefixo}_os': ordem.os_os,
+        }).order_by(campo).values_list(campo, flat=True)
+        id_mappings[f'{lista}_ids'] = [
+            {'local_id': item.get(campo), 'remote_id': remoto}
+            for item, remoto in zip(dados.get(lista) or [], gravados)
+            if isinstance(item, dict) and item.get(campo)
+        ]
+    return id_mappings
+
+
+def _resultado_os(ordem, id_mappings):
+    return {
+        'chave': {'os_empr': ordem.os_empr, 'os_fili': ordem.os_fili, 'os_os': ordem.os_os},
+        'id_mappings': id_mappings or {f'{lista}_ids': [] for lista in PREFIXOS_ITENS},
+    }
+
+
+GRAVADORES = {
+    'os': gravar_os,
+}
+
+
+def gravar_lote(banco, recurso, registros, usuario):
+    """
+    Grava os registros enviados pelo app, cada um em sua própria transação:
+    um registro com erro não desfaz os demais. Retorna um resultado por
+    registro, na ordem recebida.
+    """
+    from core.excecoes import ErroDominio
+
+    gravar = GRAVADORES.get(recurso)
+    if gravar is None:
+        raise ErroDominio(f"Recurso {recurso} não aceita envio offline.", codigo="push_indisponivel")
+
+    resultados = []
+    for indice, registro in enumerate(registros):
+        if not isinstance(registro, dict):
+            resultados.append({'indice': indice, 'situacao': 'erro', 'erro': 'Registro inválido'})
+            continue
+        try:
+            with transaction.atomic(using=banco):
+                situacao, dados = gravar(banco, registro, usuario)
+            resultados.append({'indice': indice, 'situacao': situacao, **dados})
+        except Exception as exc:
+            logger.warning("[SYNC] push %s registro %s rejeitado: %s", recurso, indice, exc)
+            detalhe = getattr(exc, 'detail', None) or getattr(exc, 'mensagem', None) or str(exc)
+            resultados.append({'indice': indice, 'situacao': 'erro', 'erro': detalhe})
+    return resultados
@@ -0,0 +1,381 @@
+import base64
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import connections, models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.excecoes import ErroDominio
+
+logger = logging.getLogger(__name__)
+
+TTL_DISPONIVEL = 300
+# Versão "depois de todas" numa transação: token que já viu a transação inteira
+VERSAO_MAXIMA = 2 ** 63 - 1
+
+# Recursos expostos ao app. 'chaves' identificam a linha (a primeira é sempre
+# a empresa); 'filial' é a coluna usada quando o app filtra por filial. Envio
+# de registros criados offline: ver sincronizacao.push.GRAVADORES.
+RECURSOS = {
+    'os': {
+        'modelo': 'O_S.Os',
+        'tabela': 'os',
+        'chaves': ('os_empr', 'os_fili', 'os_os'),
+        'filial': 'os_fili',
+    },
+    'produtos': {
+        'modelo': 'Produtos.Produtos',
+        'tabela': 'produtos',
+        'chaves': ('prod_empr', 'prod_codi'),
+    },
+    'entidades': {
+        'modelo': 'Entidades.Entidades',
+        'tabela': 'entidades',
+        'chaves': ('enti_empr', 'enti_clie'),
+    },
+    'precos': {
+        'modelo': 'Produtos.Tabelaprecos',
+        'tabela': 'tabelaprecos',
+        'chaves': ('tabe_empr', 'tabe_fili', 'tabe_prod'),
+        'filial': 'tabe_fili',
+    },
+}
+
+# Log de alterações: cada INSERT/UPDATE/DELETE nas tabelas dos recursos grava
+# a chave da linha com a transação (sync_txid) e uma versão crescente
+# (sync_vers). A leitura segue a ordem (sync_txid, sync_vers) e só entrega
+# transações anteriores ao xmin do snapshot, que já terminaram: uma transação
+# longa que pegou versão menor e comitou depois nunca é pulada pelo token.
+TABELAS_SYNC = """
+    CREATE TABLE IF NOT EXISTS sync_alteracoes (
+        sync_vers bigserial PRIMARY KEY,
+        sync_txid bigint NOT NULL DEFAULT txid_current(),
+        sync_tabe varchar(40) NOT NULL,
+        sync_empr varchar(50),
+        sync_chav jsonb NOT NULL,
+        sync_data timestamp NOT NULL DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS sync_alteracoes_tabe_empr
+        ON sync_alteracoes (sync_tabe, sync_empr, sync_txid, sync_vers);
+    CREATE INDEX IF NOT EXISTS sync_alteracoes_data ON sync_alteracoes (sync_data);
+    CREATE TABLE IF NOT EXISTS sync_controle (
+        sync_tabe varchar(40) PRIMARY KEY,
+        sync_txid_expu bigint NOT NULL DEFAULT 0
+    );
+"""
+
+# Trigger por comando com tabelas de transição: um UPDATE em massa grava as
+# chaves afetadas num único INSERT ... SELECT. Argumentos: coluna da empresa e
+# colunas da chave. Falha no log não impede a gravação original.
+FUNCAO_TRIGGER = """
+    CREATE OR REPLACE FUNCTION sync_registrar_trg()
+    RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        partes text[] := '{}';
+        chave text;
+        origem text;
+    BEGIN
+        FOR i IN 1..TG_NARGS - 1 LOOP
+            partes := partes || format('%L, r.%I', TG_ARGV[i], TG_ARGV[i]);
+        END LOOP;
+        chave := 'jsonb_build_object(' || array_to_string(partes, ', ') || ')';
+        BEGIN
+            FOREACH origem IN ARRAY (CASE TG_OP WHEN 'INSERT' THEN ARRAY['novos']
+                                                WHEN 'DELETE' THEN ARRAY['antigos']
+                                                ELSE ARRAY['antigos', 'novos'] END) LOOP
+                EXECUTE format(
+                    'INSERT INTO sync_alteracoes (sync_tabe, sync_empr, sync_chav) '
+                    'SELECT DISTINCT %L, r.%I::text, %s FROM %I r',
+                    TG_TABLE_NAME, TG_ARGV[0], chave, origem
+                );
+            END LOOP;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'sync_alteracoes não registrado (%): %', TG_TABLE_NAME, SQLERRM;
+        END;
+        RETURN NULL;
+    END
+    $$
+"""
+
+
+def _sql_triggers(tabela, chaves):
+    argumentos = ", ".join(f"'{c}'" for c in (chaves[0],) + tuple(chaves))
+    comandos = []
+    for evento, referencia in (
+        ('INSERT', 'NEW TABLE AS novos'),
+        ('UPDATE', 'OLD TABLE AS antigos NEW TABLE AS novos'),
+        ('DELETE', 'OLD TABLE AS antigos'),
+    ):
+        nome = f"sync_{tabela}_{evento.lower()}"
+        comandos.append(f"DROP TRIGGER IF EXISTS {nome} ON {tabela}")
+        comandos.append(
+            f"CREATE TRIGGER {nome} AFTER {evento} ON {tabela} "
+            f"REFERENCING {referencia} FOR EACH STATEMENT EXECUTE PROCEDURE sync_registrar_trg({argumentos})"
+        )
+    return comandos
+
+
+class TokenExpirado(Exception):
+    """Token anterior ao expurgo do log: o app precisa baixar tudo de novo."""
+
+
+def codificar_token(posicao, chave=None):
+    """Token opaco: posição (txid, versão) no log e, na carga inicial, a última chave enviada."""
+    dados = {'t': int(posicao[0]), 'v': int(posicao[1])}
+    if chave is not None:
+        dados['k'] = list(chave)
+    bruto = json.dumps(dados, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def decodificar_token(token):
+    try:
+        bruto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        dados = json.loads(bruto)
+        return (int(dados['t']), int(dados['v'])), dados.get('k')
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ErroDominio("Token de sincronização inválido.", codigo="token_invalido")
+
+
+def _recurso(nome):
+    recurso = RECURSOS.get(nome)
+    if recurso is None:
+        raise ErroDominio(f"Recurso de sincronização desconhecido: {nome}", codigo="recurso_invalido")
+    return recurso
+
+
+def _modelo(recurso):
+    return apps.get_model(recurso['modelo'])
+
+
+def _campos(modelo):
+    """(attname, coluna) dos campos enviados; binários (fotos) ficam fora."""
+    return [
+        (f.attname, f.column)
+        for f in modelo._meta.concrete_fields
+        if not isinstance(f, models.BinaryField)
+    ]
+
+
+def _atributos(modelo, colunas):
+    por_coluna = {f.column: f.attname for f in modelo._meta.concrete_fields}
+    return [por_coluna.get(c, c) for c in colunas]
+
+
+class SincronizacaoService:
+    """
+    Sincronização incremental do app offline. A primeira carga (sem token)
+    percorre a tabela por chave em páginas; depois o app só recebe as linhas
+    que mudaram desde a última versão que viu, como upserts (linha atual) ou
+    remoções (linha não existe mais).
+    """
+
+    _disponivel = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def disponivel(banco: str) -> bool:
+        agora = time.monotonic()
+        with SincronizacaoService._lock:
+            cache = SincronizacaoService._disponivel.get(banco)
+            if cache and agora - cache[1] < TTL_DISPONIVEL:
+                return cache[0]
+
+        try:
+            with connections[banco].cursor() as cursor:
+                cursor.execute("SELECT to_regclass('sync_alteracoes') IS NOT NULL")
+                disponivel = bool(cursor.fetchone()[0])
+        except Exception as e:
+            logger.warning("[SYNC] falha ao verificar log de alterações em %s: %s", banco, e)
+            disponivel = False
+
+        with SincronizacaoService._lock:
+            SincronizacaoService._disponivel[banco] = (disponivel, agora)
+        return disponivel
+
+    @staticmethod
+    def limpar_cache(banco: str = None) -> None:
+        with SincronizacaoService._lock:
+            if banco is None:
+                SincronizacaoService._disponivel.clear()
+            else:
+                SincronizacaoService._disponivel.pop(banco, None)
+
+    @staticmethod
+    def instalar(banco: str) -> None:
+        """Cria o log de alterações e as triggers das tabelas dos recursos."""
+        with transaction.atomic(using=banco):
+            with connections[banco].cursor() as cursor:
+                cursor.execute(TABELAS_SYNC)
+                cursor.execute(FUNCAO_TRIGGER)
+                for recurso in RECURSOS.values():
+                    for sql in _sql_triggers(recurso['tabela'], recurso['chaves']):
+                        cursor.execute(sql)
+        SincronizacaoService.limpar_cache(banco)
+
+    @staticmethod
+    def pagina(banco, nome, empresa, filial=None, token=None, limite=500):
+        """
+        Próxima página do recurso para a empresa (e filial, se o recurso
+        tiver). Retorna {'upserts', 'removidos', 'token', 'mais'}; o token
+        devolvido é o ``since`` da próxima chamada.
+        """
+        recurso = _recurso(nome)
+        if not SincronizacaoService.disponivel(banco):
+            raise ErroDominio(
+                "Sincronização incremental não instalada nesta base.", codigo="sync_indisponivel"
+            )
+        if token:
+            posicao, chave = decodificar_token(token)
+        else:
+            # Carga inicial: depois dela o log é lido a partir das transações
+            # que ainda podiam estar abertas quando ela começou.
+            posicao, chave = (SincronizacaoService._xmin_atual(banco), 0), []
+
+        if chave is not None:
+            return SincronizacaoService._carga_inicial(banco, recurso, empresa, filial, posicao, chave, limite)
+        return SincronizacaoService._alteracoes(banco, recurso, empresa, filial, posicao, limite)
+
+    @staticmethod
+    def _xmin_atual(banco):
+        with connections[banco].cursor() as cursor:
+            cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+            return int(cursor.fetchone()[0])
+
+    @staticmethod
+    def _queryset(banco, recurso, empresa, filial):
+        modelo = _modelo(recurso)
+        attrs = _atributos(modelo, recurso['chaves'])
+        qs = modelo.objects.using(banco).filter(**{attrs[0]: empresa})
+        if filial is not None and recurso.get('filial'):
+            qs = qs.filter(**_dict_filtro(modelo, recurso['filial'], filial))
+        return modelo, attrs, qs
+
+    @staticmethod
+    def _serializar(modelo, linhas):
+        campos = _campos(modelo)
+        return [dict(zip((c for _, c in campos), linha)) for linha in linhas]
+
+    @staticmethod
+    def _carga_inicial(banco, recurso, empresa, filial, posicao, apos, limite):
+        """Percorre a tabela por chave (keyset); ao terminar, passa para o log a partir de ``posicao``."""
+        modelo, attrs, qs = SincronizacaoService._queryset(banco, recurso, empresa, filial)
+        if apos:
+            qs = qs.filter(_depois_de(attrs, apos))
+        linhas = list(
+            qs.order_by(*attrs).values_list(*(a for a, _ in _campos(modelo)))[:limite]
+        )
+        upserts = SincronizacaoService._serializar(modelo, linhas)
+        mais = len(linhas) == limite
+        if mais:
+            ultima = upserts[-1]
+            token = codificar_token(posicao, [ultima[c] for c in recurso['chaves']])
+        else:
+            token = codificar_token(posicao)
+        return {'upserts': upserts, 'removidos': [], 'token': token, 'mais': mais}
+
+    @staticmethod
+    def _alteracoes(banco, recurso, empresa, filial, posicao, limite):
+        with connections[banco].cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT COALESCE(MAX(sync_txid_expu), 0), txid_snapshot_xmin(txid_current_snapshot())
+                  FROM sync_controle WHERE sync_tabe = %s
+                """,
+                [recurso['tabela']],
+            )
+            expurgo, xmin = (int(v) for v in cursor.fetchone())
+            if posicao[0] <= expurgo:
+                raise TokenExpirado()
+
+            # xmin lido antes da consulta: tudo abaixo dele já terminou
+            sql = """
+                SELECT sync_txid, sync_vers, sync_chav FROM sync_alteracoes
+                 WHERE sync_tabe = %s AND sync_empr = %s
+                   AND sync_txid < %s
+                   AND (sync_txid, sync_vers) > (%s, %s)
+            """
+            params = [recurso['tabela'], str(empresa), xmin, posicao[0], posicao[1]]
+            if filial is not None and recurso.get('filial'):
+                sql += " AND sync_chav ->> %s = %s"
+                params += [recurso['filial'], str(filial)]
+            cursor.execute(sql + " ORDER BY sync_txid, sync_vers LIMIT %s", params + [limite])
+            registros = cursor.fetchall()
+
+        mais = len(registros) == limite
+        # Página incompleta: o log até o xmin foi todo lido (inclusive linhas de
+        # outras empresas/filiais). O token avança até lá, para que o expurgo
+        # dessas linhas não vença o token de um app sem movimento.
+        fim = registros[-1][:2] if mais else max(tuple(posicao), (xmin - 1, VERSAO_MAXIMA))
+        if not registros:
+            return {'upserts': [], 'removidos': [], 'token': codificar_token(fim), 'mais': False}
+
+        chaves = {}
+        for _, _, chave in registros:
+            if isinstance(chave, str):
+                chave = json.loads(chave)
+            chaves[tuple(chave.get(c) for c in recurso['chaves'])] = chave
+
+        modelo = _modelo(recurso)
+        attrs = _atributos(modelo, recurso['chaves'])
+        filtro = Q()
+        for valores in chaves:
+            filtro |= Q(**dict(zip(attrs, valores)))
+        linhas = modelo.objects.using(banco).filter(filtro).values_list(*(a for a, _ in _campos(modelo)))
+        upserts = SincronizacaoService._serializar(modelo, linhas)
+
+        presentes = {tuple(str(u[c]) for c in recurso['chaves']) for u in upserts}
+        removidos = [
+            chave for valores, chave in chaves.items()
+            if tuple(str(v) for v in valores) not in presentes
+        ]
+        return {
+            'upserts': upserts,
+            'removidos': removidos,
+            'token': codificar_token(fim),
+            'mais': mais,
+        }
+
+    @staticmethod
+    def expurgar(banco, dias):
+        """
+        Remove do log as alterações com mais de ``dias`` dias. Tokens mais
+        antigos que o expurgo passam a exigir nova carga inicial.
+        """
+        limite = timezone.now() - timedelta(days=dias)
+        with transaction.atomic(using=banco):
+            with connections[banco].cursor() as cursor:
+                cursor.execute(
+                    """
+                    WITH removidas AS (
+                        DELETE FROM sync_alteracoes WHERE sync_data < %s
+                        RETURNING sync_tabe, sync_txid
+                    )
+                    INSERT INTO sync_controle (sync_tabe, sync_txid_expu)
+                    SELECT sync_tabe, MAX(sync_txid) FROM removidas GROUP BY sync_tabe
+                    ON CONFLICT (sync_tabe) DO UPDATE
+                       SET sync_txid_expu = GREATEST(sync_controle.sync_txid_expu, EXCLUDED.sync_txid_expu)
+                    """,
+                    [limite],
+                )
+                return cursor.rowcount
+
+
+def _dict_filtro(modelo, coluna, valor):
+    return {_atributos(modelo, [coluna])[0]: valor}
+
+
+def _depois_de(attrs, chave):
+    """Q de comparação de tupla: (a, b, c) > (x, y, z) por chave composta."""
+    filtro = Q()
+    for i, attr in enumerate(attrs):
+        condicao = Q(**{f"{attr}__gt": chave[i]})
+        for anterior, valor in zip(attrs[:i], chave[:i]):
+            condicao &= Q(**{anterior: valor})
+        filtro |= condicao
+    return filtro
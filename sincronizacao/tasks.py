@@ -0,0 +1,31 @@
+from celery import shared_task
+from django.conf import settings
+
+from core.licencas_loader import carregar_licencas_dict
+from core.utils import get_db_from_slug
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def expurgar_alteracoes(slug=None, dias=None):
+    """
+    Roda diariamente via Celery Beat.
+    Remove do log de sincronização as alterações antigas de cada licença.
+    """
+    from .servico import SincronizacaoService
+
+    dias = dias or getattr(settings, 'SYNC_RETENCAO_DIAS', 30)
+    slugs = [slug] if slug else [lic["slug"] for lic in carregar_licencas_dict()]
+    resultados = {}
+    for licenca_slug in slugs:
+        try:
+            banco = get_db_from_slug(licenca_slug)
+            if not SincronizacaoService.disponivel(banco):
+                continue
+            resultados[licenca_slug] = SincronizacaoService.expurgar(banco, dias)
+        except Exception as exc:
+            logger.error(f"[SYNC] Erro ao expurgar {licenca_slug}: {exc}")
+            resultados[licenca_slug] = None
+    return resultados
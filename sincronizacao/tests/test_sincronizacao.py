@@ -0,0 +1,166 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from core.excecoes import ErroDominio
+from sincronizacao import push
+from sincronizacao import servico
+from sincronizacao.servico import (
+    RECURSOS, SincronizacaoService, TokenExpirado, codificar_token, decodificar_token,
+    _depois_de, _sql_triggers,
+)
+
+
+def _conexao(fetchone=(), fetchall=()):
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = list(fetchone)
+    cursor.fetchall.side_effect = list(fetchall)
+    conexao = MagicMock()
+    conexao.cursor.return_value.__enter__.return_value = cursor
+    return conexao, cursor
+
+
+class TokenTests(SimpleTestCase):
+    def test_ida_e_volta(self):
+        token = codificar_token((120, 7), [1, "ABC"])
+        self.assertNotIn("=", token)
+        self.assertEqual(decodificar_token(token), ((120, 7), [1, "ABC"]))
+        self.assertEqual(decodificar_token(codificar_token((5, 0))), ((5, 0), None))
+
+    def test_token_invalido(self):
+        with self.assertRaises(ErroDominio):
+            decodificar_token("nao-e-token")
+
+
+class ConsultasTests(SimpleTestCase):
+    def test_triggers_por_comando_com_empresa_e_chaves(self):
+        comandos = _sql_triggers('os', RECURSOS['os']['chaves'])
+        self.assertEqual(len(comandos), 6)
+        self.assertIn("FOR EACH STATEMENT", comandos[1])
+        self.assertIn("sync_registrar_trg('os_empr', 'os_empr', 'os_fili', 'os_os')", comandos[1])
+
+    def test_keyset_chave_composta(self):
+        filtro = str(_depois_de(['a', 'b'], [1, 'X']))
+        self.assertIn("('a__gt', 1)", filtro)
+        self.assertIn("(AND: ('b__gt', 'X'), ('a', 1))", filtro)
+
+
+@patch.object(SincronizacaoService, "disponivel", return_value=True)
+class AlteracoesTests(SimpleTestCase):
+    def test_upserts_e_removidos(self, _disponivel):
+        conexao, cursor = _conexao(
+            fetchone=[(0, 200)],
+            fetchall=[[
+                (100, 1, {"os_empr": 1, "os_fili": 1, "os_os": 10}),
+                (100, 2, {"os_empr": 1, "os_fili": 1, "os_os": 11}),
+                (101, 3, {"os_empr": 1, "os_fili": 1, "os_os": 10}),
+            ]],
+        )
+        modelo = MagicMock()
+        campo = lambda nome: MagicMock(attname=nome, column=nome)
+        modelo._meta.concrete_fields = [campo("os_empr"), campo("os_fili"), campo("os_os"), campo("os_obse")]
+        modelo.objects.using.return_value.filter.return_value.values_list.return_value = [(1, 1, 10, "ok")]
+
+        with patch.object(servico, "connections", {"t1": conexao}), \
+                patch.object(servico, "_modelo", return_value=modelo):
+            pagina = SincronizacaoService.pagina("t1", "os", 1, filial=1, token=codificar_token((90, 0)), limite=3)
+
+        self.assertEqual(pagina["upserts"], [{"os_empr": 1, "os_fili": 1, "os_os": 10, "os_obse": "ok"}])
+        self.assertEqual(pagina["removidos"], [{"os_empr": 1, "os_fili": 1, "os_os": 11}])
+        self.assertTrue(pagina["mais"])
+        self.assertEqual(decodificar_token(pagina["token"])[0], (101, 3))
+        sql, params = cursor.execute.call_args_list[1].args
+        self.assertIn("(sync_txid, sync_vers) > (%s, %s)", sql)
+        self.assertIn("sync_txid < %s", sql)
+        self.assertEqual(params, ["os", "1", 200, 90, 0, "os_fili", "1", 3])
+
+    def test_sem_alteracoes_avanca_ate_o_xmin(self, _disponivel):
+        conexao, cursor = _conexao(fetchone=[(0, 200)], fetchall=[[]])
+        with patch.object(servico, "connections", {"t1": conexao}):
+            pagina = SincronizacaoService.pagina("t1", "os", 1, filial=1, token=codificar_token((90, 4)))
+
+        self.assertFalse(pagina["mais"])
+        posicao, _ = decodificar_token(pagina["token"])
+        self.assertEqual(posicao, (199, servico.VERSAO_MAXIMA))
+        self.assertIn("txid_snapshot_xmin", cursor.execute.call_args_list[0].args[0])
+
+        # o expurgo das linhas de outras empresas (txid < 199) não vence o token novo
+        conexao, _ = _conexao(fetchone=[(150, 210)], fetchall=[[]])
+        with patch.object(servico, "connections", {"t1": conexao}):
+            SincronizacaoService.pagina("t1", "os", 1, token=pagina["token"])
+
+    def test_pagina_incompleta_passa_da_ultima_linha_lida(self, _disponivel):
+        conexao, _ = _conexao(
+            fetchone=[(0, 200)],
+            fetchall=[[(100, 1, {"os_empr": 1, "os_fili": 1, "os_os": 10})]],
+        )
+        modelo = MagicMock()
+        modelo._meta.concrete_fields = [MagicMock(attname=n, column=n) for n in ("os_empr", "os_fili", "os_os")]
+        modelo.objects.using.return_value.filter.return_value.values_list.return_value = [(1, 1, 10)]
+        with patch.object(servico, "connections", {"t1": conexao}), \
+                patch.object(servico, "_modelo", return_value=modelo):
+            pagina = SincronizacaoService.pagina("t1", "os", 1, filial=1, token=codificar_token((90, 0)), limite=5)
+        self.assertEqual(decodificar_token(pagina["token"])[0], (199, servico.VERSAO_MAXIMA))
+
+    def test_token_anterior_ao_expurgo(self, _disponivel):
+        conexao, _ = _conexao(fetchone=[(95, 200)])
+        with patch.object(servico, "connections", {"t1": conexao}):
+            with self.assertRaises(TokenExpirado):
+                SincronizacaoService.pagina("t1", "produtos", 1, token=codificar_token((90, 4)))
+
+    def test_recurso_desconhecido(self, _disponivel):
+        with self.assertRaises(ErroDominio):
+            SincronizacaoService.pagina("t1", "pedidos", 1)
+
+
+class PushTests(SimpleTestCase):
+    @patch("sincronizacao.push.transaction.atomic", return_value=MagicMock())
+    def test_erro_em_um_registro_nao_para_o_lote(self, _atomic):
+        gravar = MagicMock(side_effect=[
+            ("criado", {"chave": {"os_os": 1}}), ErroDominio("falhou"), ("existente", {"chave": {"os_os": 2}}),
+        ])
+        with patch.dict(push.GRAVADORES, {"os": gravar}):
+            resultados = push.gravar_lote("t1", "os", [{"a": 1}, {"b": 2}, "x", {"c": 3}], None)
+
+        self.assertEqual([r["situacao"] for r in resultados], ["criado", "erro", "erro", "existente"])
+        self.assertEqual(resultados[1]["erro"], "falhou")
+        self.assertEqual(resultados[3]["chave"], {"os_os": 2})
+        self.assertEqual(gravar.call_count, 3)
+
+    @patch("sincronizacao.push.transaction.atomic", return_value=MagicMock())
+    def test_reenvio_trava_os_auto_e_devolve_mapeamentos(self, _atomic):
+        from O_S.models import Os, OsHora, PecasOs, ServicosOs
+
+        conexao, cursor = _conexao()
+        existente = Os(os_empr=1, os_fili=2, os_os=30)
+        registro = {
+            "os_auto": "uuid-1", "os_empr": 1, "os_fili": 2,
+            "pecas": [{"peca_item": "p-a"}, {"peca_item": "p-b"}],
+            "servicos": [{"serv_item": "s-a"}],
+        }
+        with patch.object(push, "connections", {"t1": conexao}), \
+                patch.object(Os, "objects") as oss, patch.object(PecasOs, "objects") as pecas, \
+                patch.object(ServicosOs, "objects") as servicos, patch.object(OsHora, "objects") as horas:
+            oss.using.return_value.filter.return_value.first.return_value = existente
+            pecas.using.return_value.filter.return_value.order_by.return_value.values_list.return_value = [1, 2]
+            servicos.using.return_value.filter.return_value.order_by.return_value.values_list.return_value = [900]
+            horas.using.return_value.filter.return_value.order_by.return_value.values_list.return_value = []
+            situacao, dados = push.gravar_os("t1", registro, None)
+
+        self.assertEqual(cursor.execute.call_args.args, (
+            "SELECT pg_advisory_xact_lock(hashtext(%s))", ["os_auto:uuid-1"],
+        ))
+        self.assertEqual(situacao, "existente")
+        self.assertEqual(dados, {
+            "chave": {"os_empr": 1, "os_fili": 2, "os_os": 30},
+            "id_mappings": {
+                "pecas_ids": [{"local_id": "p-a", "remote_id": 1}, {"local_id": "p-b", "remote_id": 2}],
+                "servicos_ids": [{"local_id": "s-a", "remote_id": 900}],
+                "horas_ids": [],
+            },
+        })
+        servicos.using.return_value.filter.assert_called_with(serv_empr=1, serv_fili=2, serv_os=30)
+
+    def test_recurso_sem_push(self):
+        with self.assertRaises(ErroDominio):
+            push.gravar_lote("t1", "produtos", [], None)
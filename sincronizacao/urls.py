@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .views import SincronizacaoPushView, SincronizacaoView
+
+urlpatterns = [
+    path('<str:recurso>/', SincronizacaoView.as_view(), name='sync-recurso'),
+    path('<str:recurso>/push/', SincronizacaoPushView.as_view(), name='sync-push'),
+]
@@ -0,0 +1,93 @@
+import logging
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.dominio_handler import tratar_erro, tratar_sucesso
+from core.excecoes import ErroDominio
+from core.registry import get_licenca_db_config
+
+from .push import gravar_lote
+from .servico import SincronizacaoService, TokenExpirado
+
+logger = logging.getLogger(__name__)
+
+
+def _banco(request):
+    banco = get_licenca_db_config(request)
+    if not banco:
+        raise ErroDominio("Banco de dados não encontrado.", codigo="banco_nao_encontrado")
+    return banco
+
+
+def _inteiro(valor, nome):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ErroDominio(f"Parâmetro {nome} inválido.", codigo="parametros_invalidos")
+
+
+class SincronizacaoView(APIView):
+    """
+    GET /api/<slug>/sync/<recurso>/?empr=1&fili=1&since=<token>&limite=500
+
+    Sem ``since`` faz a carga inicial em páginas; com ``since`` devolve só as
+    linhas alteradas (upserts) e removidas desde o token. Enquanto ``mais``
+    vier verdadeiro, o app chama de novo com o ``token`` recebido.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, slug=None, recurso=None):
+        try:
+            empresa = request.query_params.get('empr')
+            if not empresa:
+                raise ErroDominio("Parâmetro empr é obrigatório.", codigo="dados_obrigatorios")
+            filial = request.query_params.get('fili')
+            limite = _inteiro(request.query_params.get('limite') or getattr(settings, 'SYNC_PAGINA', 500), 'limite')
+            limite = max(1, min(limite, getattr(settings, 'SYNC_PAGINA_MAX', 2000)))
+
+            pagina = SincronizacaoService.pagina(
+                _banco(request), recurso, empresa,
+                filial=filial or None,
+                token=request.query_params.get('since') or None,
+                limite=limite,
+            )
+            return Response(pagina)
+        except TokenExpirado:
+            return Response(
+                {
+                    "erro": "token_expirado",
+                    "mensagem": "Token anterior ao histórico disponível; refaça a carga inicial sem since.",
+                },
+                status=status.HTTP_410_GONE,
+            )
+        except Exception as e:
+            return tratar_erro(e)
+
+
+class SincronizacaoPushView(APIView):
+    """
+    POST /api/<slug>/sync/<recurso>/push/ com {"registros": [...]}
+
+    Grava em lote os registros criados offline. Cada registro tem o seu
+    resultado ('criado', 'existente' ou 'erro') com a chave definitiva e o
+    ``id_mappings`` dos itens (id local → id gravado).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, slug=None, recurso=None):
+        try:
+            registros = request.data.get('registros') if isinstance(request.data, dict) else request.data
+            if not isinstance(registros, list):
+                raise ErroDominio("Envie a lista em 'registros'.", codigo="dados_obrigatorios")
+            maximo = getattr(settings, 'SYNC_PUSH_MAX', 200)
+            if len(registros) > maximo:
+                raise ErroDominio(f"Máximo de {maximo} registros por envio.", codigo="lote_grande")
+
+            resultados = gravar_lote(_banco(request), recurso, registros, request.user)
+            return tratar_sucesso({'resultados': resultados})
+        except Exception as e:
+            return tratar_erro(e)
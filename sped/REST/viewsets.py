@@ -1,4 +1,4 @@
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 
 from rest_framework import status, viewsets
 from rest_framework.permissions import IsAuthenticated
@@ -49,7 +49,7 @@ class SpedViewSet(viewsets.ViewSet):
         if not empresa or not filial:
             return Response({"detail": "Empresa e filial são obrigatórias."}, status=status.HTTP_400_BAD_REQUEST)
 
-        texto = GeradorSpedService(
+        gerador = GeradorSpedService(
             db_alias=db_alias,
             empresa_id=empresa,
             filial_id=filial,
@@ -57,7 +57,7 @@ class SpedViewSet(viewsets.ViewSet):
             data_fim=serializer.validated_data["data_fim"],
             cod_receita=serializer.validated_data.get("cod_receita"),
             data_vencimento=serializer.validated_data.get("data_vencimento"),
-        ).gerar()
+        )
 
         nome = "SPED_{empresa}_{filial}_{ini}_{fim}.txt".format(
             empresa=empresa,
@@ -65,7 +65,7 @@ class SpedViewSet(viewsets.ViewSet):
             ini=serializer.validated_data["data_inicio"].strftime("%Y%m%d"),
             fim=serializer.validated_data["data_fim"].strftime("%Y%m%d"),
         )
-        resp = HttpResponse(texto, content_type="text/plain; charset=utf-8")
+        resp = StreamingHttpResponse(gerador.pedacos(), content_type="text/plain; charset=utf-8")
         resp["Content-Disposition"] = 'attachment; filename="{0}"'.format(nome)
         return resp
 
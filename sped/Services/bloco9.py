@@ -12,16 +12,32 @@ def _reg(linha):
     return partes[1].strip()
 
 
+class ContadorRegistros:
+    """Contagem por registro e total de linhas, acumulada enquanto o arquivo é gerado."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+
+    def registrar(self, linha):
+        if not linha:
+            return
+        self.total += 1
+        r = _reg(linha)
+        if r:
+            self.counts[r] += 1
+
+
 class Bloco9Service:
-    def __init__(self, *, linhas_anteriores):
-        self.linhas_anteriores = [l for l in (linhas_anteriores or []) if l]
+    def __init__(self, *, linhas_anteriores=None, contador=None):
+        if contador is None:
+            contador = ContadorRegistros()
+            for l in linhas_anteriores or []:
+                contador.registrar(l)
+        self.contador = contador
 
     def gerar(self):
-        counts = Counter()
-        for l in self.linhas_anteriores:
-            r = _reg(l)
-            if r:
-                counts[r] += 1
+        counts = Counter(self.contador.counts)
 
         regs = set(counts.keys())
         regs.update({"9001", "9900", "9990", "9999"})
@@ -39,6 +55,6 @@ class Bloco9Service:
 
         bloco9.append("|9990|{qtd}|".format(qtd=len(bloco9) + 2))
 
-        total_arquivo = len(self.linhas_anteriores) + len(bloco9) + 1
+        total_arquivo = self.contador.total + len(bloco9) + 1
         bloco9.append("|9999|{qtd}|".format(qtd=total_arquivo))
         return bloco9
@@ -45,23 +45,26 @@ def _periodo_mensal(data_inicio, data_fim):
 
 
 class BlocoEService:
-    def __init__(self, *, data_inicio, data_fim, linhas_blococ, cod_receita=None, data_vencimento=None):
+    def __init__(self, *, data_inicio, data_fim, linhas_blococ=None, cod_receita=None, data_vencimento=None):
         self.data_inicio = data_inicio
         self.data_fim = data_fim
-        self.linhas_blococ = list(linhas_blococ or [])
         self.cod_receita = (cod_receita or "").strip()
         self.data_vencimento = data_vencimento
+        self.total_c190 = Decimal("0")
+        for l in linhas_blococ or []:
+            self.acumular_c190(l)
+
+    def acumular_c190(self, linha):
+        """Soma o C190 no total de débitos; o gerador chama a cada linha do bloco C."""
+        if not linha or not linha.startswith("|C190|"):
+            return
+        partes = linha.split("|")
+        if len(partes) < 7:
+            return
+        self.total_c190 += _to_decimal_br(partes[6])
 
     def _somar_icms_c190(self):
-        total = Decimal("0")
-        for l in self.linhas_blococ:
-            if not l or not l.startswith("|C190|"):
-                continue
-            partes = l.split("|")
-            if len(partes) < 7:
-                continue
-            total += _to_decimal_br(partes[6])
-        return total
+        return self.total_c190
 
     def gerar(self):
         dt_ini, dt_fim = _periodo_mensal(self.data_inicio, self.data_fim)
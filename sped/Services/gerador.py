@@ -1,5 +1,5 @@
 from sped.Services.bloco0 import Bloco0Service
-from sped.Services.bloco9 import Bloco9Service
+from sped.Services.bloco9 import Bloco9Service, ContadorRegistros
 from sped.Services.blocoC import BlocoCService
 from sped.Services.blocoE import BlocoEService
 from sped.Services.blocoG import BlocoGService
@@ -7,6 +7,10 @@ from sped.Services.blocoH import BlocoHService
 from sped.Services.blocoK import BlocoKService
 
 
+# Tamanho aproximado (bytes) de cada pedaço entregue ao arquivo/resposta HTTP
+TAMANHO_PEDACO = 64 * 1024
+
+
 class GeradorSpedService:
     def __init__(self, *, db_alias, empresa_id, filial_id, data_inicio, data_fim, cod_receita=None, data_vencimento=None):
         self.db_alias = db_alias
@@ -17,61 +21,73 @@ class GeradorSpedService:
         self.cod_receita = cod_receita
         self.data_vencimento = data_vencimento
 
-    def gerar(self):
-        linhas = []
-
-        bloco0 = Bloco0Service(
+    def _filtros(self):
+        return dict(
             db_alias=self.db_alias,
             empresa_id=self.empresa_id,
             filial_id=self.filial_id,
             data_inicio=self.data_inicio,
             data_fim=self.data_fim,
-        ).gerar()
-        linhas.extend(bloco0)
-
-        blococ = BlocoCService(
-            db_alias=self.db_alias,
-            empresa_id=self.empresa_id,
-            filial_id=self.filial_id,
-            data_inicio=self.data_inicio,
-            data_fim=self.data_fim,
-        ).gerar()
-        linhas.extend(blococ)
+        )
 
+    def linhas(self):
+        """
+        Linhas do arquivo na ordem dos blocos, geradas sob demanda. Os totais
+        do bloco E e as contagens do bloco 9 são acumulados enquanto as
+        linhas passam, sem guardar o arquivo em memória.
+        """
+        contador = ContadorRegistros()
         bloco_e = BlocoEService(
             data_inicio=self.data_inicio,
             data_fim=self.data_fim,
-            linhas_blococ=blococ,
             cod_receita=self.cod_receita,
             data_vencimento=self.data_vencimento,
-        ).gerar()
-        linhas.extend(bloco_e)
+        )
 
-        bloco_g = BlocoGService(
-            data_inicio=self.data_inicio,
-            data_fim=self.data_fim,
-        ).gerar()
-        linhas.extend(bloco_g)
+        for linha in Bloco0Service(**self._filtros()).gerar():
+            contador.registrar(linha)
+            yield linha
 
-        bloco_h = BlocoHService(
-            db_alias=self.db_alias,
-            empresa_id=self.empresa_id,
-            filial_id=self.filial_id,
-            data_inicio=self.data_inicio,
-            data_fim=self.data_fim,
-        ).gerar()
-        linhas.extend(bloco_h)
+        for linha in BlocoCService(**self._filtros()).linhas():
+            contador.registrar(linha)
+            bloco_e.acumular_c190(linha)
+            yield linha
 
-        bloco_k = BlocoKService(
-            db_alias=self.db_alias,
-            empresa_id=self.empresa_id,
-            filial_id=self.filial_id,
-            data_inicio=self.data_inicio,
-            data_fim=self.data_fim,
-        ).gerar()
-        linhas.extend(bloco_k)
+        blocos = (
+            bloco_e,
+            BlocoGService(data_inicio=self.data_inicio, data_fim=self.data_fim),
+            BlocoHService(**self._filtros()),
+            BlocoKService(**self._filtros()),
+        )
+        for bloco in blocos:
+            for linha in bloco.gerar():
+                contador.registrar(linha)
+                yield linha
 
-        bloco9 = Bloco9Service(linhas_anteriores=linhas).gerar()
-        linhas.extend(bloco9)
+        yield from Bloco9Service(contador=contador).gerar()
 
-        return "\r\n".join(linhas) + "\r\n"
+    def pedacos(self, tamanho=TAMANHO_PEDACO, encoding="utf-8"):
+        """Arquivo em pedaços de ~``tamanho`` bytes (para StreamingHttpResponse)."""
+        buffer = []
+        acumulado = 0
+        for linha in self.linhas():
+            dados = (linha + "\r\n").encode(encoding)
+            buffer.append(dados)
+            acumulado += len(dados)
+            if acumulado >= tamanho:
+                yield b"".join(buffer)
+                buffer = []
+                acumulado = 0
+        if buffer:
+            yield b"".join(buffer)
+
+    def gravar(self, destino, encoding="utf-8"):
+        """Grava o arquivo em ``destino`` (arquivo binário aberto); devolve os bytes escritos."""
+        total = 0
+        for pedaco in self.pedacos(encoding=encoding):
+            destino.write(pedaco)
+            total += len(pedaco)
+        return total
+
+    def gerar(self):
+        return "".join(linha + "\r\n" for linha in self.linhas())
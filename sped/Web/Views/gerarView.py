@@ -1,5 +1,5 @@
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from django.views import View
 
@@ -42,7 +42,7 @@ class SpedGerarView(View):
             messages.error(request, "Empresa e filial são obrigatórias.")
             return render(request, self.template_name, {"form": form, "slug": self.slug})
 
-        texto = GeradorSpedService(
+        gerador = GeradorSpedService(
             db_alias=self.db_alias,
             empresa_id=self.empresa_id,
             filial_id=self.filial_id,
@@ -50,7 +50,7 @@ class SpedGerarView(View):
             data_fim=form.cleaned_data["data_fim"],
             cod_receita=form.cleaned_data.get("cod_receita"),
             data_vencimento=form.cleaned_data.get("data_vencimento"),
-        ).gerar()
+        )
 
         nome = "SPED_{empresa}_{filial}_{ini}_{fim}.txt".format(
             empresa=self.empresa_id,
@@ -58,6 +58,6 @@ class SpedGerarView(View):
             ini=form.cleaned_data["data_inicio"].strftime("%Y%m%d"),
             fim=form.cleaned_data["data_fim"].strftime("%Y%m%d"),
         )
-        resp = HttpResponse(texto, content_type="text/plain; charset=utf-8")
+        resp = StreamingHttpResponse(gerador.pedacos(), content_type="text/plain; charset=utf-8")
         resp["Content-Disposition"] = 'attachment; filename="{0}"'.format(nome)
         return resp
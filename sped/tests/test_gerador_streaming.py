@@ -0,0 +1,42 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sped.Services.bloco9 import Bloco9Service
+from sped.Services.gerador import GeradorSpedService
+
+
+LINHAS_C = ["|C001|0|", "|C100|x|", "|C190|000|5102|18,00|100,00|100,00|18,00|", "|C990|4|"]
+
+
+class TestGeradorSpedStreaming(SimpleTestCase):
+    def _gerador(self):
+        return GeradorSpedService(
+            db_alias="demo", empresa_id=1, filial_id=1, data_inicio=None, data_fim=None,
+        )
+
+    def _patches(self):
+        return [
+            mock.patch("sped.Services.gerador.Bloco0Service.gerar", return_value=["|0000|x|", "|0990|2|"]),
+            mock.patch("sped.Services.gerador.BlocoCService.linhas", return_value=iter(LINHAS_C)),
+            mock.patch("sped.Services.gerador.BlocoHService.gerar", return_value=["|H001|1|", "|H990|2|"]),
+            mock.patch("sped.Services.gerador.BlocoKService.gerar", return_value=["|K001|1|", "|K990|2|"]),
+        ]
+
+    def test_bloco9_e_pedacos_iguais_a_geracao_em_lista(self):
+        for p in self._patches():
+            p.start()
+            self.addCleanup(p.stop)
+
+        linhas = list(self._gerador().linhas())
+        anteriores = linhas[:linhas.index("|9001|0|")]
+
+        self.assertEqual(linhas[len(anteriores):], Bloco9Service(linhas_anteriores=anteriores).gerar())
+        self.assertIn("|E110|100,00|", "\n".join(linhas))
+        self.assertEqual(linhas[-1], "|9999|{0}|".format(len(linhas)))
+
+        for p in self._patches():
+            p.start()
+            self.addCleanup(p.stop)
+        conteudo = b"".join(self._gerador().pedacos(tamanho=16)).decode()
+        self.assertEqual(conteudo, "".join(l + "\r\n" for l in linhas))
@@ -4,7 +4,7 @@ import base64
 from lxml import etree
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.serialization import pkcs12, Encoding
+from cryptography.hazmat.primitives.serialization import Encoding
 
 from transportes.models import Cte
 from Licencas.models import Filiais
@@ -104,22 +104,12 @@ class AssinaturaService:
         - Posicao do Signature  : ultimo filho do <CTe>
         """
         try:
-            caminho_certificado, senha_certificado = CertificadoLoader(self.filial).load()
+            certificado = CertificadoLoader(self.filial).carregar()
         except Exception as e:
             raise Exception(f"Certificado digital nao configurado/indisponivel: {str(e)}")
 
-        if not caminho_certificado:
-            raise Exception("Certificado digital nao configurado/indisponivel.")
-
         try:
-            with open(caminho_certificado, "rb") as f:
-                pfx_bytes = f.read()
-
-            password = (senha_certificado or "").encode("utf-8") if senha_certificado else None
-            private_key, cert, _chain = pkcs12.load_key_and_certificates(pfx_bytes, password)
-
-            if private_key is None or cert is None:
-                raise Exception("Certificado A1 invalido ou incompleto.")
+            private_key, cert = certificado.chave, certificado.certificado
 
             xml_content = self._normalizar_xml(xml_content)
             parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=False)
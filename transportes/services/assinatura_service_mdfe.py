@@ -4,7 +4,7 @@ import base64
 from lxml import etree
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.serialization import pkcs12, Encoding
+from cryptography.hazmat.primitives.serialization import Encoding
 
 from transportes.models import Mdfe
 from Licencas.models import Filiais
@@ -73,17 +73,8 @@ class AssinaturaMDFeService:
         return "\n".join(b64[i : i + 76] for i in range(0, len(b64), 76))
 
     def assinar(self, xml_content: str) -> str:
-        caminho_certificado, senha_certificado = CertificadoLoader(self.filial).load()
-        if not caminho_certificado:
-            raise Exception("Certificado digital não configurado/indisponível.")
-
-        with open(caminho_certificado, "rb") as f:
-            pfx_bytes = f.read()
-
-        password = (senha_certificado or "").encode("utf-8") if senha_certificado else None
-        private_key, cert, _chain = pkcs12.load_key_and_certificates(pfx_bytes, password)
-        if private_key is None or cert is None:
-            raise Exception("Certificado A1 inválido ou incompleto.")
+        certificado = CertificadoLoader(self.filial).carregar()
+        private_key, cert = certificado.chave, certificado.certificado
 
         xml_content = self._normalizar_xml(xml_content)
         parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=False)
@@ -1,17 +1,4 @@
 import logging
-import os
-import tempfile
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from lxml import etree
-from cryptography.hazmat.primitives.serialization import (
-    pkcs12,
-    Encoding,
-    PrivateFormat,
-    NoEncryption,
-)
-
 from lxml import etree
 import gzip
 import base64
@@ -66,7 +53,7 @@ class SefazGateway:
 
     def enviar(self, xml_assinado: str) -> dict:
         ambiente = self._ambiente()
-        cert, key = self._get_cert_pem_and_key_pem()
+        certificado = self._certificado()
         uf = self._uf()
 
         url = self._get_url(uf, ambiente, "recepcao_sinc")
@@ -105,7 +92,7 @@ class SefazGateway:
         resp = self._post_soap(
             url=url,
             envelope=envelope,
-            cert=(cert, key),
+            certificado=certificado,
         )
 
         return self._processar_retorno_xml(resp)
@@ -139,20 +126,9 @@ class SefazGateway:
                     </soap12:Body>
                     </soap12:Envelope>"""
 
-    def _post_soap(self, *, url: str, envelope: str, cert): 
-
-        
-        session = requests.Session()
-        
-
-        retry = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 502, 503, 504],
-            allowed_methods=["POST"],
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-        session.mount("https://", adapter)
+    def _post_soap(self, *, url: str, envelope: str, certificado):
+        # Sessão TLS do certificado em cache: reaproveita conexões entre envios
+        session = certificado.sessao(verify=self._resolve_verify(), tentativas=3)
 
         headers = {
                         "Content-Type": "application/soap+xml; charset=utf-8",
@@ -162,8 +138,6 @@ class SefazGateway:
             url,
             data=envelope.encode("utf-8"),
             headers=headers,
-            cert=cert,
-            verify=self._resolve_verify(),
             timeout=30,
         )
 
@@ -202,29 +176,8 @@ class SefazGateway:
     def _resolve_verify(self):
         return False  # homologação geralmente precisa
 
-    def _get_cert_pem_and_key_pem(self):
-        caminho, senha = CertificadoLoader(self.filial).load()
-
-        with open(caminho, "rb") as f:
-            pfx = f.read()
-
-        key, cert, _ = pkcs12.load_key_and_certificates(
-            pfx,
-            senha.encode() if senha else None
-        )
-
-        cert_pem = cert.public_bytes(Encoding.PEM)
-        key_pem = key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption())
-
-        cert_file = tempfile.NamedTemporaryFile(delete=False)
-        cert_file.write(cert_pem)
-        cert_file.close()
-
-        key_file = tempfile.NamedTemporaryFile(delete=False)
-        key_file.write(key_pem)
-        key_file.close()
-
-        return cert_file.name, key_file.name
+    def _certificado(self):
+        return CertificadoLoader(self.filial).carregar()
 
     def _montar_envi_cte(self, xml):
         root = etree.fromstring(xml.encode())
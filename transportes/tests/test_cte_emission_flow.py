@@ -25,7 +25,7 @@ class EmissaoCTEFlowTest(SimpleTestCase):
         return has_op_wrapper and has_msg and body_payload_is_base64
 
     @patch.object(SefazGateway, "_get_url", return_value="https://example.invalid/CTeRecepcaoSincV4")
-    @patch.object(SefazGateway, "_get_cert_pem_and_key_pem", return_value=("", ""))
+    @patch.object(SefazGateway, "_certificado", return_value=None)
     @patch.object(SefazGateway, "_ambiente", return_value="2")
     @patch.object(SefazGateway, "_uf", return_value="PR")
     @patch.object(SefazGateway, "_cuf_from_filial", return_value="41")
@@ -40,7 +40,7 @@ class EmissaoCTEFlowTest(SimpleTestCase):
 
         gw = SefazGateway(cte)
 
-        def fake_post(url, envelope, cert, proxies, soap_action, soap_version):
+        def fake_post(url, envelope, certificado, proxies, soap_action, soap_version):
             if self._should_accept_envelope(envelope):
                 return self._fake_success_response()
             raise Exception("cStat 244: Falha na descompactacao da area de dados")